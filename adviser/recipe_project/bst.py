@@ -20,6 +20,7 @@
 from typing import List, Set, Optional
 from services.service import PublishSubscribe
 from services.service import Service
+from services.session import SessionAttribute
 from utils.beliefstate import BeliefState
 from utils.useract import UserActionType, UserAct
 from .models.recipe_req import RecipeReq
@@ -34,11 +35,18 @@ class RecipeBST(Service):
     A rule-based approach to belief state tracking.
     """
 
-    def __init__(self, domain=None, logger=None):
-        Service.__init__(self, domain=domain)
+    # dialog-level state, kept per session
+    bs      = SessionAttribute(factory=lambda service: BeliefState(service.domain, service.history_window))
+    state   = SessionAttribute(default=None)
+
+    def __init__(self, domain=None, logger=None, history_window: int = 2, delta_publishing: bool = False):
+        # with delta_publishing, only the changes of the belief state are sent each turn (see services.delta)
+        Service.__init__(self, domain=domain, delta_topics=['beliefstate'] if delta_publishing else [])
 
         self.logger                             = logger
-        self.bs                                 = BeliefState(domain)
+        # turns kept in the belief state (and sent to the policy), see BeliefState
+        self.history_window                     = history_window
+        self.bs                                 = BeliefState(domain, history_window)
         self.state : Optional[BotStateView]     = None
 
     
@@ -97,13 +105,14 @@ class RecipeBST(Service):
                         the value is a new BeliefState object
         """
         # initialize belief state
-        self.bs = BeliefState(self.domain)
+        self.bs = BeliefState(self.domain, self.history_window)
         self.bs['start'] = True
 
     def cnt_matching(self) -> int:
         """ Returns the number of recipes matching the currently given informs. """
 
-        return len(self.matching())
+        informs = self.bs['informs']
+        return self.domain.count_recipes(RecipeReq.from_informs(informs))
 
     def matching(self) -> List[Recipe]:
         """ Returns all recipes matching the currently given informs. """
@@ -212,4 +221,4 @@ class RecipeBST(Service):
                     del self.bs['informs'][self.domain.get_primary_key()]
 
             elif act.type == UserActionType.StartOver:
-                self.bs = BeliefState(self.domain)
\ No newline at end of file
+                self.bs = BeliefState(self.domain, self.history_window)
\ No newline at end of file
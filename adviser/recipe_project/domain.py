@@ -17,22 +17,108 @@
 #
 ###############################################################################
 
-from typing import List, Iterable, Set
+import sqlite3
+import threading
+from typing import Dict, List, Iterable, Optional, Set
 from utils.domain.jsonlookupdomain import JSONLookupDomain
 from .models.recipe_req import RecipeReq
 from .models.recipe import Recipe
+from .query import RecipeQuery, TYPED_COLUMNS
+from .index import RecipeIndex
 
 
 class RecipeDomain(JSONLookupDomain):
     """Domain for the Recipe Database
 
+    Matches of `find_recipes` and `count_recipes` are cached by request, so the BST and the
+    policy can ask for the same request several times per turn without querying the database
+    again. Any write to the database clears the cache.
+
+    By default, requests are answered by an in-memory `RecipeIndex` (built on the first search),
+    so only the matching recipes themselves are loaded from the database.
+
     Attributes:
         last_results (List[dict]): Current results which the user might request info about
     """
 
-    def __init__(self):
-        JSONLookupDomain.__init__(self, 'recipes', 'resources/ontologies/recipes.json', 'resources/databases/recipes.db', 'Recipes')
+    def __init__(self, in_memory: bool = False, sqllite_db_file: str = 'resources/databases/recipes.db',
+                 max_cached_requests: int = 64, use_index: bool = True, shared_memory: bool = False,
+                 working_db_file: str = None, wal: bool = False):
+        """
+        Args:
+            in_memory (bool): If False (default), a working copy of the database file is used
+                              directly, so favorites are stored persistently. If True, a copy in
+                              memory is used and favorites are lost after the session.
+            sqllite_db_file (str): path to the recipe database (relative to the adviser directory)
+            max_cached_requests (int): number of requests whose matches are cached (0 disables
+                                       the cache)
+            use_index (bool): If True, searches use the in-memory RecipeIndex instead of SQL
+                              conditions
+            shared_memory (bool): If True (and `in_memory`), processes on this host share one
+                                  read-only copy of the database (see JSONLookupDomain)
+            working_db_file (str): path to the working copy storing the favorites (default:
+                                   `resources/databases/recipes.user.db`, see JSONLookupDomain)
+            wal (bool): If True (and not `in_memory`), the working copy uses WAL journaling, so
+                        searches don't wait for writes (see JSONLookupDomain)
+        """
+        self.query = RecipeQuery('recipes')
+        self.max_cached_requests = max_cached_requests
+        self._matches: Dict[tuple, List[Recipe]] = {}
+        self._counts: Dict[tuple, int] = {}
+        # the services of a dialog system search the domain from separate threads
+        self._cache_lock = threading.Lock()
+        self.use_index = use_index
+        self._index: Optional[RecipeIndex] = None
+        self._ingredient_names: Optional[Set[str]] = None
+        JSONLookupDomain.__init__(self, 'recipes', 'resources/ontologies/recipes.json', sqllite_db_file, 'Recipes',
+                                  in_memory=in_memory, shared_memory=shared_memory,
+                                  working_db_file=working_db_file, wal=wal)
         self.last_results = []
+
+    def __getstate__(self):
+        # caches and the index are rebuilt on demand - don't send them along with every belief state
+        state = JSONLookupDomain.__getstate__(self)
+        state.update(_matches={}, _counts={}, _index=None, _ingredient_names=None)
+        del state['_cache_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._cache_lock = threading.Lock()
+
+    def _prepare_db(self, db: sqlite3.Connection):
+        """ Creates indexes for the columns used in lookups, integer copies of the `rating` and
+            `prep_time` columns and the normalized ingredients table `recipe_ingredients`
+            (one row per recipe and ingredient), if they don't exist yet, and fills them in for
+            recipes which don't have them yet (e.g. added to the database since).
+        """
+        table = self.get_domain_name()
+        for column in ('name', 'ease', 'cookbook'):
+            db.execute(f"CREATE INDEX IF NOT EXISTS {table}_{column} ON {table} ({column} COLLATE NOCASE)")
+
+        columns = {row['name'] for row in db.execute(f"PRAGMA table_info({table})")}
+        for typed_column, column in TYPED_COLUMNS.items():
+            if typed_column not in columns:
+                db.execute(f"ALTER TABLE {table} ADD COLUMN {typed_column} INTEGER")
+            db.execute(f"UPDATE {table} SET {typed_column} = CAST({column} AS INTEGER) "
+                       f"WHERE {typed_column} IS NULL AND {column} IS NOT NULL")
+            db.execute(f"CREATE INDEX IF NOT EXISTS {table}_{typed_column} ON {table} ({typed_column})")
+
+        db.execute("CREATE TABLE IF NOT EXISTS recipe_ingredients "
+                   "(recipe_id INTEGER NOT NULL, ingredient TEXT NOT NULL COLLATE NOCASE)")
+        db.execute("CREATE INDEX IF NOT EXISTS recipe_ingredients_ingredient "
+                   "ON recipe_ingredients (ingredient, recipe_id)")
+        rows = db.execute(f"SELECT rowid AS id, ingredients FROM {table} WHERE ingredients IS NOT NULL "
+                          f"AND rowid NOT IN (SELECT recipe_id FROM recipe_ingredients)").fetchall()
+        db.executemany("INSERT INTO recipe_ingredients (recipe_id, ingredient) VALUES (?, ?)",
+                       [(row['id'], ingredient)
+                        for row in rows for ingredient in self._split_ingredients(row['ingredients'])])
+
+    @staticmethod
+    def _split_ingredients(ingredients: str) -> List[str]:
+        """ Splits the comma-joined ingredients column of a recipe into single ingredients """
+        ingredients = (i.strip().strip('"').strip() for i in ingredients.split(","))
+        return [i for i in ingredients if i]
     
  
     def find_recipes(self, request: RecipeReq, partial: bool = False) -> List[Recipe]:
@@ -46,27 +132,69 @@ class RecipeDomain(JSONLookupDomain):
 
         if request.is_empty():
             return []
-        q = ""
-        op = "OR" if partial else "AND"
-        if len(request.ingredients) > 0:
-            q += "".join(f" {op} LOWER(ingredients) LIKE '%{i.lower()}%' " for i in request.ingredients)
-        if request.ease is not None:
-            q += f" {op} lower(ease) in {self._expand_ease(request.ease)} "
-        if request.cookbook is not None:
-            q += f" {op} lower(cookbook) = '{request.cookbook.lower()}' "
-        if request.name is not None:
-            q += f" {op} lower(name) = '{request.name.lower()}' "
-        if request.rating is not None:
-            q += f" {op} CAST(rating as INTEGER) >= {request.rating} "
-        if request.prep_time is not None:
-            q += f" {op} CAST(prep_time as INTEGER) <= {request.prep_time} "
-
-        if len(q) > 0:
-            q = q[4:]
-            q = "SELECT * FROM {} where {}".format(self.get_domain_name(), q)
+        key = (request.key(), partial)
+        with self._cache_lock:
+            found = self._matches.get(key)
+        if found is not None:
+            return list(found)
+        if self.use_index:
+            q, params = self.query.by_rowids(self.get_index().find(request, partial))
+        else:
+            q, params = self.query.find(request, partial)
+        found = [Recipe.from_db(r) for r in self.query_db(q, params)]
+        self._cache(self._matches, key, found)
+        return list(found)
+
+    def count_recipes(self, request: RecipeReq, partial: bool = False) -> int:
+        """ Returns the number of recipes matching the given RecipeReq, without loading them.
+
+        Args:
+            request: A RecipeReq which represents the currently given informs
+            partial: If True, conditions are linked with OR (see `find_recipes`)
+        """
+
+        if request.is_empty():
+            return 0
+        key = (request.key(), partial)
+        with self._cache_lock:
+            if key in self._matches:
+                return len(self._matches[key])
+            if key in self._counts:
+                return self._counts[key]
+        if self.use_index:
+            cnt = self.get_index().count(request, partial)
         else:
-            q = "SELECT * FROM {}".format(self.get_domain_name())
-        return [Recipe.from_db(r) for r in self.query_db(q)]
+            q, params = self.query.count(request, partial)
+            cnt = self.query_db(q, params)[0]['cnt']
+        self._cache(self._counts, key, cnt)
+        return cnt
+
+    def get_index(self) -> RecipeIndex:
+        """ Returns the inverted index over all recipes, building it on the first call.
+            The indexed columns never change at runtime, so writes (favorites) keep the index.
+        """
+        if self._index is None:
+            recipes, ingredients = self.query.index_rows()
+            self._index = RecipeIndex(self.query_db(recipes), self.query_db(ingredients))
+        return self._index
+
+    def _cache(self, cache: dict, key: tuple, value):
+        """ Stores a result in one of the match caches, dropping all entries once it is full """
+        with self._cache_lock:
+            if len(cache) >= self.max_cached_requests:
+                cache.clear()
+            if self.max_cached_requests > 0:
+                cache[key] = value
+
+    def clear_cache(self):
+        """ Forgets all cached matches (called on every write to the database). """
+        with self._cache_lock:
+            self._matches.clear()
+            self._counts.clear()
+
+    def write_db(self, query_str: str, parameters: Iterable = ()):
+        JSONLookupDomain.write_db(self, query_str, parameters)
+        self.clear_cache()
         
 
     def get_random(self) -> Recipe:
@@ -80,49 +208,35 @@ class RecipeDomain(JSONLookupDomain):
     def get_users_favs(self) -> List[Recipe]:
         """ Get all recipes that are marked as favorite, ordered by name ascending. """
 
-        q = "SELECT * FROM {} WHERE favorite = true ORDER BY name ASC".format(self.get_domain_name())
-        r = self.query_db(q)
-        return [Recipe.from_db(r) for r in self.query_db(q)]
+        q, params = self.query.favorites()
+        return [Recipe.from_db(r) for r in self.query_db(q, params)]
 
     def set_favorite(self, name: str):
         """ Set the recipe with the given name as favorite. """
 
-        q = "UPDATE {} SET favorite = true WHERE name = '{}'".format(self.get_domain_name(), name)
-        self.query_db(q)
+        self.write_db(*self.query.set_favorite(name, True))
 
     def unset_favorite(self, name: str):
         """ Unset the recipe with the given name as favorite. """
 
-        q = "UPDATE {} SET favorite = false WHERE name = '{}'".format(self.get_domain_name(), name)
-        self.query_db(q)
-
-
-
-    def _expand_ease(self, ease: str):
-        """ Ease might be given in forms not occuring in the database. To still get meaningful results, 
-            we interpret "easy" as meaning either "super simple" or "fairly easy".
-         """
-
-        if ease.casefold() in ["easy", "simple"]:
-            return "('super simple', 'fairly easy')"
-        if ease.casefold() in ["not too hard", "not too difficult"]:
-            return "('super simple', 'fairly easy', 'average')"
-        return f"('{ease}')"
+        self.write_db(*self.query.set_favorite(name, False))
 
      
     def get_all_ingredients(self) -> Set[str]:
         """ Returns a list of all ingredients in the database """
 
-        q           = "SELECT DISTINCT ingredients from {}".format(self.get_domain_name())
-        ingredients = self.query_db(q)
-        res_set     = set()
-        for i in ingredients:
-            for t in i["ingredients"].split(","):
-                t = t.strip()
-                if not t in res_set:
-                    res_set.add(t)
-
-        return res_set
+        if self._ingredient_names is None:
+            q           = "SELECT DISTINCT ingredients from {}".format(self.get_domain_name())
+            ingredients = self.query_db(q)
+            res_set     = set()
+            for i in ingredients:
+                for t in i["ingredients"].split(","):
+                    t = t.strip()
+                    if not t in res_set:
+                        res_set.add(t)
+            self._ingredient_names = res_set
+
+        return set(self._ingredient_names)
 
     def get_all_recipe_names(self) -> Set[str]:
         """ Returns a list of all recipe names in the database """
@@ -0,0 +1,183 @@
+###############################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+"""In-process inverted index answering recipe requests with bitset operations."""
+
+import string
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .models.recipe_req import RecipeReq
+from .query import EASE_SYNONYMS
+
+# sqlite's NOCASE collation and LIKE only fold ASCII letters
+_NOCASE = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def _fold(value: str) -> str:
+    return value.translate(_NOCASE)
+
+
+class RecipeIndex:
+    """
+    Inverted index over the recipes table, built once in memory.
+
+    Every recipe gets a position (in rowid order). Each constraint of a request is turned into a
+    boolean numpy array over all positions ("bitset"); the constraints are then combined with
+    `&` (all given informs) or `|` (partial search). This gives the same results as the SQL
+    statements built by `RecipeQuery`, but doesn't touch the database.
+
+    Attributes:
+        rowids (np.ndarray): rowid of the recipe at each position
+    """
+
+    ATTRIBUTES = ('name', 'ease', 'cookbook', 'type')
+
+    def __init__(self, recipes: Iterable[dict], ingredients: Iterable[dict], max_cached_terms: int = 1024):
+        """
+        Args:
+            recipes (Iterable[dict]): rows with the keys `rowid`, `rating_value`, `prep_minutes`
+                                      and one per entry of `ATTRIBUTES`
+            ingredients (Iterable[dict]): one row per ingredient of the recipe_ingredients table,
+                                          with the keys `ingredient` and `recipe_ids` (comma
+                                          separated rowids)
+            max_cached_terms (int): number of ingredient search terms whose bitsets are kept
+        """
+        recipes = list(recipes)
+        self.rowids = np.array([recipe['rowid'] for recipe in recipes], dtype=np.int64)
+        self.size = len(recipes)
+
+        # attribute -> folded value -> positions (values repeat a lot, so group before folding)
+        self._postings = {}
+        for attribute in self.ATTRIBUTES:
+            by_value = defaultdict(list)
+            for pos, recipe in enumerate(recipes):
+                by_value[recipe[attribute]].append(pos)
+            self._postings[attribute] = self._merge_folded(
+                (value, positions) for value, positions in by_value.items() if value is not None)
+
+        self._ingredients = self._merge_folded(
+            (row['ingredient'], self._known(np.array(row['recipe_ids'].split(','), dtype=np.int64)))
+            for row in ingredients)
+        self._ingredient_terms: Dict[str, np.ndarray] = {}
+        self.max_cached_terms = max_cached_terms
+
+        # numeric columns: positions sorted by value (recipes without a value are left out)
+        self._sorted = {}
+        for column in ('rating_value', 'prep_minutes'):
+            pairs = [(recipe[column], pos) for pos, recipe in enumerate(recipes) if recipe[column] is not None]
+            values = np.array([value for value, _ in pairs], dtype=np.int64)
+            positions = np.array([pos for _, pos in pairs], dtype=np.int64)
+            order = np.argsort(values, kind='stable')
+            self._sorted[column] = (values[order], positions[order])
+
+    def _known(self, recipe_ids: np.ndarray) -> np.ndarray:
+        """ Returns the positions of those `recipe_ids` which are part of the index """
+        positions = np.searchsorted(self.rowids, recipe_ids)
+        found = positions < self.size
+        found[found] = self.rowids[positions[found]] == recipe_ids[found]
+        return positions[found]
+
+    @staticmethod
+    def _merge_folded(postings: Iterable) -> Dict[str, np.ndarray]:
+        """ Merges (value, positions) pairs into sorted positions per case-folded value """
+        merged = defaultdict(list)
+        for value, positions in postings:
+            merged[_fold(value)].append(positions)
+        # most values (e.g. names) occur in one spelling only - those are used as they are
+        return {value: arrays[0] if len(arrays) == 1 else np.unique(np.concatenate(arrays))
+                for value, arrays in merged.items()}
+
+    def _mask(self, positions: Optional[np.ndarray] = None) -> np.ndarray:
+        mask = np.zeros(self.size, dtype=bool)
+        if positions is not None:
+            mask[positions] = True
+        return mask
+
+    def ingredient(self, term: str) -> np.ndarray:
+        """ Returns the bitset of all recipes with an ingredient containing `term` (like SQL LIKE) """
+        term = _fold(term)
+        if term not in self._ingredient_terms:
+            mask = self._mask()
+            for ingredient, positions in self._ingredients.items():
+                if term in ingredient:
+                    mask[positions] = True
+            if len(self._ingredient_terms) >= self.max_cached_terms:
+                self._ingredient_terms.clear()
+            self._ingredient_terms[term] = mask
+        return self._ingredient_terms[term]
+
+    def attribute(self, attribute: str, values: Iterable[str]) -> np.ndarray:
+        """ Returns the bitset of all recipes whose `attribute` equals one of `values` (ignoring case) """
+        mask = self._mask()
+        for value in values:
+            positions = self._postings[attribute].get(_fold(value))
+            if positions is not None:
+                mask[positions] = True
+        return mask
+
+    def at_least(self, column: str, value: int) -> np.ndarray:
+        """ Returns the bitset of all recipes with `column >= value` """
+        values, positions = self._sorted[column]
+        return self._mask(positions[np.searchsorted(values, value, side='left'):])
+
+    def at_most(self, column: str, value: int) -> np.ndarray:
+        """ Returns the bitset of all recipes with `column <= value` """
+        values, positions = self._sorted[column]
+        return self._mask(positions[:np.searchsorted(values, value, side='right')])
+
+    def search(self, request: RecipeReq, partial: bool = False) -> np.ndarray:
+        """ Returns the bitset of all recipes matching the request.
+
+        Args:
+            request (RecipeReq): the currently given informs (must not be empty)
+            partial (bool): If True, recipes matching at least one of the constraints are returned
+
+        Returns:
+            boolean array over all recipe positions
+        """
+        masks = [self.ingredient(ingredient) for ingredient in request.ingredients]
+        if request.ease is not None:
+            masks.append(self.attribute('ease', EASE_SYNONYMS.get(request.ease.casefold(), (request.ease,))))
+        if request.cookbook is not None:
+            masks.append(self.attribute('cookbook', (request.cookbook,)))
+        if request.name is not None:
+            masks.append(self.attribute('name', (request.name,)))
+        if request.rating is not None:
+            masks.append(self.at_least('rating_value', int(request.rating)))
+        if request.prep_time is not None:
+            masks.append(self.at_most('prep_minutes', int(request.prep_time)))
+
+        result = masks[0].copy()
+        for mask in masks[1:]:
+            if partial:
+                result |= mask
+            else:
+                result &= mask
+        return result
+
+    def count(self, request: RecipeReq, partial: bool = False) -> int:
+        """ Returns the number of recipes matching the request """
+        return int(np.count_nonzero(self.search(request, partial)))
+
+    def find(self, request: RecipeReq, partial: bool = False) -> List[int]:
+        """ Returns the rowids of all recipes matching the request, in ascending order """
+        return self.rowids[np.flatnonzero(self.search(request, partial))].tolist()
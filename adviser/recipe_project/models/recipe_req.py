@@ -40,6 +40,11 @@ class RecipeReq:
 
         return req
 
+    def key(self) -> tuple:
+        """ Returns a hashable, canonical form of the request (ingredient order doesn't matter) """
+        return (tuple(sorted(set(self.ingredients))), self.ease, self.rating, self.prep_time,
+                self.cookbook, self.name)
+
     def is_empty(self):
         return (len(self.ingredients) == 0 
             and self.ease is None 
@@ -20,6 +20,7 @@
 from utils import DiasysLogger
 from utils import SysAct, SysActionType
 from services.service import Service, PublishSubscribe
+from services.session import SessionAttribute
 from services.nlg.templates.templatefile import TemplateFile
 from .policy import BotStateView, BotState
 from typing import Optional
@@ -31,6 +32,9 @@ import os
 class RecipeNLG(Service):
     """NLG service for our recipe bot"""
 
+    # state of the bot in the current dialog (kept per session)
+    bot_state_view = SessionAttribute(default=None)
+
     def __init__(self, domain, logger=DiasysLogger()):
 
         super(RecipeNLG, self).__init__(domain, debug_logger=logger)
@@ -42,7 +46,6 @@ class RecipeNLG(Service):
                     os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
                     'resources/nlg_templates/%sMessages.nlg' % self.domain.get_domain_name())
         
-        self.bot_state_view : Optional[BotStateView]        = None
         self.templates                                      = TemplateFile(self.template_filename, self.domain)
 
     @PublishSubscribe(sub_topics=["sys_act", "bot_state"], pub_topics=["sys_utterance"])
@@ -1,10 +1,11 @@
 import re
-import json
 import os
 from typing import List, Optional
 
 from utils import UserAct, UserActionType, DiasysLogger, SysAct, SysActionType, BeliefState
 from services.service import Service, PublishSubscribe
+from services.session import SessionAttribute
+from services.nlu.rulecache import load_rules
 from .policy import BotStateView, BotState
 
 def get_root_dir():
@@ -12,11 +13,29 @@ def get_root_dir():
 
 UNK_ING : str        = "UNK_ING"
 
+
+def _add_unknown_ingredient_rule(general_regex: dict, request_regex: dict, inform_regex: dict):
+    """ Constructs a special rule for unknown ingredients """
+    # 1. take any rule from the ingredients informs
+    (dummy_ing, reg)    = next(iter(inform_regex['ingredients'].items()))
+    # 2. replace the {ingredients} part with a regex matching any word
+    unk_re              = reg.replace(dummy_ing, "[^ ]+")
+    # 3. register the new rule for the ingredient UNK_ING
+    inform_regex['ingredients'][UNK_ING] = unk_re
+
+
 class RecipeNLU(Service):
     """NLU for the recipe bot. Code mostly taken from HandcraftedNLU, with some added checks that 
         would not fit well into GeneralRules.json.
     """
 
+    # having the current system state available can be helpful in some cases (kept per session)
+    bot_state_view = SessionAttribute(default=None)
+    # acts and slots of the current turn (kept per session, reset on every utterance)
+    user_acts = SessionAttribute(factory=lambda service: [])
+    slots_informed = SessionAttribute(factory=lambda service: set())
+    slots_requested = SessionAttribute(factory=lambda service: set())
+
     def __init__(self, domain, logger=DiasysLogger()):
         Service.__init__(self, domain=domain)
 
@@ -31,9 +50,6 @@ class RecipeNLU(Service):
         # Getting the relative path where regexes are stored
         self.base_folder                                    = os.path.join(get_root_dir(), 'resources', 'nlu_regexes')
 
-        # having the current system state available can be helpful in some cases
-        self.bot_state_view : Optional[BotStateView]  = None
-
         # Holds a set of all ingredients occurring in the domain db after initialization
         self.ingredients                                    = set()
 
@@ -161,18 +177,16 @@ class RecipeNLU(Service):
 
         """
 
-        # Iteration over all general acts
-        for act in self.general_regex:
-            # Check if the regular expression and the user utterance match
-            if re.search(self.general_regex[act], user_utterance, re.I):
-                # Mapping the act to User Act
-                if act != 'dontcare' and act != 'req_everything':
-                    user_act_type = UserActionType(act)
-                else:
-                    user_act_type = act
-               
-                user_act = UserAct(act_type=user_act_type, text=user_utterance)
-                self.user_acts.append(user_act)
+        # Iteration over all general acts matching the user utterance
+        for act in self.rule_matcher.match_general(user_utterance):
+            # Mapping the act to User Act
+            if act != 'dontcare' and act != 'req_everything':
+                user_act_type = UserActionType(act)
+            else:
+                user_act_type = act
+
+            user_act = UserAct(act_type=user_act_type, text=user_utterance)
+            self.user_acts.append(user_act)
 
     def _match_domain_specific_act(self, user_utterance: str):
         """
@@ -202,7 +216,7 @@ class RecipeNLU(Service):
         """
         # Iteration over all user requestable slots
         for slot in self.USER_REQUESTABLE:
-            if self._check(re.search(self.request_regex[slot], user_utterance, re.I)):
+            if self.rule_matcher.match_request(slot, user_utterance):
                 self._add_request(user_utterance, slot)
 
     def _add_request(self, user_utterance: str, slot: str):
@@ -232,12 +246,11 @@ class RecipeNLU(Service):
 
         """
 
-        # Iteration over all user informable slots and their slots
+        # Iteration over all user informable slots and the values matched for them
         for slot in self.USER_INFORMABLE:
-            for value in self.inform_regex[slot]:
-                if self._check(re.search(self.inform_regex[slot][value], user_utterance, re.I)):
-                    # Adding user inform act
-                    self._add_inform(user_utterance, slot, value)
+            for value in self.rule_matcher.match_inform(slot, user_utterance):
+                # Adding user inform act
+                self._add_inform(user_utterance, slot, value)
         
     def _add_inform(self, user_utterance: str, slot: str, value: str):
         """
@@ -344,19 +357,12 @@ class RecipeNLU(Service):
             Args:
                 language (Language): Enum representing the language the user has selected
         """
-        self.general_regex = json.load(open(self.base_folder + '/GeneralRules.json'))
-        self.request_regex = json.load(open(self.base_folder + '/' + self.domain_name
-                                            + 'RequestRules.json'))
-        self.inform_regex = json.load(open(self.base_folder + '/' + self.domain_name
-                                            + 'InformRules.json'))
-
-        # construct a special rule for unknown ingredients
-        # 1. take any rule from the ingredients informs
-        (dummy_ing, reg)    = list(self.inform_regex['ingredients'].items())[0]
-        # 2. replace the {ingredients} part with a regex matching any word
-        unk_re              = reg.replace(dummy_ing, "[^ ]+")
-        # 3. register the new rule for the ingredient UNK_ING
-        self.inform_regex['ingredients'][UNK_ING] = unk_re
-        
+        # the rules are loaded and compiled once per process (and cached on disk), see services.nlu.rulecache
+        rules = load_rules(self.domain, self.base_folder, extend=_add_unknown_ingredient_rule)
+        self.general_regex = rules.general_regex
+        self.request_regex = rules.request_regex
+        self.inform_regex = rules.inform_regex
+        self.rule_matcher = rules.matcher
+
         # load all ingredients
         self.ingredients = self.domain.get_all_ingredients()
\ No newline at end of file
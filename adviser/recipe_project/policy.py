@@ -24,6 +24,7 @@ from .domain import RecipeDomain
 from .models.recipe_req import RecipeReq
 from .models.recipe import Recipe
 from services.service import PublishSubscribe, Service
+from services.session import SessionAttribute
 from utils import SysAct, SysActionType
 from utils.logger import DiasysLogger
 from utils.useract import UserAct, UserActionType
@@ -99,6 +100,9 @@ class BotStateView:
 class RecipePolicy(Service):
     """Policy module for recipe lookup dialogues.  """
 
+    # dialog-level state, kept per session
+    state = SessionAttribute(factory=lambda service: BotStateView())
+
     def __init__(self, domain: RecipeDomain, logger: DiasysLogger = DiasysLogger()):
         Service.__init__(self, domain=domain, debug_logger=logger)
 
@@ -256,8 +260,8 @@ class RecipePolicy(Service):
 
             if cnt == 0:
                 if sum(len(v.keys()) for v in informs.values()) > 1:
-                    partially_matching = self.domain.find_recipes(req, partial = True)
-                    if len(partially_matching) > 0 and len(partially_matching) < 100:
+                    partially_matching = self.domain.count_recipes(req, partial = True)
+                    if partially_matching > 0 and partially_matching < 100:
                         return self.answer(BotState.ASKED_FOR_PART, SysActionType.AskForPartialSearch)
 
                 return self._not_found()
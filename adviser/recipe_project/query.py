@@ -0,0 +1,158 @@
+###############################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+"""Compiles recipe lookups into parameterized SQL statements."""
+
+import json
+from typing import List, Tuple
+
+from .models.recipe_req import RecipeReq
+
+# Ease might be given in forms not occuring in the database. To still get meaningful results,
+# we interpret "easy" as meaning either "super simple" or "fairly easy".
+EASE_SYNONYMS = {
+    "easy": ("super simple", "fairly easy"),
+    "simple": ("super simple", "fairly easy"),
+    "not too hard": ("super simple", "fairly easy", "average"),
+    "not too difficult": ("super simple", "fairly easy", "average"),
+}
+
+# typed copies of text columns, created by the RecipeDomain when the database is opened
+TYPED_COLUMNS = {
+    'rating_value': 'rating',
+    'prep_minutes': 'prep_time',
+}
+
+Statement = Tuple[str, tuple]
+
+
+def _like_pattern(value: str) -> str:
+    """ Returns a LIKE pattern matching `value` as a substring (with wildcards escaped) """
+    value = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{value}%"
+
+
+class RecipeQuery:
+    """
+    Builds the statements used by the RecipeDomain.
+
+    All values are passed as parameters, so the statement text only depends on which slots are
+    given (and the number of ingredients). This way, sqlite3 can reuse its prepared statements
+    and user input is never interpreted as SQL.
+    """
+
+    def __init__(self, table: str = 'recipes', ingredient_table: str = 'recipe_ingredients'):
+        """
+        Args:
+            table (str): name of the recipe table
+            ingredient_table (str): name of the table mapping recipe rowids to single ingredients
+        """
+        self.table = table
+        self.ingredient_table = ingredient_table
+
+    def find(self, request: RecipeReq, partial: bool = False) -> Statement:
+        """ Compiles a RecipeReq into a SELECT statement.
+
+        Args:
+            request (RecipeReq): the currently given informs (must not be empty)
+            partial (bool): If True, conditions are linked with OR instead of AND
+
+        Returns:
+            tuple(statement, parameters)
+        """
+        conditions, params = self.conditions(request)
+        op = " OR " if partial else " AND "
+        return f"SELECT * FROM {self.table} WHERE {op.join(conditions)} ORDER BY rowid", tuple(params)
+
+    def conditions(self, request: RecipeReq) -> Tuple[List[str], List]:
+        """ Returns one SQL condition per constraint of the request and the parameters for them
+
+        Args:
+            request (RecipeReq): the currently given informs
+
+        Returns:
+            tuple(list of conditions, list of parameters)
+        """
+        conditions, params = [], []
+        for ingredient in request.ingredients:
+            # substring match, so e.g. "beans" also finds recipes with "Black Beans"
+            conditions.append(f"rowid IN (SELECT recipe_id FROM {self.ingredient_table} "
+                              f"WHERE ingredient LIKE ? ESCAPE '\\')")
+            params.append(_like_pattern(ingredient))
+        if request.ease is not None:
+            eases = EASE_SYNONYMS.get(request.ease.casefold(), (request.ease,))
+            conditions.append(f"ease COLLATE NOCASE IN ({', '.join('?' * len(eases))})")
+            params.extend(eases)
+        if request.cookbook is not None:
+            conditions.append("cookbook = ? COLLATE NOCASE")
+            params.append(request.cookbook)
+        if request.name is not None:
+            conditions.append("name = ? COLLATE NOCASE")
+            params.append(request.name)
+        if request.rating is not None:
+            conditions.append("rating_value >= ?")
+            params.append(int(request.rating))
+        if request.prep_time is not None:
+            conditions.append("prep_minutes <= ?")
+            params.append(int(request.prep_time))
+        return conditions, params
+
+    def count(self, request: RecipeReq, partial: bool = False) -> Statement:
+        """ Compiles a RecipeReq into a statement counting the matching recipes.
+
+        Args:
+            request (RecipeReq): the currently given informs (must not be empty)
+            partial (bool): If True, conditions are linked with OR instead of AND
+
+        Returns:
+            tuple(statement, parameters)
+        """
+        conditions, params = self.conditions(request)
+        op = " OR " if partial else " AND "
+        return f"SELECT COUNT(*) AS cnt FROM {self.table} WHERE {op.join(conditions)}", tuple(params)
+
+    def by_rowids(self, rowids: List[int]) -> Statement:
+        """ Returns the statement loading the recipes with the given rowids, ordered by rowid
+
+        Args:
+            rowids (List[int]): rowids of the recipes (e.g. found by the RecipeIndex)
+        """
+        # a single JSON parameter keeps the statement text the same for any number of rowids
+        return (f"SELECT * FROM {self.table} WHERE rowid IN (SELECT value FROM json_each(?)) "
+                f"ORDER BY rowid", (json.dumps(rowids),))
+
+    def index_rows(self) -> Tuple[str, str]:
+        """ Returns the statements reading the recipe attributes and ingredients for the RecipeIndex """
+        return (f"SELECT rowid, name, ease, cookbook, type, {', '.join(TYPED_COLUMNS)} "
+                f"FROM {self.table} ORDER BY rowid",
+                f"SELECT ingredient, group_concat(recipe_id) AS recipe_ids FROM {self.ingredient_table} "
+                f"GROUP BY ingredient")
+
+    def favorites(self) -> Statement:
+        """ Returns the statement selecting all favorite recipes, ordered by name """
+        return f"SELECT * FROM {self.table} WHERE favorite = true ORDER BY name ASC", ()
+
+    def set_favorite(self, name: str, favorite: bool = True) -> Statement:
+        """ Returns the statement marking (or unmarking) the recipe with the given name as favorite
+
+        Args:
+            name (str): name of the recipe
+            favorite (bool): new value of the favorite flag
+        """
+        return f"UPDATE {self.table} SET favorite = ? WHERE name = ?", (favorite, name)
@@ -0,0 +1,383 @@
+############################################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify'
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+############################################################################################
+
+"""Asyncio runtime: runs all services of a process on one event loop instead of one thread per subscriber."""
+
+import asyncio
+import concurrent.futures
+import contextvars
+import inspect
+import traceback
+from typing import Any, Dict, Hashable, List
+
+import zmq
+import zmq.asyncio
+from zmq.devices import ProcessProxy
+
+from services.codec import MessageCodec, PickleCodec, decode_message, decode_topic
+from services.service import Service, TopicRouter, _send_msg
+from services.session import session_context
+from utils.logger import DiasysLogger
+from utils.topics import Topic
+
+
+class _LoopPublisher:
+    """ Publish socket of the event loop which can also be used from executor threads """
+
+    def __init__(self, socket: zmq.asyncio.Socket, loop: asyncio.AbstractEventLoop):
+        self._socket = socket
+        self._loop = loop
+
+    def send_multipart(self, frames: List[Any]):
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._socket.send_multipart(frames)
+        else:
+            # zmq sockets are not thread-safe: hand the message over to the loop (keeps the order of messages)
+            self._loop.call_soon_threadsafe(self._socket.send_multipart, frames)
+
+
+class _Listener:
+    """ Receiving state of one subscriber function """
+
+    def __init__(self, service: Service, func_instance, socket: zmq.asyncio.Socket):
+        self.service = service
+        self.func_instance = func_instance
+        self.topics = getattr(func_instance, 'sub_topics')
+        self.queued_topics = getattr(func_instance, 'queued_sub_topics')
+        self.router = TopicRouter(self.topics, self.queued_topics)
+        self.socket = socket
+        self.ready_topic = f"{func_instance}/READY"
+        self.ready = asyncio.Event()
+        self.active = False
+        # held while the function is running, so the end barrier can wait for it
+        self.busy = asyncio.Lock()
+        self.pending = service._pending_values.setdefault(str(func_instance), {})
+        self.task = None
+
+
+class AsyncDialogSystem:
+    """
+    Alternative to `services.service.DialogSystem` running all services on one asyncio event loop.
+
+    Every subscriber function gets a coroutine receiving its messages (instead of a thread), and the
+    start / end / terminate handshakes are awaitable barriers over all services at once.
+    Services are written as usual with the `PublishSubscribe` decorator:
+
+        * coroutine functions (`async def`) are awaited on the event loop
+        * plain functions are run in an executor, so CPU-heavy (or blocking) services don't stall
+          the loop; each function still handles one message at a time
+
+    Only local services are supported. The message bus is the same as for the `DialogSystem`, so
+    other processes can still listen to / publish on it.
+
+    Use it from a coroutine:
+
+        async with AsyncDialogSystem(services=[...]) as ds:
+            await ds.run_dialog(start_signals={'user_utterance/CourseDomain': ''})
+    """
+
+    def __init__(self, services: List[Service], sub_port: int = 65533, pub_port: int = 65534,
+                 protocol: str = 'tcp', debug_logger: DiasysLogger = None, codec: MessageCodec = None,
+                 executor: concurrent.futures.Executor = None, max_workers: int = 4):
+        """
+        Args:
+            services (List[Service]): List of all services to run (their ports have to match the given ports).
+            sub_port(int): subscriber port
+            pub_port(int): publisher port
+            protocol(str): communication protocol (either 'tcp' or 'ipc')
+            debug_logger (DiasysLogger): If not `None`, all messags are printed to the logger.
+            codec (MessageCodec): How messages are serialized (default: `PickleCodec`).
+            executor (concurrent.futures.Executor): runs plain (non-coroutine) subscriber functions.
+                                                    Has to share memory with the services (e.g. a thread pool).
+            max_workers (int): number of threads if no executor is given
+        """
+        assert all(isinstance(service, Service) for service in services), \
+            "the AsyncDialogSystem only runs local services"
+        self.debug_logger = debug_logger
+        self.protocol = protocol
+        self._sub_port = sub_port
+        self._pub_port = pub_port
+        self._codec = codec if codec is not None else PickleCodec()
+        self._services = services
+        self._executor = executor
+        self._max_workers = max_workers
+
+        # start proxy (a process, so it doesn't compete with the event loop)
+        self._proxy_dev = ProcessProxy(in_type=zmq.XSUB, out_type=zmq.XPUB)
+        self._proxy_dev.bind_in(f"{protocol}://127.0.0.1:{pub_port}")
+        self._proxy_dev.bind_out(f"{protocol}://127.0.0.1:{sub_port}")
+        self._proxy_dev.start()
+
+        self._ctx = zmq.asyncio.Context()
+        self._listeners: List[_Listener] = []
+        self._sessions = set()
+        self._listening = False
+        self._opened = False
+        self._stop_event = None
+        self._end_socket = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, tb):
+        await self.shutdown()
+
+    async def open(self):
+        """ Sets up the sockets of all services and waits until they are connected to the bus """
+        loop = asyncio.get_running_loop()
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self._max_workers,
+                                                                   thread_name_prefix="AsyncDialogSystem")
+        self._stop_event = asyncio.Event()
+        # one publish socket for all services: the bus routes by topic, not by sender
+        pub_socket = self._ctx.socket(zmq.PUB)
+        pub_socket.sndhwm = 1100000
+        pub_socket.connect(f"{self.protocol}://127.0.0.1:{self._pub_port}")
+        self._pub_socket = pub_socket
+        publisher = _LoopPublisher(pub_socket, loop)
+
+        for service in self._services:
+            service._codec = self._codec
+            for func_name in dir(service):
+                func_inst = getattr(service, func_name)
+                if not hasattr(func_inst, "pubsub"):
+                    continue
+                if func_inst.pub_topics:
+                    service._publish_sockets[func_inst] = publisher
+                    service._pub_topics.update(func_inst.pub_topics)
+                if func_inst.sub_topics or func_inst.queued_sub_topics:
+                    self._listeners.append(self._setup_listener(service, func_inst))
+
+        self._end_socket = self._ctx.socket(zmq.SUB)
+        self._end_socket.setsockopt(zmq.SUBSCRIBE, bytes(Topic.DIALOG_END, encoding="ascii"))
+        self._end_socket.connect(f"{self.protocol}://127.0.0.1:{self._sub_port}")
+
+        for listener in self._listeners:
+            listener.task = asyncio.ensure_future(self._receive(listener))
+        await self._connected()
+        self._opened = True
+
+    def _setup_listener(self, service: Service, func_instance) -> _Listener:
+        """ Creates the subscriber socket for a function decorated with `services.service.PublishSubscribe` """
+        topics, queued_topics = func_instance.sub_topics, func_instance.queued_sub_topics
+        assert set(topics).isdisjoint(queued_topics), "sub_topics and queued_sub_topics have to be disjoint!"
+        subscriber = self._ctx.socket(zmq.SUB)
+        for topic in topics + queued_topics:
+            subscriber.setsockopt(zmq.SUBSCRIBE, bytes(service._sub_topic_domain_str(topic), encoding="ascii"))
+        listener = _Listener(service, func_instance, subscriber)
+        subscriber.setsockopt(zmq.SUBSCRIBE, bytes(listener.ready_topic, encoding="ascii"))
+        subscriber.connect(f"{self.protocol}://127.0.0.1:{self._sub_port}")
+        service._sub_topics.update(topics + queued_topics)
+        return listener
+
+    async def _connected(self, retry_interval: float = 0.05):
+        """ Barrier: returns once every listener's subscriptions reached the bus.
+
+        Messages published before that are dropped by zmq, so each listener is probed until it
+        received one of its READY messages.
+        """
+        waiting = {asyncio.ensure_future(listener.ready.wait()): listener for listener in self._listeners}
+        while waiting:
+            for listener in waiting.values():
+                _send_msg(self._pub_socket, listener.ready_topic, True)
+            done, _ = await asyncio.wait(waiting, timeout=retry_interval)
+            for waiter in done:
+                del waiting[waiter]
+        if self.debug_logger:
+            self.debug_logger.info(f"- (DS): all listeners CONNECTED")
+
+    async def _receive(self, listener: _Listener):
+        """ Receives the messages of one subscriber function and calls it once it has a value for each topic """
+        while True:
+            try:
+                # don't copy: large buffers sent out-of-band are used directly from the received frames
+                msg = await listener.socket.recv_multipart(copy=False)
+                topic = decode_topic(msg)
+                if topic == listener.ready_topic:
+                    listener.ready.set()
+                elif listener.active:
+                    complete = listener.service._collect_message(listener.func_instance, listener.pending, topic, msg,
+                                                                 listener.router)
+                    if complete:
+                        async with listener.busy:
+                            await self._call(listener, *complete)
+            except asyncio.CancelledError:
+                break
+            except:
+                print("LISTENER ERROR")
+                traceback.print_exc()
+        listener.socket.close()
+
+    async def _call(self, listener: _Listener, session_id: Hashable, values: Dict[str, Any]):
+        """ Calls a subscriber function in the session of its messages (awaited or in the executor) """
+        with session_context(session_id):
+            if inspect.iscoroutinefunction(listener.func_instance):
+                await listener.service._call_subscriber(listener.func_instance, values)
+            else:
+                await self._in_executor(listener.service._call_subscriber, listener.func_instance, values)
+        # drops the state created for a session which ended during the call
+        listener.service._session_ended(session_id)
+
+    async def _in_executor(self, func, *args):
+        """ Runs a plain function in the executor (in the current session) """
+        # the executor thread gets a copy of the context, so the function runs in the session, too
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, context.run, func, *args)
+
+    def _activate_listeners(self):
+        for listener in self._listeners:
+            listener.pending.clear()
+            listener.active = True
+        self._listening = True
+        if self.debug_logger:
+            self.debug_logger.info(f"- (DS): all services STARTED listening")
+
+    async def _start_listening(self):
+        """ Barrier: calls `dialog_start` on all services, then activates all listeners """
+        await asyncio.gather(*(self._in_executor(service.dialog_start) for service in self._services))
+        self._activate_listeners()
+
+    async def _stop_listening(self):
+        """ Barrier: deactivates all listeners, waits for running functions, then calls `dialog_end` on all services """
+        for listener in self._listeners:
+            listener.active = False
+        for listener in self._listeners:
+            async with listener.busy:
+                pass
+        await asyncio.gather(*(self._in_executor(service.dialog_end) for service in self._services))
+        self._listening = False
+        if self.debug_logger:
+            self.debug_logger.info(f"- (DS): all services STOPPED listening")
+
+    def _publish(self, start_signals: dict, session_id: Hashable = None):
+        for topic in start_signals:
+            _send_msg(self._pub_socket, f"{topic}", start_signals[topic], self._codec, session_id)
+
+    async def _next_dialog_end(self):
+        """ Waits for a `Topic.DIALOG_END` message with value `True` and returns its session id """
+        while True:
+            msg = await self._end_socket.recv_multipart(copy=True)
+            timestamp, content, session_id = decode_message(msg)
+            if content:
+                if self.debug_logger:
+                    self.debug_logger.info(f"- (DS): received DIALOG_END message from topic {decode_topic(msg)}")
+                return session_id
+
+    def stop(self):
+        """ Set stop event (can be queried by services via the `terminating()` function) """
+        self._stop_event.set()
+
+    def terminating(self):
+        """ Returns True if the system is stopping, else False """
+        return self._stop_event is not None and self._stop_event.is_set()
+
+    async def run_dialog(self, start_signals: dict = {Topic.DIALOG_END: False}):
+        """ Run a complete dialog (returns once a service published `Topic.DIALOG_END` with value `True`).
+
+        Args:
+            start_signals (Dict[str, Any]): mapping from topic -> value
+                                            Publishes the value given for each topic to the respective topic.
+                                            Use this to trigger the start of your dialog system.
+        """
+        self._stop_event.clear()
+        await self._start_listening()
+        self._publish(start_signals)
+        while await self._next_dialog_end() is not None:
+            pass
+        self.stop()
+        await self._stop_listening()
+
+    async def start_session(self, session_id: Hashable, start_signals: dict = {Topic.DIALOG_END: False}):
+        """ Starts a new dialog as an independent session (see `DialogSystem.start_session`).
+
+        Args:
+            session_id (Hashable): a unique, picklable id for the new session (e.g. a user id)
+            start_signals (Dict[str, Any]): mapping from topic -> value, published for this session
+                                            to trigger the start of the dialog
+        """
+        assert session_id not in self._sessions, f"session {session_id} is already running"
+        if not self._listening:
+            # first session: set all listeners to listening mode once
+            self._activate_listeners()
+        for service in self._services:
+            service._begin_session(session_id)
+        with session_context(session_id):
+            await asyncio.gather(*(self._in_executor(service.dialog_start) for service in self._services))
+        self._sessions.add(session_id)
+        self._publish(start_signals, session_id)
+
+    async def end_session(self, session_id: Hashable):
+        """ Ends a session: calls `dialog_end` of all services for this session and drops its state.
+            Returns once the functions still handling messages of the session are done; messages
+            of the session arriving later are ignored.
+
+        Args:
+            session_id (Hashable): id of the session, as given to `start_session`
+        """
+        if session_id not in self._sessions:
+            return
+        self._sessions.discard(session_id)
+        with session_context(session_id):
+            await asyncio.gather(*(self._in_executor(service.dialog_end) for service in self._services))
+        for service in self._services:
+            service._drop_session(session_id)
+        for listener in self._listeners:
+            async with listener.busy:
+                pass
+
+    async def wait_for_session_end(self) -> Hashable:
+        """ Waits until a session publishes `Topic.DIALOG_END` with value `True`, then ends that session.
+
+        Returns:
+            id of the ended session
+        """
+        while True:
+            session_id = await self._next_dialog_end()
+            if session_id in self._sessions:
+                await self.end_session(session_id)
+                return session_id
+
+    def list_sessions(self) -> set:
+        """ Returns the ids of all running sessions """
+        return set(self._sessions)
+
+    async def shutdown(self):
+        """ Shutdown dialog system: stops all listeners and the bus, closes all sockets and the executor.
+            Should be awaited in the end before exiting your program (done by `async with`).
+        """
+        if self._stop_event is not None:
+            self._stop_event.set()
+        for listener in self._listeners:
+            listener.task.cancel()
+        await asyncio.gather(*(listener.task for listener in self._listeners), return_exceptions=True)
+        self._listeners = []
+        if self._opened:
+            self._end_socket.close()
+            self._pub_socket.close(linger=0)
+            self._executor.shutdown(wait=True)
+            self._opened = False
+        self._ctx.term()
+        # free the ports for the next dialog system
+        self._proxy_dev.launcher.terminate()
+        self._proxy_dev.join()
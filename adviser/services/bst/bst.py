@@ -21,6 +21,7 @@ from typing import List, Set
 
 from services.service import PublishSubscribe
 from services.service import Service
+from services.session import SessionAttribute
 from utils.beliefstate import BeliefState
 from utils.useract import UserActionType, UserAct
 
@@ -30,10 +31,16 @@ class HandcraftedBST(Service):
     A rule-based approach to belief state tracking.
     """
 
-    def __init__(self, domain=None, logger=None):
-        Service.__init__(self, domain=domain)
+    # belief state of the current dialog (kept per session)
+    bs = SessionAttribute(factory=lambda service: BeliefState(service.domain, service.history_window))
+
+    def __init__(self, domain=None, logger=None, history_window: int = 2, delta_publishing: bool = False):
+        # with delta_publishing, only the changes of the belief state are sent each turn (see services.delta)
+        Service.__init__(self, domain=domain, delta_topics=['beliefstate'] if delta_publishing else [])
         self.logger = logger
-        self.bs = BeliefState(domain)
+        # turns kept in the belief state (and sent to the policy), see BeliefState
+        self.history_window = history_window
+        self.bs = BeliefState(domain, history_window)
 
     @PublishSubscribe(sub_topics=["user_acts"], pub_topics=["beliefstate"])
     def update_bst(self, user_acts: List[UserAct] = None) \
@@ -76,7 +83,7 @@ class HandcraftedBST(Service):
                         the value is a new BeliefState object
         """
         # initialize belief state
-        self.bs = BeliefState(self.domain)
+        self.bs = BeliefState(self.domain, self.history_window)
 
     def _reset_informs(self, acts: List[UserAct]):
         """
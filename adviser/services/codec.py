@@ -0,0 +1,232 @@
+############################################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify'
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+############################################################################################
+
+"""Message codecs, defining how message contents are serialized into zmq frames."""
+
+import io
+import itertools
+import pickle
+import sys
+import warnings
+import weakref
+from typing import Any, Callable, Hashable, List, Optional, Sequence, Tuple
+
+import zmq
+
+
+def _message(timestamp: float, content: Any, session_id: Optional[Hashable]) -> tuple:
+    """ Returns the tuple which is pickled (the session id is only added if there is one) """
+    return (timestamp, content) if session_id is None else (timestamp, content, session_id)
+
+
+class MessageCodec:
+    """
+    Base class for message codecs.
+    A codec turns a `(timestamp, content)` pair into the data frames following the topic frame of
+    a multipart message.
+
+    All codecs produce messages that can be read by `decode_frames`, so services using different
+    codecs can still talk to each other - the codec only decides how messages are *sent*.
+    """
+
+    # whether subscribers receive the published objects themselves instead of copies
+    by_reference = False
+
+    def encode(self, timestamp: float, content: Any, session_id: Optional[Hashable] = None) -> List[Any]:
+        """ Serializes message content.
+
+        Args:
+            timestamp (float): POSIX timestamp of the message
+            content (Any): message content
+            session_id (Hashable): session the message belongs to (`None` outside of sessions)
+
+        Returns:
+            List of data frames (bytes-like objects), the first one being the pickle stream
+        """
+        raise NotImplementedError
+
+
+class PickleCodec(MessageCodec):
+    """ Pickles the whole message into a single frame (default). """
+
+    def encode(self, timestamp: float, content: Any, session_id: Optional[Hashable] = None) -> List[Any]:
+        return [pickle.dumps(_message(timestamp, content, session_id))]
+
+
+def _tensor_from_numpy(array, requires_grad: bool):
+    """ Rebuilds a cpu torch tensor on top of a received numpy array (no copy). """
+    import torch
+    with warnings.catch_warnings():
+        # torch warns if the received buffer is read-only
+        warnings.simplefilter("ignore", UserWarning)
+        tensor = torch.from_numpy(array)
+    tensor.requires_grad_(requires_grad)
+    return tensor
+
+
+class _OutOfBandPickler(pickle.Pickler):
+    """ Pickler sending torch tensors as numpy arrays, so their data can go out-of-band as well """
+
+    def reducer_override(self, obj):
+        # only look for tensors if torch was imported by someone - never import it here
+        torch = sys.modules.get('torch')
+        if torch is not None and isinstance(obj, torch.Tensor) and obj.device.type == 'cpu' \
+                and obj.layout == torch.strided and not obj.is_sparse:
+            return _tensor_from_numpy, (obj.detach().numpy(), obj.requires_grad)
+        return NotImplemented
+
+
+class OutOfBandCodec(MessageCodec):
+    """
+    Sends large buffers (numpy arrays, cpu torch tensors, `bytearray`s, ...) as separate frames
+    using pickle protocol 5 out-of-band buffers; everything else is pickled as usual.
+
+    On the receiving side, the arrays are rebuilt directly on top of the received zmq frames,
+    so audio / video payloads are not copied again by zmq or pickle.
+
+    Note:
+        Arrays received this way share memory with the received zmq message (which stays alive as
+        long as the array does). Depending on the transport, the buffer may be read-only.
+    """
+
+    def __init__(self, min_buffer_size: int = 64 * 1024):
+        """
+        Args:
+            min_buffer_size (int): buffers smaller than this (in bytes) stay inside the pickle
+                                   stream - for those, an extra frame costs more than the copy
+        """
+        self.min_buffer_size = min_buffer_size
+
+    def encode(self, timestamp: float, content: Any, session_id: Optional[Hashable] = None) -> List[Any]:
+        buffers = []
+
+        def buffer_callback(buffer: pickle.PickleBuffer):
+            if buffer.raw().nbytes < self.min_buffer_size:
+                return True  # serialize in-band
+            buffers.append(buffer)
+            return False
+
+        stream = io.BytesIO()
+        _OutOfBandPickler(stream, protocol=5, buffer_callback=buffer_callback).dump(
+            _message(timestamp, content, session_id))
+        return [stream.getbuffer()] + [buffer.raw() for buffer in buffers]
+
+
+class _LocalFrame(bytearray):
+    """ Frame of a `LocalCodec` message: a small pickle stream which also holds the message content """
+    pass
+
+
+# message id -> frame; an entry lives exactly as long as zmq holds the (zero-copy) frame
+_local_frames = weakref.WeakValueDictionary()
+_local_ids = itertools.count()
+
+
+def _local_content(message_id: int) -> Any:
+    """ Returns the content of a `LocalCodec` message (called while unpickling it) """
+    return _local_frames[message_id].content
+
+
+class _LocalReference:
+    """ Placeholder for the content of a `LocalCodec` message, unpickled into the content itself """
+
+    def __init__(self, message_id: int):
+        self.message_id = message_id
+
+    def __reduce__(self):
+        return _local_content, (self.message_id,)
+
+
+class LocalCodec(MessageCodec):
+    """
+    Passes message contents by reference instead of serializing them. Only works if publisher and
+    subscribers run in the same process, i.e. for a `DialogSystem` with `protocol='inproc'` (which
+    uses this codec by default).
+
+    The frame sent is a tiny pickle stream referring to the content. zmq sends it without copying
+    and keeps it alive until every subscriber received the message, which keeps the content alive.
+
+    Note:
+        Without `copy`, all subscribers receive the very object the publisher returned, so neither
+        side may modify it afterwards (e.g. publish a copy of state you keep updating).
+        Topics published in delta mode (see `services.delta`) are sent as whole objects, since
+        subscribers applying changes to a shared object would modify each other's (and the
+        publisher's) state.
+    """
+
+    by_reference = True
+
+    def __init__(self, copy: Callable[[Any], Any] = None):
+        """
+        Args:
+            copy (Callable[[Any], Any]): if given, published contents are replaced by `copy(content)`
+                                         (e.g. `copy.deepcopy`) - subscribers still share that copy
+        """
+        self.copy = copy
+
+    def encode(self, timestamp: float, content: Any, session_id: Optional[Hashable] = None) -> List[Any]:
+        message_id = next(_local_ids)
+        frame = _LocalFrame(pickle.dumps(_message(timestamp, _LocalReference(message_id), session_id)))
+        frame.content = content if self.copy is None else self.copy(content)
+        _local_frames[message_id] = frame
+        # without copying, zmq refers to (and keeps) the frame object itself
+        return [zmq.Frame(frame, copy=False)]
+
+
+def _frame_buffer(frame):
+    """ Returns a bytes-like view on a received frame (works for `copy=True` and `copy=False`) """
+    return frame.buffer if isinstance(frame, zmq.Frame) else frame
+
+
+def decode_message(frames: Sequence[Any]) -> Tuple[float, Any, Optional[Hashable]]:
+    """ Decodes a received multipart message (written by any `MessageCodec`).
+        Messages of a `LocalCodec` have to be received with `copy=False` and decoded before the frames are released.
+
+    Args:
+        frames (Sequence): all frames of the multipart message, including the topic frame
+
+    Returns:
+        tuple(timestamp, content, session id (`None` if the message doesn't belong to a session))
+    """
+    message = pickle.loads(_frame_buffer(frames[1]),
+                           buffers=[_frame_buffer(frame) for frame in frames[2:]])
+    return message if len(message) == 3 else (message[0], message[1], None)
+
+
+def decode_frames(frames: Sequence[Any]) -> Tuple[float, Any]:
+    """ Decodes a received multipart message (written by any `MessageCodec`).
+
+    Args:
+        frames (Sequence): all frames of the multipart message, including the topic frame
+
+    Returns:
+        tuple(timestamp, content)
+    """
+    return decode_message(frames)[:2]
+
+
+def decode_topic(frames: Sequence[Any]) -> str:
+    """ Returns the topic of a received multipart message """
+    frame = frames[0]
+    return (frame.bytes if isinstance(frame, zmq.Frame) else frame).decode("ascii")
+
+
+def message_size(frames: Sequence[Any]) -> int:
+    """ Returns the number of payload bytes of a multipart message (all frames) """
+    return sum(memoryview(_frame_buffer(frame)).nbytes for frame in frames)
@@ -0,0 +1,136 @@
+###############################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+"""Delta publication: sending only the changes of an object since its last publication.
+
+A service publishing a topic in delta mode (see the `delta_topics` argument of `Service`) sends
+a `DeltaMessage` instead of the object. Every `snapshot_interval`-th message, the first message of
+a stream and every message after the publisher switched to a new object contain the whole object
+(snapshot); all others only the changes to the previously published version. Receiving services
+keep a replica per stream and hand a copy of it to their subscriber functions, so they don't notice
+the difference (and may change the received object, as without delta publication).
+
+Published objects have to implement the delta protocol of `utils.beliefstate.BeliefState`:
+    * `_delta_base()`: returns a copy of the current version which is not changed afterwards
+    * `_delta_since(base)`: returns the changes since a version returned by `_delta_base`
+    * `_apply_delta(changes)`: applies changes returned by `_delta_since` to a replica
+    * `_delta_view()`: returns a copy of a replica whose changes don't change the replica
+"""
+
+from typing import Any, Dict, Hashable, Optional
+
+
+class DeltaMessage(object):
+    """ Snapshot of, or changes to, an object published in delta mode """
+
+    __slots__ = ('version', 'snapshot', 'changes')
+
+    def __init__(self, version: int, snapshot: Any = None, changes: Any = None):
+        """
+        Args:
+            version (int): number of the message in its stream
+            snapshot (Any): the whole object (for snapshots)
+            changes (Any): changes to the object of message `version - 1` (for deltas)
+        """
+        self.version = version
+        self.snapshot = snapshot
+        self.changes = changes
+
+    def __getstate__(self):
+        return self.version, self.snapshot, self.changes
+
+    def __setstate__(self, state):
+        self.version, self.snapshot, self.changes = state
+
+
+class DeltaEncoder(object):
+    """ Publisher side: turns the successive versions of the objects of each stream into `DeltaMessage`s """
+
+    def __init__(self, snapshot_interval: int = 10):
+        """
+        Args:
+            snapshot_interval (int): send the whole object (at least) every `snapshot_interval` messages
+        """
+        self.snapshot_interval = snapshot_interval
+        # (session id, topic) -> (published object, its version when it was published, message number)
+        self._streams = {}
+
+    def encode(self, session_id: Optional[Hashable], topic: str, obj: Any) -> DeltaMessage:
+        """ Returns the message to publish for the current version of obj
+
+        Args:
+            session_id (Hashable): session the message belongs to
+            topic (str): topic the message is published to
+            obj (Any): the object to publish
+        """
+        stream = (session_id, topic)
+        last = self._streams.get(stream)
+        if last is None or last[0] is not obj or (last[2] + 1) % self.snapshot_interval == 0:
+            version = 0 if last is None else last[2] + 1
+            message = DeltaMessage(version, snapshot=obj)
+        else:
+            version = last[2] + 1
+            message = DeltaMessage(version, changes=obj._delta_since(last[1]))
+        self._streams[stream] = (obj, obj._delta_base(), version)
+        return message
+
+    def drop_session(self, session_id: Optional[Hashable]):
+        """ Forgets the streams of a session """
+        for stream in list(self._streams):
+            if stream[0] == session_id:
+                self._streams.pop(stream, None)
+
+
+class DeltaDecoder(object):
+    """ Subscriber side: keeps a replica of the object of each stream up to date """
+
+    def __init__(self):
+        # (session id, topic) -> (replica, version)
+        self._replicas: Dict[Hashable, tuple] = {}
+
+    def decode(self, session_id: Optional[Hashable], topic: str, message: DeltaMessage) -> Any:
+        """ Applies a received message to the replica of its stream
+
+        Args:
+            session_id (Hashable): session the message belongs to
+            topic (str): topic the message was received from
+            message (DeltaMessage): the received message
+
+        Returns:
+            a copy of the replica (see `_delta_view`), or `None` if the message is a delta which can't
+            be applied (because earlier messages of the stream were missed) - the replica is complete
+            again with the next snapshot
+        """
+        stream = (session_id, topic)
+        if message.snapshot is not None:
+            self._replicas[stream] = (message.snapshot, message.version)
+            return message.snapshot._delta_view()
+        replica, version = self._replicas.get(stream, (None, None))
+        if replica is None or version != message.version - 1:
+            self._replicas.pop(stream, None)
+            return None
+        replica._apply_delta(message.changes)
+        self._replicas[stream] = (replica, message.version)
+        return replica._delta_view()
+
+    def drop_session(self, session_id: Optional[Hashable]):
+        """ Forgets the replicas of a session """
+        for stream in list(self._replicas):
+            if stream[0] == session_id:
+                self._replicas.pop(stream, None)
@@ -99,6 +99,20 @@ class SpeechInputDecoder(Service):
         Returns:
             dict(string, string): The user utterance as text
         """
+        user_utterance = self._decode(speech_features)
+        self._log_user_utterance(user_utterance)
+        return {'gen_user_utterance': user_utterance}
+
+    def _decode(self, speech_features: np.ndarray) -> str:
+        """
+        Runs the encoder and the beam search on the features of an utterance
+
+        Args:
+            speech_features (np.array): The features of the utterance
+
+        Returns:
+            string: The most probable hypothesis as text
+        """
         speech_in_features_normalized = torch.from_numpy(speech_features) * self.scale + self.offset
         with torch.no_grad():
             encoded = self.model.encode(speech_in_features_normalized.to(self.device))
@@ -107,18 +121,22 @@ class SpeechInputDecoder(Service):
         # We only consider the most probable hypothesis.
         # Language Model could improve this, right now we don't use one.
         # This might need some post-processing...
-        user_utterance = "".join(self.vocab[y] for y in result[0].yseq) \
+        return "".join(self.vocab[y] for y in result[0].yseq) \
             .replace("▁", " ") \
             .replace("<space>", " ") \
             .replace("<eos>", "") \
             .strip()
 
-        # write decoded text into logging directory
+    def _log_user_utterance(self, user_utterance: str):
+        """
+        Writes the decoded text into the logging directory (if there is one) and prints it
+
+        Args:
+            user_utterance (string): The user utterance as text
+        """
         if self.conversation_log_dir is not None:
             with open(os.path.join(self.conversation_log_dir, (str(np.math.floor(time.time())) + "_user.txt")),
                       "w") as convo_log:
                 convo_log.write(user_utterance)
 
         print("User: {}\n".format(user_utterance))
-
-        return {'gen_user_utterance': user_utterance}
@@ -27,6 +27,25 @@ from utils.domain.domain import Domain
 import torchaudio
 import numpy
 
+
+def speech_features(samples: numpy.array, sampling_rate: int) -> numpy.array:
+    """
+    Computes the features of the ASR model (80 filterbanks and 3 pitch features per 10 ms frame)
+
+    Args:
+        samples (np.array): The audio samples
+        sampling_rate (int): The sampling rate of the samples
+
+    Returns:
+        np.array: The features, frames x 83
+    """
+    speech_in = torch.from_numpy(samples).unsqueeze(0)
+    filter_bank = torchaudio.compliance.kaldi.fbank(speech_in, num_mel_bins=80, sample_frequency=sampling_rate)
+    # Default ASR model uses 16kHz, but different models are possible, then the sampling rate only needs to be changd in the recorder
+    pitch = torch.zeros(filter_bank.shape[0], 3)  # TODO: check if torchaudio pitch function is better
+    return torch.cat([filter_bank, pitch], 1).numpy()
+
+
 class SpeechInputFeatureExtractor(Service):
 
     def __init__(self, domain: Domain = ""):
@@ -49,15 +68,7 @@ class SpeechInputFeatureExtractor(Service):
         Returns:
             np.array: The extracted features of the utterance
         """
-        sample_frequence = speech_in[1]
-        speech_in = torch.from_numpy(speech_in[0]).unsqueeze(0)
-
-        filter_bank = torchaudio.compliance.kaldi.fbank(speech_in, num_mel_bins=80, sample_frequency=sample_frequence)
-        # Default ASR model uses 16kHz, but different models are possible, then the sampling rate only needs to be changd in the recorder
-        pitch = torch.zeros(filter_bank.shape[0], 3)  # TODO: check if torchaudio pitch function is better
-        speech_in_features = torch.cat([filter_bank, pitch], 1).numpy()
-
-        return {'speech_features': speech_in_features}
+        return {'speech_features': speech_features(speech_in[0], speech_in[1])}
 
     @PublishSubscribe(sub_topics=["speech_in"], pub_topics=["mfcc"])
     def speech_to_mfcc(self, speech_in):
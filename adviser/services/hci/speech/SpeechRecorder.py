@@ -33,6 +33,7 @@ except:
     # make sure that imports work if XServer is not available
     warnings.warn("Could not import pynput, speech recorder will not work.")
 
+from services.hci.speech.streaming import AudioChunk, UtteranceChunker
 from services.service import PublishSubscribe
 from services.service import Service
 from utils.domain.domain import Domain
@@ -41,7 +42,8 @@ from utils.domain.domain import Domain
 class SpeechRecorder(Service):
 
     def __init__(self, domain: Union[str, Domain] = "", conversation_log_dir: str = None, enable_plotting: bool = False, threshold: int = 8000,
-                 voice_privacy: bool = False, identifier: str = None) -> None:
+                 voice_privacy: bool = False, identifier: str = None, streaming: bool = False,
+                 end_of_utterance_silence: float = 3.0) -> None:
         """
         A service that can record a microphone upon a key pressing event 
         and publish the result as an array. The end of the utterance is 
@@ -55,6 +57,8 @@ class SpeechRecorder(Service):
             threshold (int): The threshold below which the assumption of the end of utterance detection is silence
             voice_privacy (boolean): Whether or not to enable the masking of the users voice
             identifier (string): I don't know why this is here. Service needs it.
+            streaming (boolean): If True, the audio is also published in chunks (topic `speech_in_chunk`) while the user is speaking, see `services.hci.speech.streaming`. Can't be combined with voice privacy, which needs the whole utterance.
+            end_of_utterance_silence (float): Seconds of continuous silence after which the utterance ends
         """
         Service.__init__(self, domain=domain, identifier=identifier)
         self.conversation_log_dir = conversation_log_dir
@@ -64,6 +68,9 @@ class SpeechRecorder(Service):
         self.threshold = threshold
         self.enable_plotting = enable_plotting
         self.voice_privacy = voice_privacy
+        assert not (streaming and voice_privacy), "the voice can't be masked in streamed audio"
+        self.streaming = streaming
+        self.end_of_utterance_silence = end_of_utterance_silence
 
     @PublishSubscribe(pub_topics=["speech_in"])
     def record_user_utterance(self):
@@ -85,29 +92,23 @@ class SpeechRecorder(Service):
                                            input=True,
                                            frames_per_buffer=chunk)
         binary_sequence = []  # this will hold the entire utterance once it's finished as binary data
-        # setup for naive end of utterance detection
-        continuous_seconds_of_silence_before_utterance_ends = 3.0  # this may be changed freely
-        required_silence_length_to_stop_in_chunks = int(
-            (continuous_seconds_of_silence_before_utterance_ends * sampling_rate) / chunk)
-        reset = int((continuous_seconds_of_silence_before_utterance_ends * sampling_rate) / chunk)
-        maximum_utterance_time_in_chunks = int((20 * sampling_rate) / chunk)  # 20 seconds
+        # naive end of utterance detection (and the chunks to stream), utterances last 20 seconds at most
+        chunker = UtteranceChunker(sampling_rate, chunk, self.threshold,
+                                   end_of_utterance_silence=self.end_of_utterance_silence, max_seconds=20)
         if self.enable_plotting:
             threshold_plotter = self.threshold_plotter_generator()
         chunks_recorded = 0
         print("\nrecording...")
-        for _ in range(maximum_utterance_time_in_chunks):
+        while not chunker.finished:
             raw_data = stream.read(chunk)
             chunks_recorded += 1
-            wave_data = wave.struct.unpack("%dh" % chunk, raw_data)
+            wave_data = np.frombuffer(raw_data, dtype=np.int16)
             binary_sequence.append(raw_data)
             if self.enable_plotting:
                 threshold_plotter(wave_data)
-            if np.max(wave_data) > self.threshold:
-                required_silence_length_to_stop_in_chunks = reset
-            else:
-                required_silence_length_to_stop_in_chunks -= 1
-                if required_silence_length_to_stop_in_chunks == 0:
-                    break
+            for audio_chunk in chunker.add_block(wave_data):
+                if self.streaming:
+                    self.publish_speech_chunk(audio_chunk)
         print("...done recording.\n")
         stream.stop_stream()
         stream.close()
@@ -128,6 +129,19 @@ class SpeechRecorder(Service):
         else:
             return {"speech_in": (np.array(audio_sequence, dtype=np.float32), sampling_rate)}
 
+    @PublishSubscribe(pub_topics=["speech_in_chunk"])
+    def publish_speech_chunk(self, speech_in_chunk: AudioChunk):
+        """
+        Publishes a chunk of the utterance which is being recorded
+
+        Args:
+            speech_in_chunk (AudioChunk): The audio recorded since the previous chunk
+
+        Returns:
+            dict(string, AudioChunk): The chunk
+        """
+        return {"speech_in_chunk": speech_in_chunk}
+
     def start_recording(self, key):
         """
         This method is a callback of the push to talk key
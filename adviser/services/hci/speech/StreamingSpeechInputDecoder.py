@@ -0,0 +1,122 @@
+###############################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+from typing import List
+
+import numpy as np
+
+from services.hci.speech.SpeechInputDecoder import SpeechInputDecoder
+from services.hci.speech.streaming import FeatureChunk
+from services.service import PublishSubscribe
+from services.session import SessionAttribute
+from utils.domain.domain import Domain
+
+# frames per second of the features
+FRAME_RATE = 100
+
+
+class StreamingSpeechInputDecoder(SpeechInputDecoder):
+    """
+    Decodes an utterance while it is being recorded.
+
+    The feature frames received so far are decoded again every `partial_interval` seconds of new
+    audio and published as partial hypothesis (`partial_user_utterance`). Chunks arriving while
+    a hypothesis is decoded are queued and decoded together afterwards, so the decoder doesn't
+    fall behind on slow hardware. At the end of speech, the whole utterance is decoded while the
+    recorder still waits for the end of the utterance (the user might continue speaking); if no
+    more speech arrived, this hypothesis is published as the user utterance right away once the
+    utterance ends.
+
+    The encoder of the default (transformer) ASR model attends to the whole utterance, so
+    hypotheses are decoded from all frames received so far rather than from the new frames only.
+    """
+
+    # feature frames of the current utterance
+    features = SessionAttribute(factory=lambda service: [])
+    num_frames = SessionAttribute(default=0)
+    # (number of frames, text) of the latest hypothesis
+    hypothesis = SessionAttribute(default=None)
+
+    def __init__(self, domain: Domain = "", identifier=None, conversation_log_dir: str = None, use_cuda=False,
+                 partial_interval: float = 1.0):
+        """
+        Args:
+            domain (Domain): Needed for Service, but has no meaning here
+            identifier (string): Needed for Service
+            conversation_log_dir (string): If this is provided, logfiles will be placed by this Service into the specified directory.
+            use_cuda (boolean): Whether or not to run the computations on a GPU
+            partial_interval (float): Seconds of new audio after which a partial hypothesis is decoded
+        """
+        SpeechInputDecoder.__init__(self, domain=domain, identifier=identifier,
+                                    conversation_log_dir=conversation_log_dir, use_cuda=use_cuda)
+        self.partial_interval_frames = int(partial_interval * FRAME_RATE)
+
+    def features_to_text(self, speech_features):
+        """
+        Turns the features of a whole utterance into text. Unlike in the `SpeechInputDecoder`, this
+        function doesn't subscribe to `speech_features`, so utterances aren't decoded twice if a
+        `SpeechInputFeatureExtractor` is part of the dialog system (e.g. for emotion recognition).
+        """
+        return {'gen_user_utterance': self._decode(speech_features)}
+
+    @PublishSubscribe(queued_sub_topics=["speech_features_chunk"],
+                      pub_topics=["partial_user_utterance", "gen_user_utterance"])
+    def feature_chunks_to_text(self, speech_features_chunk: List[FeatureChunk]):
+        """
+        Decodes the utterance received so far and publishes partial hypotheses or, once the
+        utterance ended, the user utterance
+
+        Args:
+            speech_features_chunk (List[FeatureChunk]): The feature chunks received since the previous call
+
+        Returns:
+            dict(string, string): The partial hypothesis or the user utterance as text
+        """
+        for chunk in speech_features_chunk:
+            if len(chunk.features):
+                self.features.append(chunk.features)
+                self.num_frames += len(chunk.features)
+        # no audio follows the end of speech unless the user speaks again: the flags of the last
+        # chunk hold for all of them
+        last = speech_features_chunk[-1]
+
+        if last.end_of_utterance:
+            if self.hypothesis is not None and self.hypothesis[0] == self.num_frames:
+                user_utterance = self.hypothesis[1]
+            else:
+                user_utterance = self._decode_received()
+            self.features, self.num_frames, self.hypothesis = [], 0, None
+            self._log_user_utterance(user_utterance)
+            return {'gen_user_utterance': user_utterance}
+
+        decoded_frames = self.hypothesis[0] if self.hypothesis is not None else 0
+        new_frames = self.num_frames - decoded_frames
+        if new_frames and (last.end_of_speech or new_frames >= self.partial_interval_frames):
+            self.hypothesis = (self.num_frames, self._decode_received())
+            return {'partial_user_utterance': self.hypothesis[1]}
+        return None
+
+    def _decode_received(self) -> str:
+        """ Decodes all frames of the utterance received so far """
+        if not self.num_frames:
+            return ""
+        if len(self.features) > 1:
+            # decode the concatenation, but keep it, so it isn't concatenated again next time
+            self.features = [np.concatenate(self.features)]
+        return self._decode(self.features[0])
@@ -0,0 +1,80 @@
+###############################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+from typing import List
+
+import numpy
+
+from services.hci.speech.SpeechInputFeatureExtractor import speech_features
+from services.hci.speech.streaming import AudioChunk, FeatureChunk, complete_frames
+from services.service import PublishSubscribe
+from services.service import Service
+from services.session import SessionAttribute
+from utils.domain.domain import Domain
+
+# frame length and shift of the features (in seconds)
+FRAME_LENGTH = 0.025
+FRAME_SHIFT = 0.01
+
+
+class StreamingSpeechInputFeatureExtractor(Service):
+    """
+    Computes the features of an utterance incrementally while it is being recorded.
+
+    Each frame is computed as soon as all of its samples were received; samples of incomplete
+    frames are kept for the next chunk. The frames of all chunks of an utterance are the same as
+    the frames the `SpeechInputFeatureExtractor` computes from the whole utterance.
+    """
+
+    # samples received after the last complete frame
+    pending_samples = SessionAttribute(factory=lambda service: numpy.zeros(0, numpy.float32))
+
+    def __init__(self, domain: Domain = ""):
+        """
+        Args:
+            domain (Domain): Needed for Service, no meaning here
+        """
+        Service.__init__(self, domain=domain)
+
+    @PublishSubscribe(queued_sub_topics=["speech_in_chunk"], pub_topics=["speech_features_chunk"])
+    def speech_chunks_to_features(self, speech_in_chunk: List[AudioChunk]):
+        """
+        Turns the audio chunks received since the previous call into feature frames
+
+        Args:
+            speech_in_chunk (List[AudioChunk]): The chunks of the utterance received since the previous call
+
+        Returns:
+            dict(string, FeatureChunk): The new feature frames
+        """
+        samples = numpy.concatenate([self.pending_samples] + [chunk.samples for chunk in speech_in_chunk])
+        sampling_rate = speech_in_chunk[-1].sampling_rate
+        frame_shift = int(sampling_rate * FRAME_SHIFT)
+        num_frames = complete_frames(len(samples), int(sampling_rate * FRAME_LENGTH), frame_shift)
+        features = speech_features(samples, sampling_rate) if num_frames else numpy.zeros((0, 83), numpy.float32)
+
+        # the chunker doesn't send more audio after the end of speech unless the user speaks again,
+        # so the flags of the last chunk hold for all of them
+        last = speech_in_chunk[-1]
+        if last.end_of_utterance:
+            # like the features of the whole utterance: incomplete frames at the end are dropped
+            self.pending_samples = numpy.zeros(0, numpy.float32)
+        else:
+            self.pending_samples = samples[num_frames * frame_shift:]
+        return {'speech_features_chunk': FeatureChunk(features, last.end_of_speech, last.end_of_utterance)}
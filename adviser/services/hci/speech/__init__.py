@@ -22,3 +22,5 @@ from .SpeechInputFeatureExtractor import SpeechInputFeatureExtractor
 from .SpeechOutputGenerator import SpeechOutputGenerator
 from .SpeechOutputPlayer import SpeechOutputPlayer
 from .SpeechRecorder import SpeechRecorder
+from .StreamingSpeechInputDecoder import StreamingSpeechInputDecoder
+from .StreamingSpeechInputFeatureExtractor import StreamingSpeechInputFeatureExtractor
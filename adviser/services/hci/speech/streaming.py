@@ -0,0 +1,153 @@
+###############################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+"""Messages and bookkeeping of the streaming speech input pipeline.
+
+The `SpeechRecorder` (with `streaming=True`) publishes the audio of an utterance in `AudioChunk`s
+on the topic `speech_in_chunk` while the user is speaking. The
+`StreamingSpeechInputFeatureExtractor` turns them into `FeatureChunk`s (`speech_features_chunk`)
+and the `StreamingSpeechInputDecoder` publishes partial hypotheses (`partial_user_utterance`) and
+the final transcript (`gen_user_utterance`).
+"""
+
+from typing import List, NamedTuple
+
+import numpy as np
+
+
+class AudioChunk(NamedTuple):
+    """ Audio of an utterance, published while it is recorded
+
+    Attributes:
+        samples (np.ndarray): the samples of the chunk (float32, may be empty)
+        sampling_rate (int): sampling rate of the samples
+        end_of_speech (bool): the user stopped speaking after this chunk (further chunks of the
+                              utterance follow only if they start speaking again)
+        end_of_utterance (bool): this is the last chunk of the utterance
+    """
+    samples: np.ndarray
+    sampling_rate: int
+    end_of_speech: bool = False
+    end_of_utterance: bool = False
+
+
+class FeatureChunk(NamedTuple):
+    """ Feature frames of the audio chunks received since the previous feature chunk
+
+    Attributes:
+        features (np.ndarray): frames x features (may have no frames)
+        end_of_speech (bool): see `AudioChunk`
+        end_of_utterance (bool): see `AudioChunk`
+    """
+    features: np.ndarray
+    end_of_speech: bool = False
+    end_of_utterance: bool = False
+
+
+def complete_frames(num_samples: int, frame_length: int, frame_shift: int) -> int:
+    """ Returns the number of frames which fit completely into the samples (frames start every
+        `frame_shift` samples, like Kaldi features with `snip_edges`) """
+    return 0 if num_samples < frame_length else 1 + (num_samples - frame_length) // frame_shift
+
+
+class UtteranceChunker(object):
+    """ Splits the audio recorded for an utterance into `AudioChunk`s and detects the end of speech
+        and the end of the utterance from the loudness of the recorded blocks.
+
+        A block is silent if no sample exceeds the threshold. The speech ends after
+        `end_of_speech_silence` seconds of silence following a loud block; the silent blocks
+        after the end of speech are held back and only published if the user starts speaking
+        again, so the utterance doesn't end in a long silence. The utterance ends after
+        `end_of_utterance_silence` seconds of silence or after `max_seconds`.
+    """
+
+    def __init__(self, sampling_rate: int, block_size: int, threshold: int, chunk_seconds: float = 0.25,
+                 end_of_speech_silence: float = 0.5, end_of_utterance_silence: float = 3.0,
+                 max_seconds: float = 20.0):
+        """
+        Args:
+            sampling_rate (int): sampling rate of the recorded audio
+            block_size (int): number of samples per recorded block
+            threshold (int): loudness below which a block is silent
+            chunk_seconds (float): minimum length of a published chunk
+            end_of_speech_silence (float): seconds of silence after which the speech ends
+            end_of_utterance_silence (float): seconds of silence after which the utterance ends
+            max_seconds (float): maximum length of an utterance
+        """
+        self.sampling_rate = sampling_rate
+        self.threshold = threshold
+
+        def blocks(seconds):
+            return max(1, int(seconds * sampling_rate / block_size))
+        self.blocks_per_chunk = blocks(chunk_seconds)
+        self.end_of_speech_blocks = blocks(end_of_speech_silence)
+        self.end_of_utterance_blocks = blocks(end_of_utterance_silence)
+        self.max_blocks = int(max_seconds * sampling_rate / block_size)
+
+        self.num_blocks = 0
+        self.silent_blocks = 0
+        self.heard_speech = False
+        self._pending: List[np.ndarray] = []
+
+    @property
+    def finished(self) -> bool:
+        """ Whether the utterance is over """
+        return self.silent_blocks >= self.end_of_utterance_blocks or self.num_blocks >= self.max_blocks
+
+    @property
+    def speech_ended(self) -> bool:
+        """ Whether the user stopped speaking (for now) """
+        return self.heard_speech and self.silent_blocks >= self.end_of_speech_blocks
+
+    def add_block(self, samples: np.ndarray) -> List[AudioChunk]:
+        """ Adds the next recorded block and returns the chunks to publish (the last one marks the
+            end of the utterance if it is over)
+
+        Args:
+            samples (np.ndarray): samples of the block
+        """
+        self.num_blocks += 1
+        if np.max(samples, initial=0) > self.threshold:
+            self.heard_speech = True
+            self.silent_blocks = 0
+        else:
+            self.silent_blocks += 1
+        self._pending.append(samples)
+
+        chunks = []
+        if self.heard_speech and self.silent_blocks == self.end_of_speech_blocks:
+            chunks.append(self._chunk(end_of_speech=True))
+        elif not self.speech_ended and len(self._pending) >= self.blocks_per_chunk:
+            chunks.append(self._chunk())
+        if self.finished:
+            chunks.append(self.end_utterance())
+        return chunks
+
+    def end_utterance(self) -> AudioChunk:
+        """ Returns the last chunk of the utterance (called by `add_block` once the utterance is
+            over, call it yourself if the recording stops earlier) """
+        if self.speech_ended:
+            # the silence after the end of speech isn't part of the utterance
+            self._pending = []
+        return self._chunk(end_of_utterance=True)
+
+    def _chunk(self, end_of_speech: bool = False, end_of_utterance: bool = False) -> AudioChunk:
+        samples = np.concatenate(self._pending).astype(np.float32) if self._pending else np.zeros(0, np.float32)
+        self._pending = []
+        return AudioChunk(samples, self.sampling_rate, end_of_speech, end_of_utterance)
@@ -0,0 +1,263 @@
+############################################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify'
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+############################################################################################
+
+"""Latency and throughput statistics of the message bus.
+
+A `DialogSystem` hands its `BusInstrumentation` to all local services (see its `instrument`
+argument). The services then record
+    * every published message (per topic: count and rate)
+    * the delivery latency of every received message (receive time - send timestamp)
+    * wall and CPU time of every subscriber function call
+    * the turn latency: time from a `gen_user_utterance` message to the next `sys_utterance`
+      message of the same session
+
+Recording an event costs a few microseconds, so the instrumentation can stay on. Use
+`BusInstrumentation.summary()` for a table of all statistics and `start_trace()` /
+`write_trace()` to look at the timeline of single dialogs in a Chrome trace viewer
+(chrome://tracing or https://ui.perfetto.dev).
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from typing import Dict, Hashable, List, Optional
+
+
+class StreamingHistogram:
+    """ Histogram of durations with logarithmic buckets (constant memory, ~9% relative error for percentiles) """
+
+    # buckets per factor of two
+    _RESOLUTION = 8
+    # smallest resolved duration: 1 microsecond
+    _MIN_VALUE = 1e-6
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+        # bucket index -> count
+        self._buckets: Dict[int, int] = {}
+
+    def add(self, value: float):
+        """ Adds a duration (in seconds) """
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        bucket = int(math.log2(value / self._MIN_VALUE) * self._RESOLUTION) if value > self._MIN_VALUE else 0
+        self._buckets[bucket] = self._buckets.get(bucket, 0) + 1
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, q: float) -> float:
+        """ Returns the (approximate) q-th percentile, q in [0, 100] """
+        if not self.count:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for bucket in sorted(self._buckets):
+            seen += self._buckets[bucket]
+            if seen >= rank:
+                # geometric center of the bucket, within the observed range
+                value = self._MIN_VALUE * 2 ** ((bucket + 0.5) / self._RESOLUTION)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+
+class _TopicStats:
+    def __init__(self):
+        self.published = 0
+        self.first_published = None
+        self.last_published = None
+        self.delivery = StreamingHistogram()
+
+
+class _HandlerStats:
+    def __init__(self):
+        self.wall = StreamingHistogram()
+        self.cpu = StreamingHistogram()
+
+
+class BusInstrumentation:
+    """ Collects the statistics of all services of a dialog system (thread-safe). """
+
+    def __init__(self, turn_start_topic: str = 'gen_user_utterance', turn_end_topic: str = 'sys_utterance',
+                 max_trace_events: int = 100000):
+        """
+        Args:
+            turn_start_topic (str): topic of the messages starting a turn (the user's input)
+            turn_end_topic (str): topic of the messages ending a turn (the system's answer)
+            max_trace_events (int): stop recording a trace after this many events
+        """
+        self.turn_start_topic = turn_start_topic
+        self.turn_end_topic = turn_end_topic
+        self.max_trace_events = max_trace_events
+        self._lock = threading.Lock()
+        self._topics: Dict[str, _TopicStats] = {}
+        self._handlers: Dict[str, _HandlerStats] = {}
+        self.turns = StreamingHistogram()
+        # session id -> start time of its current turn
+        self._turn_starts: Dict[Hashable, float] = {}
+        # trace recording
+        self._tracing = False
+        self._trace_sessions = None
+        self._trace_events: List[dict] = []
+
+    def _topic(self, topic: str) -> _TopicStats:
+        if topic not in self._topics:
+            self._topics[topic] = _TopicStats()
+        return self._topics[topic]
+
+    def _traced(self, session_id: Optional[Hashable]) -> bool:
+        return self._tracing and (self._trace_sessions is None or session_id in self._trace_sessions) \
+            and len(self._trace_events) < self.max_trace_events
+
+    def record_publish(self, topic: str, session_id: Optional[Hashable] = None):
+        """ Records a published message (call right before sending it, so the start of a turn is
+            recorded before a subscriber can answer it)
+
+        Args:
+            topic (str): topic the message was published to (including the domain)
+            session_id (Hashable): session of the message
+        """
+        now = time.time()
+        base_topic = topic.split("/")[0]
+        with self._lock:
+            stats = self._topic(topic)
+            stats.published += 1
+            if stats.first_published is None:
+                stats.first_published = now
+            stats.last_published = now
+            if base_topic == self.turn_start_topic:
+                self._turn_starts[session_id] = now
+            elif base_topic == self.turn_end_topic and session_id in self._turn_starts:
+                self.turns.add(now - self._turn_starts.pop(session_id))
+            if self._traced(session_id):
+                self._trace_events.append({'name': topic, 'cat': 'publish', 'ph': 'i', 's': 't',
+                                           'ts': time.perf_counter() * 1e6, 'pid': os.getpid(),
+                                           'tid': threading.get_ident(), 'args': {'session': str(session_id)}})
+
+    def record_delivery(self, topic: str, timestamp: float):
+        """ Records a received message
+
+        Args:
+            topic (str): topic the message was received from
+            timestamp (float): POSIX send timestamp of the message
+        """
+        latency = max(time.time() - timestamp, 0.0)
+        with self._lock:
+            self._topic(topic).delivery.add(latency)
+
+    def record_call(self, handler: str, session_id: Optional[Hashable], start: float, wall: float,
+                    cpu: Optional[float]):
+        """ Records a call of a subscriber function
+
+        Args:
+            handler (str): name of the subscriber function (`Service.function`)
+            session_id (Hashable): session of the handled messages
+            start (float): `time.perf_counter()` at the start of the call
+            wall (float): duration of the call in seconds
+            cpu (float): CPU time of the calling thread in seconds (`None` if unknown, e.g. for coroutines)
+        """
+        with self._lock:
+            if handler not in self._handlers:
+                self._handlers[handler] = _HandlerStats()
+            stats = self._handlers[handler]
+            stats.wall.add(wall)
+            if cpu is not None:
+                stats.cpu.add(cpu)
+            if self._traced(session_id):
+                args = {'session': str(session_id)}
+                if cpu is not None:
+                    args['cpu_ms'] = round(cpu * 1000, 3)
+                self._trace_events.append({'name': handler, 'cat': 'handler', 'ph': 'X', 'ts': start * 1e6,
+                                           'dur': wall * 1e6, 'pid': os.getpid(), 'tid': threading.get_ident(),
+                                           'args': args})
+
+    def start_trace(self, session_ids: List[Hashable] = None):
+        """ Starts recording a timeline of handler calls and published messages
+
+        Args:
+            session_ids (List[Hashable]): only record these sessions (`None`: record everything, e.g. for
+                                          `DialogSystem.run_dialog`)
+        """
+        with self._lock:
+            self._tracing = True
+            self._trace_sessions = None if session_ids is None else set(session_ids)
+            self._trace_events = []
+
+    def stop_trace(self):
+        """ Stops recording the timeline (the recorded events are kept) """
+        with self._lock:
+            self._tracing = False
+
+    def trace(self) -> dict:
+        """ Returns the recorded timeline in the Chrome trace event format """
+        with self._lock:
+            events = list(self._trace_events)
+        names = {event['tid'] for event in events}
+        threads = {thread.ident: thread.name for thread in threading.enumerate()}
+        metadata = [{'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid,
+                     'args': {'name': threads.get(tid, str(tid))}} for tid in names]
+        return {'traceEvents': metadata + events, 'displayTimeUnit': 'ms'}
+
+    def write_trace(self, path: str):
+        """ Writes the recorded timeline as a Chrome trace (JSON) file """
+        with open(path, 'w') as trace_file:
+            json.dump(self.trace(), trace_file)
+
+    def reset(self):
+        """ Forgets all statistics """
+        with self._lock:
+            self._topics = {}
+            self._handlers = {}
+            self.turns = StreamingHistogram()
+            self._turn_starts = {}
+
+    def summary(self) -> str:
+        """ Returns a table of all statistics (times in ms) """
+        def times(histogram: StreamingHistogram) -> str:
+            return f"{histogram.mean() * 1000:>9.3f} {histogram.percentile(50) * 1000:>9.3f} " \
+                   f"{histogram.percentile(95) * 1000:>9.3f} {histogram.max * 1000:>9.3f}"
+
+        with self._lock:
+            lines = [f"{'turn latency':<40} {'count':>8} {'mean':>9} {'p50':>9} {'p95':>9} {'max':>9}",
+                     f"{self.turn_start_topic + ' -> ' + self.turn_end_topic:<40} {self.turns.count:>8} "
+                     f"{times(self.turns)}", "",
+                     f"{'topic (delivery latency)':<40} {'published':>9} {'msg/s':>8} {'received':>8} "
+                     f"{'mean':>9} {'p50':>9} {'p95':>9} {'max':>9}"]
+            for topic in sorted(self._topics):
+                stats = self._topics[topic]
+                duration = (stats.last_published or 0) - (stats.first_published or 0)
+                rate = stats.published / duration if duration > 0 else 0.0
+                lines.append(f"{topic:<40} {stats.published:>9} {rate:>8.1f} {stats.delivery.count:>8} "
+                             f"{times(stats.delivery)}")
+            lines += ["", f"{'handler (wall / cpu time)':<40} {'calls':>8} {'mean':>9} {'p50':>9} {'p95':>9} "
+                          f"{'max':>9} {'cpu mean':>9}"]
+            for handler in sorted(self._handlers):
+                stats = self._handlers[handler]
+                lines.append(f"{handler:<40} {stats.wall.count:>8} {times(stats.wall)} "
+                             f"{stats.cpu.mean() * 1000:>9.3f}")
+        return "\n".join(lines)
@@ -17,10 +17,11 @@
 #
 ###############################################################################
 
-from typing import List
+from typing import Callable, List, Union
 
 from services.nlg.templates.data.commands.command import Command
 from services.nlg.templates.data.commands.probability import Probability
+from services.nlg.templates.data.expressions.expression import Expression
 from services.nlg.templates.data.memory import Memory
 from services.nlg.templates.parsing.parsers.codeparser.codeparser import CodeParser
 from services.nlg.templates.parsing.parsers.messageparser.data.messagecomponent import MessageComponent, \
@@ -37,10 +38,57 @@ class Message(Command):
 
         self.components = self._parse_message()
         self.score = 1.0
+        self._parts = self._lower()
+        self._render = self._compile(self._parts)
 
     def _parse_message(self) -> List[MessageComponent]:
         return MESSAGE_PARSER.parse(self.arguments)
 
+    def _lower(self) -> List[Union[str, Expression]]:
+        """Parses the code components into expressions once and merges adjacent strings"""
+        parts: List[Union[str, Expression]] = []
+        for component in self.components:
+            if component.component_type == MessageComponentType.STRING:
+                if parts and isinstance(parts[-1], str):
+                    parts[-1] += component.value
+                else:
+                    parts.append(component.value)
+            elif component.component_type == MessageComponentType.ADVISER_CODE or \
+                component.component_type == MessageComponentType.PYTHON_CODE:
+                code = component.value + '$'  # CodeParser expects end of statement
+                parts.append(CODE_PARSER.parse(code)[0])
+        return parts
+
+    @staticmethod
+    def _compile(parts: List[Union[str, Expression]]) -> Callable[[Memory], str]:
+        """Turns the lowered message into a function of the memory
+
+        Returns:
+            Callable[[Memory], str] -- function returning the text of the message
+        """
+        if not parts:
+            return lambda parameters: ''
+        if len(parts) == 1 and isinstance(parts[0], str):
+            text = parts[0]
+            return lambda parameters: text
+
+        def render(parameters: Memory) -> str:
+            output = ''
+            for part in parts:
+                output += part if isinstance(part, str) else part.evaluate(parameters)
+            return output
+        return render
+
+    def __getstate__(self):
+        # the compiled function can't be pickled, it is rebuilt after unpickling
+        state = self.__dict__.copy()
+        del state['_render']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._render = self._compile(self._parts)
+
     def are_arguments_valid(self) -> bool:
         return True  # since parse_arguments would have thrown an exception otherwise
 
@@ -58,13 +106,4 @@ class Message(Command):
         return True  # messages are always applicable
 
     def apply(self, parameters: Memory) -> str:
-        output = ''
-        for component in self.components:
-            if component.component_type == MessageComponentType.STRING:
-                output += component.value
-            elif component.component_type == MessageComponentType.ADVISER_CODE or \
-                component.component_type == MessageComponentType.PYTHON_CODE:
-                code = component.value + '$'  # CodeParser expects end of statement
-                expression = CODE_PARSER.parse(code)[0]
-                output += expression.evaluate(parameters)
-        return output
+        return self._render(parameters)
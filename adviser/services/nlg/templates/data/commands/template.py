@@ -81,13 +81,20 @@ class Template(Command):
         return len(slot_names_to_check) == 0 or self.free_parameter is not None
 
     def apply(self, parameters: Memory = None) -> str:
-        slot_dict = parameters.variable_dict.copy()
+        return self.render(parameters.variable_dict, parameters.global_memory)
+
+    def render(self, slot_values: Dict[str, List[object]], global_memory: GlobalMemory) -> str:
+        """Applies the template to the slots of a system act without building a memory for them first
+
+        Arguments:
+            slot_values {Dict[str, List[object]]} -- slot -> values of the system act
+            global_memory {GlobalMemory} -- memory of the template file
+        """
+        slot_dict = dict(slot_values)
         if self.free_parameter is not None:
-            variables = self._build_memory_with_free_parameter(slot_dict,
-                                                               parameters.global_memory)
+            variables = self._build_memory_with_free_parameter(slot_dict, global_memory)
         else:
-            variables = self._build_memory_without_free_parameter(slot_dict,
-                                                                  parameters.global_memory)
+            variables = self._build_memory_without_free_parameter(slot_dict, global_memory)
 
         special_case = self._get_applicable_special_case(variables)
         if special_case is not None:
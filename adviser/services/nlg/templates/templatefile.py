@@ -17,6 +17,9 @@
 #
 ###############################################################################
 
+import hashlib
+import os
+import pickle
 import sys
 from typing import Tuple, List, Dict, Callable
 
@@ -52,20 +55,85 @@ KEYWORDS = {
     'weight': Probability
 }
 
+# bump when the classes of the parsed commands change, so old cache files are not used anymore
+_CACHE_VERSION = 1
+
+# hash of a template file -> its parsed templates and functions, shared by all TemplateFiles
+_parsed_files: Dict[str, Tuple[List[Template], List[Function]]] = {}
+
+
+def _cache_path(filename: str, file_hash: str) -> str:
+    directory, name = os.path.split(os.path.abspath(filename))
+    return os.path.join(directory, '__pycache__', f'{name}.{file_hash[:16]}.pickle')
+
+
+def _load_template_file(filename: str, disk_cache: bool) -> Tuple[List[Template], List[Function]]:
+    """Returns the parsed templates and functions of a template file
+
+    A file is parsed once per process. With the disk cache, the parsed file is also stored next to
+    it (like python's bytecode cache) and only parsed again when its content changes.
+    """
+    with open(filename, 'rb') as file:
+        file_hash = hashlib.sha1(_CACHE_VERSION.to_bytes(4, 'little') + file.read()).hexdigest()
+    if file_hash in _parsed_files:
+        return _parsed_files[file_hash]
+
+    parsed = None
+    cache_path = _cache_path(filename, file_hash)
+    if disk_cache and os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'rb') as cache_file:
+                parsed = pickle.load(cache_file)
+        except Exception:
+            parsed = None  # unreadable or outdated cache file, parse again
+    if parsed is None:
+        tfr = _TemplateFileReader(filename)
+        parsed = (tfr.get_templates(), tfr.get_functions())
+        if disk_cache:
+            _write_cache_file(cache_path, parsed)
+    _parsed_files[file_hash] = parsed
+    return parsed
+
+
+def _write_cache_file(cache_path: str, parsed: Tuple[List[Template], List[Function]]):
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        temp_path = f'{cache_path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as cache_file:
+            pickle.dump(parsed, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path)
+    except OSError:
+        pass  # e.g. read-only directory, the file is parsed again next time
+
 
 class TemplateFile:
     """Interprets a template file
-    
+
+    The file is parsed only once (see `_load_template_file`); the parsed templates and functions are
+    shared by all TemplateFiles of the file. The template applied to a system act only depends on its
+    intent and slot names, so it is looked up once per slot signature and remembered.
+
     Attributes:
         global_memory {GlobalMemory} -- memory that can be accessed at all times in the tempaltes
     """
 
-    def __init__(self, filename: str, domain: JSONLookupDomain):
+    def __init__(self, filename: str, domain: JSONLookupDomain, disk_cache: bool = True):
+        """
+        Arguments:
+            filename {str} -- path of the template file
+            domain {JSONLookupDomain} -- domain whose database the templates can access
+
+        Keyword Arguments:
+            disk_cache {bool} -- store the parsed file in a __pycache__ directory next to it
+                (default: {True})
+        """
         self.global_memory = GlobalMemory(domain)
         self._add_built_in_functions()
-        tfr = _TemplateFileReader(filename)
-        self._templates = self._create_template_dict(tfr.get_templates())
-        self._add_functions_to_global_memory(tfr.get_functions())
+        templates, functions = _load_template_file(filename, disk_cache)
+        self._templates = self._create_template_dict(templates)
+        self._add_functions_to_global_memory(functions)
+        # (intent, slot names) -> first applicable template
+        self._template_index: Dict[Tuple[str, Tuple[str, ...]], Template] = {}
 
     def _add_built_in_functions(self):
         self.global_memory.add_function(ForFunction(self.global_memory))
@@ -85,7 +153,7 @@ class TemplateFile:
             self.global_memory.add_function(function)
 
     def create_message(self, sys_act: SysAct) -> str:
-        """Iterates through all possible templates and applies the first one to fit the system act
+        """Applies the first template fitting the system act (its intent and slot names)
         
         Arguments:
             sys_act {SysAct} -- the system act to find a template for
@@ -96,10 +164,18 @@ class TemplateFile:
         Returns:
             str -- the message returned by the template
         """
+        signature = (sys_act.type.value, tuple(sys_act.slot_values))
+        template = self._template_index.get(signature)
+        if template is None:
+            template = self._find_template(sys_act)
+            self._template_index[signature] = template
+        return template.render(sys_act.slot_values, self.global_memory)
+
+    def _find_template(self, sys_act: SysAct) -> Template:
         slots = self._create_memory_from_sys_act(sys_act)
         for template in self._templates[sys_act.type.value]:
             if template.is_applicable(slots):
-                return template.apply(slots)
+                return template
         raise BaseException(f'No template was found for given system act {sys_act.type}.')
 
     def _create_memory_from_sys_act(self, sys_act: SysAct) -> Memory:
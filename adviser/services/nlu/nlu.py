@@ -17,13 +17,13 @@
 #
 ###############################################################################
 
-import json
 import os
-import re
 from typing import List
 
+from services.nlu.rulecache import load_rules
 from services.service import PublishSubscribe
 from services.service import Service
+from services.session import SessionAttribute
 from utils import UserAct, UserActionType
 from utils.beliefstate import BeliefState
 from utils.common import Language
@@ -52,7 +52,8 @@ class HandcraftedNLU(Service):
 
     There are two more files per domain that contain the domain-specific rules
     for request and inform user acts, e.g. ImsCoursesInformRules.json and
-    ImsCoursesRequestRules.json.
+    ImsCoursesRequestRules.json (or the inform patterns of each slot in
+    <domain>InformPatterns.json, see services.nlu.rulecache).
 
     The output during dialog interaction of this module is a semantic
     representation of the user input.
@@ -65,6 +66,14 @@ class HandcraftedNLU(Service):
 
     """
 
+    # dialog-level state (kept per session, initialized in `dialog_start`)
+    sys_act_info = SessionAttribute(factory=lambda service: {
+        'last_act': None, 'lastInformedPrimKeyVal': None, 'lastRequestSlot': None})
+    user_acts = SessionAttribute(factory=lambda service: [])
+    slots_informed = SessionAttribute(factory=lambda service: set())
+    slots_requested = SessionAttribute(factory=lambda service: set())
+    req_everything = SessionAttribute(default=False)
+
     def __init__(self, domain: JSONLookupDomain, logger: DiasysLogger = DiasysLogger(),
                  language: Language = None):
         """
@@ -192,7 +201,7 @@ class HandcraftedNLU(Service):
         # Iteration over all general acts
         for act in self.general_regex:
             # Check if the regular expression and the user utterance match
-            if re.search(self.general_regex[act], user_utterance, re.I):
+            if self.rule_matcher.general[act].search(user_utterance):
                 # Mapping the act to User Act
                 if act != 'dontcare' and act != 'req_everything':
                     user_act_type = UserActionType(act)
@@ -283,7 +292,7 @@ class HandcraftedNLU(Service):
         """
         # Iteration over all user requestable slots
         for slot in self.USER_REQUESTABLE:
-            if self._check(re.search(self.request_regex[slot], user_utterance, re.I)):
+            if self.rule_matcher.match_request(slot, user_utterance):
                 self._add_request(user_utterance, slot)
 
     def _add_request(self, user_utterance: str, slot: str):
@@ -315,17 +324,16 @@ class HandcraftedNLU(Service):
 
         # Iteration over all user informable slots and their slots
         for slot in self.USER_INFORMABLE:
-            for value in self.inform_regex[slot]:
-                if self._check(re.search(self.inform_regex[slot][value], user_utterance, re.I)):
-                    if slot == self.domain_key and self.req_everything:
-                        # Adding all requestable slots because of the req_everything
-                        for req_slot in self.USER_REQUESTABLE:
-                            # skipping the domain key slot
-                            if req_slot != self.domain_key:
-                                # Adding user request act
-                                self._add_request(user_utterance, req_slot)
-                    # Adding user inform act
-                    self._add_inform(user_utterance, slot, value)
+            for value in self.rule_matcher.match_inform(slot, user_utterance):
+                if slot == self.domain_key and self.req_everything:
+                    # Adding all requestable slots because of the req_everything
+                    for req_slot in self.USER_REQUESTABLE:
+                        # skipping the domain key slot
+                        if req_slot != self.domain_key:
+                            # Adding user request act
+                            self._add_request(user_utterance, req_slot)
+                # Adding user inform act
+                self._add_inform(user_utterance, slot, value)
         
     def _add_inform(self, user_utterance: str, slot: str, value: str):
         """
@@ -453,22 +461,13 @@ class HandcraftedNLU(Service):
             Args:
                 language (Language): Enum representing the language the user has selected
         """
-        if self.language == Language.ENGLISH:
-            # Loading regular expression from JSON files
-            # as dictionaries {act:regex, ...} or {slot:{value:regex, ...}, ...}
-            self.general_regex = json.load(open(self.base_folder + '/GeneralRules.json'))
-            self.request_regex = json.load(open(self.base_folder + '/' + self.domain_name
-                                                + 'RequestRules.json'))
-            self.inform_regex = json.load(open(self.base_folder + '/' + self.domain_name
-                                               + 'InformRules.json'))
-        elif self.language == Language.GERMAN:
-            # TODO: Change this once
-            # Loading regular expression from JSON files
+        if self.language in (Language.ENGLISH, Language.GERMAN):
+            # Loading regular expressions (shared by all NLU modules of the process)
             # as dictionaries {act:regex, ...} or {slot:{value:regex, ...}, ...}
-            self.general_regex = json.load(open(self.base_folder + '/GeneralRulesGerman.json'))
-            self.request_regex = json.load(open(self.base_folder + '/' + self.domain_name
-                                                + 'GermanRequestRules.json'))
-            self.inform_regex = json.load(open(self.base_folder + '/' + self.domain_name
-                                               + 'GermanInformRules.json'))
+            rules = load_rules(self.domain, self.base_folder, self.language)
+            self.general_regex = rules.general_regex
+            self.request_regex = rules.request_regex
+            self.inform_regex = rules.inform_regex
+            self.rule_matcher = rules.matcher
         else:
             print('No language')
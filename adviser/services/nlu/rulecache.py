@@ -0,0 +1,246 @@
+###############################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+"""Loads the regex rules of the NLU modules once per process and keeps them in a rule artifact on disk.
+
+The rules of a domain are built from
+    * the general rules (`GeneralRules.json`)
+    * the domain's `.nlu` file and its ontology, if the `.nlu` file exists (the rules are generated
+      like `tools/regextemplates/gen_regexes.py` does; only values missing in `<domain>InformPatterns.json`
+      are generated again), otherwise the generated `<domain>RequestRules.json` and
+      `<domain>InformPatterns.json` (or the expanded `<domain>InformRules.json`)
+and analysed for the `RuleMatcher` once. The result is pickled into `resources/nlu_regexes/__pycache__`,
+keyed by a hash of all sources, so it is rebuilt automatically whenever one of them changes (the
+ontology is regenerated from the database by `tools/create_ontology.py`). Within a process, all NLU
+modules with the same rules share one `NLURules` object.
+
+`<domain>InformPatterns.json` stores the inform rules of each slot as one pattern (see `SlotRules`):
+    {"source": sha1 of the .nlu file,
+     "slots": {slot: {"pattern": rule with "\\u0000" in place of the value,
+                      "values": [values, in rule order],
+                      "exceptions": {value: rule of a value not following the pattern}}}}
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import re
+import threading
+import types
+from typing import Callable, Dict, Mapping, Optional, Tuple
+
+from services.nlu.rulematcher import RuleMatcher, SlotRules
+from utils.common import Language
+from utils.domain.jsonlookupdomain import JSONLookupDomain
+
+# bump when the format of the cached rules changes
+_CACHE_VERSION = 2
+
+# hash of the rule sources -> rules, shared by all NLU modules of the process
+_rule_sets: Dict[str, 'NLURules'] = {}
+_lock = threading.Lock()
+# (path, modification time, size) -> hash of the file's content
+_file_digests: Dict[tuple, bytes] = {}
+
+
+class NLURules(object):
+    """ The regex rules of an NLU module and the `RuleMatcher` compiled from them.
+
+    The rules are shared by all NLU modules using them, so they must not be modified.
+
+    Attributes:
+        general_regex (Dict[str, str]): mapping act -> regex
+        request_regex (Dict[str, str]): mapping slot -> regex
+        inform_regex (Dict[str, Mapping[str, str]]): mapping slot -> value -> regex (`SlotRules`
+                                                     unless read from expanded rule files)
+        matcher (RuleMatcher): the compiled rules
+    """
+
+    def __init__(self, general_regex: Dict[str, str], request_regex: Dict[str, str],
+                 inform_regex: Dict[str, Mapping[str, str]], flags: int = re.I):
+        self.general_regex = general_regex
+        self.request_regex = request_regex
+        self.inform_regex = inform_regex
+        self.matcher = RuleMatcher(general_regex, request_regex, inform_regex, flags)
+
+
+# callable changing the (general, request, inform) rules before they are compiled
+RuleExtension = Callable[[Dict[str, str], Dict[str, str], Dict[str, Mapping[str, str]]], None]
+
+
+def _read_json(path: str) -> dict:
+    with open(path, encoding='utf-8') as rule_file:
+        return json.load(rule_file)
+
+
+def source_hash(nlu_file: str) -> str:
+    """ Returns the hash of a .nlu file stored in the inform patterns generated from it """
+    with open(nlu_file, 'rb') as source:
+        return hashlib.sha1(source.read()).hexdigest()
+
+
+def read_inform_patterns(path: str) -> Tuple[Optional[str], Dict[str, SlotRules]]:
+    """ Reads a <domain>InformPatterns.json file
+
+    Returns:
+        the hash of the .nlu file it was generated from and the rules of each slot
+    """
+    patterns = _read_json(path)
+    return patterns.get('source'), {slot: SlotRules(rules['pattern'], rules['values'], rules['exceptions'])
+                                    for slot, rules in patterns['slots'].items()}
+
+
+def write_inform_patterns(path: str, nlu_hash: str, inform_rules: Dict[str, SlotRules]):
+    """ Writes a <domain>InformPatterns.json file
+
+    Args:
+        path (str): the file to write
+        nlu_hash (str): `source_hash` of the .nlu file the rules were generated from
+        inform_rules (Dict[str, SlotRules]): the rules of each slot
+    """
+    slots = {slot: {'pattern': rules.pattern, 'values': rules.values, 'exceptions': rules.exceptions}
+             for slot, rules in inform_rules.items()}
+    with open(path, 'w', encoding='utf-8') as pattern_file:
+        json.dump({'source': nlu_hash, 'slots': slots}, pattern_file, sort_keys=True, indent=1)
+
+
+def _file_digest(path: str) -> bytes:
+    """ Returns the hash of a file's content (hashed again only if its size or modification time changed) """
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    if key not in _file_digests:
+        with open(path, 'rb') as source:
+            _file_digests[key] = hashlib.sha1(source.read()).digest()
+    return _file_digests[key]
+
+
+def _source_files(base_folder: str, domain: JSONLookupDomain, language: Language) -> Dict[str, str]:
+    suffix = 'German' if language == Language.GERMAN else ''
+    domain_name = domain.get_domain_name()
+    files = {'general': os.path.join(base_folder, f'GeneralRules{suffix}.json')}
+    nlu_file = os.path.join(base_folder, f'{domain_name}{suffix}.nlu')
+    patterns_file = os.path.join(base_folder, f'{domain_name}{suffix}InformPatterns.json')
+    if os.path.exists(nlu_file):
+        files['nlu'] = nlu_file
+    else:
+        files['request'] = os.path.join(base_folder, f'{domain_name}{suffix}RequestRules.json')
+        if os.path.exists(patterns_file):
+            files['patterns'] = patterns_file
+        else:
+            files['inform'] = os.path.join(base_folder, f'{domain_name}{suffix}InformRules.json')
+    return files
+
+
+def _code_digest(code: types.CodeType, digest):
+    """ Adds the bytecode, names and constants of a function's code (and of nested code) to a hash.
+        Unlike marshal.dumps, this doesn't change once the function ran (e.g. by quickening). """
+    digest.update(code.co_code)
+    digest.update(repr(code.co_names).encode('utf-8'))
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            _code_digest(const, digest)
+        elif isinstance(const, frozenset):
+            # the order of set elements differs between processes
+            digest.update(repr(sorted(const, key=repr)).encode('utf-8'))
+        else:
+            digest.update(repr(const).encode('utf-8'))
+
+
+def _rules_hash(files: Dict[str, str], domain: JSONLookupDomain, extend: Optional[RuleExtension]) -> str:
+    rules_hash = hashlib.sha1(_CACHE_VERSION.to_bytes(4, 'little'))
+    for name in sorted(files):
+        rules_hash.update(files[name].encode('utf-8') + _file_digest(files[name]))
+    if 'nlu' in files:
+        # the rules are generated for the values in the ontology
+        rules_hash.update(json.dumps(domain.ontology_json, sort_keys=True).encode('utf-8'))
+    if extend is not None:
+        rules_hash.update(f'{extend.__module__}.{extend.__qualname__}'.encode('utf-8'))
+        _code_digest(extend.__code__, rules_hash)
+    return rules_hash.hexdigest()
+
+
+def _build_rules(files: Dict[str, str], domain: JSONLookupDomain, extend: Optional[RuleExtension]) -> NLURules:
+    general_regex = _read_json(files['general'])
+    if 'nlu' in files:
+        from tools.regextemplates.gen_regexes import create_rules_from_template
+        previous = None
+        patterns_file = files['nlu'][:-len('.nlu')] + 'InformPatterns.json'
+        if os.path.exists(patterns_file):
+            nlu_hash, inform_regex = read_inform_patterns(patterns_file)
+            if nlu_hash == source_hash(files['nlu']):
+                # rules of values in the patterns file are reused, only new values are generated
+                previous = inform_regex
+        request_regex, inform_regex = create_rules_from_template(domain, files['nlu'], previous)
+    elif 'patterns' in files:
+        request_regex, inform_regex = _read_json(files['request']), read_inform_patterns(files['patterns'])[1]
+    else:
+        request_regex, inform_regex = _read_json(files['request']), _read_json(files['inform'])
+    if extend is not None:
+        extend(general_regex, request_regex, inform_regex)
+    return NLURules(general_regex, request_regex, inform_regex)
+
+
+def _write_cache_file(cache_path: str, rules: NLURules):
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        temp_path = f'{cache_path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as cache_file:
+            pickle.dump(rules, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path)
+    except OSError:
+        pass  # e.g. read-only directory, the rules are built again next time
+
+
+def load_rules(domain: JSONLookupDomain, base_folder: str, language: Language = Language.ENGLISH,
+               extend: RuleExtension = None, disk_cache: bool = True) -> NLURules:
+    """ Returns the (shared) rules of an NLU module for a domain
+
+    Args:
+        domain (JSONLookupDomain): domain of the NLU module
+        base_folder (str): folder of the rule files (resources/nlu_regexes)
+        language (Language): language of the rules
+        extend (RuleExtension): module-level function adding rules before they are compiled (part
+                                of the cache key, including its code)
+        disk_cache (bool): keep the built rules in a __pycache__ directory in base_folder
+
+    Returns:
+        the rules, shared with all other NLU modules loading the same rules - don't modify them
+    """
+    files = _source_files(base_folder, domain, language)
+    rules_hash = _rules_hash(files, domain, extend)
+    with _lock:
+        if rules_hash in _rule_sets:
+            return _rule_sets[rules_hash]
+
+        rules = None
+        cache_path = os.path.join(base_folder, '__pycache__',
+                                  f"{domain.get_domain_name()}Rules.{rules_hash[:16]}.pickle")
+        if disk_cache and os.path.exists(cache_path):
+            try:
+                with open(cache_path, 'rb') as cache_file:
+                    rules = pickle.load(cache_file)
+            except Exception:
+                rules = None  # unreadable or outdated cache file, build the rules again
+        if rules is None:
+            rules = _build_rules(files, domain, extend)
+            if disk_cache:
+                _write_cache_file(cache_path, rules)
+        _rule_sets[rules_hash] = rules
+        return rules
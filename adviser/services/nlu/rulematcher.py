@@ -0,0 +1,384 @@
+###############################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+"""Pre-compiled matching of the regex rules used by the handcrafted NLU modules."""
+
+import os
+import re
+import sys
+from collections.abc import Mapping, MutableMapping
+from functools import lru_cache
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# stands in for the value literal inside a slot template (never occurs in a rule)
+PLACEHOLDER = "\x00"
+# characters which would turn a value into a regex instead of a plain literal
+_REGEX_SPECIAL = set(".^$*+?{}[]\\|()")
+
+
+def _top_level(pattern: str) -> Iterator[Tuple[int, str]]:
+    """ Yields (index, character) for all characters of `pattern` which are not nested in a
+        group, a character class or an escape sequence. Opening and closing parentheses of
+        top-level groups are yielded as well.
+    """
+    depth = 0
+    in_class = False
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == '\\':
+            i += 2
+            continue
+        if in_class:
+            if c == ']':
+                in_class = False
+        elif c == '[':
+            in_class = True
+            # a ']' directly after '[' or '[^' is a literal, not the end of the class
+            i += 1
+            if pattern[i:i + 1] == '^':
+                i += 1
+            if pattern[i:i + 1] == ']':
+                i += 1
+            continue
+        elif c == '(':
+            if depth == 0:
+                yield i, c
+            depth += 1
+        elif c == ')':
+            depth -= 1
+            if depth == 0:
+                yield i, c
+        elif depth == 0:
+            yield i, c
+        i += 1
+
+
+def _split_alternatives(pattern: str) -> List[str]:
+    """ Splits `pattern` at its top-level '|' characters. """
+    parts, start = [], 0
+    for i, c in _top_level(pattern):
+        if c == '|':
+            parts.append(pattern[start:i])
+            start = i + 1
+    parts.append(pattern[start:])
+    return parts
+
+
+@lru_cache(maxsize=4096)
+def _requires_placeholder(template: str) -> bool:
+    """ Checks whether every possible match of `template` has to contain the placeholder,
+        i.e. whether it occurs in each alternative without being optional.
+        Returns False whenever this cannot be decided with certainty.
+    """
+    alternatives = _split_alternatives(template)
+    if len(alternatives) > 1:
+        return all(_requires_placeholder(alt) for alt in alternatives)
+
+    top = list(_top_level(template))
+    if len(top) == 2 and top[0] == (0, '(') and top[1] == (len(template) - 1, ')'):
+        # whole template is wrapped in a single (capturing or non-capturing) group
+        if not template.startswith('(?'):
+            return _requires_placeholder(template[1:-1])
+        if template.startswith('(?:'):
+            return _requires_placeholder(template[3:-1])
+        return False
+    return any(c == PLACEHOLDER and template[i + 1:i + 2] not in ('?', '*', '{')
+               for i, c in top)
+
+
+def _plain_value(value: str) -> bool:
+    """ Checks whether a value can be inserted into a pattern as a literal """
+    return bool(value) and not _REGEX_SPECIAL.intersection(value) and value.isascii()
+
+
+def _derive_template(value: str, regex: str, other_value: str, other_regex: str) -> Optional[str]:
+    """ Derives the template two rules were generated from by aligning them: the value literals
+        only sit where the rules differ, so occurrences of a value in the text of the template
+        (e.g. a value 'in' or 's') are kept.
+
+    Returns:
+        the template with PLACEHOLDER where the values were inserted, or None if the rules weren't
+        generated from one template
+    """
+    parts = []
+    i = j = 0
+    while True:
+        common = len(os.path.commonprefix([regex[i:], other_regex[j:]]))
+        if i + common == len(regex) and j + common == len(other_regex):
+            parts.append(regex[i:])
+            template = PLACEHOLDER.join(parts)
+            if len(parts) > 1 and template.replace(PLACEHOLDER, other_value) == other_regex:
+                return template
+            return None
+        # the rules differ inside the values, which may start with the same characters
+        for position in range(i + common, i - 1, -1):
+            other_position = position - i + j
+            if regex.startswith(value, position) and other_regex.startswith(other_value, other_position):
+                break
+        else:
+            return None
+        parts.append(regex[i:position])
+        i = position + len(value)
+        j = other_position + len(other_value)
+
+
+
+def check(re_object) -> bool:
+    """ Checks if the regular expression and the user utterance matched, i.e. whether at
+        least one group participated in the match.
+
+    Args:
+        re_object: output from re.search(...)
+
+    Returns:
+        True/False if match happened
+    """
+    if re_object is None:
+        return False
+    for o in re_object.groups():
+        if o is not None:
+            return True
+    return False
+
+
+class SlotRules(MutableMapping):
+    """ The inform rules of one slot (value -> regex), stored as one parameterized pattern.
+
+        Rules generated from a .nlu file only differ in the value literal inserted into the rule,
+        so only the pattern (with PLACEHOLDER where the value is inserted) and the values are kept.
+        Values whose rule differs from the pattern (e.g. because of special cases in the .nlu file)
+        keep their own regex.
+    """
+
+    def __init__(self, pattern: Optional[str], values: List[str], exceptions: Dict[str, str] = None):
+        """
+        Args:
+            pattern (str): rule of the slot with PLACEHOLDER standing in for the value (None if the
+                           slot has no values)
+            values (List[str]): all values of the slot, in rule order
+            exceptions (Dict[str, str]): mapping value -> regex for values not following the pattern
+        """
+        self.pattern = pattern
+        self.values = list(values)
+        self.exceptions = dict(exceptions or {})
+        self._value_set = set(self.values)
+
+    def template(self, value: str) -> Optional[str]:
+        """ Returns the pattern if the rule of the value follows it, otherwise None """
+        return self.pattern if value in self._value_set and value not in self.exceptions else None
+
+    def __getitem__(self, value: str) -> str:
+        if value in self.exceptions:
+            return self.exceptions[value]
+        if value not in self._value_set:
+            raise KeyError(value)
+        return self.pattern.replace(PLACEHOLDER, value)
+
+    def __setitem__(self, value: str, regex: str):
+        self.exceptions[value] = regex
+        if value not in self._value_set:
+            self._value_set.add(value)
+            self.values.append(value)
+
+    def __delitem__(self, value: str):
+        if value not in self._value_set:
+            raise KeyError(value)
+        self._value_set.remove(value)
+        self.values.remove(value)
+        self.exceptions.pop(value, None)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.values)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __eq__(self, other):
+        # equal to any mapping with the same value -> regex pairs (e.g. the expanded JSON rules)
+        return isinstance(other, Mapping) and len(self) == len(other) \
+            and all(value in other and self[value] == other[value] for value in self.values)
+
+    def __getstate__(self):
+        return self.pattern, self.values, self.exceptions
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+
+class SlotMatcher(object):
+    """ Matches all inform rules of a single slot.
+
+        The per-value rules generated from a .nlu template only differ in the value literal.
+        The shared template is derived by aligning the rules of two values (or taken from
+        `SlotRules`) and compiled once into a single pattern with an alternation over all values.
+        Scanning an utterance with this pattern tells us in one pass whether any value of the slot
+        can match. Only then are the per-value patterns consulted, and only for values whose
+        literal actually occurs in the utterance. The result is identical to searching every
+        per-value rule on its own.
+
+        Patterns are compiled on first use, so creating (or unpickling) a SlotMatcher does not
+        get slower with the number of values.
+    """
+
+    def __init__(self, value_regexes: Mapping[str, str], flags: int = re.I):
+        """
+        Args:
+            value_regexes (Mapping[str, str]): mapping value -> regex for one slot, as stored in the
+                                               *InformRules.json files, or `SlotRules`
+            flags (int): regex flags used for matching
+        """
+        self.flags = flags
+        # (value, per-value regex or template containing PLACEHOLDER, literal required in the
+        # utterance or None)
+        self.entries: List[Tuple[str, str, Optional[str]]] = []
+        # template -> values sharing it
+        templates: Dict[str, List[str]] = {}
+        # the templates with a placeholder, which the rules of further values are checked against
+        shared: List[str] = []
+        gate_possible = True
+
+        for value in value_regexes:
+            template = value_regexes.template(value) if isinstance(value_regexes, SlotRules) else None
+            literal = None
+            if _plain_value(value):
+                if template is None:
+                    template = self._find_template(value, value_regexes, shared)
+                if PLACEHOLDER in template:
+                    if template not in templates:
+                        shared.append(template)
+                    if _requires_placeholder(template):
+                        literal = value.lower()
+            else:
+                # values containing regex syntax can't be inserted into the alternation of the gate
+                template = value_regexes[value]
+            # share one string per template instead of storing the rule of every value
+            template = sys.intern(template)
+            templates.setdefault(template, []).append(value)
+            if re.search(r"\\[1-9]|\(\?P=", template):
+                # back references would be renumbered when joining the templates
+                gate_possible = False
+            self.entries.append((value, template, literal))
+
+        self.gate_regex: Optional[str] = None
+        if gate_possible and self.entries:
+            self.gate_regex = "|".join(
+                "(?:{})".format(template.replace(PLACEHOLDER, "(?:{})".format("|".join(values))))
+                for template, values in templates.items())
+        self._reset_patterns()
+
+    @staticmethod
+    def _find_template(value: str, value_regexes: Mapping[str, str], templates: List[str]) -> str:
+        """ Returns the template the rule of the value was generated from (the rule itself if no
+            template can be derived, e.g. for special cases)
+
+        Args:
+            value (str): the value
+            value_regexes (Mapping[str, str]): mapping value -> regex of all values of the slot
+            templates (List[str]): the templates of the previous values
+        """
+        regex = value_regexes[value]
+        for template in templates:
+            if template.replace(PLACEHOLDER, value) == regex:
+                return template
+        # a few other values, in case some of them are special cases
+        others = islice((other for other in value_regexes if other != value and _plain_value(other)), 3)
+        for other in others:
+            template = _derive_template(value, regex, other, value_regexes[other])
+            if template is not None:
+                return template
+        return regex
+
+    def _reset_patterns(self):
+        self._gate: Optional[re.Pattern] = None
+        self._patterns: List[Optional[re.Pattern]] = [None] * len(self.entries)
+
+    def __getstate__(self):
+        # compiled patterns are not stored, they are compiled again on first use
+        state = self.__dict__.copy()
+        del state['_gate'], state['_patterns']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reset_patterns()
+
+    @property
+    def gate(self) -> Optional[re.Pattern]:
+        """ Pattern matching wherever any value of the slot can match (None if not possible) """
+        if self._gate is None and self.gate_regex is not None:
+            self._gate = re.compile(self.gate_regex, self.flags)
+        return self._gate
+
+    def match(self, user_utterance: str) -> Iterator[str]:
+        """ Yields all values whose rule matches the user utterance (in rule order).
+
+        Args:
+            user_utterance (str): text input from user
+        """
+        gate = self.gate
+        if gate is not None and gate.search(user_utterance) is None:
+            return
+        # the literal pre-filter relies on lower() agreeing with re.I, which holds for ASCII
+        utterance_lower = user_utterance.lower() if user_utterance.isascii() else None
+        for idx, (value, regex, literal) in enumerate(self.entries):
+            if literal is not None and utterance_lower is not None \
+                    and literal not in utterance_lower:
+                continue
+            pattern = self._patterns[idx]
+            if pattern is None:
+                pattern = self._patterns[idx] = re.compile(regex.replace(PLACEHOLDER, value), self.flags)
+            if check(pattern.search(user_utterance)):
+                yield value
+
+
+class RuleMatcher(object):
+    """ Compiles the general, request and inform rules of an NLU module once, so matching an
+        utterance does not have to go through the uncompiled regex strings again.
+    """
+
+    def __init__(self, general_regex: Dict[str, str], request_regex: Dict[str, str],
+                 inform_regex: Dict[str, Mapping[str, str]], flags: int = re.I):
+        """
+        Args:
+            general_regex (Dict[str, str]): mapping act -> regex
+            request_regex (Dict[str, str]): mapping slot -> regex
+            inform_regex (Dict[str, Mapping[str, str]]): mapping slot -> value -> regex (or
+                                                         `SlotRules`)
+            flags (int): regex flags used for matching
+        """
+        self.general = {act: re.compile(regex, flags) for act, regex in general_regex.items()}
+        self.request = {slot: re.compile(regex, flags) for slot, regex in request_regex.items()}
+        self.inform = {slot: SlotMatcher(values, flags) for slot, values in inform_regex.items()}
+
+    def match_general(self, user_utterance: str) -> Iterator[str]:
+        """ Yields all general acts (e.g. 'hello', 'bye') found in the user utterance. """
+        for act, pattern in self.general.items():
+            if pattern.search(user_utterance):
+                yield act
+
+    def match_request(self, slot: str, user_utterance: str) -> bool:
+        """ Checks whether the user utterance requests the given slot. """
+        return check(self.request[slot].search(user_utterance))
+
+    def match_inform(self, slot: str, user_utterance: str) -> Iterator[str]:
+        """ Yields all values informed for the given slot in the user utterance. """
+        if slot in self.inform:
+            yield from self.inform[slot].match(user_utterance)
@@ -0,0 +1,68 @@
+###############################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+"""Selects the slot whose answer is expected to reduce the uncertainty about the user's entity the most."""
+
+from typing import Any, Dict, List
+
+import numpy as np
+
+
+def expected_information_gain(value_counts: Dict[str, Dict[Any, int]], slots: List[str]) -> np.ndarray:
+    """ Calculates the expected information gain (in bits) of requesting each of the slots.
+
+        All candidate entities are taken to be equally likely. Answering a request for a slot with
+        a value leaves the candidates with that value, so the expected entropy of the remaining
+        candidates is sum_v p(v) * log2(count(v)) and the expected reduction of the entropy
+        log2(#candidates) is the entropy of the slot's value distribution among the candidates.
+        The gains of all slots are computed at once over a (slots x values) matrix of counts.
+
+    Args:
+        value_counts (Dict[str, Dict[Any, int]]): for each slot, the number of candidates for each
+                                                  value (slots without counts have no gain)
+        slots (List[str]): the slots which could be requested
+
+    Returns:
+        the expected information gain of each slot, in the order of `slots`
+    """
+    histograms = [list(value_counts.get(slot, {}).values()) for slot in slots]
+    counts = np.zeros((len(slots), max((len(histogram) for histogram in histograms), default=0) or 1))
+    for row, histogram in enumerate(histograms):
+        counts[row, :len(histogram)] = histogram
+    totals = counts.sum(axis=1)
+    # sum_v count(v) * log2(count(v)), with 0 * log2(0) = 0
+    weighted = np.where(counts > 0, counts * np.log2(np.maximum(counts, 1)), 0.0).sum(axis=1)
+    gains = np.log2(np.maximum(totals, 1)) - weighted / np.maximum(totals, 1)
+    # rounding errors must not make a slot with only one value look informative
+    return np.where(gains > 1e-9, gains, 0.0)
+
+
+def most_informative_slot(value_counts: Dict[str, Dict[Any, int]], slots: List[str]) -> str:
+    """ Returns the slot with the highest expected information gain (the first one if there are
+        several), or an empty string if no slot has more than one value among the candidates.
+
+    Args:
+        value_counts (Dict[str, Dict[Any, int]]): for each slot, the number of candidates for each value
+        slots (List[str]): the slots which could be requested
+    """
+    if not slots:
+        return ""
+    gains = expected_information_gain(value_counts, slots)
+    best = int(np.argmax(gains))
+    return slots[best] if gains[best] > 0 else ""
@@ -19,13 +19,14 @@
 
 from typing import List, Dict
 
+from services.policy.infogain import most_informative_slot
 from utils.domain.lookupdomain import LookupDomain
 from services.service import PublishSubscribe, Service
 from utils import SysAct, SysActionType
 from utils.logger import DiasysLogger
 from utils.beliefstate import BeliefState
 from utils.useract import UserActionType
-from collections import defaultdict
+from collections import Counter, defaultdict
 
 
 class HandcraftedPolicy(Service):
@@ -359,14 +360,13 @@ class HandcraftedPolicy(Service):
         # if there is more than one result
         if len(q_res) > 1:
             constraints, dontcare = self._get_constraints(beliefstate)
-            # Gather all the results for each column
-            temp = {key: [] for key in q_res[0].keys()}
-            # If any column has multiple values, ask for clarification
+            # Count the values of each column among the results
+            value_counts = defaultdict(Counter)
             for result in q_res:
                 for key in result.keys():
                     if key != self.domain_key:
-                        temp[key].append(result[key])
-            next_req = self._gen_next_request(temp, beliefstate)
+                        value_counts[key][result[key]] += 1
+            next_req = self._gen_next_request(value_counts, beliefstate)
             if next_req:
                 sys_act.type = SysActionType.Request
                 sys_act.add_value(next_req)
@@ -376,62 +376,36 @@ class HandcraftedPolicy(Service):
         sys_act.type = SysActionType.InformByName
         return sys_act
 
-    def _gen_next_request(self, temp: Dict[str, List[str]], belief_state: BeliefState):
+    def _gen_next_request(self, value_counts: Dict[str, Dict[str, int]], belief_state: BeliefState):
         """
-            Calculates which slot to request next based asking for non-binary slotes first and then
-            based on which binary slots provide the biggest reduction in the size of db results
-
-            NOTE: If the dataset is large, this is probably not a great idea to calculate each turn
-                  it's relatively simple, but could add up over time
+            Calculates which slot to request next: the system requestable slot (not specified by
+            the user yet) whose answer is expected to reduce the number of results the most
 
             Args:
-                temp (Dict[str, List[str]]: a dictionary with the keys and values for each result
-                                            in the result set
+                value_counts (Dict[str, Dict[str, int]]): for each column of the results, a
+                                            dictionary with the number of results for each value
 
             Returns: (str) representing the slot to ask for next (or empty if none)
         """
         req_slots = self.domain.get_system_requestable_slots()
         # don't other to cacluate statistics for things which have been specified
         constraints, dontcare = self._get_constraints(belief_state)
-        # split out binary slots so we can ask about them second
         req_slots = [s for s in req_slots if s not in dontcare and s not in constraints]
-        bin_slots = [slot for slot in req_slots if len(self.domain.get_possible_values(slot)) == 2]
-        non_bin_slots = [slot for slot in req_slots if slot not in bin_slots]
-
-        # check if there are any differences in values for non-binary slots,
-        # if a slot has multiple values, ask about that slot
-        for slot in non_bin_slots:
-            if len(set(temp[slot])) > 1:
-                return slot
-        # Otherwise look to see if there are differnces in binary slots
-        return self._highest_info_gain(bin_slots, temp)
+        return self._highest_info_gain(req_slots, value_counts)
 
-    def _highest_info_gain(self, bin_slots: List[str], temp: Dict[str, List[str]]):
-        """ Since we don't have lables, we can't properlly calculate entropy, so instead we'll go
-            for trying to ask after a feature that splits the results in half as evenly as possible
-            (that way we gain most info regardless of which way the user chooses)
+    def _highest_info_gain(self, slots: List[str], value_counts: Dict[str, Dict[str, int]]):
+        """ Chooses the slot with the highest expected information gain (see
+            `services.policy.infogain`)
 
             Args:
-                bin_slots: a list of strings representing system requestable binary slots which
-                           have not yet been specified
-                temp (Dict[str, List[str]]: a dictionary with the keys and values for each result
-                                            in the result set
+                slots: a list of strings representing system requestable slots which have not yet
+                       been specified
+                value_counts (Dict[str, Dict[str, int]]): for each slot, a dictionary with the number
+                                            of results for each value of the slot
 
             Returns: (str) representing the slot to ask for next (or empty if none)
         """
-        diffs = {}
-        for slot in bin_slots:
-            val1, val2 = self.domain.get_possible_values(slot)
-            values_dic = defaultdict(int)
-            for val in temp[slot]:
-                values_dic[val] += 1
-            if val1 in values_dic and val2 in values_dic:
-                diffs[slot] = abs(values_dic[val1] - values_dic[val2])
-            # If all slots have the same value, we don't need to request anything, return none
-        if not diffs:
-            return ""
-        sorted_diffs = sorted(diffs.items(), key=lambda kv: kv[1])
-        return sorted_diffs[0][0]
+        return most_informative_slot(value_counts, slots)
 
     def _convert_inform(self, q_results: iter,
                         sys_act: SysAct, beliefstate: BeliefState):
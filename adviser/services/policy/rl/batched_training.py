@@ -0,0 +1,171 @@
+###############################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+"""Runs simulated dialogs for training the DQN policy in lockstep, without the message bus."""
+
+import itertools
+from typing import List
+
+import torch
+
+from services.bst import HandcraftedBST
+from services.policy.rl.dqnpolicy import DQNPolicy
+from services.session import session_context
+from services.simulator import HandcraftedUserSimulator
+from services.stats.evaluation import PolicyEvaluator
+from utils.domain.jsonlookupdomain import JSONLookupDomain
+from utils.logger import DiasysLogger
+
+
+class _Environment(object):
+    """ A user simulator with its own belief state tracker, running one dialog at a time """
+
+    def __init__(self, domain: JSONLookupDomain, logger: DiasysLogger):
+        self.user = HandcraftedUserSimulator(domain, logger=logger)
+        self.bst = HandcraftedBST(domain=domain, logger=logger)
+        self.session_id = None
+        self.user_acts = None
+
+
+class BatchedSimulation(object):
+    """ Runs dialogs between user simulators and a `DQNPolicy` in lockstep.
+
+    The services are called directly, in the order the `DialogSystem` would call them, instead
+    of sending every message over the bus. `num_envs` dialogs run at the same time, each in its
+    own session (see `services.session`). In every step, the policy chooses the actions of all
+    running dialogs with one forward pass of the DQN. Each finished dialog writes its transitions
+    to the replay buffer at once and is replaced by a new dialog.
+
+    Example:
+
+        simulation = BatchedSimulation(domain, policy, evaluator, num_envs=16)
+        policy.train()
+        evaluator.train()
+        simulation.run_dialogs(1000)
+    """
+
+    def __init__(self, domain: JSONLookupDomain, policy: DQNPolicy, evaluator: PolicyEvaluator,
+                 num_envs: int = 16, logger: DiasysLogger = DiasysLogger()):
+        """
+        Args:
+            domain (JSONLookupDomain): domain of the simulated users
+            policy (DQNPolicy): the policy to train / evaluate
+            evaluator (PolicyEvaluator): records reward and success of all dialogs
+            num_envs (int): number of dialogs running at the same time (the batch size of the
+                            DQN's forward passes)
+            logger (DiasysLogger): logger for the user simulators and belief state trackers
+        """
+        self.policy = policy
+        self.evaluator = evaluator
+        self.envs = [_Environment(domain, logger) for _ in range(num_envs)]
+        self._session_ids = itertools.count()
+
+    def _services(self, env: _Environment):
+        return env.user, env.bst, self.policy, self.evaluator
+
+    def _start_dialog(self, env: _Environment):
+        env.session_id = next(self._session_ids)
+        with session_context(env.session_id):
+            for service in self._services(env):
+                service.dialog_start()
+        # start signal (empty user acts let the policy greet the user)
+        env.user_acts = []
+
+    def _end_dialog(self, env: _Environment):
+        with session_context(env.session_id):
+            for service in self._services(env):
+                service.dialog_end()
+        for service in self._services(env):
+            service._drop_session(env.session_id)
+        env.session_id = None
+
+    def _choose_sys_acts(self, envs: List[_Environment]) -> List[dict]:
+        """ Runs the belief state tracking and the policy for one turn of each dialog
+
+        Returns:
+            the output of `DQNPolicy.choose_sys_act` for each dialog
+        """
+        outputs = [None] * len(envs)
+        turns = []  # (index, belief state, sys_state, fixed action index) of turns needing a state vector
+        for idx, env in enumerate(envs):
+            with session_context(env.session_id):
+                beliefstate = env.bst.update_bst(user_acts=env.user_acts)['beliefstate']
+                outputs[idx] = self.policy._prepare_turn(beliefstate)
+                if outputs[idx] is None:
+                    turns.append((idx, beliefstate, self.policy.sys_state,
+                                  self.policy._fixed_action(beliefstate)))
+        if not turns:
+            return outputs
+
+        # featurize all belief states at once, then one forward pass for all dialogs waiting for the DQN
+        state_batch = self.policy.beliefstates_to_batch([turn[1] for turn in turns],
+                                                        [turn[2] for turn in turns])
+        actions = [turn[3] for turn in turns]
+        waiting = [row for row, action in enumerate(actions) if action == -1]
+        if waiting:
+            for row, action in zip(waiting, self.policy.select_actions_eps_greedy(state_batch[waiting])):
+                actions[row] = action
+
+        for row, (idx, beliefstate, _, _) in enumerate(turns):
+            with session_context(envs[idx].session_id):
+                outputs[idx] = self.policy._complete_turn(beliefstate, state_batch[row:row + 1], actions[row])
+        return outputs
+
+    def run_dialogs(self, num_dialogs: int) -> int:
+        """ Runs complete dialogs.
+
+        Whether they are used for training depends on the mode of the policy and evaluator
+        (`train()` / `eval()`), as with the `DialogSystem`.
+
+        Args:
+            num_dialogs (int): number of dialogs to run
+
+        Returns:
+            number of system turns of all dialogs
+        """
+        started = 0
+        active = []
+        for env in self.envs[:num_dialogs]:
+            self._start_dialog(env)
+            started += 1
+            active.append(env)
+
+        num_turns = 0
+        while active:
+            finished = []
+            for env, output in zip(active, self._choose_sys_acts(active)):
+                num_turns += 1
+                with session_context(env.session_id):
+                    self.evaluator.evaluate_turn(sys_act=output['sys_act'])
+                    user_turn = env.user.user_turn(sys_act=output['sys_act'], sys_turn_over=True)
+                    if 'sim_goal' in user_turn:
+                        self.policy.end(sim_goal=user_turn['sim_goal'])
+                        self.evaluator.end_dialog(sim_goal=user_turn['sim_goal'])
+                        finished.append(env)
+                    else:
+                        env.user_acts = user_turn['user_acts']
+
+            for env in finished:
+                self._end_dialog(env)
+                active.remove(env)
+                if started < num_dialogs:
+                    self._start_dialog(env)
+                    started += 1
+                    active.append(env)
+        return num_turns
@@ -28,8 +28,9 @@ from torch.utils.tensorboard import SummaryWriter
 
 from services.policy.rl.policy_rl import RLPolicy
 from services.policy.rl.dqn import DQN, DuelingDQN, NetArchitecture
-from services.policy.rl.experience_buffer import Buffer, NaivePrioritizedBuffer
+from services.policy.rl.experience_buffer import Buffer, PrioritizedBuffer
 from services.service import Service, PublishSubscribe
+from services.session import SessionAttribute
 from services.simulator.goal import Goal
 from utils import common
 from utils.beliefstate import BeliefState
@@ -41,6 +42,10 @@ from utils.useract import UserActionType
 
 class DQNPolicy(RLPolicy, Service):
 
+    # dialog-level state (kept per session, see `services.session`)
+    turns = SessionAttribute(default=0)
+    sim_goal = SessionAttribute()
+
     def __init__(self, domain: JSONLookupDomain,
                  architecture: NetArchitecture = NetArchitecture.DUELING,
                  hidden_layer_sizes: List[int] = [256, 700, 700],  # vanilla architecture
@@ -49,7 +54,7 @@ class DQNPolicy(RLPolicy, Service):
                  lr: float = 0.0001, discount_gamma: float = 0.99,
                  target_update_rate: int = 3,
                  replay_buffer_size: int = 8192, batch_size: int = 64,
-                 buffer_cls: Type[Buffer] = NaivePrioritizedBuffer,
+                 buffer_cls: Type[Buffer] = PrioritizedBuffer,
                  eps_start: float = 0.3, eps_end: float = 0.0,
                  l2_regularisation: float = 0.0, gradient_clipping: float = 5.0,
                  p_dropout: float = 0.0, training_frequency: int = 2, train_dialogs: int = 1000,
@@ -121,6 +126,7 @@ class DQNPolicy(RLPolicy, Service):
     def dialog_start(self, dialog_start=False):
         self.turns = 0
         self.last_sys_act = None
+        self.trajectory = []
         if self.is_training:
             self.cumulative_train_dialogs += 1
         self.sys_state = {
@@ -138,17 +144,39 @@ class DQNPolicy(RLPolicy, Service):
         Returns:
             action index for action selected by the agent for the current state
         """
+        return self.select_actions_eps_greedy(state_vector)[0]
+
+    def select_actions_eps_greedy(self, state_batch: torch.FloatTensor) -> List[int]:
+        """ Epsilon-greedy policy for the states of several dialogs at once.
+
+        The Q-values of all states which are not explored are computed in one forward pass.
+
+        Args:
+            state_batch (torch.FloatTensor): current states (dimension batch x state_dim)
+
+        Returns:
+            action index selected by the agent for each state
+        """
         self.eps_scheduler()
 
         # epsilon greedy exploration
-        if self.is_training and common.random.random() < self.epsilon:
-            next_action_idx = common.random.randint(0, self.action_dim - 1)
-        else:
+        actions = []
+        for _ in range(state_batch.size(0)):
+            if self.is_training and common.random.random() < self.epsilon:
+                actions.append(common.random.randint(0, self.action_dim - 1))
+            else:
+                actions.append(None)
+        greedy = [idx for idx, action in enumerate(actions) if action is None]
+        if greedy:
             torch.autograd.set_grad_enabled(False)
-            q_values = self.model(state_vector)
-            next_action_idx = q_values.squeeze(dim=0).max(dim=0)[1].item()
+            if len(greedy) < len(actions):
+                state_batch = state_batch.index_select(
+                    0, torch.tensor(greedy, dtype=torch.long, device=state_batch.device))
+            q_values = self.model(state_batch)
+            for idx, action in zip(greedy, q_values.max(dim=1)[1].tolist()):
+                actions[idx] = action
             torch.autograd.set_grad_enabled(True)
-        return next_action_idx
+        return actions
 
     @PublishSubscribe(sub_topics=["sim_goal"])
     def end(self, sim_goal: Goal):
@@ -184,6 +212,25 @@ class DQNPolicy(RLPolicy, Service):
                         be needed by the NLU to disambiguate challenging utterances.
         """
 
+        out_dict = self._prepare_turn(beliefstate)
+        if out_dict is not None:
+            return out_dict
+
+        # intermediate or closing turn
+        state_vector = self.beliefstate_dict_to_vector(beliefstate)
+        next_action_idx = self._fixed_action(beliefstate)
+        if next_action_idx == -1:
+            # dialog continues
+            next_action_idx = self.select_action_eps_greedy(state_vector)
+        return self._complete_turn(beliefstate, state_vector, next_action_idx)
+
+    def _prepare_turn(self, beliefstate: BeliefState):
+        """ Counts the turn and handles the turns which don't need the DQN.
+
+        Returns:
+            the output of `choose_sys_act` for the first turn and turns after the turn limit,
+            else `None`
+        """
         self.num_dialogs = self.cumulative_train_dialogs % self.train_dialogs
         if self.cumulative_train_dialogs == 0 and self.target_model is not None:
             # start with same weights for target and online net when a new epoch begins
@@ -205,19 +252,23 @@ class DQNPolicy(RLPolicy, Service):
                 self.logger.dialog_turn("system action > " + str(bye_action))
             sys_state = {"last_act": bye_action}
             return {'sys_act': bye_action, "sys_state": sys_state}
+        return None
 
-        # intermediate or closing turn
-        state_vector = self.beliefstate_dict_to_vector(beliefstate)
-        next_action_idx = -1
-
+    def _fixed_action(self, beliefstate: BeliefState) -> int:
+        """ Returns the action the system has to take regardless of the DQN (-1 if there is none) """
         # check if user ended dialog
         if UserActionType.Bye in beliefstate["user_acts"]:
             # user terminated current dialog -> say bye
-            next_action_idx = self.action_idx(SysActionType.Bye.value)
-        if next_action_idx == -1:
-            # dialog continues
-            next_action_idx = self.select_action_eps_greedy(state_vector)
+            return self.action_idx(SysActionType.Bye.value)
+        return -1
 
+    def _complete_turn(self, beliefstate: BeliefState, state_vector: torch.FloatTensor,
+                       next_action_idx: int) -> dict:
+        """ Expands the selected action and records the turn.
+
+        Returns:
+            the output of `choose_sys_act`
+        """
         self.turn_end(beliefstate, state_vector, next_action_idx)
 
         # Update the sys_state
@@ -335,11 +386,10 @@ class DQNPolicy(RLPolicy, Service):
             # calculate loss
             loss = self.loss(s_batch, a_batch, s2_batch, r_batch, t_batch, gamma)
             if importance_weights is not None:
+                # importance weighting
                 loss = loss * importance_weights
-                for i in range(self.batch_size):
-                    # importance weighting
-                    # update priorities
-                    self.buffer.update(i, loss[i].item())
+                # update priorities
+                self.buffer.update_batch(indices, loss.detach().view(-1))
             loss = loss.mean()
             loss.backward()
 
@@ -18,9 +18,12 @@
 ###############################################################################
 
 
+from typing import List
+
 import numpy as np
 import torch
 
+from services.policy.rl.sum_tree import SumTree
 from utils import common
 
 
@@ -120,6 +123,49 @@ class Buffer(object):
                 self.episode_length += 1
                 return True
 
+    def store_dialog(self, states: List[torch.FloatTensor], actions: List[int], rewards: List[float],
+                     final_reward: float) -> torch.LongTensor:
+        """ Store all experiences of a finished dialog at once.
+
+        Gives the same buffer contents as calling `store` for each turn and once more with
+        terminal=True, but writes all transitions of the dialog with one indexed assignment per
+        memory. This way, dialogs running at the same time (see
+        `services.policy.rl.batched_training`) don't mix up their transitions.
+
+        Args:
+            states (List[torch.FloatTensor]): state tensor of each turn (dimension 1 x state_dim)
+            actions (List[int]): action index of each turn
+            rewards (List[float]): reward of each turn
+            final_reward (float): reward of the end of the dialog
+
+        Returns:
+            buffer indices of the stored transitions
+        """
+        num_transitions = len(states) - 1
+        if num_transitions <= 0:
+            # no transition: the first turn of a trajectory is only stored together with its successor
+            return torch.empty(0, dtype=torch.long, device=self.device)
+        positions = torch.arange(self.write_pos, self.write_pos + num_transitions,
+                                 dtype=torch.long, device=self.device) % self.buffer_size
+        states = torch.cat(states).detach().to(self.device)
+        rewards = torch.tensor(rewards[:-1], dtype=torch.float, device=self.device) / 20.0
+        # the final reward is added to the last recorded transition, which also becomes terminal
+        rewards[-1] += final_reward / 20.0
+        terminals = torch.zeros(num_transitions, dtype=torch.float, device=self.device)
+        terminals[-1] = float(True)
+
+        self.mem_state[positions] = states[:-1]
+        self.mem_next_state[positions] = states[1:]
+        self.mem_action[positions, 0] = torch.tensor(actions[:-1], dtype=torch.long, device=self.device)
+        self.mem_reward[positions, 0] = rewards
+        self.mem_terminal[positions, 0] = terminals
+
+        # update write index
+        self.last_write_pos = int(positions[-1])
+        self.write_pos = (self.write_pos + num_transitions) % self.buffer_size
+        self.buffer_count = min(self.buffer_count + num_transitions, self.buffer_size)
+        return positions
+
     def print_contents(self, max_size: int = None):
         """ Print contents of the experience replay memory.
         
@@ -249,6 +295,17 @@ class NaivePrioritizedBuffer(Buffer):
             # create new tree node only if something new was added to the buffers
             self.probs[self.last_write_pos] = self._priority_to_probability(self.max_p)
 
+    def store_dialog(self, states: List[torch.FloatTensor], actions: List[int], rewards: List[float],
+                     final_reward: float) -> torch.LongTensor:
+        """ Store all experiences of a finished dialog at once (see `Buffer.store_dialog`).
+
+        Newly added experience tuples will be assigned maximum priority.
+        """
+        positions = super(NaivePrioritizedBuffer, self).store_dialog(states, actions, rewards, final_reward)
+        for position in positions.tolist():
+            self.probs[position] = self._priority_to_probability(self.max_p)
+        return positions
+
     def update(self, idx: int, error: float):
         """ Update the priority of transition with index idx """
         p = self._priority_to_probability(error)
@@ -256,6 +313,11 @@ class NaivePrioritizedBuffer(Buffer):
             self.max_p = p
         self.probs[idx] = p
 
+    def update_batch(self, indices, errors):
+        """ Update the priorities of several transitions (see `PrioritizedBuffer.update_batch`) """
+        for idx, error in zip(torch.as_tensor(indices).tolist(), torch.as_tensor(errors).tolist()):
+            self.update(idx, error)
+
     def sample(self):
         """ Sample from buffer.
         
@@ -303,3 +365,122 @@ class NaivePrioritizedBuffer(Buffer):
 
         return s_batch, a_batch, r_batch, s2_batch, t_batch, data_indices, \
                importance_weights.view(-1, 1)
+
+
+class PrioritizedBuffer(Buffer):
+    """ Prioritized experience replay buffer backed by a sum tree.
+
+    Assigns sampling probabilities dependent on TD-error of the transitions, like
+    `NaivePrioritizedBuffer`, but storing, updating and sampling a transition takes O(log N)
+    instead of O(N) steps (see `services.policy.rl.sum_tree.SumTree`).
+    Batches are sampled stratified: the priority mass is split into one segment per transition
+    of the batch. The exponent beta of the importance sampling weights is annealed linearly to 1
+    (see Schaul et al.: Prioritized experience replay).
+    """
+
+    def __init__(self, buffer_size: int, batch_size: int, state_dim: int,
+                 sample_last_transition: bool = True,
+                 regularisation: float = 0.00001, exponent: float = 0.6, beta: float = 0.4,
+                 beta_annealing_steps: int = 10000,
+                 discount_gamma: float = 0.99, device=torch.device('cpu')):
+        """
+        Args:
+            sample_last_transition (bool): if True, a batch will always include the most recent
+                                           transition
+            regularisation (float): added to each priority, so no transition gets probability 0
+            exponent (float): how much the priorities count (0: uniform sampling)
+            beta (float): initial exponent of the importance sampling weights
+            beta_annealing_steps (int): number of sampled batches until beta reaches 1
+        """
+        super(PrioritizedBuffer, self).__init__(buffer_size, batch_size, state_dim,
+                                                discount_gamma=discount_gamma,
+                                                device=device)
+        print("  REPLAY MEMORY: Prioritized (sum tree)")
+
+        self.tree = SumTree(buffer_size)
+        self.regularisation = regularisation
+        self.exponent = exponent
+        self.beta_start = beta
+        self.beta = beta
+        self.beta_annealing_steps = beta_annealing_steps
+        self.sample_count = 0
+        # largest priority (in probability space) so far, assigned to new transitions
+        self.max_p = 1.0
+        self.sample_last_transition = sample_last_transition
+
+    def _priority_to_probability(self, priority: np.ndarray) -> np.ndarray:
+        """ Convert priority numbers to (unnormalized) probability space """
+        return (np.abs(priority) + self.regularisation) ** self.exponent
+
+    def store(self, state: torch.FloatTensor, action: torch.LongTensor, reward: float,
+              terminal: bool = False):
+        """ Store an experience of the form (s,a,r,s',t) (see `Buffer.store`).
+
+        Newly added experience tuples will be assigned maximum priority.
+        """
+        if super(PrioritizedBuffer, self).store(state, action, reward, terminal=terminal):
+            self.tree.update(self.last_write_pos, self.max_p)
+
+    def store_dialog(self, states: List[torch.FloatTensor], actions: List[int], rewards: List[float],
+                     final_reward: float) -> torch.LongTensor:
+        """ Store all experiences of a finished dialog at once (see `Buffer.store_dialog`).
+
+        Newly added experience tuples will be assigned maximum priority.
+        """
+        positions = super(PrioritizedBuffer, self).store_dialog(states, actions, rewards, final_reward)
+        self.tree.update(positions.cpu().numpy(), self.max_p)
+        return positions
+
+    def update(self, idx: int, error: float):
+        """ Update the priority of transition with index idx """
+        self.update_batch([idx], [error])
+
+    def update_batch(self, indices, errors):
+        """ Update the priorities of several transitions at once
+
+        Args:
+            indices (torch.LongTensor or sequence of int): buffer indices of the transitions
+            errors (torch.FloatTensor or sequence of float): new TD-error of each transition
+        """
+        if isinstance(indices, torch.Tensor):
+            indices = indices.detach().cpu().numpy()
+        if isinstance(errors, torch.Tensor):
+            errors = errors.detach().cpu().numpy()
+        probs = self._priority_to_probability(np.asarray(errors, dtype=np.float64).reshape(-1))
+        self.max_p = max(self.max_p, float(probs.max()))
+        self.tree.update(indices, probs)
+
+    def _anneal_beta(self):
+        self.sample_count += 1
+        self.beta = min(1.0, self.beta_start + (1.0 - self.beta_start) * self.sample_count
+                        / self.beta_annealing_steps)
+
+    def sample(self):
+        """ Sample from buffer.
+
+        Returns:
+            states, actions, rewards, next states, terminal state indicator {0,1}, buffer indices,
+            importance weights
+        """
+        indices = self.tree.sample_stratified(self.batch_size - int(self.sample_last_transition),
+                                              random_state=common.numpy.random)
+        if self.sample_last_transition:
+            # include last transition -> see Sutton: A deeper look at experience replay
+            indices = np.concatenate(([self.last_write_pos], indices))
+
+        # calculate importance sampling weights
+        probabilities = self.tree[indices] / self.tree.total()
+        importance_weights = (len(self) * probabilities) ** -self.beta
+        importance_weights = importance_weights / importance_weights.max()
+        self._anneal_beta()
+
+        # assemble batch from data indices
+        data_indices = torch.as_tensor(indices, dtype=torch.long, device=self.device)
+        s_batch = self.mem_state.index_select(0, data_indices)
+        a_batch = self.mem_action.index_select(0, data_indices)
+        r_batch = self.mem_reward.index_select(0, data_indices)
+        t_batch = self.mem_terminal.index_select(0, data_indices)
+        s2_batch = self.mem_next_state.index_select(0, data_indices)
+
+        return s_batch, a_batch, r_batch, s2_batch, t_batch, data_indices, \
+               torch.as_tensor(importance_weights, dtype=torch.float, device=self.device).view(-1, 1)
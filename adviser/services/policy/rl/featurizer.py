@@ -0,0 +1,150 @@
+###############################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+"""Converts belief states into the state vectors of the RL policies."""
+
+from typing import List
+
+import torch
+
+from utils.beliefstate import BeliefState
+from utils.domain.jsonlookupdomain import JSONLookupDomain
+from utils.useract import UserActionType
+
+
+class BeliefStateFeaturizer(object):
+    """ Converts belief states (and the policy's dialog state) into state vectors.
+
+    The column of every feature is computed once from the domain ontology. A state vector starts
+    as a copy of the features that are 1 in an empty belief state; only the features present in
+    the belief state are written afterwards.
+
+    Layout of a state vector:
+        * one column per user act type and one column that is always 1
+        * per informable slot (sorted): a "not mentioned" column, then one column per possible
+          value and one for "dontcare" holding the belief
+        * one column per requestable slot (sorted)
+        * system features: last action was inform none, offer happened, number of matching
+          entities in buckets 0, 1, 2-4 and >4, discriminable
+    """
+
+    def __init__(self, domain: JSONLookupDomain, device=torch.device('cpu')):
+        """
+        Args:
+            domain (JSONLookupDomain): domain whose slots and values are featurized
+            device (torch.device): device of the created tensors
+        """
+        self.device = device
+        column = 0
+        self._user_act_columns = {}
+        for act in UserActionType:
+            self._user_act_columns[act] = column
+            column += 1
+        constant_columns = [column]
+        column += 1
+
+        # slot -> (column of "not mentioned", value -> columns)
+        self._inform_columns = {}
+        for slot in sorted(domain.get_informable_slots()):
+            none_column = column
+            constant_columns.append(none_column)
+            column += 1
+            value_columns = {}
+            for value in domain.get_possible_values(slot) + ["dontcare"]:
+                value_columns.setdefault(value, []).append(column)
+                column += 1
+            self._inform_columns[slot] = (none_column, value_columns)
+
+        self._request_columns = {}
+        for slot in sorted(domain.get_requestable_slots()):
+            self._request_columns[slot] = column
+            column += 1
+
+        self._system_column = column
+        self.state_dim = column + 7
+
+        self._template = torch.zeros(1, self.state_dim, dtype=torch.float, device=device)
+        self._template[0, constant_columns] = 1.0
+
+    def _sparse_features(self, beliefstate: BeliefState, sys_state: dict):
+        """ Yields (column, value) of all features differing from the template """
+        for act in beliefstate['user_acts']:
+            if act in self._user_act_columns:
+                yield self._user_act_columns[act], 1.0
+
+        for slot, bs_slot in beliefstate['informs'].items():
+            if slot not in self._inform_columns:
+                continue
+            none_column, value_columns = self._inform_columns[slot]
+            yield none_column, 0.0
+            for value, belief in bs_slot.items():
+                for column in value_columns.get(value, ()):
+                    yield column, float(belief)
+
+        for slot in beliefstate['requests']:
+            if slot in self._request_columns:
+                yield self._request_columns[slot], 1.0
+
+        candidate_count = beliefstate['num_matches']
+        # buckets for match count: 0, 1, 2-4, >4
+        system_features = (float(sys_state['lastActionInformNone']),
+                           float(sys_state['offerHappened']),
+                           float(candidate_count == 0),
+                           float(candidate_count == 1),
+                           float(2 <= candidate_count <= 4),
+                           float(candidate_count > 4),
+                           float(beliefstate["discriminable"]))
+        for offset, value in enumerate(system_features):
+            if value:
+                yield self._system_column + offset, value
+
+    def featurize(self, beliefstate: BeliefState, sys_state: dict) -> torch.FloatTensor:
+        """ Converts one belief state
+
+        Args:
+            beliefstate (BeliefState): belief state of the current turn
+            sys_state (dict): dialog state of the policy (see `RLPolicy.sys_state`)
+
+        Returns:
+            state tensor with dimension 1 x state_dim
+        """
+        return self.featurize_batch([beliefstate], [sys_state])
+
+    def featurize_batch(self, beliefstates: List[BeliefState], sys_states: List[dict]) \
+            -> torch.FloatTensor:
+        """ Converts several belief states into one tensor
+
+        Args:
+            beliefstates (List[BeliefState]): belief states
+            sys_states (List[dict]): dialog state of the policy for each belief state
+
+        Returns:
+            state tensor with dimension len(beliefstates) x state_dim
+        """
+        rows, columns, values = [], [], []
+        for row, (beliefstate, sys_state) in enumerate(zip(beliefstates, sys_states)):
+            for column, value in self._sparse_features(beliefstate, sys_state):
+                rows.append(row)
+                columns.append(column)
+                values.append(value)
+
+        state_batch = self._template.repeat(len(beliefstates), 1)
+        if rows:
+            state_batch[rows, columns] = torch.tensor(values, dtype=torch.float, device=self.device)
+        return state_batch
@@ -18,10 +18,13 @@
 ###############################################################################
 
 import random
+from typing import List
 
 import torch
 
 from services.policy.rl.experience_buffer import UniformBuffer
+from services.policy.rl.featurizer import BeliefStateFeaturizer
+from services.session import SessionAttribute
 from services.simulator.goal import Goal
 from services.stats.evaluation import ObjectiveReachedEvaluator
 from utils import common
@@ -29,7 +32,6 @@ from utils.beliefstate import BeliefState
 from utils.domain.jsonlookupdomain import JSONLookupDomain
 from utils.logger import DiasysLogger
 from utils.sysact import SysAct, SysActionType
-from utils.useract import UserActionType
 
 
 class RLPolicy(object):
@@ -53,6 +55,16 @@ class RLPolicy(object):
 
     """
 
+    # dialog-level state (kept per session, see `services.session`)
+    sys_state = SessionAttribute(factory=lambda policy: {
+        "lastInformedPrimKeyVal": None,
+        "lastActionInformNone": False,
+        "offerHappened": False,
+        'informedPrimKeyValsSinceNone': []})
+    last_sys_act = SessionAttribute()
+    # (state vector, action index, reward) of each turn of the current dialog
+    trajectory = SessionAttribute(factory=lambda policy: [])
+
     def __init__(self, domain: JSONLookupDomain, buffer_cls=UniformBuffer,
                  buffer_size=6000, batch_size=64, discount_gamma=0.99, max_turns: int = 25,
                  include_confreq=False, logger: DiasysLogger = DiasysLogger(),
@@ -98,8 +110,8 @@ class RLPolicy(object):
         self.writer = None
 
         # get state size
-        self.state_dim = self.beliefstate_dict_to_vector(
-            BeliefState(domain)._init_beliefstate()).size(1)
+        self.featurizer = BeliefStateFeaturizer(domain, device=device)
+        self.state_dim = self.featurizer.state_dim
         self.logger.info("state space dim: " + str(self.state_dim))
 
         # get system action list
@@ -150,48 +162,19 @@ class RLPolicy(object):
         Returns:
             belief tensor with dimension 1 x state_dim
         """
+        return self.featurizer.featurize(beliefstate, self.sys_state)
 
-        belief_vec = []
-
-        # add user acts
-        belief_vec += [1 if act in beliefstate['user_acts'] else 0 for act in UserActionType]
-        # handle none actions
-        belief_vec.append(1 if sum(belief_vec) == 0 else 1)
-
-        # add informs (including special flag if slot not mentioned)
-        for slot in sorted(self.domain.get_informable_slots()):
-            values = self.domain.get_possible_values(slot) + ["dontcare"]
-            if slot not in beliefstate['informs']:
-                # add **NONE** value first, then 0.0 for all others
-                belief_vec.append(1.0)
-                # also add value for don't care
-                belief_vec += [0 for i in range(len(values))]
-            else:
-                # add **NONE** value first
-                belief_vec.append(0.0)
-                bs_slot = beliefstate['informs'][slot]
-                belief_vec += [bs_slot[value] if value in bs_slot else 0.0 for value in values]
-
-        # add requests
-        for slot in sorted(self.domain.get_requestable_slots()):
-            if slot in beliefstate['requests']:
-                belief_vec.append(1.0)
-            else:
-                belief_vec.append(0.0)
-
-        # append system features
-        belief_vec.append(float(self.sys_state['lastActionInformNone']))
-        belief_vec.append(float(self.sys_state['offerHappened']))
-        candidate_count = beliefstate['num_matches']
-        # buckets for match count: 0, 1, 2-4, >4
-        belief_vec.append(float(candidate_count == 0))
-        belief_vec.append(float(candidate_count == 1))
-        belief_vec.append(float(2 <= candidate_count <= 4))
-        belief_vec.append(float(candidate_count > 4))
-        belief_vec.append(float(beliefstate["discriminable"]))
-
-        # convert to torch tensor
-        return torch.tensor([belief_vec], dtype=torch.float, device=self.device)
+    def beliefstates_to_batch(self, beliefstates: List[BeliefState], sys_states: List[dict]):
+        """ Converts the beliefstate dicts of several dialogs to one torch tensor
+
+        Args:
+            beliefstates: dicts of belief (with at least beliefs and system keys)
+            sys_states: the `sys_state` of the dialog of each belief state
+
+        Returns:
+            belief tensor with dimension len(beliefstates) x state_dim
+        """
+        return self.featurizer.featurize_batch(beliefstates, sys_states)
 
     def _remove_dontcare_slots(self, slot_value_dict: dict):
         """ Returns a new dictionary without the slots set to dontcare """
@@ -529,7 +512,8 @@ class RLPolicy(object):
         turn_reward = self.evaluator.get_turn_reward()
 
         if self.is_training:
-            self.buffer.store(state_vector, sys_act_idx, turn_reward, terminal=False)
+            # stored in the replay buffer once the dialog ended
+            self.trajectory.append((state_vector, sys_act_idx, turn_reward))
 
     def _expand_hello(self):
         """ Call this function when a dialog begins """
@@ -543,6 +527,7 @@ class RLPolicy(object):
 
     def end_dialog(self, sim_goal: Goal):
         """ Call this function when a dialog ended """
+        trajectory, self.trajectory = self.trajectory, []
         if sim_goal is None:
             # real user interaction, no simulator - don't have to evaluate
             # anything, just reset counters
@@ -550,8 +535,9 @@ class RLPolicy(object):
 
         final_reward, success = self.evaluator.get_final_reward(sim_goal, logging=False)
 
-        if self.is_training:
-            self.buffer.store(None, None, final_reward, terminal=True)
+        if self.is_training and trajectory:
+            states, actions, rewards = zip(*trajectory)
+            self.buffer.store_dialog(list(states), list(actions), list(rewards), final_reward)
 
         # if self.writer is not None:
         #     self.writer.add_scalar('buffer/items', len(self.buffer),
@@ -0,0 +1,108 @@
+###############################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+"""Sum tree for sampling items proportional to their priority."""
+
+import numpy as np
+
+
+class SumTree(object):
+    """ Binary tree whose leaves hold the priorities of `capacity` items and whose inner nodes hold
+    the sums of their children.
+
+    Setting priorities and finding the item at a position of the cumulative priority mass both
+    take O(log N) steps. Both operations work on whole arrays of items at once.
+
+    The tree is stored in one array: node 1 is the root, the children of node n are 2n and 2n + 1
+    and the leaves start at the first power of two >= capacity.
+    """
+
+    def __init__(self, capacity: int):
+        """
+        Args:
+            capacity (int): number of items (leaves)
+        """
+        assert capacity > 0, 'the tree needs at least one leaf'
+        self.capacity = capacity
+        self._first_leaf = 1 << (capacity - 1).bit_length()
+        self._nodes = np.zeros(2 * self._first_leaf, dtype=np.float64)
+
+    def total(self) -> float:
+        """ Returns the sum of all priorities """
+        return float(self._nodes[1])
+
+    def __getitem__(self, indices):
+        """ Returns the priorities of the items with the given index (or array of indices) """
+        return self._nodes[np.asarray(indices) + self._first_leaf]
+
+    def update(self, indices, priorities):
+        """ Sets the priorities of items.
+
+        Args:
+            indices (int or array of int): item indices; if an index occurs more than once, the
+                                           last priority given for it is kept
+            priorities (float or array of float): new priority of each item
+        """
+        nodes = np.asarray(indices, dtype=np.int64).reshape(-1) + self._first_leaf
+        self._nodes[nodes] = np.broadcast_to(np.asarray(priorities, dtype=np.float64), nodes.shape)
+        # all leaves have the same depth, so the parents of updated nodes are on one level
+        nodes = np.unique(nodes // 2)
+        while nodes.size and nodes[0] > 0:
+            self._nodes[nodes] = self._nodes[2 * nodes] + self._nodes[2 * nodes + 1]
+            nodes = np.unique(nodes // 2)
+
+    def find(self, values) -> np.ndarray:
+        """ Finds the items at positions of the cumulative priority mass.
+
+        Item i is found for all values in [sum of priorities of items < i, same sum + priority i).
+        Items with priority 0 are never found.
+
+        Args:
+            values (float or array of float): positions in [0, total())
+
+        Returns:
+            array of item indices, one for each value
+        """
+        values = np.array(values, dtype=np.float64).reshape(-1)
+        nodes = np.ones(values.shape, dtype=np.int64)
+        while nodes.size and nodes[0] < self._first_leaf:
+            left = 2 * nodes
+            left_sums = self._nodes[left]
+            # rounding errors must not lead into empty subtrees
+            go_right = (values >= left_sums) & (self._nodes[left + 1] > 0)
+            values = np.where(go_right, values - left_sums, values)
+            nodes = np.where(go_right, left + 1, left)
+        return nodes - self._first_leaf
+
+    def sample_stratified(self, num_samples: int, random_state=np.random) -> np.ndarray:
+        """ Samples items proportional to their priority.
+
+        The priority mass is split into `num_samples` segments of equal size and one item is drawn
+        from each segment, which spreads the samples more evenly than independent draws.
+
+        Args:
+            num_samples (int): number of items to draw
+            random_state: numpy random generator to use
+
+        Returns:
+            array of item indices
+        """
+        total = self.total()
+        values = (np.arange(num_samples) + random_state.uniform(size=num_samples)) * (total / max(num_samples, 1))
+        return self.find(np.minimum(values, np.nextafter(total, 0)))
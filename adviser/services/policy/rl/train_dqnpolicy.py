@@ -27,6 +27,7 @@
 import os
 import sys
 import argparse
+import time
 
 def get_root_dir():
     return os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
@@ -34,7 +35,8 @@ def get_root_dir():
 
 sys.path.append(get_root_dir())
 
-from services.policy.rl.experience_buffer import NaivePrioritizedBuffer, UniformBuffer
+from services.policy.rl.experience_buffer import NaivePrioritizedBuffer, PrioritizedBuffer, UniformBuffer
+from services.policy.rl.batched_training import BatchedSimulation
 
 from services.bst import HandcraftedBST
 from services.simulator import HandcraftedUserSimulator
@@ -52,7 +54,7 @@ from utils import common
 def train(domain_name: str, log_to_file: bool, seed: int, train_epochs: int, train_dialogs: int,
           eval_dialogs: int, max_turns: int, train_error_rate: float, test_error_rate: float,
           lr: float, eps_start: float, grad_clipping: float, buffer_classname: str,
-          buffer_size: int, use_tensorboard: bool):
+          buffer_size: int, use_tensorboard: bool, num_envs: int = 0):
 
     """
         Training loop for the RL policy, for information on the parameters, look at the descriptions
@@ -67,6 +69,8 @@ def train(domain_name: str, log_to_file: bool, seed: int, train_epochs: int, tra
     summary_writer = SummaryWriter(log_dir='logs') if use_tensorboard else None
     
     if buffer_classname == "prioritized":
+        buffer_cls = PrioritizedBuffer
+    elif buffer_classname == "naive-prioritized":
         buffer_cls = NaivePrioritizedBuffer
     elif buffer_classname == "uniform":
         buffer_cls = UniformBuffer
@@ -84,35 +88,49 @@ def train(domain_name: str, log_to_file: bool, seed: int, train_epochs: int, tra
     evaluator = PolicyEvaluator(domain=domain, use_tensorboard=use_tensorboard,
                                 experiment_name=domain_name, logger=logger,
                                 summary_writer=summary_writer)
-    ds = DialogSystem(services=[user, bst, policy, evaluator], protocol='tcp')
-    # ds.draw_system_graph()
-
-    error_free = ds.is_error_free_messaging_pipeline()
-    if not error_free:
-        ds.print_inconsistencies()
+    if num_envs > 0:
+        # simulate num_envs dialogs at a time in this thread, without the message bus
+        simulation = BatchedSimulation(domain, policy, evaluator, num_envs=num_envs, logger=logger)
+        ds = None
+    else:
+        ds = DialogSystem(services=[user, bst, policy, evaluator], protocol='tcp')
+        # ds.draw_system_graph()
+
+        error_free = ds.is_error_free_messaging_pipeline()
+        if not error_free:
+            ds.print_inconsistencies()
+
+    def run_dialogs(num_dialogs: int, log_progress: bool = False):
+        if ds is None:
+            simulation.run_dialogs(num_dialogs)
+            return
+        for episode in range(num_dialogs):
+            if log_progress and episode % 100 == 0:
+                print("DIALOG", episode)
+            logger.dialog_turn("\n\n!!!!!!!!!!!!!!!! NEW DIALOG !!!!!!!!!!!!!!!!!!!!!!!!!!!!\n\n")
+            ds.run_dialog(start_signals={f'user_acts/{domain.get_domain_name()}': []})
 
     for j in range(train_epochs):
         # START TRAIN EPOCH
         evaluator.train()
         policy.train()
         evaluator.start_epoch()
-        for episode in range(train_dialogs):
-            if episode % 100 == 0:
-                print("DIALOG", episode)
-            logger.dialog_turn("\n\n!!!!!!!!!!!!!!!! NEW DIALOG !!!!!!!!!!!!!!!!!!!!!!!!!!!!\n\n")
-            ds.run_dialog(start_signals={f'user_acts/{domain.get_domain_name()}': []})
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        run_dialogs(train_dialogs, log_progress=True)
+        wall_time, cpu_time = time.perf_counter() - wall_start, time.process_time() - cpu_start
         evaluator.end_epoch()
+        logger.result(f"# training dialogs per second: {train_dialogs / wall_time:.1f} "
+                      f"(per CPU second: {train_dialogs / max(cpu_time, 1e-9):.1f})")
         policy.save()
 
         # START EVAL EPOCH
         evaluator.eval()
         policy.eval()
         evaluator.start_epoch()
-        for episode in range(eval_dialogs):
-            logger.dialog_turn("\n\n!!!!!!!!!!!!!!!! NEW DIALOG !!!!!!!!!!!!!!!!!!!!!!!!!!!!\n\n")
-            ds.run_dialog(start_signals={f'user_acts/{domain.get_domain_name()}': []})
+        run_dialogs(eval_dialogs)
         evaluator.end_epoch()
-    ds.shutdown()
+    if ds is not None:
+        ds.shutdown()
 
 
 if __name__ == "__main__":
@@ -152,10 +170,13 @@ if __name__ == "__main__":
     parser.add_argument("-cg", "--clipgrad", type=float, default=0.0,
                         help="upper bound gradient is going to be clipped to")
 
-    parser.add_argument("-bn", "--buffername", choices=['uniform', 'prioritized'],
+    parser.add_argument("-bn", "--buffername", choices=['uniform', 'prioritized', 'naive-prioritized'],
                         help="experience replay buffer type", default='prioritized')
     parser.add_argument("-bs", "--buffersize", type=int, default=8192,
                         help="capacity of experience replay buffer")
+    parser.add_argument("-ne", "--numenvs", type=int, default=0,
+                        help="number of dialogs simulated in lockstep without the message bus; "
+                             "0 runs one dialog at a time through the DialogSystem")
     args = parser.parse_args()
     assert 0 <= args.epsilon <= 1, "exploration rate has to be between 0 and 1"
 
@@ -167,5 +188,5 @@ if __name__ == "__main__":
           train_dialogs=args.traindialogs, eval_dialogs=args.evaldialogs, max_turns=args.maxturns,
           train_error_rate=args.trainerror, test_error_rate=args.evalerror, lr=args.learningrate,
           eps_start=args.epsilon, grad_clipping=args.clipgrad, buffer_classname=args.buffername,
-          buffer_size=args.buffersize
+          buffer_size=args.buffersize, num_envs=args.numenvs
           )
@@ -17,6 +17,7 @@
 #
 ############################################################################################
 
+import asyncio
 import copy
 import datetime
 import inspect
@@ -24,19 +25,26 @@ import pickle
 import threading
 import time
 from threading import Thread
-from typing import List, Dict, Union, Iterable, Any
-import platform
+from typing import List, Dict, Union, Iterable, Any, Hashable, Optional, Callable
 
 import zmq
 from zmq import Context, Socket
 from zmq.devices import ThreadProxy, ProcessProxy
 
+from services.codec import LocalCodec, MessageCodec, PickleCodec, decode_frames, decode_message, decode_topic
+from services.delta import DeltaDecoder, DeltaEncoder, DeltaMessage
+from services.instrumentation import BusInstrumentation
+from services.session import current_session, drop_session_state, session_context
 from utils.domain.domain import Domain
 from utils.logger import DiasysLogger
 from utils.topics import Topic
 
 
-def _send_msg(pub_channel: Socket, topic: str, content: Any):
+_DEFAULT_CODEC = PickleCodec()
+
+
+def _send_msg(pub_channel: Socket, topic: str, content: Any, codec: MessageCodec = None,
+              session_id: Optional[Hashable] = None):
     """ Serializes message, appends current timespamp and sends it over the specified channel to the specified topic.
         Use this function for all internal message passing.
 
@@ -44,10 +52,12 @@ def _send_msg(pub_channel: Socket, topic: str, content: Any):
         pub_channel (Socket): publisher socket
         topic (str): topic to publish to
         content (Any): message content
+        codec (MessageCodec): serializes the message (default: pickle everything into one frame)
+        session_id (Hashable): session the message belongs to (`None` outside of sessions)
      """
     timestamp = datetime.datetime.now().timestamp()  # current timestamp as POSIX float
-    data = pickle.dumps((timestamp, content))
-    pub_channel.send_multipart((bytes(topic, encoding="ascii"), data))
+    frames = (codec or _DEFAULT_CODEC).encode(timestamp, content, session_id)
+    pub_channel.send_multipart([bytes(topic, encoding="ascii")] + frames)
 
 
 def _send_ack(pub_channel: Socket, topic: str, content: bool = True):
@@ -71,14 +81,123 @@ def _recv_ack(sub_channel: Socket, topic: str, expected_content: bool = True):
         topic (str): topic to listen for ACK's
         expected_content (bool): are we expecting `True` (ACK) or `False` (NACK)
     """
-    ack_topic = topic if topic.startswith("ACK/") else f"ACK/{topic}"
-    while True:
-        msg = sub_channel.recv_multipart(copy=True)
-        recv_topic = msg[0].decode("ascii")
-        content = pickle.loads(msg[1])[1]  # pickle.loads(msg) -> tuple(timestamp, content) -> return content
-        if recv_topic == ack_topic:
-            if content == expected_content:
-                return
+    _gather_acks(sub_channel, [topic], expected_content)
+
+
+def _gather_acks(sub_channel: Socket, topics: Iterable[str], expected_content: bool = True,
+                 timeout: Optional[float] = None, resend: Callable[[List[str]], None] = None,
+                 resend_interval: float = 0.01):
+    """ Blocks until acknowledge-messages for all specified topics with the expected content are received via the
+        specified subscriber channel, in any order.
+
+    Args:
+        sub_channel (Socket): subscriber socket
+        topics (Iterable[str]): topics to listen for ACK's
+        expected_content (bool): are we expecting `True` (ACK) or `False` (NACK)
+        timeout (float): seconds to wait for all ACK's (`None`: wait forever)
+        resend (Callable[[List[str]], None]): if given, called with the topics still missing an ACK every
+                                              `resend_interval` seconds (for handshakes whose messages are
+                                              dropped until all subscriptions reached the bus)
+        resend_interval (float): seconds between calls of `resend`
+
+    Raises:
+        TimeoutError: if not all ACK's were received within `timeout` seconds
+    """
+    missing = {(topic if topic.startswith("ACK/") else f"ACK/{topic}"): topic for topic in topics}
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while missing:
+        wait = resend_interval if resend else None
+        if deadline is not None:
+            remaining = max(deadline - time.monotonic(), 0.0)
+            wait = remaining if wait is None else min(wait, remaining)
+        if sub_channel.poll(None if wait is None else int(wait * 1000)):
+            msg = sub_channel.recv_multipart(copy=True)
+            recv_topic = decode_topic(msg)
+            content = decode_frames(msg)[1]  # decode_frames(msg) -> tuple(timestamp, content) -> return content
+            if recv_topic in missing and content == expected_content:
+                del missing[recv_topic]
+        elif deadline is not None and time.monotonic() >= deadline:
+            raise TimeoutError(f"no ACK within {timeout} s for: {', '.join(sorted(missing.values()))}")
+        elif resend:
+            resend(list(missing.values()))
+
+
+def _barrier(pub_channel: Socket, sub_channel: Socket, topics: Iterable[str], content: Any = True,
+             timeout: Optional[float] = None, resend: bool = False):
+    """ Sends a control message to all specified topics at once, then blocks until all of them are acknowledged.
+
+    Args:
+        pub_channel (Socket): publisher socket
+        sub_channel (Socket): subscriber socket receiving the ACK's
+        topics (Iterable[str]): control topics
+        content (Any): message content
+        timeout (float): seconds to wait for all ACK's (`None`: wait forever)
+        resend (bool): repeat the message to topics not acknowledged yet (only for idempotent messages)
+
+    Raises:
+        TimeoutError: if not all ACK's were received within `timeout` seconds
+    """
+    def send(missing_topics):
+        for topic in missing_topics:
+            _send_msg(pub_channel, topic, content)
+
+    topics = list(topics)
+    send(topics)
+    _gather_acks(sub_channel, topics, True, timeout, send if resend else None)
+
+
+def _session_topic(control_topic: str) -> str:
+    """ Returns the control topic for starting / ending sessions belonging to a service's START / END topic """
+    prefix, _, name = control_topic.rpartition("/")
+    return f"{prefix}/SESSION_{name}"
+
+
+def _ready_topic(control_topic: str) -> str:
+    """ Returns the control topic for the readiness handshake belonging to a service's START topic """
+    prefix, _, _ = control_topic.rpartition("/")
+    return f"{prefix}/READY"
+
+
+class TopicRouter:
+    """
+    Maps the topics of received messages to the arguments of a subscriber function.
+
+    A message belongs to the longest subscribed topic which is a prefix of its topic (published
+    topics carry a domain suffix). Topics seen before are looked up in a dict; a new topic is
+    routed once by walking a character trie of the subscribed topics (O(topic length)).
+    """
+
+    def __init__(self, topics: Iterable[str], queued_topics: Iterable[str]):
+        """
+        Args:
+            topics (Iterable[str]): last-message-only topics of the subscriber function
+            queued_topics (Iterable[str]): collect-all-messages-since-last-call topics of the subscriber function
+        """
+        self.num_arguments = 0
+        # character -> child node; the key None marks the end of a subscribed topic
+        self._trie = {}
+        for topic_list, queued in ((topics, False), (queued_topics, True)):
+            for topic in topic_list:
+                node = self._trie
+                for char in topic:
+                    node = node.setdefault(char, {})
+                node[None] = (topic, queued)
+                self.num_arguments += 1
+        self._routes = {}
+
+    def route(self, topic: str) -> Optional[tuple]:
+        """ Returns (argument name, is queued topic) for a received topic, or `None` if it wasn't subscribed to """
+        if topic in self._routes:
+            return self._routes[topic]
+        node = self._trie
+        route = node.get(None)
+        for char in topic:
+            node = node.get(char)
+            if node is None:
+                break
+            route = node.get(None, route)
+        self._routes[topic] = route
+        return route
 
 
 class RemoteService:
@@ -109,11 +228,15 @@ class Service:
 
     Note: A `Service` will only start listening to messages once it is added to a `DialogSystem` 
           (or calling `run_standalone()` in the remote case and adding a corresponding `RemoteService` to the `DialogSystem`).
+
+    To serve several dialogs at once (see `DialogSystem.start_session`), declare dialog-level state
+    as `services.session.SessionAttribute`s instead of plain instance attributes.
     """
 
     def __init__(self, domain: Union[str, Domain] = "", sub_topic_domains: Dict[str, str] = {}, pub_topic_domains: Dict[str, str] = {},
                  ds_host_addr: str = "127.0.0.1", sub_port: int = 65533, pub_port: int = 65534, protocol: str = "tcp",
-                 debug_logger: DiasysLogger = None, identifier: str = None):
+                 debug_logger: DiasysLogger = None, identifier: str = None, codec: MessageCodec = None,
+                 delta_topics: List[str] = []):
         """
         Create a new service instance *(call this super constructor from your inheriting classes!)*.
         
@@ -135,6 +258,12 @@ class Service:
                                          even if they are never forwarded (as expected) to your `Service`.
             identifier (str): Set this to a *UNIQUE* identifier per service to be run remotely.
                               See `RemoteService` for more details.
+            codec (MessageCodec): How published messages are serialized (default: `PickleCodec`).
+                                  Local services use the codec of their `DialogSystem` instead.
+            delta_topics (List[str]): Published topics whose values are sent as changes since the last
+                                      message (plus periodic snapshots), see `services.delta`.
+                                      The values have to implement the delta protocol (e.g. `BeliefState`).
+                                      Codecs passing objects by reference (`LocalCodec`) send them whole.
         """
 
         self.is_training = False
@@ -153,6 +282,7 @@ class Service:
         self._pub_port = pub_port
         self._protocol = protocol
         self._identifier = identifier
+        self._codec = codec
 
         self.debug_logger = debug_logger
 
@@ -163,6 +293,7 @@ class Service:
         self._internal_start_topics = dict()
         self._internal_end_topics = dict()
         self._internal_terminate_topics = dict()
+        self._internal_ready_topics = dict()
 
         # NOTE: class name + memory pointer make topic unique (required, e.g. for running mutliple instances of same module!)
         self._start_topic = f"{type(self).__name__}/{id(self)}/START"
@@ -170,6 +301,25 @@ class Service:
         self._terminate_topic = f"{type(self).__name__}/{id(self)}/TERMINATE"
         self._train_topic = f"{type(self).__name__}/{id(self)}/TRAIN"
         self._eval_topic = f"{type(self).__name__}/{id(self)}/EVAL"
+        self._session_start_topic = _session_topic(self._start_topic)
+        self._session_end_topic = _session_topic(self._end_topic)
+        self._ready_topic = _ready_topic(self._start_topic)
+        self._listeners_ready = False
+
+        # listener -> session id -> (values, timestamps) received so far
+        self._pending_values = dict()
+        # started sessions: messages of other sessions (e.g. arriving after the end of theirs) are ignored
+        self._live_sessions = set()
+        self._session_lock = threading.RLock()
+
+        # delta publication (see services.delta)
+        self._delta_topics = set(delta_topics)
+        self._delta_encoder = DeltaEncoder()
+        # listener -> replicas of the objects received in delta mode
+        self._delta_decoders = dict()
+
+        # bus statistics (local services use the instrumentation of their `DialogSystem`)
+        self._instrumentation = None
 
     def _init_pubsub(self): 
         """ Search for all functions decorated with the `PublishSubscribe` decorator and call the setup methods for them """
@@ -206,32 +356,39 @@ class Service:
         subscriber = ctx.socket(zmq.SUB)
         # subscribe to all listed topics
         for topic in topics + queued_topics:
-            topic_domain_str = f"{topic}/{self._domain_name}" if self._domain_name else topic
-            if topic in self._sub_topic_domains:
-                # overwrite domain for this specific topic and service instance
-                topic_domain_str = f"{topic}/{self._sub_topic_domains[topic]}" if self._sub_topic_domains[topic] else topic
-            subscriber.setsockopt(zmq.SUBSCRIBE, bytes(topic_domain_str, encoding="ascii"))
+            subscriber.setsockopt(zmq.SUBSCRIBE, bytes(self._sub_topic_domain_str(topic), encoding="ascii"))
         # subscribe to control channels
         subscriber.setsockopt(zmq.SUBSCRIBE, bytes(f"{func_instance}/START", encoding="ascii"))
         subscriber.setsockopt(zmq.SUBSCRIBE, bytes(f"{func_instance}/END", encoding="ascii"))
         subscriber.setsockopt(zmq.SUBSCRIBE, bytes(f"{func_instance}/TERMINATE", encoding="ascii"))
+        subscriber.setsockopt(zmq.SUBSCRIBE, bytes(f"{func_instance}/READY", encoding="ascii"))
         subscriber.connect(f"{self._protocol}://{self._host_addr}:{self._sub_port}")
         self._internal_start_topics[f"{str(func_instance)}/START"] = str(func_instance)
         self._internal_end_topics[f"{str(func_instance)}/END"] = str(func_instance)
         self._internal_terminate_topics[f"{str(func_instance)}/TERMINATE"] = str(func_instance)
+        self._internal_ready_topics[f"{str(func_instance)}/READY"] = str(func_instance)
 
         # register and run listener thread
         listener_thread = Thread(target=self._receiver_thread, args=(subscriber, func_instance,
                                                                      topics, queued_topics,
                                                                      f"{str(func_instance)}/START",
                                                                      f"{str(func_instance)}/END",
-                                                                     f"{str(func_instance)}/TERMINATE"))
+                                                                     f"{str(func_instance)}/TERMINATE",
+                                                                     f"{str(func_instance)}/READY"))
         listener_thread.start()
 
         # add to list of local topics
         # TODO maybe add topic_domain_str instead for more clarity?
         self._sub_topics.update(topics + queued_topics)
 
+    def _sub_topic_domain_str(self, topic: str) -> str:
+        """ Returns the topic (including the domain) a subscription to `topic` listens to """
+        topic_domain_str = f"{topic}/{self._domain_name}" if self._domain_name else topic
+        if topic in self._sub_topic_domains:
+            # overwrite domain for this specific topic and service instance
+            topic_domain_str = f"{topic}/{self._sub_topic_domains[topic]}" if self._sub_topic_domains[topic] else topic
+        return topic_domain_str
+
     def _setup_publishers(self, func_instance, topics):
         """ Creates a publish socket for a function decorated with `services.service.PublishSubscribe`. """
         if len(topics) == 0:
@@ -259,6 +416,9 @@ class Service:
         self._control_channel_sub.setsockopt(zmq.SUBSCRIBE, bytes(self._terminate_topic, encoding="ascii"))
         self._control_channel_sub.setsockopt(zmq.SUBSCRIBE, bytes(self._train_topic, encoding="ascii"))
         self._control_channel_sub.setsockopt(zmq.SUBSCRIBE, bytes(self._eval_topic, encoding="ascii"))
+        self._control_channel_sub.setsockopt(zmq.SUBSCRIBE, bytes(self._session_start_topic, encoding="ascii"))
+        self._control_channel_sub.setsockopt(zmq.SUBSCRIBE, bytes(self._session_end_topic, encoding="ascii"))
+        self._control_channel_sub.setsockopt(zmq.SUBSCRIBE, bytes(self._ready_topic, encoding="ascii"))
         self._control_channel_sub.connect(f"{self._protocol}://{self._host_addr}:{self._sub_port}")
 
         # setup sender for dialog system control message acknowledgements 
@@ -269,7 +429,8 @@ class Service:
         # setup receiver for internal ACK messages
         self._internal_control_channel_sub = ctx.socket(zmq.SUB)
         for internal_ctrl_topic in list(self._internal_end_topics.keys()) + list(
-                self._internal_start_topics.keys()) + list(self._internal_terminate_topics.keys()):
+                self._internal_start_topics.keys()) + list(self._internal_terminate_topics.keys()) + list(
+                self._internal_ready_topics.keys()):
             self._internal_control_channel_sub.setsockopt(zmq.SUBSCRIBE,
                                                           bytes(f"ACK/{internal_ctrl_topic}", encoding="ascii"))
         self._internal_control_channel_sub.connect(f"{self._protocol}://{self._host_addr}:{self._sub_port}")
@@ -283,38 +444,52 @@ class Service:
             try:
                 # receive message for subscribed control topic
                 msg = self._control_channel_sub.recv_multipart(copy=True)
-                topic = msg[0].decode("ascii")
-                timestamp, content = pickle.loads(msg[1])
+                topic = decode_topic(msg)
+                timestamp, content = decode_frames(msg)
 
                 if topic == self._start_topic:
                     # initialize dialog state
                     self.dialog_start()
                     # set all listeners of this service to listening mode (block until they are listening)
-                    for internal_start_topic in self._internal_start_topics:
-                        _send_msg(self._control_channel_pub, internal_start_topic, True)
-                        _recv_ack(self._internal_control_channel_sub, internal_start_topic)
+                    _barrier(self._control_channel_pub, self._internal_control_channel_sub, self._internal_start_topics)
                     _send_ack(self._control_channel_pub, self._start_topic)
                 elif topic == self._end_topic:
                     # stop all listeners of this service (block until they stopped)
-                    for internal_end_topic in self._internal_end_topics:
-                        _send_msg(self._control_channel_pub, internal_end_topic, True)
-                        _recv_ack(self._internal_control_channel_sub, internal_end_topic, True)
+                    _barrier(self._control_channel_pub, self._internal_control_channel_sub, self._internal_end_topics)
                     self.dialog_end()
                     _send_ack(self._control_channel_pub, self._end_topic)
                 elif topic == self._terminate_topic:
                     # terminate all listeners of this service (block until they stopped)
-                    for internal_terminate_topic in self._internal_terminate_topics:
-                        _send_msg(self._control_channel_pub, internal_terminate_topic, True)
-                        _recv_ack(self._internal_control_channel_sub, internal_terminate_topic, True)
+                    _barrier(self._control_channel_pub, self._internal_control_channel_sub,
+                             self._internal_terminate_topics)
                     self.dialog_exit()
                     _send_ack(self._control_channel_pub, self._terminate_topic)
                     listen = False
+                elif topic == self._ready_topic:
+                    # readiness handshake: block until all listeners of this service receive control messages
+                    # (the dialog system repeats this message until it gets the ACK)
+                    if not self._listeners_ready:
+                        _barrier(self._control_channel_pub, self._internal_control_channel_sub,
+                                 self._internal_ready_topics, resend=True)
+                        self._listeners_ready = True
+                    _send_ack(self._control_channel_pub, self._ready_topic)
                 elif topic == self._train_topic:
                     self.train()
                     _send_ack(self._control_channel_pub, self._train_topic)
                 elif topic == self._eval_topic:
                     self.eval()
                     _send_ack(self._control_channel_pub, self._eval_topic)
+                elif topic == self._session_start_topic:
+                    # content: session id - initialize the dialog state of this session
+                    self._begin_session(content)
+                    with session_context(content):
+                        self.dialog_start()
+                    _send_ack(self._control_channel_pub, self._session_start_topic)
+                elif topic == self._session_end_topic:
+                    with session_context(content):
+                        self.dialog_end()
+                    self._drop_session(content)
+                    _send_ack(self._control_channel_pub, self._session_end_topic)
                 else:
                     if self.debug_logger:
                         self.debug_logger.info("- (Service): received unknown control message from topic", topic,
@@ -326,9 +501,46 @@ class Service:
                 print("ERROR in Service: _control_channel_listener")
                 traceback.print_exc()
 
+    def _begin_session(self, session_id: Hashable):
+        """ Starts accepting the messages of a session """
+        with self._session_lock:
+            self._live_sessions.add(session_id)
+
+    def _drop_session(self, session_id: Hashable):
+        """ Forgets the state and all partially received messages of an ended session. Messages of
+            the session still arriving afterwards are ignored. """
+        with self._session_lock:
+            self._live_sessions.discard(session_id)
+            self._forget_session(session_id)
+
+    def _forget_session(self, session_id: Hashable):
+        drop_session_state(self, session_id)
+        for pending in self._pending_values.values():
+            pending.pop(session_id, None)
+        self._delta_encoder.drop_session(session_id)
+        for decoder in list(self._delta_decoders.values()):
+            decoder.drop_session(session_id)
+
+    def _session_ended(self, session_id: Optional[Hashable]) -> bool:
+        """ Called after a subscriber function handled a message of the session: if the session
+            ended in the meantime, the state the function created for it is dropped again.
+
+        Returns:
+            whether the session ended
+        """
+        if session_id is None:
+            return False
+        with self._session_lock:
+            if session_id in self._live_sessions:
+                return False
+            self._forget_session(session_id)
+            return True
+
     def dialog_start(self):
         """ This function is called before the first message to a new dialog is published.
-            You should overwrite this function to set/reset dialog-level variables. """
+            You should overwrite this function to set/reset dialog-level variables.
+            When serving several sessions, it is called once per session (with the session as
+            current session, see `services.session`). """
         pass
 
     def dialog_end(self):
@@ -398,9 +610,115 @@ class Service:
         """
         return copy.deepcopy(self._pub_topics)
 
+    def _collect_message(self, func_instance, pending: Dict[Hashable, tuple], topic: str, msg: List[Any],
+                         router: TopicRouter):
+        """
+        Stores a received message for a subscriber function until it has a value for each of its topics.
+
+        Args:
+            func_instance (function instance): the decorated subscriber function the message was received for
+            pending (Dict[Hashable, tuple]): session id -> (values, timestamps) received so far
+            topic (str): topic of the message
+            msg (List[Any]): the received frames
+            router (TopicRouter): maps topics to the arguments of `func_instance`
+
+        Returns:
+            (session id, keyword arguments for `func_instance`) once the function should be called, else `None`
+        """
+        timestamp, content, session_id = decode_message(msg)
+        if self._instrumentation:
+            self._instrumentation.record_delivery(topic, timestamp)
+        with self._session_lock:
+            if session_id is not None and session_id not in self._live_sessions:
+                # the session ended (or wasn't started): don't create its state again
+                return None
+            return self._collect_content(func_instance, pending, topic, session_id, timestamp, content, router)
+
+    def _collect_content(self, func_instance, pending: Dict[Hashable, tuple], topic: str, session_id: Hashable,
+                         timestamp: float, content: Any, router: TopicRouter):
+        """ Stores the decoded content of a message of a live session (see `_collect_message`) """
+        if isinstance(content, DeltaMessage):
+            if func_instance not in self._delta_decoders:
+                self._delta_decoders[func_instance] = DeltaDecoder()
+            content = self._delta_decoders[func_instance].decode(session_id, topic, content)
+            if content is None:
+                # earlier messages of this stream were missed: wait for the next snapshot
+                return None
+        if self.debug_logger:
+            self.debug_logger.info(
+                f"- (DS): listener thread for function {func_instance}:\n   received for topic {topic}:\n   {content}")
+        if session_id not in pending:
+            pending[session_id] = ({}, {})
+        values, timestamps = pending[session_id]
+
+        # simple synchronization mechanism: remember only newest values,
+        # store them until there was at least 1 new value received per topic.
+        # Then call callback function with complete set of values.
+        # Reset values afterwards and start collecting again.
+
+        # routing based on prefixes -> function argument names may differ from the received topic
+        route = router.route(topic)
+        if route is None:
+            return None
+        argument, queued = route
+        if not queued:
+            # store only latest value
+            values[argument] = content  # set value for received topic
+            timestamps[argument] = timestamp  # set timestamp for received value
+        else:
+            # topic is a queued_topic - queue all values and their timestamps
+            if not argument in values:
+                values[argument] = []
+                timestamps[argument] = []
+            values[argument].append(content)
+            timestamps[argument].append(timestamp)
+
+        if len(values) < router.num_arguments:
+            return None
+        # received a new value for each topic -> call callback function
+        if func_instance.timestamp_enabled:
+            # append timestamps, if required
+            values['timestamps'] = timestamps
+        if self.debug_logger:
+            self.debug_logger.info(
+                f"- (DS): received all messages for function {func_instance}\n   -> CALLING function")
+        # reset values
+        pending.pop(session_id, None)
+        return session_id, values
+
+    def _call_subscriber(self, func_instance, values: Dict[str, Any]):
+        """ Calls a decorated subscriber function with the collected values and returns its result """
+        if self._instrumentation:
+            return self._timed_call(func_instance, values)
+        if self.__class__ == Service:
+            # NOTE workaround for publisher / subscriber without being an instance method
+            return func_instance(**values)
+        return func_instance(self, **values)
+
+    def _timed_call(self, func_instance, values: Dict[str, Any]):
+        """ Calls a subscriber function like `_call_subscriber`, recording its wall and CPU time """
+        handler = f"{type(self).__name__}.{func_instance.__name__}"
+        session_id = current_session()
+        start, start_cpu = time.perf_counter(), time.thread_time()
+        if self.__class__ == Service:
+            result = func_instance(**values)
+        else:
+            result = func_instance(self, **values)
+        if inspect.iscoroutine(result):
+            # other tasks run while the coroutine waits: only its wall time is known
+            async def timed(coroutine):
+                try:
+                    return await coroutine
+                finally:
+                    self._instrumentation.record_call(handler, session_id, start, time.perf_counter() - start, None)
+            return timed(result)
+        self._instrumentation.record_call(handler, session_id, start, time.perf_counter() - start,
+                                          time.thread_time() - start_cpu)
+        return result
+
     def _receiver_thread(self, subscriber: Socket, func_instance,
                          topics: Iterable[str], queued_topics: Iterable[str],
-                         start_topic: str, end_topic: str, terminate_topic: str):
+                         start_topic: str, end_topic: str, terminate_topic: str, ready_topic: str):
         """
         Loop for receiving messages.
         Will continue until a message for `terminate_topic` is received.
@@ -419,6 +737,7 @@ class Service:
             end_topic (str): Control message topic to set this specific `function_instance` into non-listening mode (ignore all non-control messages)
             terminate_topic (str): Control message topic to end the listener loop for this specific `function_instance`. 
                                    Also closes the socket before returning.
+            ready_topic (str): Control message topic acknowledged as soon as this listener receives messages
         """
 
         ctx = Context.instance()
@@ -426,22 +745,21 @@ class Service:
         control_channel_pub.sndhwm = 1100000
         control_channel_pub.connect(f"{self._protocol}://{self._host_addr}:{self._pub_port}")
 
-        values = {}
-        timestamps = {}
-        all_sub_topics = topics + queued_topics
-        num_topics = len(all_sub_topics)
+        # session id -> (values, timestamps): messages of different sessions are collected separately
+        pending = self._pending_values.setdefault(str(func_instance), {})
+        router = TopicRouter(topics, queued_topics)
         active = False
         terminating = False
 
         while not terminating:
             try:
-                msg = subscriber.recv_multipart(copy=True)
-                topic = msg[0].decode("ascii")
+                # don't copy: large buffers sent out-of-band are used directly from the received frames
+                msg = subscriber.recv_multipart(copy=False)
+                topic = decode_topic(msg)
                 # based on topic, decide what to do
                 if topic == start_topic:
                     # reset values and start listening to non-control messages
-                    values = {}
-                    timestamps = {}
+                    pending.clear()
                     active = True
                     _send_ack(control_channel_pub, start_topic)
                 elif topic == end_topic:
@@ -453,54 +771,22 @@ class Service:
                     active = False
                     _send_ack(control_channel_pub, terminate_topic)
                     terminating = True
+                elif topic == ready_topic:
+                    _send_ack(control_channel_pub, ready_topic)
                 else:
                     # non-control message
                     if active:
                         # process message
-                        timestamp, content = pickle.loads(msg[1])
-                        if self.debug_logger:
-                            self.debug_logger.info(
-                                f"- (DS): listener thread for function {func_instance}:\n   received for topic {topic}:\n   {content}")
-
-                        # simple synchronization mechanism: remember only newest values,
-                        # store them until there was at least 1 new value received per topic.
-                        # Then call callback function with complete set of values.
-                        # Reset values afterwards and start collecting again.
-
-                        # problem: routing based on prefixes -> function argument names may differ
-                        # solution: find longest common prefix of argument name and received topic
-                        common_prefix = ""
-                        for key in all_sub_topics:
-                            if topic.startswith(key) and len(topic) > len(common_prefix):
-                                common_prefix = key
-                        if common_prefix in topics:
-                            # store only latest value
-                            values[common_prefix] = content  # set value for received topic
-                            timestamps[common_prefix] = timestamp  # set timestamp for received value
-                        else:
-                            # topic is a queued_topic - queue all values and their timestamps
-                            if not common_prefix in values:
-                                values[common_prefix] = []
-                                timestamps[common_prefix] = []
-                            values[common_prefix].append(content)
-                            timestamps[common_prefix].append(timestamp)
-
-                        if len(values) == num_topics:
-                            # received a new value for each topic -> call callback function
-                            if func_instance.timestamp_enabled:
-                                # append timestamps, if required
-                                values['timestamps'] = timestamps
-                            if self.debug_logger:
-                                self.debug_logger.info(
-                                    f"- (DS): received all messages for function {func_instance}\n   -> CALLING function")
-                            if self.__class__ == Service:
-                                # NOTE workaround for publisher / subscriber without being an instance method
-                                func_instance(**values)
-                            else:
-                                func_instance(self, **values)
-                            # reset values
-                            values = {}
-                            timestamps = {}
+                        complete = self._collect_message(func_instance, pending, topic, msg, router)
+                        if complete:
+                            session_id, values = complete
+                            # handle the message in its session: state and published messages belong to it
+                            with session_context(session_id):
+                                result = self._call_subscriber(func_instance, values)
+                                if inspect.iscoroutine(result):
+                                    # coroutine subscribers (see `services.async_service`) run to completion here
+                                    asyncio.run(result)
+                            self._session_ended(session_id)
             except KeyboardInterrupt:
                 break
             except:
@@ -540,29 +826,27 @@ def PublishSubscribe(sub_topics: List[str] = [], pub_topics: List[str] = [], que
         * sub_topics and queued_sub_topics have to be disjoint!
         * If you need timestamps for your messages, specify a 'timestamps' argument in your subscribing function.
           It will be filled by a dictionary providing timestamps for each received value, indexed by name.
-    
+        * Your function may also be a coroutine (`async def`). The `AsyncDialogSystem` awaits it on its event loop,
+          the threaded `DialogSystem` runs it to completion in the listener thread.
+
     Technical notes:
         * Data will be automatically pickled / unpickled during send / receive to reduce meassage size.
           However, some python objects are not serializable (e.g. database connections) for good reasons
           and will throw an error if you try to publish them.
+          The serialization format is chosen per `DialogSystem` via its `codec` (see `services.codec`).
         * The domain name of your service class will be appended to your publish topics.
           Subscription topics are prefix-matched, so you will receive all messages from 'topic/suffix'
           if you subscibe to 'topic'.
     """
 
     def wrapper(func):
-        def delegate(self, *args, **kwargs):
-            func_inst = getattr(self, func.__name__)
-
-            callargs = list(args)
-            if self in callargs:    # remove self when in *args, because already known to function
-                callargs.remove(self)
-            result = func(self, *callargs, **kwargs)
+        def publish(self, result):
             if result:
                 # fix! (user could have multiple "/" characters in topic - only use last one )
                 domains = {res.split("/")[0]: res.split("/")[1] if "/" in res else "" for res in result}
                 result = {key.split("/")[0]: result[key] for key in result}
 
+            func_inst = getattr(self, func.__name__)
             if func_inst not in self._publish_sockets:
                 # not a publisher, just normal function
                 return result
@@ -578,12 +862,35 @@ def PublishSubscribe(sub_topics: List[str] = [], pub_topics: List[str] = [], que
                         topic_domain_str = f"{topic}/{domain}" if domain else topic
                         if topic in self._pub_topic_domains:
                             topic_domain_str = f"{topic}/{self._pub_topic_domains[topic]}" if self._pub_topic_domains[topic] else topic
-                        _send_msg(socket, topic_domain_str, result[topic])
+                        content = result[topic]
+                        if topic in self._delta_topics and not getattr(self._codec, 'by_reference', False):
+                            content = self._delta_encoder.encode(current_session(), topic_domain_str, content)
+                        if self._instrumentation:
+                            # record before sending: over inproc, the answer may arrive before the send returns
+                            self._instrumentation.record_publish(topic_domain_str, current_session())
+                        _send_msg(socket, topic_domain_str, content, self._codec, current_session())
                         if self.debug_logger:
                             self.debug_logger.info(
                                 f"- (DS): sent message from {func} to topic {topic_domain_str}:\n   {result[topic]}")
             return result
 
+        def callargs(self, args):
+            callargs = list(args)
+            if self in callargs:    # remove self when in *args, because already known to function
+                callargs.remove(self)
+            return callargs
+
+        if inspect.iscoroutinefunction(func):
+            # coroutine subscribers: publish once the coroutine returned
+            async def delegate(self, *args, **kwargs):
+                return publish(self, await func(self, *callargs(self, args), **kwargs))
+        else:
+            def delegate(self, *args, **kwargs):
+                return publish(self, func(self, *callargs(self, args), **kwargs))
+
+        # the name makes the control topics of each subscriber function unique (see `Service._setup_listener`)
+        delegate.__name__ = func.__name__
+        delegate.__qualname__ = func.__qualname__
         # declare function as publish / subscribe functions and attach the respective topics
         delegate.pubsub = True
         delegate.sub_topics = sub_topics
@@ -603,10 +910,14 @@ class DialogSystem:
     It will also handle synchronization for initalization of services before dialog start / after dialog end / on system shutdown
     and lets you discover potential conflicts in you messaging pipeline.
     This class is also used to communicate / synchronize with services running on different nodes.
+
+    Dialogs are either run one at a time (`run_dialog`) or as independent sessions sharing all
+    services (`start_session`, `wait_for_session_end`, `end_session`).
     """
 
     def __init__(self, services: List[Union[Service, RemoteService]], sub_port: int = 65533, pub_port: int = 65534,
-                 reg_port: int = 65535, protocol: str = 'tcp', debug_logger: DiasysLogger = None):
+                 reg_port: int = 65535, protocol: str = 'tcp', debug_logger: DiasysLogger = None,
+                 codec: MessageCodec = None, ack_timeout: Optional[float] = 60.0, instrument: bool = True):
         """
         Args:
             services (List[Union[Service, RemoteService]]): List of all (remote) services to connect to.
@@ -617,14 +928,27 @@ class DialogSystem:
             pub_port(int): publisher port
             pub_addr(str): IP-address or domain name of proxy publisher interface (e.g. 127.0.0.1 for your local machine) 
             reg_port (int): registration port for remote services
-            protocol(str): communication protol, either 'inproc' or 'tcp' or `ipc`
+            protocol(str): communication protol, either 'inproc' or 'tcp' or `ipc`.
+                           With 'inproc', the whole dialog system runs in this process: the proxy runs in a
+                           thread and messages are passed by reference (see `services.codec.LocalCodec`).
+                           Local services use the protocol of their `DialogSystem`.
             debug_logger (DiasysLogger): If not `None`, all messags are printed to the logger, including send/receive events.
                                 Can be useful for debugging because you can still see messages received by the `DialogSystem`
                                 even if they are never forwarded (as expected) to your `Service`
+            codec (MessageCodec): How messages of all local services are serialized
+                                  (default: `LocalCodec` for 'inproc', else `PickleCodec`).
+                                  Use `services.codec.OutOfBandCodec` to send numpy arrays / torch tensors
+                                  (e.g. audio, video frames) as separate frames without extra copies.
+            ack_timeout (float): seconds to wait for the ACK's of all services to a control message before raising
+                                 a `TimeoutError` (`None`: wait forever)
+            instrument (bool): If `True`, all local services record latency and throughput statistics of the bus in
+                               `self.instrumentation` (see `services.instrumentation.BusInstrumentation`)
         """
         # node-local topics
         self.debug_logger = debug_logger
         self.protocol = protocol
+        self._codec = codec or (LocalCodec() if protocol == 'inproc' else _DEFAULT_CODEC)
+        self.instrumentation = BusInstrumentation() if instrument else None
         self._sub_topics = {}
         self._pub_topics = {}
         self._remote_identifiers = set()
@@ -634,20 +958,33 @@ class DialogSystem:
         # node-local sockets
         self._domains = set()
 
-        # start proxy thread
-        self._proxy_dev = ProcessProxy(in_type=zmq.XSUB, out_type=zmq.XPUB)  # , mon_type=zmq.XSUB)
+        # start proxy (inproc sockets only reach sockets of the same process)
+        if protocol == 'inproc':
+            self._proxy_dev = ThreadProxy(in_type=zmq.XSUB, out_type=zmq.XPUB)
+        else:
+            self._proxy_dev = ProcessProxy(in_type=zmq.XSUB, out_type=zmq.XPUB)  # , mon_type=zmq.XSUB)
         self._proxy_dev.bind_in(f"{protocol}://127.0.0.1:{pub_port}")
         self._proxy_dev.bind_out(f"{protocol}://127.0.0.1:{sub_port}")
         self._proxy_dev.start()
         self._sub_port = sub_port
         self._pub_port = pub_port
+        self._ack_timeout = ack_timeout
+        self._wait_for_proxy()
 
         # thread control
         self._start_topics = set()
         self._end_topics = set()
         self._terminate_topics = set()
+        self._session_start_topics = set()
+        self._session_end_topics = set()
+        self._ready_topics = set()
         self._stopEvent = threading.Event()
 
+        # sessions
+        self._sessions = set()
+        self._listening = False
+        self._control_lock = threading.RLock()  # control channel handshakes are not thread-safe
+
         # control channels
         ctx = Context.instance()
         self._control_channel_pub = ctx.socket(zmq.PUB)
@@ -661,6 +998,9 @@ class DialogSystem:
             if isinstance(service, Service):
                 # register local service
                 service_name = type(service).__name__ if service._identifier is None else service._identifier
+                service._codec = self._codec
+                service._protocol = protocol
+                service._instrumentation = self.instrumentation
                 service._init_pubsub()
                 self._add_service_info(service_name, service._domain_name, service._sub_topics, service._pub_topics,
                                        service._start_topic, service._end_topic, service._terminate_topic)
@@ -672,7 +1012,34 @@ class DialogSystem:
         self._control_channel_sub.connect(f"{protocol}://127.0.0.1:{sub_port}")
         self._setup_dialog_end_listener()
 
-        time.sleep(0.25)
+        # readiness handshake: block until all services and their listeners receive control messages
+        _barrier(self._control_channel_pub, self._control_channel_sub, self._ready_topics,
+                 timeout=self._ack_timeout, resend=True)
+
+    def _wait_for_proxy(self, retry_interval: float = 0.005):
+        """ Blocks until the proxy process forwards messages.
+            Sockets connecting before the proxy bound its ports only retry after zmq's reconnect interval
+            (100 ms by default), so the services connect only after a probe went through the proxy.
+        """
+        ctx = Context.instance()
+        probe_topic = f"DS/{id(self)}/PROBE"
+        probe_pub = ctx.socket(zmq.PUB)
+        probe_sub = ctx.socket(zmq.SUB)
+        for socket in (probe_pub, probe_sub):
+            socket.setsockopt(zmq.RECONNECT_IVL, int(retry_interval * 1000))
+            socket.setsockopt(zmq.LINGER, 0)
+        probe_sub.setsockopt(zmq.SUBSCRIBE, bytes(probe_topic, encoding="ascii"))
+        probe_pub.connect(f"{self.protocol}://127.0.0.1:{self._pub_port}")
+        probe_sub.connect(f"{self.protocol}://127.0.0.1:{self._sub_port}")
+        deadline = None if self._ack_timeout is None else time.monotonic() + self._ack_timeout
+        try:
+            while not probe_sub.poll(int(retry_interval * 1000)):
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise TimeoutError(f"proxy not reachable within {self._ack_timeout} s")
+                _send_msg(probe_pub, probe_topic, True)
+        finally:
+            probe_pub.close()
+            probe_sub.close()
 
     def _register_pub_topic(self, publisher, topic: str):
         """ Map a publisher instance to a topic """
@@ -753,10 +1120,13 @@ class DialogSystem:
         self._start_topics.add(start_topic)
         self._end_topics.add(end_topic)
         self._terminate_topics.add(terminate_topic)
+        self._session_start_topics.add(_session_topic(start_topic))
+        self._session_end_topics.add(_session_topic(end_topic))
+        self._ready_topics.add(_ready_topic(start_topic))
 
-        self._control_channel_sub.setsockopt(zmq.SUBSCRIBE, bytes(f"ACK/{start_topic}", encoding="ascii"))
-        self._control_channel_sub.setsockopt(zmq.SUBSCRIBE, bytes(f"ACK/{end_topic}", encoding="ascii"))
-        self._control_channel_sub.setsockopt(zmq.SUBSCRIBE, bytes(f"ACK/{terminate_topic}", encoding="ascii"))
+        for topic in (start_topic, end_topic, terminate_topic, _session_topic(start_topic), _session_topic(end_topic),
+                      _ready_topic(start_topic)):
+            self._control_channel_sub.setsockopt(zmq.SUBSCRIBE, bytes(f"ACK/{topic}", encoding="ascii"))
 
     def _setup_dialog_end_listener(self):
         """ Creates socket for listening to Topic.DIALOG_END messages """
@@ -787,9 +1157,9 @@ class DialogSystem:
             Blocks until all services sent ACK's confirming they're stopped.
         """
         self._stopEvent.set()
-        for terminate_topic in self._terminate_topics:
-            _send_msg(self._control_channel_pub, terminate_topic, True)
-            _recv_ack(self._control_channel_sub, terminate_topic)
+        with self._control_lock:
+            _barrier(self._control_channel_pub, self._control_channel_sub, self._terminate_topics,
+                     timeout=self._ack_timeout)
 
     def _end_dialog(self):
         """ Block until all receivers stopped listening.
@@ -798,10 +1168,10 @@ class DialogSystem:
         # listen for Topic.DIALOG_END messages
         while True:
             try:
-                msg = self._end_socket.recv_multipart(copy=True)
+                msg = self._end_socket.recv_multipart(copy=False)
                 # receive message for subscribed topic
-                topic = msg[0].decode("ascii")
-                timestamp, content = pickle.loads(msg[1])
+                topic = decode_topic(msg)
+                timestamp, content = decode_frames(msg)
                 if content:
                     if self.debug_logger:
                         self.debug_logger.info(f"- (DS): received DIALOG_END message in _end_dialog from topic {topic}")
@@ -815,11 +1185,12 @@ class DialogSystem:
                 print("ERROR in _end_dialog ")
 
         # stop receivers (blocking)
-        for end_topic in self._end_topics:
-            _send_msg(self._control_channel_pub, end_topic, True)
-            _recv_ack(self._control_channel_sub, end_topic)
+        with self._control_lock:
+            _barrier(self._control_channel_pub, self._control_channel_sub, self._end_topics,
+                     timeout=self._ack_timeout)
         if self.debug_logger:
             self.debug_logger.info(f"- (DS): all services STOPPED listening")
+        self._listening = False
 
     def _start_dialog(self, start_signals: dict):
         """ Block until all receivers started listening.
@@ -827,19 +1198,20 @@ class DialogSystem:
             Finally, publish all start signals given. """
     
         self._stopEvent.clear()
-        if platform.system().lower() == 'windows':
-            time.sleep(1) # wait until stop event is cleared and dialog system is listening
         # start receivers (blocking)
-        for start_topic in self._start_topics:
-            _send_msg(self._control_channel_pub, start_topic, True)
-            _recv_ack(self._control_channel_sub, start_topic)
+        with self._control_lock:
+            _barrier(self._control_channel_pub, self._control_channel_sub, self._start_topics,
+                     timeout=self._ack_timeout)
+            self._listening = True
         if self.debug_logger:
             self.debug_logger.info(f"- (DS): all services STARTED listening")
         # publish first turn trigger
         # for domain in self._domains:
         # "wildcard" mechanism: publish start messages to all known domains
         for topic in start_signals:
-            _send_msg(self._control_channel_pub, f"{topic}", start_signals[topic])
+            if self.instrumentation:
+                self.instrumentation.record_publish(topic)
+            _send_msg(self._control_channel_pub, f"{topic}", start_signals[topic], self._codec)
 
     def run_dialog(self, start_signals: dict = {Topic.DIALOG_END: False}):
         """ Run a complete dialog (blocking).
@@ -855,6 +1227,65 @@ class DialogSystem:
         self._start_dialog(start_signals)
         self._end_dialog()
 
+    def start_session(self, session_id: Hashable, start_signals: dict = {Topic.DIALOG_END: False}):
+        """ Starts a new dialog as an independent session (blocking until all services are ready).
+            All services are shared between sessions: `dialog_start` is called per session and
+            every message is tagged with its session, so many dialogs can run at the same time
+            (see `services.session`). Can be called from any thread.
+
+        Args:
+            session_id (Hashable): a unique, picklable id for the new session (e.g. a user id)
+            start_signals (Dict[str, Any]): mapping from topic -> value, published for this session
+                                            to trigger the start of the dialog
+        """
+        with self._control_lock:
+            if not self._listening:
+                # first session: set all listeners to listening mode once
+                self._start_dialog({})
+            assert session_id not in self._sessions, f"session {session_id} is already running"
+            _barrier(self._control_channel_pub, self._control_channel_sub, self._session_start_topics, session_id,
+                     timeout=self._ack_timeout)
+            self._sessions.add(session_id)
+            for topic in start_signals:
+                if self.instrumentation:
+                    self.instrumentation.record_publish(topic, session_id)
+                _send_msg(self._control_channel_pub, f"{topic}", start_signals[topic], self._codec, session_id)
+
+    def end_session(self, session_id: Hashable):
+        """ Ends a session: calls `dialog_end` of all services for this session and drops its state
+            (blocking until all services are done).
+
+        Args:
+            session_id (Hashable): id of the session, as given to `start_session`
+        """
+        with self._control_lock:
+            if session_id not in self._sessions:
+                return
+            self._sessions.discard(session_id)
+            _barrier(self._control_channel_pub, self._control_channel_sub, self._session_end_topics, session_id,
+                     timeout=self._ack_timeout)
+
+    def wait_for_session_end(self) -> Hashable:
+        """ Blocks until a session publishes a `Topic.DIALOG_END` message with value `True`, then
+            ends that session (see `end_session`).
+            Should be called from one thread only (e.g. a loop serving all sessions).
+
+        Returns:
+            id of the ended session
+        """
+        while True:
+            msg = self._end_socket.recv_multipart(copy=False)
+            timestamp, content, session_id = decode_message(msg)
+            if content and session_id in self._sessions:
+                if self.debug_logger:
+                    self.debug_logger.info(f"- (DS): received DIALOG_END message for session {session_id}")
+                self.end_session(session_id)
+                return session_id
+
+    def list_sessions(self) -> set:
+        """ Returns the ids of all running sessions """
+        return set(self._sessions)
+
     def list_published_topics(self):
         """ Get all declared publisher topics.
 
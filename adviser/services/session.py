@@ -0,0 +1,117 @@
+############################################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify'
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+############################################################################################
+
+"""Session context for running many dialogs in one `DialogSystem`.
+
+Every message on the bus can carry a session id. While a service function handles a message,
+the session id of that message is the *current session* of the handling thread (or task): messages
+published from the function are tagged with it and `SessionAttribute`s of the service resolve
+to the state of that session.
+"""
+
+import contextlib
+import contextvars
+from typing import Any, Callable, Dict, Hashable, Optional
+
+# a context variable (instead of a thread-local) also keeps coroutines handling different sessions
+# on the same event loop apart
+_session_id = contextvars.ContextVar('session_id', default=None)
+
+
+def current_session() -> Optional[Hashable]:
+    """ Returns the id of the session handled by the calling thread or task (`None` outside of sessions) """
+    return _session_id.get()
+
+
+@contextlib.contextmanager
+def session_context(session_id: Optional[Hashable]):
+    """ Makes `session_id` the current session of the calling thread or task inside a `with` block.
+
+    Use this to publish messages for a session from outside a subscriber function, e.g.
+
+        with session_context(user_id):
+            user_input_service.publish_utterance(text)
+    """
+    token = _session_id.set(session_id)
+    try:
+        yield
+    finally:
+        _session_id.reset(token)
+
+
+class SessionAttribute:
+    """
+    Declares an instance attribute of a `Service` whose value is kept per session.
+
+    Reading or writing the attribute accesses the value of the current session, so service code
+    can keep using `self.<attribute>` while one service instance serves many dialogs.
+    Without sessions (`DialogSystem.run_dialog`), the attribute behaves like a normal attribute.
+
+    Example:
+
+        class MyBST(Service):
+            bs = SessionAttribute(factory=lambda service: BeliefState(service.domain))
+    """
+
+    def __init__(self, default: Any = None, factory: Callable[[Any], Any] = None):
+        """
+        Args:
+            default (Any): value for sessions which didn't set the attribute yet
+            factory (Callable): if given, called with the service instance to create the value for
+                                sessions which didn't set the attribute yet (use this for mutable
+                                values)
+        """
+        self.default = default
+        self.factory = factory
+        self.name = None
+
+    def __set_name__(self, owner, name: str):
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        state = session_state(instance)
+        if self.name not in state:
+            state[self.name] = self.factory(instance) if self.factory else self.default
+        return state[self.name]
+
+    def __set__(self, instance, value):
+        session_state(instance)[self.name] = value
+
+
+def session_state(instance, session_id: Hashable = None, current: bool = True) -> Dict[str, Any]:
+    """ Returns the dictionary holding the `SessionAttribute` values of a service for one session.
+
+    Args:
+        instance: the service
+        session_id (Hashable): the session (only used if `current` is False)
+        current (bool): If True, the state of the current session is returned
+    """
+    states = instance.__dict__.setdefault('_session_states', {})
+    if current:
+        session_id = current_session()
+    if session_id not in states:
+        states[session_id] = {}
+    return states[session_id]
+
+
+def drop_session_state(instance, session_id: Hashable):
+    """ Forgets all `SessionAttribute` values of a service for the given session """
+    instance.__dict__.get('_session_states', {}).pop(session_id, None)
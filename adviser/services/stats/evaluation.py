@@ -19,6 +19,7 @@
 
 
 from services.service import Service, PublishSubscribe
+from services.session import SessionAttribute
 from services.simulator.goal import Goal
 from utils.domain.domain import Domain
 from utils.logger import DiasysLogger
@@ -104,6 +105,10 @@ class PolicyEvaluator(Service):
 
     """
 
+    # reward and turns of the current dialog (kept per session)
+    dialog_reward = SessionAttribute(default=0.0)
+    dialog_turns = SessionAttribute(default=0)
+
     def __init__(self, domain: Domain, subgraph: dict = None, use_tensorboard=False,
                  experiment_name: str = '', turn_reward=-1, success_reward=20,
                  logger: DiasysLogger = DiasysLogger(), summary_writer=None):
@@ -0,0 +1,132 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+
+
+def get_root_dir():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.append(get_root_dir())
+from services.async_service import AsyncDialogSystem
+from services.service import DialogSystem, PublishSubscribe, Service
+from services.session import SessionAttribute, current_session, session_context
+from utils.topics import Topic
+
+PORTS = {'sub_port': 65423, 'pub_port': 65424}
+THREADED_PORTS = {'sub_port': 65426, 'pub_port': 65427}
+
+
+class CountingService(Service):
+    """ Answers every utterance with the number of turns of the current dialog (in an executor thread) """
+
+    turns = SessionAttribute(default=0)
+
+    def __init__(self, ports: dict = PORTS):
+        Service.__init__(self, **ports)
+        self.threads = set()
+
+    def dialog_start(self):
+        self.turns = 0
+
+    @PublishSubscribe(sub_topics=["user_utterance"], pub_topics=["sys_utterance", Topic.DIALOG_END])
+    def answer(self, user_utterance: str = None):
+        self.threads.add(threading.current_thread())
+        self.turns += 1
+        return {'sys_utterance': f"{user_utterance}:{self.turns}",
+                Topic.DIALOG_END: user_utterance == "bye"}
+
+
+class UserService(Service):
+    """ Coroutine subscriber: records system utterances and says "bye" after `turns` answers """
+
+    def __init__(self, turns: int = 2, ports: dict = PORTS):
+        Service.__init__(self, **ports)
+        self.turns = turns
+        self.received = {}
+
+    @PublishSubscribe(pub_topics=["user_utterance"])
+    def say(self, text: str):
+        return {'user_utterance': text}
+
+    @PublishSubscribe(sub_topics=["sys_utterance"], pub_topics=["user_utterance"])
+    async def reply(self, sys_utterance: str = None):
+        await asyncio.sleep(0)
+        received = self.received.setdefault(current_session(), [])
+        received.append(sys_utterance)
+        return {'user_utterance': "bye" if len(received) >= self.turns else "again"}
+
+
+async def _wait_for(condition, timeout: float = 10.0):
+    end = time.time() + timeout
+    while not condition() and time.time() < end:
+        await asyncio.sleep(0.01)
+    return condition()
+
+
+def test_run_dialog():
+    """
+
+    Tests whether a dialog between a coroutine and a plain subscriber runs until DIALOG_END
+
+    """
+    async def dialog():
+        user, counter = UserService(), CountingService()
+        async with AsyncDialogSystem(services=[user, counter], **PORTS) as ds:
+            await asyncio.wait_for(ds.run_dialog(start_signals={'user_utterance': "hi"}), timeout=10)
+            assert ds.terminating()
+        return user, counter
+
+    user, counter = asyncio.run(dialog())
+    # the answer to "bye" may still arrive before the listeners stop
+    assert user.received[None][:2] == ["hi:1", "again:2"]
+    # the plain subscriber ran in the executor, not on the event loop
+    assert threading.main_thread() not in counter.threads
+
+
+def test_concurrent_sessions():
+    """
+
+    Tests whether sessions on the event loop keep their own state and messages
+
+    """
+    async def sessions():
+        user, counter = UserService(turns=3), CountingService()
+        async with AsyncDialogSystem(services=[user, counter], **PORTS) as ds:
+            for session in ("alice", "bob"):
+                await ds.start_session(session, start_signals={})
+            with session_context("alice"):
+                user.say("hi")
+            assert await asyncio.wait_for(ds.wait_for_session_end(), timeout=10) == "alice"
+            assert ds.list_sessions() == {"bob"}
+            # answers to alice still in flight don't create her state again
+            assert "alice" not in counter._session_states
+            for _ in range(10):
+                await asyncio.sleep(0.01)
+                assert "alice" not in counter._session_states
+                assert all("alice" not in pending for pending in counter._pending_values.values())
+
+            with session_context("bob"):
+                user.say("hello")
+            assert await _wait_for(lambda: len(user.received.get("bob", [])) >= 3)
+        return user
+
+    user = asyncio.run(sessions())
+    assert user.received["alice"][:3] == ["hi:1", "again:2", "again:3"]
+    assert user.received["bob"][:3] == ["hello:1", "again:2", "again:3"]
+
+
+def test_coroutine_subscriber_in_threaded_dialog_system():
+    """
+
+    Tests whether the threaded DialogSystem also runs coroutine subscribers
+
+    """
+    user, counter = UserService(ports=THREADED_PORTS), CountingService(ports=THREADED_PORTS)
+    ds = DialogSystem(services=[user, counter], reg_port=65425, **THREADED_PORTS)
+    try:
+        ds.run_dialog(start_signals={'user_utterance': "hi"})
+    finally:
+        ds.shutdown()
+    assert user.received[None][:2] == ["hi:1", "again:2"]
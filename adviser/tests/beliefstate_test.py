@@ -0,0 +1,70 @@
+import os
+import pickle
+import sys
+
+
+def get_root_dir():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.append(get_root_dir())
+from utils.beliefstate import BeliefState
+from utils.useract import UserActionType
+
+
+def _turn(bs: BeliefState, slot: str, value: str, score: float = 1.0):
+    bs.start_new_turn()
+    bs['user_acts'] = {UserActionType.Inform}
+    bs['requests'] = {}
+    if slot in bs['informs']:
+        bs['informs'][slot][value] = score
+    else:
+        bs['informs'][slot] = {value: score}
+
+
+def test_new_turn_does_not_change_history():
+    """
+
+    Tests whether changing the informs of the current turn in place leaves earlier turns unchanged
+
+    """
+    bs = BeliefState(None)
+    _turn(bs, 'name', 'a')
+    _turn(bs, 'name', 'b', 0.5)
+    _turn(bs, 'area', 'west')
+    assert bs[1]['informs'] == {'name': {'a': 1.0}}
+    assert bs[2]['informs'] == {'name': {'a': 1.0, 'b': 0.5}}
+    assert bs['informs'] == {'name': {'a': 1.0, 'b': 0.5}, 'area': {'west': 1.0}}
+    assert bs.get('user_acts') == {UserActionType.Inform}
+    assert bs.get('unknown', 42) == 42
+
+
+def test_unchanged_values_are_shared():
+    """
+
+    Tests whether values which are not accessed in a turn are shared with the previous turn
+
+    """
+    bs = BeliefState(None)
+    _turn(bs, 'name', 'a')
+    chosen = object()
+    bs['chosen'] = chosen
+    bs.start_new_turn()
+    assert bs._history[-1]['informs'] is bs._history[-2]['informs']
+    assert bs['chosen'] is chosen
+    assert bs['informs'] is not bs._history[-2]['informs']
+
+
+def test_history_window_bounds_size():
+    """
+
+    Tests whether a history window keeps the number of turns and the pickled size constant
+
+    """
+    bs = BeliefState(None, history_window=2)
+    sizes = []
+    for turn in range(20):
+        _turn(bs, 'name', 'a')
+        sizes.append(len(pickle.dumps(bs)))
+    assert len(bs) == 2
+    assert sizes[-1] == sizes[5]
+    assert pickle.loads(pickle.dumps(bs))['informs'] == {'name': {'a': 1.0}}
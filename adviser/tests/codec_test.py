@@ -0,0 +1,74 @@
+import copy
+import os
+import sys
+import pytest
+
+
+def get_root_dir():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.append(get_root_dir())
+from services.codec import LocalCodec, PickleCodec, OutOfBandCodec, decode_frames, decode_message, decode_topic
+
+
+np = pytest.importorskip("numpy")
+
+
+def _roundtrip(codec, content):
+    frames = [b"speech_in/recipes"] + [bytes(frame) for frame in codec.encode(1.5, content)]
+    return frames, decode_topic(frames), decode_frames(frames)
+
+
+def test_pickle_codec_single_frame():
+    """
+
+    Tests whether the default codec pickles everything into one data frame
+
+    """
+    audio = np.arange(100000, dtype=np.float32)
+    frames, topic, (timestamp, content) = _roundtrip(PickleCodec(), (audio, 16000))
+    assert len(frames) == 2
+    assert topic == "speech_in/recipes"
+    assert timestamp == 1.5
+    assert np.array_equal(content[0], audio) and content[1] == 16000
+
+
+def test_out_of_band_codec_sends_large_arrays_as_frames():
+    """
+
+    Tests whether large arrays are sent out-of-band while small ones stay in the pickle stream
+
+    """
+    audio = np.arange(100000, dtype=np.float32)
+    small = np.arange(10, dtype=np.float32)
+    frames, _, (_, content) = _roundtrip(OutOfBandCodec(), {'audio': audio, 'small': small})
+    assert len(frames) == 3
+    assert np.array_equal(content['audio'], audio)
+    assert np.array_equal(content['small'], small)
+
+
+def test_out_of_band_codec_plain_objects():
+    """
+
+    Tests whether messages without buffers are unaffected by the out-of-band codec
+
+    """
+    frames, _, (_, content) = _roundtrip(OutOfBandCodec(), ["hello", None, True])
+    assert len(frames) == 2
+    assert content == ["hello", None, True]
+
+
+def test_local_codec_passes_references():
+    """
+
+    Tests whether the local codec hands the published object itself (or its copy) to the receiver
+
+    """
+    content = {'informs': {'food': 'mango'}}
+    frames = [b"beliefstate/recipes"] + LocalCodec().encode(1.5, content, session_id="alice")
+    assert decode_message(frames) == (1.5, content, "alice")
+    assert decode_frames(frames)[1] is content
+
+    frames = [b"beliefstate/recipes"] + LocalCodec(copy=copy.deepcopy).encode(1.5, content)
+    received = decode_frames(frames)[1]
+    assert received == content and received is not content
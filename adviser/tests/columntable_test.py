@@ -0,0 +1,122 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+
+
+def get_root_dir():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.append(get_root_dir())
+from services.policy.policy_handcrafted import HandcraftedPolicy
+from utils import SysActionType
+from utils.domain.columntable import ColumnTable
+from utils.domain.jsonlookupdomain import JSONLookupDomain
+from utils.logger import DiasysLogger, LogLevel
+
+ROWS = [('ball', 'red', 'small', 'round'),
+        ('cube', 'Red', 'small', 'square'),
+        ('kite', 'blue', 'large', None),
+        ('drum', 'blue', 'small', 'round'),
+        ('boat', 'green', 'large', 'long')]
+
+
+def _toys_domain(folder) -> JSONLookupDomain:
+    db_file = os.path.join(str(folder), 'toys.db')
+    with sqlite3.connect(db_file) as db:
+        db.execute('CREATE TABLE toys (name TEXT, color TEXT, size TEXT, shape TEXT)')
+        db.executemany('INSERT INTO toys VALUES (?, ?, ?, ?)', ROWS)
+    ontology = {'key': 'name', 'requestable': ['color', 'size', 'shape'],
+                'system_requestable': ['color', 'size', 'shape'],
+                'informable': {'color': ['red', 'blue', 'green'], 'size': ['small', 'large'],
+                               'shape': ['round', 'square', 'long']}}
+    ontology_file = os.path.join(str(folder), 'toys.json')
+    with open(ontology_file, 'w') as file:
+        json.dump(ontology, file)
+    return JSONLookupDomain('toys', json_ontology_file=ontology_file, sqllite_db_file=db_file)
+
+
+def test_value_counts(tmp_path):
+    """
+
+    Tests whether the value counts equal the counts of the entities found by find_entities and
+    whether they are updated after a write to the database
+
+    """
+    domain = _toys_domain(tmp_path)
+    for constraints in ({}, {'color': 'RED'}, {'size': 'small', 'color': 'blue'},
+                        {'color': 'dontcare', 'shape': 'round'}, {'color': 'purple'}):
+        expected = {}
+        for entity in domain.find_entities(constraints):
+            for slot in ('size', 'shape'):
+                counts = expected.setdefault(slot, {})
+                counts[entity[slot]] = counts.get(entity[slot], 0) + 1
+        assert domain.get_value_counts(constraints, ['size', 'shape']) == \
+            {slot: expected.get(slot, {}) for slot in ('size', 'shape')}
+    assert domain.get_value_counts({}, ['shape'])['shape'] == {'round': 2, 'square': 1, None: 1, 'long': 1}
+
+    # the rows of an extended constraint set are filtered from those of the cached constraints
+    table = domain._get_column_table(['name'])
+    assert table.select({'size': 'small'}).tolist() == [0, 1, 3]
+    assert table.select({'size': 'SMALL', 'shape': 'round'}).tolist() == [0, 3]
+    assert table.select({'size': 'small', 'shape': 'round', 'name': 'drum'}).tolist() == [3]
+
+    domain.write_db("UPDATE toys SET size = 'large' WHERE name = 'ball'")
+    assert domain.get_value_counts({'color': 'red'}, ['size']) == {'size': {'large': 1, 'small': 1}}
+
+
+def test_concurrent_selections():
+    """
+
+    Tests whether threads selecting rows from one table get correct rows while its selection
+    cache is filled and cleared once full
+
+    """
+    columns = ('name', 'color', 'size', 'shape')
+    table = ColumnTable(len(ROWS), max_cached_selections=2)
+    for position, column in enumerate(columns):
+        table.add_column(column, (row[position] for row in ROWS))
+    constraints = [{'size': 'small'}, {'size': 'small', 'shape': 'round'}, {'color': 'blue'},
+                   {'color': 'red', 'size': 'small'}, {'shape': 'long'}]
+    expected = [[i for i, row in enumerate(ROWS)
+                 if all(str(row[columns.index(column)]).lower() == value for column, value in constraint.items())]
+                for constraint in constraints]
+    errors = []
+
+    def select(offset):
+        try:
+            for i in range(2000):
+                position = (i + offset) % len(constraints)
+                assert table.select(constraints[position]).tolist() == expected[position]
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=select, args=(offset,)) for offset in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+
+
+def test_next_request_from_value_counts(tmp_path):
+    """
+
+    Tests whether the policy requests a non-binary slot with several values among the results first
+    and otherwise the binary slot splitting the results most evenly
+
+    """
+    policy = HandcraftedPolicy(_toys_domain(tmp_path),
+                               logger=DiasysLogger(console_log_lvl=LogLevel.NONE, file_log_lvl=LogLevel.NONE))
+    results = [{}, {}]  # only the number of results is used
+    beliefstate = {'informs': {}, 'requests': {}}
+    sys_act = policy._raw_action(results, beliefstate)
+    assert sys_act.type == SysActionType.Request and list(sys_act.slot_values) == ['color']
+
+    beliefstate = {'informs': {'color': {'blue': 1.0}, 'shape': {'dontcare': 1.0}}, 'requests': {}}
+    sys_act = policy._raw_action(results, beliefstate)
+    assert sys_act.type == SysActionType.Request and list(sys_act.slot_values) == ['size']
+
+    beliefstate = {'informs': {'color': {'red': 1.0}, 'shape': {'dontcare': 1.0}}, 'requests': {}}
+    assert policy._raw_action(results, beliefstate).type == SysActionType.InformByName
@@ -0,0 +1,163 @@
+import os
+import sys
+import threading
+
+
+def get_root_dir():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.append(get_root_dir())
+from services.codec import PickleCodec, decode_message
+from services.delta import DeltaDecoder, DeltaEncoder
+from services.service import DialogSystem, PublishSubscribe, Service
+from services.session import session_context
+from utils.beliefstate import BeliefState
+from utils.useract import UserActionType
+
+PORTS = {'sub_port': 65453, 'pub_port': 65454}
+
+
+class Tracker(Service):
+    """ Publishes its belief state in delta mode """
+
+    def __init__(self):
+        Service.__init__(self, delta_topics=['beliefstate'], **PORTS)
+        self.bs = BeliefState(None)
+
+    @PublishSubscribe(pub_topics=["beliefstate"])
+    def track(self, turn: int):
+        _turn(self.bs, turn)
+        return {'beliefstate': self.bs}
+
+
+class Listener(Service):
+    """ Receives the belief state and remembers its number of turns """
+
+    def __init__(self, identifier: str):
+        Service.__init__(self, identifier=identifier, **PORTS)
+        self.turns = []
+        self.received = threading.Event()
+
+    @PublishSubscribe(sub_topics=["beliefstate"])
+    def listen(self, beliefstate: BeliefState = None):
+        self.turns.append(len(beliefstate))
+        self.received.set()
+
+
+def _send(encoder: DeltaEncoder, bs: BeliefState, session_id: str = None):
+    """ Encodes the belief state like a publishing service and decodes the frames again """
+    message = encoder.encode(session_id, 'beliefstate', bs)
+    frames = [b'beliefstate'] + PickleCodec().encode(0.0, message, session_id)
+    return decode_message(frames)[1]
+
+
+def _turn(bs: BeliefState, turn: int):
+    bs.start_new_turn()
+    bs['user_acts'] = {UserActionType.Inform}
+    bs['informs'].setdefault('slot', {})[f'value{turn}'] = 1.0
+    bs['num_matches'] = turn
+    if turn == 2:
+        del bs['informs']['slot']
+        bs['chosen'] = 'entity'
+
+
+def test_replica_follows_deltas():
+    """
+
+    Tests whether a replica rebuilt from deltas equals the published belief state in every turn
+
+    """
+    encoder, decoder = DeltaEncoder(snapshot_interval=4), DeltaDecoder()
+    bs = BeliefState(None)
+    snapshots = []
+    for turn in range(10):
+        _turn(bs, turn)
+        message = _send(encoder, bs)
+        snapshots.append(message.snapshot is not None)
+        replica = decoder.decode(None, 'beliefstate', message)
+        assert replica is not bs
+        assert dict((key, replica[key]) for key in replica) == dict((key, bs[key]) for key in bs)
+    assert snapshots == [True, False, False, False, True, False, False, False, True, False]
+
+
+def test_subscribers_may_change_received_belief_state():
+    """
+
+    Tests whether subscribers changing the received belief state in place (like the handcrafted
+    policy removing user acts) don't change the replica the following deltas are applied to
+
+    """
+    encoder, decoder = DeltaEncoder(snapshot_interval=4), DeltaDecoder()
+    bs = BeliefState(None)
+    for turn in range(6):
+        _turn(bs, turn)
+        received = decoder.decode(None, 'beliefstate', _send(encoder, bs))
+        assert dict((key, received[key]) for key in received) == dict((key, bs[key]) for key in bs)
+        received['user_acts'].discard(UserActionType.Inform)
+        received['informs'].clear()
+        received['requests']['slot'] = 1.0
+        received[-1]['chosen'] = 'other entity'
+
+
+def test_new_belief_state_is_sent_as_snapshot():
+    """
+
+    Tests whether a new belief state object (e.g. a new dialog) is sent as snapshot
+
+    """
+    encoder = DeltaEncoder()
+    bs = BeliefState(None)
+    _turn(bs, 0)
+    _send(encoder, bs)
+    _turn(bs, 1)
+    assert _send(encoder, bs).snapshot is None
+    bs = BeliefState(None)
+    assert _send(encoder, bs).snapshot is not None
+
+
+def test_missed_messages_wait_for_snapshot():
+    """
+
+    Tests whether a receiver which missed messages ignores deltas until the next snapshot
+
+    """
+    encoder, decoder = DeltaEncoder(snapshot_interval=3), DeltaDecoder()
+    bs = BeliefState(None)
+    messages = []
+    for turn in range(4):
+        _turn(bs, turn)
+        messages.append(_send(encoder, bs, "alice"))
+    # the receiver starts listening after the first message
+    assert decoder.decode("alice", 'beliefstate', messages[1]) is None
+    assert decoder.decode("alice", 'beliefstate', messages[2]) is None
+    assert decoder.decode("alice", 'beliefstate', messages[3])['num_matches'] == 3
+    decoder.drop_session("alice")
+    encoder.drop_session("alice")
+    _turn(bs, 4)
+    assert _send(encoder, bs, "alice").snapshot is not None
+
+
+def test_inproc_subscribers_leave_published_object_alone():
+    """
+
+    Tests whether subscribers of a delta topic don't modify the published belief state when
+    objects are passed by reference (inproc)
+
+    """
+    tracker, listeners = Tracker(), [Listener("first"), Listener("second")]
+    ds = DialogSystem(services=[tracker] + listeners, reg_port=65455, protocol='inproc', **PORTS)
+    try:
+        ds.start_session("alice", start_signals={})
+        for turn in range(3):
+            for listener in listeners:
+                listener.received.clear()
+            with session_context("alice"):
+                tracker.track(turn)
+            for listener in listeners:
+                assert listener.received.wait(10.0)
+        # the initial turn plus one per track call
+        assert len(tracker.bs) == 4
+        for listener in listeners:
+            assert listener.turns == [2, 3, 4]
+    finally:
+        ds.shutdown()
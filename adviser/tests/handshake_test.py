@@ -0,0 +1,67 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+
+def get_root_dir():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.append(get_root_dir())
+from services.service import DialogSystem, PublishSubscribe, Service, _barrier
+from services.session import session_context
+
+PORTS = {'sub_port': 65433, 'pub_port': 65434}
+
+
+class TwoListenerService(Service):
+    """ Records the messages received by two subscriber functions """
+
+    def __init__(self):
+        Service.__init__(self, **PORTS)
+        self.received = []
+        self.lock = threading.Lock()
+
+    @PublishSubscribe(pub_topics=["first", "second"])
+    def send(self, text: str):
+        return {'first': text, 'second': text}
+
+    @PublishSubscribe(sub_topics=["first"])
+    def listen_first(self, first: str = None):
+        with self.lock:
+            self.received.append(('first', first))
+
+    @PublishSubscribe(sub_topics=["second"])
+    def listen_second(self, second: str = None):
+        with self.lock:
+            self.received.append(('second', second))
+
+
+def test_handshakes_include_every_listener():
+    """
+
+    Tests whether each subscriber function gets its own control topics and listens as soon as a
+    dialog started, without waiting
+
+    """
+    service = TwoListenerService()
+    ds = DialogSystem(services=[service], reg_port=65435, ack_timeout=10.0, **PORTS)
+    try:
+        assert len(service._internal_start_topics) == 2
+        assert len(service._internal_ready_topics) == 2
+        ds.start_session("alice", start_signals={})
+        with session_context("alice"):
+            service.send("hi")
+        end = time.time() + 10.0
+        while len(service.received) < 2 and time.time() < end:
+            time.sleep(0.01)
+        assert sorted(service.received) == [('first', "hi"), ('second', "hi")]
+        ds.end_session("alice")
+
+        # nobody acknowledges an unknown control topic
+        with pytest.raises(TimeoutError):
+            _barrier(ds._control_channel_pub, ds._control_channel_sub, ["Nobody/0/START"], timeout=0.05)
+    finally:
+        ds.shutdown()
@@ -0,0 +1,105 @@
+import json
+import os
+import sys
+import threading
+import time
+
+
+def get_root_dir():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.append(get_root_dir())
+from services.instrumentation import BusInstrumentation, StreamingHistogram
+from services.service import DialogSystem, PublishSubscribe, Service
+from services.session import session_context
+
+PORTS = {'sub_port': 65443, 'pub_port': 65444}
+
+
+class EchoService(Service):
+    """ Answers every user utterance """
+
+    def __init__(self):
+        Service.__init__(self, **PORTS)
+        self.answered = threading.Event()
+        self.turn_started_before_answer = None
+
+    @PublishSubscribe(pub_topics=["gen_user_utterance"])
+    def say(self, text: str):
+        return {'gen_user_utterance': text}
+
+    @PublishSubscribe(sub_topics=["gen_user_utterance"], pub_topics=["sys_utterance"])
+    def answer(self, gen_user_utterance: str = None):
+        # the publisher records the start of the turn before its message can arrive here
+        self.turn_started_before_answer = "alice" in self._instrumentation._turn_starts
+        return {'sys_utterance': gen_user_utterance}
+
+    @PublishSubscribe(sub_topics=["sys_utterance"])
+    def hear(self, sys_utterance: str = None):
+        self.answered.set()
+
+
+def test_histogram_percentiles():
+    """
+
+    Tests whether the streaming histogram approximates percentiles within its bucket resolution
+
+    """
+    histogram = StreamingHistogram()
+    for value in range(1, 1001):
+        histogram.add(value / 1000)
+    assert histogram.count == 1000
+    assert histogram.min == 0.001 and histogram.max == 1.0
+    assert abs(histogram.mean() - 0.5005) < 1e-9
+    assert abs(histogram.percentile(50) - 0.5) < 0.05
+    assert abs(histogram.percentile(95) - 0.95) < 0.1
+    assert histogram.percentile(100) == 1.0
+
+
+def test_turn_latency_and_trace():
+    """
+
+    Tests whether turns are measured per session and handler calls end up in the trace
+
+    """
+    instrumentation = BusInstrumentation()
+    instrumentation.start_trace(["alice"])
+    instrumentation.record_publish("gen_user_utterance", "alice")
+    instrumentation.record_publish("gen_user_utterance", "bob")
+    instrumentation.record_call("NLU.extract_user_acts", "alice", 1.0, 0.002, 0.001)
+    instrumentation.record_call("NLU.extract_user_acts", "bob", 1.0, 0.002, 0.001)
+    instrumentation.record_publish("sys_utterance/recipes", "alice")
+    assert instrumentation.turns.count == 1
+
+    trace = json.loads(json.dumps(instrumentation.trace()))
+    calls = [event for event in trace['traceEvents'] if event['ph'] == 'X']
+    assert len(calls) == 1 and calls[0]['name'] == "NLU.extract_user_acts"
+    assert calls[0]['dur'] == 2000.0
+    assert "NLU.extract_user_acts" in instrumentation.summary()
+
+
+def test_dialog_system_records_statistics():
+    """
+
+    Tests whether local services record publications, deliveries, handler calls and turns
+
+    """
+    echo = EchoService()
+    ds = DialogSystem(services=[echo], reg_port=65445, protocol='inproc', **PORTS)
+    try:
+        ds.start_session("alice", start_signals={})
+        with session_context("alice"):
+            echo.say("hello")
+        assert echo.answered.wait(10.0)
+        instrumentation = ds.instrumentation
+        # the call of `answer` is recorded once it returned, i.e. after it published the answer
+        end = time.time() + 10.0
+        while "EchoService.answer" not in instrumentation._handlers and time.time() < end:
+            time.sleep(0.01)
+        assert echo.turn_started_before_answer
+        assert instrumentation.turns.count == 1
+        assert instrumentation._topics["gen_user_utterance"].published == 1
+        assert instrumentation._topics["gen_user_utterance"].delivery.count == 1
+        assert instrumentation._handlers["EchoService.answer"].wall.count == 1
+    finally:
+        ds.shutdown()
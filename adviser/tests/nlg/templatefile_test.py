@@ -0,0 +1,82 @@
+import os
+import sys
+
+
+def get_root_dir():
+    return os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+sys.path.append(get_root_dir())
+from services.nlg.templates import templatefile
+from services.nlg.templates.templatefile import TemplateFile
+from utils.sysact import SysAct, SysActionType
+
+
+TEMPLATES = '''
+function slot_text(slot, value)
+    "the {slot} is {value}"
+    if slot = "ease": "it is {value}"
+
+template welcomemsg(): "Hello."
+template request(ease): "How difficult should the recipe be?"
+template inform(name): "{shout(name)}!"
+template inform(name, *slots)
+    "{name}: {for_entry(slots, "slot_text", ", ", " and ")}."
+'''
+
+
+def _write_templates(directory) -> str:
+    filename = os.path.join(str(directory), 'testMessages.nlg')
+    with open(filename, 'w', encoding='utf8') as file:
+        file.write(TEMPLATES)
+    return filename
+
+
+def _template_file(filename: str, **kwargs) -> TemplateFile:
+    templates = TemplateFile(filename, None, **kwargs)
+    templates.add_python_function('shout', lambda text: text.upper())
+    return templates
+
+
+def test_create_message(tmp_path):
+    """
+
+    Tests whether the compiled templates render functions, special cases and free parameters and whether
+    the template is looked up again for the same slot signature
+
+    """
+    templates = _template_file(_write_templates(tmp_path), disk_cache=False)
+    assert templates.create_message(SysAct(SysActionType.Welcome)) == 'Hello.'
+    assert templates.create_message(SysAct(SysActionType.Request, {'ease': []})) == \
+        'How difficult should the recipe be?'
+    sys_act = SysAct(SysActionType.Inform, {'name': ['cake'], 'ease': ['easy'], 'prep_time': ['30']})
+    assert templates.create_message(sys_act) == 'cake: it is easy and the prep_time is 30.'
+    assert templates.create_message(SysAct(SysActionType.Inform, {'name': ['pie']})) == 'PIE!'
+    assert templates.create_message(SysAct(SysActionType.Inform, {'name': ['soup']})) == 'SOUP!'
+    assert len(templates._template_index) == 4
+
+
+def test_parsed_once(tmp_path):
+    """
+
+    Tests whether a template file is parsed once per process and reloaded from the disk cache after
+    the in-process cache is cleared, and whether a changed file is parsed again
+
+    """
+    filename = _write_templates(tmp_path)
+    templatefile._parsed_files.clear()
+    first = _template_file(filename)
+    second = _template_file(filename)
+    assert first._templates['inform'][0] is second._templates['inform'][0]
+    assert len(os.listdir(os.path.join(str(tmp_path), '__pycache__'))) == 1
+
+    templatefile._parsed_files.clear()
+    reloaded = _template_file(filename)
+    assert reloaded._templates['inform'][0] is not first._templates['inform'][0]
+    sys_act = SysAct(SysActionType.Inform, {'name': ['cake'], 'ease': ['easy']})
+    assert reloaded.create_message(sys_act) == first.create_message(sys_act) == 'cake: it is easy.'
+
+    with open(filename, 'a', encoding='utf8') as file:
+        file.write('template bad(): "Sorry?"\n')
+    changed = _template_file(filename)
+    assert changed.create_message(SysAct(SysActionType.Bad)) == 'Sorry?'
+    assert len(os.listdir(os.path.join(str(tmp_path), '__pycache__'))) == 2
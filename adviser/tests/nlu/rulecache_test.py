@@ -0,0 +1,105 @@
+import json
+import os
+import shutil
+import sys
+
+
+def get_root_dir():
+    return os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+sys.path.append(get_root_dir())
+from recipe_project.domain import RecipeDomain
+from services.nlu import rulecache
+from services.nlu.rulecache import load_rules, read_inform_patterns
+from services.nlu.rulematcher import PLACEHOLDER, SlotRules
+from tools.regextemplates import gen_regexes
+from tools.regextemplates.gen_regexes import create_rules_from_template
+
+RULE_FOLDER = os.path.join(get_root_dir(), 'resources', 'nlu_regexes')
+
+
+def _write_rules(folder, general_regex: dict, request_regex: dict, inform_regex: dict):
+    for filename, rules in (('GeneralRules.json', general_regex), ('recipesRequestRules.json', request_regex),
+                            ('recipesInformRules.json', inform_regex)):
+        with open(os.path.join(str(folder), filename), 'w', encoding='utf-8') as rule_file:
+            json.dump(rules, rule_file)
+
+
+def _add_rule(general_regex, request_regex, inform_regex):
+    inform_regex['ease']['any'] = '(any difficulty)'
+
+
+def test_rules_are_shared_and_cached_on_disk(tmp_path):
+    """
+
+    Tests whether the rules are built once per process, reloaded from the disk cache with the same
+    matches and rebuilt when a source file changes
+
+    """
+    domain = RecipeDomain(in_memory=True)
+    _write_rules(tmp_path, {'hello': '(^hi$)'}, {'ease': '(how difficult)'}, {'ease': {'easy': '(easy)'}})
+    rulecache._rule_sets.clear()
+    rules = load_rules(domain, str(tmp_path), extend=_add_rule)
+    assert load_rules(domain, str(tmp_path), extend=_add_rule) is rules
+    assert rules.inform_regex['ease'] == {'easy': '(easy)', 'any': '(any difficulty)'}
+    assert load_rules(domain, str(tmp_path)) is not rules
+
+    rulecache._rule_sets.clear()
+    reloaded = load_rules(domain, str(tmp_path), extend=_add_rule)
+    assert reloaded is not rules
+    assert reloaded.inform_regex == rules.inform_regex
+    assert list(reloaded.matcher.match_general('hi')) == ['hello']
+    assert reloaded.matcher.match_request('ease', 'how difficult is it?')
+    assert list(reloaded.matcher.match_inform('ease', 'something easy of any difficulty')) == ['easy', 'any']
+
+    _write_rules(tmp_path, {'hello': '(^hello$)'}, {'ease': '(how difficult)'}, {'ease': {'easy': '(easy)'}})
+    changed = load_rules(domain, str(tmp_path), extend=_add_rule)
+    assert list(changed.matcher.match_general('hello')) == ['hello']
+    assert len(os.listdir(os.path.join(str(tmp_path), '__pycache__'))) == 3
+
+
+def test_rules_generated_from_nlu_file(tmp_path):
+    """
+
+    Tests whether the rules generated from the .nlu file equal the rule files generated offline
+
+    """
+    domain = RecipeDomain(in_memory=True)
+    for filename in ('GeneralRules.json', 'recipes.nlu'):
+        shutil.copy(os.path.join(RULE_FOLDER, filename), str(tmp_path))
+    rules = load_rules(domain, str(tmp_path), disk_cache=False)
+    with open(os.path.join(RULE_FOLDER, 'recipesRequestRules.json'), encoding='utf-8') as rule_file:
+        assert rules.request_regex == json.load(rule_file)
+    patterns = read_inform_patterns(os.path.join(RULE_FOLDER, 'recipesInformPatterns.json'))[1]
+    assert rules.inform_regex == patterns
+    # values are sorted like the keys of the expanded rules, so matched values keep their order
+    for slot, slot_rules in rules.inform_regex.items():
+        assert slot_rules.values == sorted(slot_rules.values) == patterns[slot].values
+    assert rules.inform_regex['ease']['Easy'] == rules.inform_regex['ease'].pattern.replace(PLACEHOLDER, 'Easy')
+
+
+def test_inform_rules_updated_incrementally(monkeypatch):
+    """
+
+    Tests whether only the rules of values missing in previously generated inform rules are generated
+    and whether the updated rules equal fully generated ones
+
+    """
+    domain = RecipeDomain(in_memory=True)
+    nlu_file = os.path.join(RULE_FOLDER, 'recipes.nlu')
+    full = create_rules_from_template(domain, nlu_file)[1]
+    previous = {slot: SlotRules(rules.pattern, rules.values, rules.exceptions) for slot, rules in full.items()}
+    del previous['ease']['Easy']
+    previous['ease']['impossible'] = previous['ease'].pattern.replace(PLACEHOLDER, 'impossible')
+
+    generated = []
+    create_regex = gen_regexes.RegexFile.create_regex
+    def _create_regex(self, user_act):
+        if user_act.value is not None:  # inform act
+            generated.append((user_act.slot, user_act.value))
+        return create_regex(self, user_act)
+    monkeypatch.setattr(gen_regexes.RegexFile, 'create_regex', _create_regex)
+    updated = create_rules_from_template(domain, nlu_file, previous)[1]
+    assert generated == [('ease', 'Easy')]
+    assert updated == full
+    assert 'impossible' not in updated['ease']
@@ -0,0 +1,122 @@
+import os
+import sys
+import re
+import pytest
+
+
+def get_root_dir():
+    return os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+sys.path.append(get_root_dir())
+from services.nlu.rulematcher import SlotMatcher, RuleMatcher, PLACEHOLDER, _requires_placeholder
+
+
+TEMPLATE = "(I want to (cook|make) something with {0}|(what|which) recipes? can I use {0}s? for)"
+VALUES = ["Beans", "Bean Sprouts", "Chicken", "do"]
+
+
+def _legacy_match(value_regexes, utterance):
+    """ Per-value matching as done by the NLU modules before compiling the rules """
+    result = []
+    for value, regex in value_regexes.items():
+        match = re.search(regex, utterance, re.I)
+        if match is not None and any(group is not None for group in match.groups()):
+            result.append(value)
+    return result
+
+
+@pytest.fixture
+def value_regexes():
+    regexes = {value: TEMPLATE.format(value) for value in VALUES}
+    # rule whose value is a regex itself (like the RecipeNLU's unknown ingredient rule)
+    regexes['UNK'] = TEMPLATE.format("[^ ]+")
+    return regexes
+
+
+@pytest.mark.parametrize('utterance', [
+    "I want to cook something with beans",
+    "I want to make something with bean sprouts",
+    "which recipes can I use chickens for",
+    "I want to cook something with DO",
+    "I want to cook something with tofu",
+    "what should I cook today?",
+    "I want to cook something with crème fraîche",
+    ""])
+def test_slot_matcher_equals_per_value_matching(value_regexes, utterance):
+    """
+
+    Tests whether the compiled slot matcher finds exactly the values the per-value rules find,
+    in the same order
+
+    """
+    matcher = SlotMatcher(value_regexes)
+    assert list(matcher.match(utterance)) == _legacy_match(value_regexes, utterance)
+
+
+def test_slot_matcher_uses_literal_prefilter(value_regexes):
+    """
+
+    Tests whether plain values get a required literal, while regex values are always checked
+
+    """
+    matcher = SlotMatcher(value_regexes)
+    literals = {value: literal for value, _, literal in matcher.entries}
+    assert literals['Beans'] == 'beans'
+    assert literals['UNK'] is None
+    assert matcher.gate is not None
+
+
+# values which also occur in the text of the template (also inside "\\s" and "\\b")
+ESCAPED_TEMPLATE = "(\\bsomething (with|in)\\s+{0}\\b|in a {0} dish)"
+TEMPLATE_TEXT_VALUES = ["s", "a", "in", "b", "Chicken", "Easy", "Easy Peasy"]
+
+
+@pytest.mark.parametrize('utterance', [
+    "something with chicken",
+    "something in s",
+    "I'd like something in an easy peasy dish",
+    "in a b dish",
+    "something with bacon"])
+def test_slot_matcher_values_in_template_text(utterance):
+    """
+
+    Tests whether values occurring in the text of the template are only replaced where they were
+    inserted into the template
+
+    """
+    value_regexes = {value: ESCAPED_TEMPLATE.format(value) for value in TEMPLATE_TEXT_VALUES}
+    matcher = SlotMatcher(value_regexes)
+    assert {template for _, template, _ in matcher.entries} == {ESCAPED_TEMPLATE.format(PLACEHOLDER)}
+    assert list(matcher.match(utterance)) == _legacy_match(value_regexes, utterance)
+
+
+@pytest.mark.parametrize('template, expected', [
+    ("(a {0}|b {0})", True),
+    ("(a {0}|b)", False),
+    ("(a ({0})?)", False),
+    ("a {0}?", False),
+    ("a {0}s?", True),
+    ("(?:x|y) {0}", True),
+    ("[(]{0}", True),
+    ("(?=a){0}", True)])
+def test_requires_placeholder(template, expected):
+    """
+
+    Tests whether optional occurrences of a value are detected in rule templates
+
+    """
+    assert _requires_placeholder(template.format(PLACEHOLDER)) == expected
+
+
+def test_rule_matcher_general_and_request():
+    """
+
+    Tests whether general acts and requests are matched with the compiled rules
+
+    """
+    matcher = RuleMatcher({'hello': "(^hi$|^hello$)", 'bye': "(bye)"},
+                          {'name': "(what is (the|its) name)"}, {})
+    assert list(matcher.match_general("Hello")) == ['hello']
+    assert matcher.match_request('name', "what is its name?")
+    assert not matcher.match_request('name', "hello")
+    assert list(matcher.match_inform('name', "hello")) == []
@@ -0,0 +1,114 @@
+import os
+import sys
+
+import pytest
+
+torch = pytest.importorskip('torch')
+
+
+def get_root_dir():
+    return os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+sys.path.append(get_root_dir())
+from services.policy.rl.batched_training import BatchedSimulation
+from services.policy.rl.dqnpolicy import DQNPolicy
+from services.policy.rl.experience_buffer import UniformBuffer
+from services.session import current_session
+from services.stats.evaluation import PolicyEvaluator
+from utils import common
+from utils.domain.jsonlookupdomain import JSONLookupDomain
+from utils.logger import DiasysLogger
+
+STATE_DIM = 3
+
+
+def _store_sequentially(buffer, states, actions, rewards, final_reward):
+    """ Stores a dialog turn by turn, like the policy did before `store_dialog` """
+    for state, action, reward in zip(states, actions, rewards):
+        buffer.store(state, action, reward)
+    buffer.store(None, None, final_reward, terminal=True)
+
+
+def _assert_same_contents(buffer, reference):
+    assert len(buffer) == len(reference)
+    assert (buffer.write_pos, buffer.last_write_pos) == (reference.write_pos, reference.last_write_pos)
+    for memory in ('mem_state', 'mem_action', 'mem_reward', 'mem_next_state', 'mem_terminal'):
+        assert torch.allclose(getattr(buffer, memory)[:len(buffer)], getattr(reference, memory)[:len(reference)]), \
+            memory
+
+
+def test_store_dialog_equals_sequential_store():
+    """
+
+    Tests whether storing whole dialogs gives the same buffer contents as storing every turn
+    (including dialogs without transitions and wrapping around the end of the buffer)
+
+    """
+    common.init_random(0)
+    buffer = UniformBuffer(16, 4, STATE_DIM)
+    reference = UniformBuffer(16, 4, STATE_DIM)
+    for dialog in range(12):
+        num_turns = common.random.randint(1, 6)
+        states = [torch.rand(1, STATE_DIM) for _ in range(num_turns)]
+        actions = [common.random.randint(0, 9) for _ in range(num_turns)]
+        rewards = [-1.0] * num_turns
+        final_reward = 20.0 * (dialog % 2)
+        buffer.store_dialog(states, actions, rewards, final_reward)
+        _store_sequentially(reference, states, actions, rewards, final_reward)
+        _assert_same_contents(buffer, reference)
+    assert len(buffer) == 16
+
+
+def test_lockstep_dialogs_store_their_own_transitions():
+    """
+
+    Tests whether dialogs simulated in lockstep store the transitions and rewards of their own
+    turns, like dialogs run one after the other, and whether finished dialogs leave no state behind
+
+    """
+    common.init_random(0)
+    domain = JSONLookupDomain('recipes')
+    logger = DiasysLogger()
+    policy = DQNPolicy(domain, buffer_cls=UniformBuffer, replay_buffer_size=4096, batch_size=8,
+                       shared_layer_sizes=[16], value_layer_sizes=[16], advantage_layer_sizes=[16],
+                       logger=logger)
+    evaluator = PolicyEvaluator(domain, logger=logger)
+    simulation = BatchedSimulation(domain, policy, evaluator, num_envs=4, logger=logger)
+
+    # record the turns chosen for each dialog and the dialogs written to the buffer
+    turns, stored = {}, []
+    complete_turn, store_dialog = policy._complete_turn, policy.buffer.store_dialog
+
+    def record_turn(beliefstate, state_vector, action):
+        turns.setdefault(current_session(), []).append((state_vector.clone(), action))
+        return complete_turn(beliefstate, state_vector, action)
+
+    def record_dialog(states, actions, rewards, final_reward):
+        stored.append((current_session(), states, actions, rewards, final_reward))
+        return store_dialog(states, actions, rewards, final_reward)
+
+    policy._complete_turn, policy.buffer.store_dialog = record_turn, record_dialog
+
+    policy.train()
+    evaluator.train()
+    evaluator.start_epoch()
+    simulation.run_dialogs(12)
+
+    # all dialogs with a turn chosen by the DQN were stored, more than one batch of them
+    assert {session_id for session_id, *_ in stored} == set(turns)
+    assert len(stored) > 4
+    reference = UniformBuffer(4096, 8, policy.state_dim)
+    for session_id, states, actions, rewards, final_reward in stored:
+        # the transitions of each dialog are its own turns, in order
+        assert actions == [action for _, action in turns[session_id]]
+        assert all(torch.equal(state, turn_state) for state, (turn_state, _) in zip(states, turns[session_id]))
+        assert rewards == [policy.evaluator.get_turn_reward()] * len(actions)
+        _store_sequentially(reference, states, actions, rewards, final_reward)
+    _assert_same_contents(policy.buffer, reference)
+
+    # ended sessions are dropped from all services
+    for service in [policy, evaluator] + [service for env in simulation.envs for service in (env.user, env.bst)]:
+        assert set(service.__dict__.get('_session_states', {})) <= {None}
+        assert all(not pending for pending in service._pending_values.values())
+        assert not service._delta_encoder._streams
+    assert all(env.session_id is None for env in simulation.envs)
@@ -0,0 +1,105 @@
+import os
+import sys
+
+import pytest
+
+torch = pytest.importorskip('torch')
+
+
+def get_root_dir():
+    return os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+sys.path.append(get_root_dir())
+from services.policy.rl.featurizer import BeliefStateFeaturizer
+from utils.beliefstate import BeliefState
+from utils.domain.jsonlookupdomain import JSONLookupDomain
+from utils.useract import UserActionType
+
+
+def _previous_beliefstate_dict_to_vector(domain, beliefstate, sys_state):
+    """ The featurization of RLPolicy.beliefstate_dict_to_vector before the featurizer """
+    belief_vec = []
+    belief_vec += [1 if act in beliefstate['user_acts'] else 0 for act in UserActionType]
+    belief_vec.append(1 if sum(belief_vec) == 0 else 1)
+    for slot in sorted(domain.get_informable_slots()):
+        values = domain.get_possible_values(slot) + ["dontcare"]
+        if slot not in beliefstate['informs']:
+            belief_vec.append(1.0)
+            belief_vec += [0 for i in range(len(values))]
+        else:
+            belief_vec.append(0.0)
+            bs_slot = beliefstate['informs'][slot]
+            belief_vec += [bs_slot[value] if value in bs_slot else 0.0 for value in values]
+    for slot in sorted(domain.get_requestable_slots()):
+        belief_vec.append(1.0 if slot in beliefstate['requests'] else 0.0)
+    belief_vec.append(float(sys_state['lastActionInformNone']))
+    belief_vec.append(float(sys_state['offerHappened']))
+    candidate_count = beliefstate['num_matches']
+    belief_vec.append(float(candidate_count == 0))
+    belief_vec.append(float(candidate_count == 1))
+    belief_vec.append(float(2 <= candidate_count <= 4))
+    belief_vec.append(float(candidate_count > 4))
+    belief_vec.append(float(beliefstate["discriminable"]))
+    return torch.tensor([belief_vec], dtype=torch.float)
+
+
+def _beliefstates(domain):
+    """ Yields belief states and policy states covering all features """
+    bs = BeliefState(domain)
+    yield bs, {'lastActionInformNone': False, 'offerHappened': False}
+
+    bs = BeliefState(domain)
+    bs['user_acts'] = {UserActionType.Inform, UserActionType.Request}
+    bs['informs'] = {'ease': {'Easy': 0.8, 'Hard': 0.1}, 'type': {'dontcare': 1.0},
+                     'rating': {'unknown value': 0.5}, 'unknown slot': {'x': 1.0}}
+    bs['requests'] = {'name': 1.0, 'page': 1.0, 'unknown slot': 1.0}
+    bs['num_matches'] = 1
+    bs['discriminable'] = False
+    yield bs, {'lastActionInformNone': True, 'offerHappened': False}
+
+    bs = BeliefState(domain)
+    bs['user_acts'] = {UserActionType.Bye}
+    bs['informs'] = {'ingredients': {'Apple': 0.6, 'Bacon': 0.3}, 'prep_time': {'10': 1.0}}
+    bs['num_matches'] = 3
+    bs['discriminable'] = True
+    yield bs, {'lastActionInformNone': False, 'offerHappened': True}
+
+    bs = BeliefState(domain)
+    bs['user_acts'] = set(UserActionType)
+    bs['informs'] = {slot: {'dontcare': 0.2} for slot in domain.get_informable_slots()}
+    bs['requests'] = {slot: 1.0 for slot in domain.get_requestable_slots()}
+    bs['num_matches'] = 12
+    yield bs, {'lastActionInformNone': True, 'offerHappened': True}
+
+
+def test_featurize_equals_previous_featurization():
+    """
+
+    Tests whether single belief states are featurized like by the previous featurization
+
+    """
+    domain = JSONLookupDomain('recipes')
+    featurizer = BeliefStateFeaturizer(domain)
+    for beliefstate, sys_state in _beliefstates(domain):
+        expected = _previous_beliefstate_dict_to_vector(domain, beliefstate, sys_state)
+        state = featurizer.featurize(beliefstate, sys_state)
+        assert state.shape == (1, featurizer.state_dim)
+        assert torch.equal(state, expected)
+
+
+def test_featurize_batch_equals_single_featurization():
+    """
+
+    Tests whether a batch holds the featurization of each belief state in its row
+
+    """
+    domain = JSONLookupDomain('recipes')
+    featurizer = BeliefStateFeaturizer(domain)
+    beliefstates, sys_states = zip(*_beliefstates(domain))
+    batch = featurizer.featurize_batch(list(beliefstates), list(sys_states))
+    assert batch.shape == (len(beliefstates), featurizer.state_dim)
+    for row, (beliefstate, sys_state) in enumerate(zip(beliefstates, sys_states)):
+        assert torch.equal(batch[row:row + 1], _previous_beliefstate_dict_to_vector(domain, beliefstate, sys_state))
+    # the template isn't changed by featurizing
+    assert torch.equal(featurizer.featurize_batch([beliefstates[0]], [sys_states[0]]),
+                       featurizer.featurize(beliefstates[0], sys_states[0]))
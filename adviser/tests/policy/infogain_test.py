@@ -0,0 +1,38 @@
+import math
+import os
+import sys
+
+
+def get_root_dir():
+    return os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+sys.path.append(get_root_dir())
+from services.policy.infogain import expected_information_gain, most_informative_slot
+
+
+def test_expected_information_gain():
+    """
+
+    Tests whether the expected information gain of a slot is the entropy of its values among the
+    candidates, for slots with any number of values
+
+    """
+    value_counts = {'binary': {'yes': 2, 'no': 2}, 'three': {'a': 4, 'b': 2, 'c': 2},
+                    'single': {'x': 8}, 'skewed': {'yes': 7, 'no': 1}}
+    gains = expected_information_gain(value_counts, ['binary', 'three', 'single', 'skewed', 'missing'])
+    expected = [1.0, 1.5, 0.0, -(7 / 8 * math.log2(7 / 8) + 1 / 8 * math.log2(1 / 8)), 0.0]
+    assert all(abs(gain - value) < 1e-9 for gain, value in zip(gains, expected))
+
+
+def test_most_informative_slot():
+    """
+
+    Tests whether the slot splitting the candidates best is chosen, regardless of the number of
+    its values, and whether no slot is chosen if no slot splits the candidates
+
+    """
+    value_counts = {'skewed': {'a': 9, 'b': 1, 'c': 1}, 'even': {'yes': 5, 'no': 6}, 'single': {'x': 11}}
+    assert most_informative_slot(value_counts, ['skewed', 'even', 'single']) == 'even'
+    assert most_informative_slot(value_counts, ['skewed', 'single']) == 'skewed'
+    assert most_informative_slot(value_counts, ['single']) == ''
+    assert most_informative_slot(value_counts, []) == ''
@@ -1,5 +1,7 @@
 import os
 import sys
+from collections import Counter
+
 import pytest
 
 def get_root_dir():
@@ -10,6 +12,11 @@ sys.path.append(get_root_dir())
 from utils import SysAct, SysActionType, UserActionType
 
 
+def value_counts(temp):
+    """ Converts the values of each slot in a result set to the value counts used by the policy """
+    return {slot: Counter(values) for slot, values in temp.items()}
+
+
 def execute_choose_sys_act(policy, beliefstate):
     """
     Tests the return value of the choose_sys_act method and makes sure that the return value is
@@ -667,7 +674,7 @@ def test_gen_next_request_with_non_binary_slots(policy, beliefstate):
         temp = {system_requestable[0]: ['foo', 'bar']}
         temp.update({slot: ['foo'] for slot in system_requestable[1:]})
         beliefstate['informs'] = {}
-        slot = policy._gen_next_request(temp, beliefstate)
+        slot = policy._gen_next_request(value_counts(temp), beliefstate)
         assert slot != ""
         assert slot == system_requestable[0]
 
@@ -685,7 +692,7 @@ def test_gen_next_request_with_non_binary_slot_with_one_value(policy, beliefstat
     temp = {slot: ['foo'] if len(policy.domain.get_possible_values(slot)) != 2  else []
             for slot in system_requestable}
     beliefstate['informs'] = {}
-    slot = policy._gen_next_request(temp, beliefstate)
+    slot = policy._gen_next_request(value_counts(temp), beliefstate)
     assert slot == ""
 
 
@@ -707,7 +714,7 @@ def test_gen_next_request_with_binary_slots(policy, beliefstate):
         temp = {bin_slot: [val1] * 3 + [val2] * 4}
         temp.update({slot: [] for slot in system_requestable if slot != bin_slot})
         beliefstate['informs'] = {}
-        slot = policy._gen_next_request(temp, beliefstate)
+        slot = policy._gen_next_request(value_counts(temp), beliefstate)
         assert slot != ""
         assert slot == bin_slot
 
@@ -733,7 +740,7 @@ def test_highest_info_gain_with_difference_between_slots(policy, constraint_bina
             constraint_binaryB['slot']: [val1B] + [val2B] * 5
         }
         bin_slots = [constraint_binaryA['slot'], constraint_binaryB['slot']]
-        slot = policy._highest_info_gain(bin_slots, temp)
+        slot = policy._highest_info_gain(bin_slots, value_counts(temp))
         assert slot != ""
         assert slot == constraint_binaryA['slot']
 
@@ -757,7 +764,7 @@ constraint_binaryB):
             constraint_binaryB['slot']: [constraint_binaryB['value']]
         }
         bin_slots = [constraint_binaryA['slot'], constraint_binaryB['slot']]
-        slot = policy._highest_info_gain(bin_slots, temp)
+        slot = policy._highest_info_gain(bin_slots, value_counts(temp))
         assert slot == ""
 
 
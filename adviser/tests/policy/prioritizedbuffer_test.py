@@ -0,0 +1,130 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip('torch')
+
+
+def get_root_dir():
+    return os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+sys.path.append(get_root_dir())
+from services.policy.rl.experience_buffer import PrioritizedBuffer
+from utils import common
+
+STATE_DIM = 3
+
+
+def _states(first: int, num: int):
+    """ Returns num distinguishable state tensors """
+    return [torch.full((1, STATE_DIM), float(first + turn)) for turn in range(num)]
+
+
+def _buffer(buffer_size: int = 4, batch_size: int = 4, **kwargs):
+    """ Returns a buffer filled with one dialog of buffer_size transitions """
+    kwargs.setdefault('sample_last_transition', False)
+    kwargs.setdefault('regularisation', 0.0)
+    kwargs.setdefault('exponent', 1.0)
+    buffer = PrioritizedBuffer(buffer_size, batch_size, STATE_DIM, **kwargs)
+    buffer.store_dialog(_states(0, buffer_size + 1), list(range(buffer_size + 1)), [0.0] * (buffer_size + 1), 20.0)
+    return buffer
+
+
+def test_sampling_frequency_follows_priorities():
+    """
+
+    Tests whether transitions are sampled in proportion to their priorities
+
+    """
+    common.numpy.random.seed(0)
+    priorities = np.arange(1.0, 11.0)
+    buffer = _buffer(buffer_size=10, batch_size=10)
+    buffer.update_batch(list(range(10)), priorities)
+    counts = np.zeros(10)
+    for _ in range(200):
+        indices = buffer.sample()[5]
+        np.add.at(counts, indices.numpy(), 1)
+    assert np.allclose(counts / counts.sum(), priorities / priorities.sum(), atol=0.01)
+
+    # without exponent, sampling is uniform; the most recent transition is always sampled
+    buffer = _buffer(buffer_size=10, batch_size=10, exponent=0.0, sample_last_transition=True)
+    buffer.update_batch(list(range(10)), priorities)
+    counts = np.zeros(10)
+    for _ in range(200):
+        indices = buffer.sample()[5]
+        assert indices[0] == buffer.last_write_pos
+        np.add.at(counts, indices[1:].numpy(), 1)
+    assert np.allclose(counts / counts.sum(), [0.1] * 10, atol=0.01)
+
+
+def test_importance_weights_and_beta_annealing():
+    """
+
+    Tests whether the importance weights are normalized to a maximum of 1 and whether beta grows
+    linearly to 1 with the number of sampled batches
+
+    """
+    common.numpy.random.seed(0)
+    buffer = _buffer(beta=0.4, beta_annealing_steps=4)
+    buffer.update_batch([0, 1, 2, 3], [1.0, 2.0, 3.0, 4.0])
+    betas = []
+    for _ in range(6):
+        beta = buffer.beta
+        betas.append(beta)
+        indices, weights = buffer.sample()[5:]
+        assert weights.shape == (4, 1)
+        probabilities = (indices.numpy() + 1) / 10.0
+        expected = (len(buffer) * probabilities) ** -beta
+        assert np.allclose(weights.view(-1).numpy(), expected / expected.max(), atol=1e-6)
+        assert float(weights.max()) == pytest.approx(1.0)
+    assert np.allclose(betas, [0.4, 0.55, 0.7, 0.85, 1.0, 1.0])
+    assert buffer.sample_count == 6
+
+
+def test_update_batch():
+    """
+
+    Tests whether batched updates set the priorities of transitions (given as tensors or lists),
+    and whether new transitions get the largest priority so far
+
+    """
+    buffer = _buffer(buffer_size=6, exponent=0.5, regularisation=0.01)
+    buffer.update_batch(torch.tensor([0, 2, 4]), torch.tensor([3.99, -0.99, 0.0]))
+    buffer.update(5, 0.24)
+    expected = [2.0, 1.0, 1.0, 1.0, 0.1, 0.5]
+    assert np.allclose(buffer.tree[np.arange(6)], expected)
+    assert buffer.tree.total() == pytest.approx(sum(expected))
+    assert buffer.max_p == pytest.approx(2.0)
+
+    # newly stored transitions overwrite the oldest ones with the largest priority
+    buffer.store_dialog(_states(10, 3), [1, 2, 3], [0.0, 0.0, 0.0], 0.0)
+    assert np.allclose(buffer.tree[np.arange(6)], [2.0, 2.0, 1.0, 1.0, 0.1, 0.5])
+
+
+def test_store_dialog():
+    """
+
+    Tests whether the transitions of a dialog are stored in order (wrapping around the end of the
+    buffer) with maximum priority
+
+    """
+    buffer = PrioritizedBuffer(5, 2, STATE_DIM, sample_last_transition=False)
+    positions = buffer.store_dialog(_states(0, 4), [0, 1, 2, 3], [-1.0, -1.0, -1.0, -1.0], 20.0)
+    assert positions.tolist() == [0, 1, 2]
+    positions = buffer.store_dialog(_states(10, 4), [4, 5, 6, 7], [-1.0, -1.0, -1.0, -1.0], 0.0)
+    assert positions.tolist() == [3, 4, 0]
+    assert len(buffer) == 5
+    assert buffer.write_pos == 1 and buffer.last_write_pos == 0
+
+    assert buffer.mem_state[:, 0].tolist() == [12.0, 1.0, 2.0, 10.0, 11.0]
+    assert buffer.mem_next_state[:, 0].tolist() == [13.0, 2.0, 3.0, 11.0, 12.0]
+    assert buffer.mem_action[:, 0].tolist() == [6, 1, 2, 4, 5]
+    assert buffer.mem_terminal[:, 0].tolist() == [1.0, 0.0, 1.0, 0.0, 0.0]
+    assert np.allclose(buffer.mem_reward[:, 0].numpy(), [-0.05, -0.05, 0.95, -0.05, -0.05])
+    assert np.allclose(buffer.tree[np.arange(5)], buffer.max_p)
+
+    # dialogs without transitions leave the buffer alone
+    assert buffer.store_dialog(_states(20, 1), [0], [0.0], 20.0).tolist() == []
+    assert len(buffer) == 5 and buffer.write_pos == 1
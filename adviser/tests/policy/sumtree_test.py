@@ -0,0 +1,52 @@
+import os
+import sys
+
+import numpy as np
+
+
+def get_root_dir():
+    return os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+sys.path.append(get_root_dir())
+from services.policy.rl.sum_tree import SumTree
+
+
+def test_update_keeps_sums():
+    """
+
+    Tests whether the total priority follows single and batched updates (including repeated indices)
+
+    """
+    tree = SumTree(5)
+    tree.update(0, 1.0)
+    tree.update([1, 2, 4], [2.0, 3.0, 4.0])
+    assert tree.total() == 10.0
+    tree.update([2, 2], [0.5, 1.5])
+    assert tree.total() == 8.5
+    assert list(tree[[0, 1, 2, 3, 4]]) == [1.0, 2.0, 1.5, 0.0, 4.0]
+
+
+def test_find_uses_cumulative_priorities():
+    """
+
+    Tests whether find returns the item whose priority interval contains each value and skips
+    items with priority 0
+
+    """
+    tree = SumTree(6)
+    tree.update([0, 1, 3, 5], [1.0, 2.0, 3.0, 4.0])
+    found = tree.find([0.0, 0.99, 1.0, 2.99, 3.0, 5.99, 6.0, 9.99])
+    assert list(found) == [0, 0, 1, 1, 3, 3, 5, 5]
+
+
+def test_stratified_sampling_follows_priorities():
+    """
+
+    Tests whether stratified samples are distributed proportional to the priorities
+
+    """
+    tree = SumTree(4)
+    tree.update([0, 1, 2, 3], [1.0, 1.0, 2.0, 0.0])
+    samples = tree.sample_stratified(4000, random_state=np.random.RandomState(0))
+    counts = np.bincount(samples, minlength=4)
+    assert list(counts) == [1000, 1000, 2000, 0]
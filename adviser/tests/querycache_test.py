@@ -0,0 +1,107 @@
+import json
+import os
+import pickle
+import sqlite3
+import sys
+import threading
+
+import pytest
+
+
+def get_root_dir():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.append(get_root_dir())
+from utils.domain.jsonlookupdomain import JSONLookupDomain
+from utils.domain.querycache import QueryCache
+
+
+def _toys_domain(folder, **kwargs) -> JSONLookupDomain:
+    db_file = os.path.join(str(folder), 'toys.db')
+    with sqlite3.connect(db_file) as db:
+        db.execute('CREATE TABLE toys (name TEXT, color TEXT, size TEXT)')
+        db.executemany('INSERT INTO toys VALUES (?, ?, ?)',
+                       [('ball', 'red', 'small'), ('kite', 'blue', 'large'), ('drum', 'red', 'large')])
+    ontology = {'key': 'name', 'requestable': ['color', 'size'], 'system_requestable': ['color'],
+                'informable': {'color': ['red', 'blue'], 'size': ['small', 'large']}}
+    ontology_file = os.path.join(str(folder), 'toys.json')
+    with open(ontology_file, 'w') as file:
+        json.dump(ontology, file)
+    return JSONLookupDomain('toys', json_ontology_file=ontology_file, sqllite_db_file=db_file, **kwargs)
+
+
+def test_lru_eviction_and_counters():
+    """
+
+    Tests whether the least recently used result is dropped once the cache is full and whether
+    hits and misses are counted
+
+    """
+    cache = QueryCache(max_size=2)
+    queries = []
+    def lookup(key):
+        return cache.get(key, lambda: queries.append(key) or [{'key': key}])
+
+    assert lookup('a')[0]['key'] == 'a'
+    lookup('b')
+    assert lookup('a') is lookup('a')
+    lookup('c')  # drops b, the least recently used result
+    lookup('b')
+    assert queries == ['a', 'b', 'c', 'b']
+    assert (cache.hits, cache.misses, len(cache)) == (2, 4, 2)
+    assert cache.hit_rate == pytest.approx(2 / 6)
+
+
+def test_concurrent_lookups():
+    """
+
+    Tests whether threads sharing a cache neither corrupt it nor lose counted lookups
+
+    """
+    cache = QueryCache(max_size=8)
+    errors = []
+
+    def look_up_keys(offset):
+        try:
+            for i in range(2000):
+                key = (i + offset) % 16
+                assert cache.get(key, lambda: [{'key': key}])[0]['key'] == key
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=look_up_keys, args=(offset,)) for offset in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert cache.hits + cache.misses == 8 * 2000
+    assert len(cache) == 8
+
+
+def test_domain_lookups_are_cached(tmp_path):
+    """
+
+    Tests whether equal lookups share one result of read-only rows, whether the result is the same
+    as without the cache and whether writes through the domain invalidate it
+
+    """
+    domain = _toys_domain(tmp_path)
+    (tmp_path / 'uncached').mkdir()
+    uncached = _toys_domain(tmp_path / 'uncached', max_cached_queries=0)
+    red = domain.find_entities({'color': 'red', 'size': 'dontcare'}, ['size'])
+    assert domain.find_entities({'color': 'red'}, {'size': 1.0}.keys()) is red
+    assert [dict(row) for row in red] == [dict(row) for row in uncached.find_entities({'color': 'red'}, ['size'])]
+    assert sorted(row['name'] for row in red) == ['ball', 'drum']
+    with pytest.raises(TypeError):
+        red[0]['name'] = 'bell'
+    assert domain.find_info_about_entity('kite', ['size']) is domain.find_info_about_entity('kite', ['size'])
+    assert domain.query_cache.hits == 2
+    assert pickle.loads(pickle.dumps(red)) == red
+    # domains are sent along with belief states: the copy starts with an empty cache
+    assert len(pickle.loads(pickle.dumps(domain)).query_cache) == 0
+
+    domain.write_db("UPDATE toys SET color = 'blue' WHERE name = 'drum'")
+    assert [row['name'] for row in domain.find_entities({'color': 'red'}, ['size'])] == ['ball']
+    assert domain.find_info_about_entity('kite', ['size'])[0]['size'] == 'large'
+    assert uncached.query_cache.hits == 0 and len(uncached.query_cache) == 0
@@ -0,0 +1,363 @@
+import contextlib
+import gc
+import hashlib
+import os
+import pickle
+import sqlite3
+import sys
+import shutil
+import threading
+import pytest
+
+
+def get_root_dir():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.append(get_root_dir())
+from recipe_project.domain import RecipeDomain
+from recipe_project.models.recipe_req import RecipeReq
+from recipe_project.index import RecipeIndex
+
+
+@pytest.fixture
+def recipe_db_file(tmp_path):
+    """ Temporary copy of the recipe database, so tests don't change the real favorites """
+    db_file = str(tmp_path / 'recipes.db')
+    shutil.copy(os.path.join(get_root_dir(), 'resources', 'databases', 'recipes.db'), db_file)
+    return db_file
+
+
+@pytest.fixture
+def recipe_domain(recipe_db_file):
+    return RecipeDomain(sqllite_db_file=recipe_db_file)
+
+
+def test_favorites_survive_restart(recipe_db_file):
+    """
+
+    Tests whether favorites set in file mode are still there for a new domain instance
+
+    """
+    domain = RecipeDomain(sqllite_db_file=recipe_db_file)
+    domain.set_favorite('Pasta Salad')
+
+    restarted = RecipeDomain(sqllite_db_file=recipe_db_file)
+    assert [recipe.name for recipe in restarted.get_users_favs()] == ['Pasta Salad']
+
+    restarted.unset_favorite('Pasta Salad')
+    assert domain.get_users_favs() == []
+
+
+def test_file_mode_leaves_shipped_database_alone(recipe_db_file):
+    """
+
+    Tests whether the file mode prepares and writes to a working copy instead of the database
+    shipped with the domain
+
+    """
+    with open(recipe_db_file, 'rb') as db_file:
+        shipped = hashlib.sha1(db_file.read()).hexdigest()
+    domain = RecipeDomain(sqllite_db_file=recipe_db_file)
+    domain.set_favorite('Pasta Salad')
+    with open(recipe_db_file, 'rb') as db_file:
+        assert hashlib.sha1(db_file.read()).hexdigest() == shipped
+    assert not os.path.exists(recipe_db_file + '-wal')
+    assert os.path.exists(os.path.splitext(recipe_db_file)[0] + '.user.db')
+
+
+def test_wal_is_opt_in(recipe_db_file):
+    """
+
+    Tests whether only domains asking for it switch their working copy to WAL journaling
+
+    """
+    working_db_file = os.path.splitext(recipe_db_file)[0] + '.user.db'
+    RecipeDomain(sqllite_db_file=recipe_db_file)
+    with contextlib.closing(sqlite3.connect(working_db_file)) as db:
+        assert db.execute("PRAGMA journal_mode").fetchone()[0] == 'delete'
+    # the journal mode can't be changed while other connections are open
+    gc.collect()
+    domain = RecipeDomain(sqllite_db_file=recipe_db_file, wal=True)
+    domain.set_favorite('Pasta Salad')
+    assert domain.query_db("PRAGMA journal_mode")[0]['journal_mode'] == 'wal'
+    assert os.path.exists(working_db_file + '-wal') and not os.path.exists(recipe_db_file + '-wal')
+    with sqlite3.connect(recipe_db_file) as db:
+        assert db.execute("PRAGMA journal_mode").fetchone()[0] == 'delete'
+
+
+def test_derived_data_of_added_recipes(recipe_db_file):
+    """
+
+    Tests whether typed columns and ingredient rows are filled in for recipes added to a prepared
+    database
+
+    """
+    working_db_file = os.path.splitext(recipe_db_file)[0] + '.user.db'
+    RecipeDomain(sqllite_db_file=recipe_db_file)
+    with sqlite3.connect(working_db_file) as db:
+        db.execute("INSERT INTO recipes (name, rating, prep_time, ingredients) "
+                   "VALUES ('Buttered Toast', '4', '5', 'Bread, Butter')")
+    domain = RecipeDomain(sqllite_db_file=recipe_db_file)
+    toast = domain.query_db("SELECT rowid AS id, rating_value, prep_minutes FROM recipes "
+                            "WHERE name = 'Buttered Toast'")[0]
+    assert (toast['rating_value'], toast['prep_minutes']) == (4, 5)
+    rows = domain.query_db("SELECT ingredient FROM recipe_ingredients WHERE recipe_id = ?", (toast['id'],))
+    assert sorted(row['ingredient'] for row in rows) == ['Bread', 'Butter']
+
+
+def test_favorites_in_memory_are_not_persisted(recipe_db_file):
+    """
+
+    Tests whether favorites set on an in-memory copy don't reach the database file
+
+    """
+    domain = RecipeDomain(in_memory=True, sqllite_db_file=recipe_db_file)
+    domain.set_favorite('Pasta Salad')
+    assert [recipe.name for recipe in domain.get_users_favs()] == ['Pasta Salad']
+    assert RecipeDomain(sqllite_db_file=recipe_db_file).get_users_favs() == []
+
+
+def test_shared_memory_snapshot(recipe_db_file):
+    """
+
+    Tests whether in-memory domains with shared memory read one snapshot of the prepared database,
+    whether unpickled domains attach to it and whether a write only changes the writing domain
+
+    """
+    domain = RecipeDomain(in_memory=True, sqllite_db_file=recipe_db_file, shared_memory=True)
+    prefix, version = domain._shared_snapshot_path(recipe_db_file)
+    try:
+        assert os.path.exists(prefix + version)
+        copy = RecipeDomain(in_memory=True, sqllite_db_file=recipe_db_file)
+        assert domain.query_db("SELECT * FROM recipe_ingredients") == copy.query_db("SELECT * FROM recipe_ingredients")
+        unpickled = pickle.loads(pickle.dumps(domain))
+        assert len(unpickled.find_entities({})) == len(copy.find_entities({}))
+
+        unpickled.set_favorite('Pasta Salad')
+        assert [recipe.name for recipe in unpickled.get_users_favs()] == ['Pasta Salad']
+        assert domain.get_users_favs() == []
+        assert RecipeDomain(sqllite_db_file=recipe_db_file).get_users_favs() == []
+        # a change to the file leads to a new snapshot replacing the old one
+        with sqlite3.connect(recipe_db_file) as db:
+            db.execute("UPDATE recipes SET notes = 'changed' WHERE name = 'Pasta Salad'")
+        RecipeDomain(in_memory=True, sqllite_db_file=recipe_db_file, shared_memory=True)
+        assert not os.path.exists(prefix + version)
+    finally:
+        for snapshot in (prefix + domain._shared_snapshot_path(recipe_db_file)[1], prefix + version):
+            if os.path.exists(snapshot):
+                os.remove(snapshot)
+
+
+def test_favorite_names_are_not_interpreted_as_sql(recipe_domain):
+    """
+
+    Tests whether quotes in recipe names can't break the favorite statements
+
+    """
+    recipe_domain.set_favorite("x' OR '1'='1")
+    assert recipe_domain.get_users_favs() == []
+
+
+def test_ingredients_table(recipe_domain):
+    """
+
+    Tests whether the normalized ingredients table is created on startup
+
+    """
+    rows = recipe_domain.query_db("SELECT ingredient FROM recipe_ingredients r JOIN recipes ON "
+                                  "recipes.rowid = r.recipe_id WHERE recipes.name = 'Pasta Salad'")
+    assert sorted(row['ingredient'] for row in rows) == ['Kielbasa', 'Noodles']
+
+
+def test_find_recipes_by_ingredient_substring(recipe_domain):
+    """
+
+    Tests whether ingredients still match as substrings of the recipe's ingredients
+
+    """
+    req = RecipeReq()
+    req.ingredients = ['beans']
+    found = {recipe.name for recipe in recipe_domain.find_recipes(req)}
+    expected = {row['name'] for row in recipe_domain.query_db(
+        "SELECT name FROM recipes WHERE LOWER(ingredients) LIKE '%beans%'")}
+    assert found and found == expected
+
+
+def test_find_recipes_partial(recipe_domain):
+    """
+
+    Tests whether partial requests return the union of the single conditions
+
+    """
+    req = RecipeReq()
+    req.ingredients, req.ease, req.prep_time = ['Chicken'], 'easy', '20'
+    partial = {recipe.name for recipe in recipe_domain.find_recipes(req, partial=True)}
+    full = {recipe.name for recipe in recipe_domain.find_recipes(req)}
+    single = set()
+    for ingredients, ease, prep_time in ((['Chicken'], None, None), ([], 'easy', None), ([], None, '20')):
+        req.ingredients, req.ease, req.prep_time = ingredients, ease, prep_time
+        single |= {recipe.name for recipe in recipe_domain.find_recipes(req)}
+    assert full < partial == single
+
+
+def test_find_recipes_typed_columns(recipe_domain):
+    """
+
+    Tests whether rating and preparation time are compared as numbers
+
+    """
+    ratings = {row['name']: row['rating'] for row in recipe_domain.query_db("SELECT name, rating FROM recipes")}
+    req = RecipeReq()
+    req.rating = '4'
+    found = recipe_domain.find_recipes(req)
+    assert found and all(int(ratings[recipe.name]) >= 4 for recipe in found)
+    req.rating, req.prep_time = None, '100'
+    found = recipe_domain.find_recipes(req)
+    assert found and all(int(recipe.prep_time) <= 100 for recipe in found if recipe.prep_time != 'NULL')
+    assert '120' not in {recipe.prep_time for recipe in found}
+
+
+def test_find_recipes_quotes_in_values(recipe_domain):
+    """
+
+    Tests whether quotes in the request are matched literally instead of breaking the query
+
+    """
+    req = RecipeReq()
+    req.name = "Mom's Meatloaf' OR '1'='1"
+    assert recipe_domain.find_recipes(req) == []
+    req.name, req.ingredients = None, ["100%"]
+    assert recipe_domain.find_recipes(req) == []
+
+
+def test_find_recipes_exact_ease(recipe_domain):
+    """
+
+    Tests whether eases from the ontology match regardless of their case
+
+    """
+    req = RecipeReq()
+    req.ease = 'Average'
+    found = recipe_domain.find_recipes(req)
+    assert found and all(recipe.ease == 'Average' for recipe in found)
+
+
+def test_count_recipes(recipe_domain):
+    """
+
+    Tests whether counting returns the number of recipes find_recipes would return
+
+    """
+    req = RecipeReq()
+    req.ingredients, req.ease = ['Chicken'], 'easy'
+    for partial in (False, True):
+        assert recipe_domain.count_recipes(req, partial) == len(recipe_domain.find_recipes(req, partial))
+    assert recipe_domain.count_recipes(RecipeReq()) == 0
+
+
+def test_matches_are_cached(recipe_domain):
+    """
+
+    Tests whether repeated requests (in any ingredient order) don't query the database again
+    and whether writes clear the cache
+
+    """
+    recipe_domain.get_index()
+    queries = []
+    query_db = recipe_domain.query_db
+    recipe_domain.query_db = lambda *args: queries.append(args) or query_db(*args)
+
+    req = RecipeReq()
+    req.ingredients = ['Chicken', 'Rice']
+    cnt = recipe_domain.count_recipes(req)
+    found = recipe_domain.find_recipes(req)
+    req.ingredients = ['Rice', 'Chicken']
+    assert recipe_domain.find_recipes(req) == found
+    assert recipe_domain.count_recipes(req) == cnt == len(found)
+    assert len(queries) == 1
+
+    recipe_domain.set_favorite(found[0].name)
+    recipe_domain.find_recipes(req)
+    assert len(queries) == 2
+
+
+def test_concurrent_cached_searches(recipe_db_file):
+    """
+
+    Tests whether threads searching one domain get correct results while the match caches are
+    filled, cleared once full and cleared by writes
+
+    """
+    domain = RecipeDomain(sqllite_db_file=recipe_db_file, max_cached_requests=2)
+    requests = []
+    for ingredient in ('Chicken', 'Rice', 'Egg', 'Tomato', 'Garlic'):
+        req = RecipeReq()
+        req.ingredients = [ingredient]
+        requests.append(req)
+    expected = [[recipe.name for recipe in domain.find_recipes(req)] for req in requests]
+    domain.clear_cache()
+    errors = []
+
+    def search(offset):
+        try:
+            for i in range(200):
+                position = (i + offset) % len(requests)
+                assert [recipe.name for recipe in domain.find_recipes(requests[position])] == expected[position]
+                assert domain.count_recipes(requests[position]) == len(expected[position])
+                if i % 50 == 0:
+                    domain.clear_cache()
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=search, args=(offset,)) for offset in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    # the lock isn't pickled, but the copy gets its own
+    assert pickle.loads(pickle.dumps(domain)).count_recipes(requests[0]) == len(expected[0])
+
+
+def test_index_matches_sql(recipe_db_file):
+    """
+
+    Tests whether searches on the RecipeIndex give the same results as the SQL conditions
+
+    """
+    indexed = RecipeDomain(sqllite_db_file=recipe_db_file, max_cached_requests=0, use_index=True)
+    sql = RecipeDomain(sqllite_db_file=recipe_db_file, max_cached_requests=0, use_index=False)
+    req = RecipeReq()
+    for ingredients, ease, rating, prep_time in ((['beans'], None, None, None),
+                                                 (['Chicken', 'rice'], 'easy', None, None),
+                                                 (['Noodles'], 'Average', '3', '30'),
+                                                 ([], 'not too hard', '0', '0'),
+                                                 (['100%_'], None, None, None)):
+        req.ingredients, req.ease, req.rating, req.prep_time = ingredients, ease, rating, prep_time
+        for partial in (False, True):
+            assert [r.name for r in indexed.find_recipes(req, partial)] == \
+                   [r.name for r in sql.find_recipes(req, partial)]
+            assert indexed.count_recipes(req, partial) == sql.count_recipes(req, partial)
+
+
+def test_index_bitsets():
+    """
+
+    Tests the RecipeIndex on a handful of recipes
+
+    """
+    def recipe(rowid, name, ease, rating, prep_time):
+        return {'rowid': rowid, 'name': name, 'ease': ease, 'cookbook': None, 'type': 'Main',
+                'rating_value': rating, 'prep_minutes': prep_time}
+    index = RecipeIndex(
+        [recipe(2, 'Chili', 'Easy', 5, 60), recipe(5, 'Soup', 'Hard', 3, 20), recipe(9, 'Salad', None, None, 0)],
+        [{'ingredient': 'Black Beans', 'recipe_ids': '2,5'}, {'ingredient': 'Lettuce', 'recipe_ids': '9,11'}])
+    req = RecipeReq()
+    req.ingredients = ['BEANS']
+    assert index.find(req) == [2, 5]
+    req.prep_time = '30'
+    assert index.find(req) == [5]
+    assert index.find(req, partial=True) == [2, 5, 9]
+    req.ingredients, req.prep_time, req.rating = ['lettuce'], None, '4'
+    assert index.find(req, partial=True) == [2, 9]
+    assert index.count(req) == 0
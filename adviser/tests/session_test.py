@@ -0,0 +1,254 @@
+import os
+import sys
+import threading
+import time
+
+
+def get_root_dir():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.append(get_root_dir())
+from services.codec import LocalCodec, OutOfBandCodec, PickleCodec, decode_frames, decode_message
+from services.service import DialogSystem, PublishSubscribe, Service
+from services.session import SessionAttribute, current_session, drop_session_state, session_context
+from utils.topics import Topic
+
+PORTS = {'sub_port': 65413, 'pub_port': 65414}
+
+
+class CountingService(Service):
+    """ Answers every utterance with the number of turns of the current dialog """
+
+    turns = SessionAttribute(default=0)
+
+    def __init__(self):
+        Service.__init__(self, **PORTS)
+
+    def dialog_start(self):
+        self.turns = 0
+
+    @PublishSubscribe(sub_topics=["user_utterance"], pub_topics=["sys_utterance", Topic.DIALOG_END])
+    def answer(self, user_utterance: str = None):
+        self.turns += 1
+        return {'sys_utterance': f"{user_utterance}:{self.turns}",
+                Topic.DIALOG_END: user_utterance == "bye"}
+
+
+class InputOutputService(Service):
+    """ Publishes user utterances and records system utterances per session """
+
+    def __init__(self):
+        Service.__init__(self, **PORTS)
+        self.received = {}
+        self.lock = threading.Lock()
+
+    @PublishSubscribe(pub_topics=["user_utterance"])
+    def say(self, text: str):
+        return {'user_utterance': text}
+
+    @PublishSubscribe(sub_topics=["sys_utterance"])
+    def record(self, sys_utterance: str = None):
+        with self.lock:
+            self.received.setdefault(current_session(), []).append(sys_utterance)
+
+
+def _wait_for(condition, timeout: float = 10.0):
+    end = time.time() + timeout
+    while not condition() and time.time() < end:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_session_attribute_without_sessions():
+    """
+
+    Tests whether session attributes behave like normal attributes outside of sessions
+
+    """
+    service = CountingService()
+    assert service.turns == 0
+    service.turns = 3
+    assert service.turns == 3
+    with session_context("a"):
+        assert service.turns == 0
+        service.turns = 1
+    assert service.turns == 3
+
+
+def test_sessions_keep_separate_state():
+    """
+
+    Tests whether a service handling several sessions keeps the state of each session apart
+
+    """
+    service = CountingService()
+    for utterance, session in (("hi", "a"), ("hi", "b"), ("again", "a")):
+        with session_context(session):
+            answer = service.answer(user_utterance=utterance)
+    assert answer == {'sys_utterance': "again:2", Topic.DIALOG_END: False}
+    with session_context("b"):
+        assert current_session() == "b"
+        assert service.turns == 1
+    assert current_session() is None
+
+    drop_session_state(service, "a")
+    with session_context("a"):
+        assert service.turns == 0
+
+
+def test_recipe_nlu_keeps_turn_state_per_session():
+    """
+
+    Tests whether the acts and slots the recipe NLU collects in a turn belong to the session of
+    the utterance
+
+    """
+    from recipe_project.domain import RecipeDomain
+    from recipe_project.nlu import RecipeNLU
+
+    nlu = RecipeNLU(RecipeDomain(in_memory=True))
+    with session_context("a"):
+        user_acts = nlu.extract_user_acts(user_utterance="I want to cook something easy")['user_acts']
+        assert user_acts and nlu.slots_informed
+    with session_context("b"):
+        assert nlu.user_acts == [] and nlu.slots_informed == set()
+    with session_context("a"):
+        assert nlu.user_acts == user_acts
+
+
+def test_codecs_carry_session_id():
+    """
+
+    Tests whether messages keep their session id on the bus and stay compatible without one
+
+    """
+    for codec in (PickleCodec(), OutOfBandCodec()):
+        frames = [b"topic"] + codec.encode(1.5, {'x': 1}, session_id="alice")
+        assert decode_message(frames) == (1.5, {'x': 1}, "alice")
+        assert decode_frames(frames) == (1.5, {'x': 1})
+        frames = [b"topic"] + codec.encode(2.0, "hello")
+        assert decode_message(frames) == (2.0, "hello", None)
+
+
+def test_concurrent_sessions():
+    """
+
+    Tests whether sessions running at the same time keep their own state and messages
+
+    """
+    io = InputOutputService()
+    counter = CountingService()
+    ds = DialogSystem(services=[io, counter], reg_port=65415, **PORTS)
+    try:
+        sessions = ["alice", "bob", "carol"]
+        for session in sessions:
+            ds.start_session(session, start_signals={})
+        assert ds.list_sessions() == set(sessions)
+
+        for turn in range(3):
+            for session in sessions:
+                with session_context(session):
+                    io.say(f"{session}{turn}")
+        assert _wait_for(lambda: all(len(io.received.get(s, [])) == 3 for s in sessions))
+        for session in sessions:
+            assert io.received[session] == [f"{session}{turn}:{turn + 1}" for turn in range(3)]
+
+        with session_context("bob"):
+            io.say("bye")
+        assert ds.wait_for_session_end() == "bob"
+        assert ds.list_sessions() == {"alice", "carol"}
+        assert "bob" not in counter._session_states
+
+        # a new session with the same id starts from scratch
+        ds.start_session("bob", start_signals={})
+        with session_context("bob"):
+            io.say("hi")
+        # the answer to "bye" is dropped if it arrives after the end of the session
+        assert _wait_for(lambda: io.received["bob"][-1] == "hi:1")
+    finally:
+        ds.shutdown()
+
+
+class SlowService(Service):
+    """ Remembers the system utterances of each session, waiting for `release` before handling one """
+
+    utterances = SessionAttribute(factory=lambda service: [])
+
+    def __init__(self):
+        Service.__init__(self, **PORTS)
+        self.handling = threading.Event()
+        self.release = threading.Event()
+        self.handled = threading.Event()
+
+    @PublishSubscribe(sub_topics=["sys_utterance"])
+    def remember(self, sys_utterance: str = None):
+        self.handling.set()
+        self.release.wait(10.0)
+        self.utterances = self.utterances + [sys_utterance]
+        self.handled.set()
+
+    @PublishSubscribe(sub_topics=["sys_utterance", "user_goal"])
+    def wait_for_goal(self, sys_utterance: str = None, user_goal: str = None):
+        pass
+
+
+def test_ended_sessions_leave_no_state():
+    """
+
+    Tests whether messages of a session which are delivered after its end don't create its state again
+
+    """
+    io = InputOutputService()
+    counter = CountingService()
+    slow = SlowService()
+    ds = DialogSystem(services=[io, counter, slow], reg_port=65415, **PORTS)
+    try:
+        ds.start_session("alice", start_signals={})
+        with session_context("alice"):
+            io.say("bye")
+        # the last system utterance is still handled while the session ends
+        assert slow.handling.wait(10.0)
+        assert ds.wait_for_session_end() == "alice"
+        slow.release.set()
+        assert slow.handled.wait(10.0)
+        # messages of the ended session are ignored
+        with session_context("alice"):
+            io.say("hello again")
+
+        def no_state_left():
+            return all("alice" not in service.__dict__.get('_session_states', {}) and
+                       all(not pending for pending in service._pending_values.values())
+                       for service in (io, counter, slow))
+        assert _wait_for(no_state_left)
+        time.sleep(0.2)
+        assert no_state_left()
+    finally:
+        ds.shutdown()
+
+
+def test_inproc_sessions():
+    """
+
+    Tests whether a dialog system running in one process passes messages by reference and keeps sessions apart
+
+    """
+    io = InputOutputService()
+    counter = CountingService()
+    ds = DialogSystem(services=[io, counter], reg_port=65415, protocol='inproc', **PORTS)
+    try:
+        assert isinstance(ds._codec, LocalCodec)
+        for session in ("alice", "bob"):
+            ds.start_session(session, start_signals={})
+        for turn in range(2):
+            for session in ("alice", "bob"):
+                with session_context(session):
+                    io.say(f"{session}{turn}")
+        assert _wait_for(lambda: all(len(io.received.get(s, [])) == 2 for s in ("alice", "bob")))
+        assert io.received["bob"] == ["bob0:1", "bob1:2"]
+
+        with session_context("alice"):
+            io.say("bye")
+        assert ds.wait_for_session_end() == "alice"
+        assert ds.list_sessions() == {"bob"}
+    finally:
+        ds.shutdown()
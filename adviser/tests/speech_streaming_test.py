@@ -0,0 +1,72 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+
+def get_root_dir():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.append(get_root_dir())
+# the speech services need torch and torchaudio
+pytest.importorskip('torchaudio')
+from services.hci.speech import SpeechInputFeatureExtractor, StreamingSpeechInputFeatureExtractor
+from services.hci.speech.streaming import UtteranceChunker
+
+SAMPLING_RATE = 16000
+BLOCK_SIZE = 1024
+
+
+def _recording(*parts):
+    """ Concatenates (seconds, loud) parts to a recording """
+    rng = np.random.RandomState(0)
+    return np.concatenate([rng.randint(-20000 if loud else -100, 20000 if loud else 100,
+                                       int(seconds * SAMPLING_RATE)).astype(np.int16)
+                           for seconds, loud in parts])
+
+
+def _chunks(recording):
+    chunker = UtteranceChunker(SAMPLING_RATE, BLOCK_SIZE, threshold=8000)
+    chunks = []
+    for offset in range(0, len(recording) - BLOCK_SIZE + 1, BLOCK_SIZE):
+        chunks += chunker.add_block(recording[offset:offset + BLOCK_SIZE])
+        if chunker.finished:
+            return chunks
+    return chunks + [chunker.end_utterance()]
+
+
+def test_chunks_end_with_speech():
+    """
+
+    Tests whether the chunks contain the recording until the end of speech, including short pauses
+    and silence before the user speaks again, and whether the end of speech and of the utterance
+    are marked
+
+    """
+    recording = _recording((0.5, False), (1.0, True), (0.2, False), (0.6, True), (1.0, False),
+                           (0.5, True), (3.5, False))
+    chunks = _chunks(recording)
+    assert [chunk for chunk in chunks if chunk.end_of_utterance] == [chunks[-1]]
+    assert len([chunk for chunk in chunks if chunk.end_of_speech]) == 2
+    streamed = np.concatenate([chunk.samples for chunk in chunks])
+    assert np.array_equal(streamed, recording[:len(streamed)])
+    # the recording ends 0.5 s of speech and less than 0.5 s of silence later
+    assert 3.8 * SAMPLING_RATE < len(streamed) < 4.3 * SAMPLING_RATE
+
+
+def test_streamed_features_equal_features_of_utterance():
+    """
+
+    Tests whether the features computed chunk by chunk are the features of the whole utterance
+
+    """
+    chunks = _chunks(_recording((0.3, False), (1.3, True), (3.2, False)))
+    streaming_extractor = StreamingSpeechInputFeatureExtractor()
+    streamed = [streaming_extractor.speech_chunks_to_features(chunks[start:start + 2])['speech_features_chunk']
+                for start in range(0, len(chunks), 2)]
+    assert streamed[-1].end_of_utterance and not any(chunk.end_of_utterance for chunk in streamed[:-1])
+
+    utterance = np.concatenate([chunk.samples for chunk in chunks])
+    expected = SpeechInputFeatureExtractor().speech_to_features((utterance, SAMPLING_RATE))['speech_features']
+    assert np.allclose(np.concatenate([chunk.features for chunk in streamed]), expected, atol=1e-4)
@@ -0,0 +1,55 @@
+import os
+import sys
+
+
+def get_root_dir():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.append(get_root_dir())
+from services.codec import PickleCodec
+from services.service import PublishSubscribe, Service, TopicRouter
+
+
+class ListeningService(Service):
+    @PublishSubscribe(sub_topics=['beliefstate'], queued_sub_topics=['user_acts'])
+    def listen(self, beliefstate=None, user_acts=None):
+        pass
+
+
+def test_route_longest_prefix():
+    """
+
+    Tests whether received topics are routed to the longest subscribed topic they start with
+
+    """
+    router = TopicRouter(['sys_act', 'sys_act_detail'], ['user_acts'])
+    assert router.num_arguments == 3
+    assert router.route('sys_act/recipes') == ('sys_act', False)
+    assert router.route('sys_act_detail/recipes') == ('sys_act_detail', False)
+    assert router.route('user_acts') == ('user_acts', True)
+    assert router.route('beliefstate/recipes') is None
+    # routes are remembered
+    assert router._routes['sys_act/recipes'] == ('sys_act', False)
+
+
+def test_collect_message_uses_router():
+    """
+
+    Tests whether a subscriber function gets its arguments once a message arrived for each topic
+
+    """
+    service = ListeningService()
+    router = TopicRouter(['beliefstate'], ['user_acts'])
+    pending = {}
+    service._begin_session("alice")
+
+    def frames(topic, content):
+        return [topic.encode('ascii')] + PickleCodec().encode(1.0, content, "alice")
+
+    assert service._collect_message(service.listen, pending, 'user_acts/recipes', frames('user_acts/recipes', 1), router) is None
+    assert service._collect_message(service.listen, pending, 'user_acts/recipes', frames('user_acts/recipes', 2), router) is None
+    session_id, values = service._collect_message(service.listen, pending, 'beliefstate/recipes',
+                                                  frames('beliefstate/recipes', 'bs'), router)
+    assert session_id == "alice"
+    assert values == {'user_acts': [1, 2], 'beliefstate': 'bs'}
+    assert pending == {}
@@ -0,0 +1,150 @@
+###############################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+"""
+Benchmark for the service runtimes: sends turns through a chain of services (like the
+NLU -> BST -> policy -> NLG pipeline) and reports turn latency and the number of threads of the
+process for the threaded `DialogSystem` and the `AsyncDialogSystem`.
+
+Usage: python tools/benchmarks/async_runtime.py [--services N] [--turns N] [--work MS]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+
+head_location = os.path.abspath(os.path.join(os.path.abspath(__file__), '..', '..', '..')) # main folder of adviser
+sys.path.append(head_location)
+
+import numpy as np
+
+from services.async_service import AsyncDialogSystem
+from services.service import DialogSystem, PublishSubscribe, Service
+from services.session import session_context
+
+
+def _thread_count() -> int:
+    """ Number of OS threads of this process (including zmq's I/O threads, if visible) """
+    if os.path.isdir('/proc/self/task'):
+        return len(os.listdir('/proc/self/task'))
+    return threading.active_count()
+
+
+def _busy(milliseconds: float):
+    end = time.perf_counter() + milliseconds / 1000
+    while time.perf_counter() < end:
+        pass
+
+
+def _stage(index: int, work: float, coroutine: bool, ports: dict) -> Service:
+    """ Creates a service forwarding `stage{index}` to `stage{index + 1}` after `work` ms of CPU time """
+    if coroutine:
+        async def forward(self, **values):
+            _busy(work)
+            return {f'stage{index + 1}': values[f'stage{index}']}
+    else:
+        def forward(self, **values):
+            _busy(work)
+            return {f'stage{index + 1}': values[f'stage{index}']}
+    forward.__name__ = 'forward'
+    stage_class = type(f'Stage{index}', (Service,), {
+        'forward': PublishSubscribe(sub_topics=[f'stage{index}'], pub_topics=[f'stage{index + 1}'])(forward)})
+    return stage_class(**ports)
+
+
+def _output(num_services: int, coroutine: bool, ports: dict) -> Service:
+    """ Creates the service publishing turns to the first stage and noticing when they leave the last one """
+    if coroutine:
+        async def receive(self, **values):
+            self.done.set()
+    else:
+        def receive(self, **values):
+            self.done.set()
+
+    def send(self, turn: int):
+        return {'stage0': turn}
+
+    output = type('Output', (Service,), {
+        'send': PublishSubscribe(pub_topics=['stage0'])(send),
+        'receive': PublishSubscribe(sub_topics=[f'stage{num_services}'])(receive)})(**ports)
+    output.done = asyncio.Event() if coroutine else threading.Event()
+    return output
+
+
+def _report(name: str, latencies: list, threads: int):
+    latencies = np.array(latencies) * 1000
+    print(f"{name:>26} {np.median(latencies):>9.3f} {np.percentile(latencies, 95):>9.3f} {threads:>8}")
+
+
+def threaded(num_services: int, num_turns: int, work: float):
+    ports = {'sub_port': 63013, 'pub_port': 63014}
+    stages = [_stage(index, work, False, ports) for index in range(num_services)]
+    output = _output(num_services, False, ports)
+    ds = DialogSystem(services=[output] + stages, reg_port=63015, **ports)
+    ds.start_session('benchmark', start_signals={})
+    latencies = []
+    for turn in range(num_turns):
+        output.done.clear()
+        start = time.perf_counter()
+        with session_context('benchmark'):
+            output.send(turn)
+        output.done.wait()
+        latencies.append(time.perf_counter() - start)
+    _report('DialogSystem', latencies, _thread_count())
+    ds.shutdown()
+
+
+async def asynchronous(num_services: int, num_turns: int, work: float, coroutine: bool):
+    ports = {'sub_port': 63023, 'pub_port': 63024}
+    stages = [_stage(index, work, coroutine, ports) for index in range(num_services)]
+    output = _output(num_services, True, ports)
+    async with AsyncDialogSystem(services=[output] + stages, **ports) as ds:
+        await ds.start_session('benchmark', start_signals={})
+        latencies = []
+        for turn in range(num_turns):
+            output.done.clear()
+            start = time.perf_counter()
+            with session_context('benchmark'):
+                output.send(turn)
+            await output.done.wait()
+            latencies.append(time.perf_counter() - start)
+        threads = _thread_count()
+    _report(f"AsyncDialogSystem ({'coroutines' if coroutine else 'executor'})", latencies, threads)
+
+
+def main(num_services: int, num_turns: int, work: float):
+    print(f"{num_services} services, {work} ms CPU time per service and turn")
+    print(f"{'runtime':>26} {'p50 [ms]':>9} {'p95 [ms]':>9} {'threads':>8}")
+    threaded(num_services, num_turns, work)
+    for coroutine in (False, True):
+        asyncio.run(asynchronous(num_services, num_turns, work, coroutine))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--services', type=int, default=7, help='number of services in the chain')
+    parser.add_argument('--turns', type=int, default=200, help='number of measured turns')
+    parser.add_argument('--work', type=float, default=0.5, help='CPU time per service and turn in ms')
+    args = parser.parse_args()
+    main(args.services, args.turns, args.work)
+    # the threaded dialog system's proxy process is only stopped on exit
+    os._exit(0)
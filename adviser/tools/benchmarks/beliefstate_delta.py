@@ -0,0 +1,101 @@
+###############################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+"""
+Benchmark for publishing belief states: runs simulated recipe dialogs (informs, requests and a
+chosen recipe, updated like the RecipeBST does) and reports the message size and the time for
+decoding a message (unpickling, plus applying the delta to the replica) per turn when the whole
+belief state is published and when only deltas are published (see `services.delta`).
+
+Usage: python tools/benchmarks/beliefstate_delta.py [--dialogs N] [--turns N] [--snapshots N]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+head_location = os.path.abspath(os.path.join(os.path.abspath(__file__), '..', '..', '..')) # main folder of adviser
+sys.path.append(head_location)
+
+from recipe_project.domain import RecipeDomain
+from recipe_project.models.recipe_req import RecipeReq
+from services.codec import PickleCodec, decode_message
+from services.delta import DeltaDecoder, DeltaEncoder
+from utils.beliefstate import BeliefState
+from utils.useract import UserActionType
+
+
+def _dialog(domain: RecipeDomain, ingredients: list, num_turns: int):
+    """ Yields the belief state of a simulated dialog after each turn """
+    bs = BeliefState(domain, history_window=None)
+    for turn in range(num_turns):
+        bs.start_new_turn()
+        bs['user_acts'] = {random.choice([UserActionType.Inform, UserActionType.Request])}
+        bs['requests'] = {}
+        if UserActionType.Inform in bs['user_acts']:
+            bs['informs'].setdefault('ingredients', {})[random.choice(ingredients)] = 1.0
+        else:
+            bs['requests']['prep_time'] = 1.0
+        bs['num_matches'] = domain.count_recipes(RecipeReq.from_informs(bs['informs']))
+        if turn % 8 == 4:
+            bs['chosen'] = domain.get_random()
+        yield bs
+
+
+def _measure(domain: RecipeDomain, num_dialogs: int, num_turns: int, mode: str, snapshot_interval: int):
+    random.seed(0)
+    ingredients = sorted(domain.get_all_ingredients())
+    codec = PickleCodec()
+    sizes, times = [], []
+    for dialog in range(num_dialogs):
+        encoder, decoder = DeltaEncoder(snapshot_interval), DeltaDecoder()
+        for bs in _dialog(domain, ingredients, num_turns):
+            if mode == 'window':
+                bs.history_window = 2
+            content = encoder.encode(None, 'beliefstate', bs) if mode == 'delta' else bs
+            frames = [b'beliefstate'] + codec.encode(0.0, content)
+            sizes.append(sum(len(frame) for frame in frames))
+            start = time.perf_counter()
+            content = decode_message(frames)[1]
+            if mode == 'delta':
+                decoder.decode(None, 'beliefstate', content)
+            times.append(time.perf_counter() - start)
+    return sum(sizes) / len(sizes), max(sizes), sum(times) / len(times) * 1e6
+
+
+def main(num_dialogs: int, num_turns: int, snapshot_interval: int):
+    # in memory: the benchmark must not change the database file
+    domain = RecipeDomain(in_memory=True)
+    print(f"{num_dialogs} dialogs with {num_turns} turns, snapshot every {snapshot_interval} messages")
+    print(f"{'published':>28} {'avg [bytes]':>12} {'max [bytes]':>12} {'decode [us]':>12}")
+    for mode, name in (('full', 'whole belief state'), ('window', 'whole, history window 2'),
+                       ('delta', 'deltas')):
+        avg_size, max_size, decode_time = _measure(domain, num_dialogs, num_turns, mode, snapshot_interval)
+        print(f"{name:>28} {avg_size:>12.0f} {max_size:>12} {decode_time:>12.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--dialogs', type=int, default=20, help='number of simulated dialogs')
+    parser.add_argument('--turns', type=int, default=25, help='turns per dialog')
+    parser.add_argument('--snapshots', type=int, default=10, help='snapshot interval of the delta mode')
+    args = parser.parse_args()
+    main(args.dialogs, args.turns, args.snapshots)
@@ -0,0 +1,105 @@
+###############################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+"""
+Microbenchmark for the message codecs of the pub/sub bus: sends audio- and frame-sized payloads
+over a zmq PUB/SUB connection and reports bytes on the wire and send-to-decoded latency per topic.
+
+Usage: python tools/benchmarks/bus_codec.py [--messages N] [--protocol tcp|ipc]
+"""
+
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+head_location = os.path.abspath(os.path.join(os.path.abspath(__file__), '..', '..', '..')) # main folder of adviser
+sys.path.append(head_location)
+
+import numpy as np
+import zmq
+
+from services.codec import OutOfBandCodec, PickleCodec, decode_frames, message_size
+
+
+def _payloads():
+    """ Message contents shaped like the ones published by the speech / video services """
+    rng = np.random.default_rng(0)
+    return {
+        # 5 s of 16 kHz audio from the SpeechRecorder
+        'speech_in': (rng.standard_normal(16000 * 5).astype(np.float32), 16000),
+        # fbank + pitch features of that utterance
+        'speech_features': rng.standard_normal((500, 83)).astype(np.float32),
+        # one 640x480 RGB camera frame
+        'video_input': rng.integers(0, 255, (480, 640, 3), dtype=np.uint8),
+        # 3 s of synthesized 22.05 kHz speech from the SpeechOutputGenerator
+        'system_speech': (rng.standard_normal(22050 * 3).astype(np.float32), 22050, "How about Spaghetti?"),
+    }
+
+
+def _same(a, b):
+    if isinstance(a, tuple):
+        return all(_same(x, y) for x, y in zip(a, b))
+    if isinstance(a, np.ndarray):
+        return np.array_equal(a, b)
+    return a == b
+
+
+def main(num_messages: int, protocol: str):
+    ctx = zmq.Context.instance()
+    pub = ctx.socket(zmq.PUB)
+    sub = ctx.socket(zmq.SUB)
+    if protocol == 'ipc':
+        address = f"ipc://{os.path.join(tempfile.mkdtemp(), 'bus_codec')}"
+        pub.bind(address)
+    else:
+        port = pub.bind_to_random_port("tcp://127.0.0.1")
+        address = f"tcp://127.0.0.1:{port}"
+    sub.setsockopt(zmq.SUBSCRIBE, b"")
+    sub.connect(address)
+    time.sleep(0.3)  # let the subscription propagate
+
+    print(f"{'topic':>16} {'codec':>15} {'frames':>7} {'bytes':>10} {'latency [ms]':>13}")
+    for topic, content in _payloads().items():
+        for codec in (PickleCodec(), OutOfBandCodec()):
+            latencies = []
+            size = frames = 0
+            for _ in range(num_messages):
+                start = time.perf_counter()
+                timestamp = datetime.datetime.now().timestamp()
+                pub.send_multipart([bytes(topic, encoding="ascii")] + codec.encode(timestamp, content))
+                msg = sub.recv_multipart(copy=False)
+                _, received = decode_frames(msg)
+                latencies.append(time.perf_counter() - start)
+                size, frames = message_size(msg), len(msg)
+                assert _same(content, received)
+            print(f"{topic:>16} {type(codec).__name__:>15} {frames:>7} {size:>10} "
+                  f"{np.mean(latencies) * 1000:>13.3f}")
+    pub.close()
+    sub.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=200, help='messages per topic and codec')
+    parser.add_argument('--protocol', default='tcp', choices=['tcp', 'ipc'])
+    args = parser.parse_args()
+    main(args.messages, args.protocol)
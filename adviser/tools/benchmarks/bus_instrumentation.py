@@ -0,0 +1,142 @@
+###############################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+"""
+Benchmark for the overhead of the bus instrumentation: measures the cost of recording single
+events and the turn latency of a chain of services (like NLU -> BST -> policy -> NLG, without
+any work) with and without instrumentation. Prints the collected statistics and optionally
+writes the trace of one dialog.
+
+Usage: python tools/benchmarks/bus_instrumentation.py [--services N] [--turns N] [--trace FILE]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+head_location = os.path.abspath(os.path.join(os.path.abspath(__file__), '..', '..', '..')) # main folder of adviser
+sys.path.append(head_location)
+
+import numpy as np
+
+from services.instrumentation import BusInstrumentation
+from services.service import DialogSystem, PublishSubscribe, Service
+from services.session import session_context
+
+
+def _stage(index: int, ports: dict) -> Service:
+    """ Creates a service forwarding `stage{index}` to `stage{index + 1}` """
+    def forward(self, **values):
+        return {f'stage{index + 1}': values[f'stage{index}']}
+    forward.__name__ = forward.__qualname__ = 'forward'
+    stage_class = type(f'Stage{index}', (Service,), {
+        'forward': PublishSubscribe(sub_topics=[f'stage{index}'], pub_topics=[f'stage{index + 1}'])(forward)})
+    return stage_class(**ports)
+
+
+def _output(num_services: int, ports: dict) -> Service:
+    """ Creates the service starting turns and noticing when they leave the last stage """
+    def send(self, turn: int):
+        return {'stage0': turn}
+
+    def receive(self, **values):
+        self.done.set()
+
+    output = type('Output', (Service,), {
+        'send': PublishSubscribe(pub_topics=['stage0'])(send),
+        'receive': PublishSubscribe(sub_topics=[f'stage{num_services}'])(receive)})(**ports)
+    output.done = threading.Event()
+    return output
+
+
+def record_costs(num_events: int = 100000):
+    instrumentation = BusInstrumentation()
+    start = time.perf_counter()
+    for _ in range(num_events):
+        instrumentation.record_publish('beliefstate/recipes', 1)
+    publish = time.perf_counter() - start
+    timestamp = time.time()
+    start = time.perf_counter()
+    for _ in range(num_events):
+        instrumentation.record_delivery('beliefstate/recipes', timestamp)
+    delivery = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(num_events):
+        instrumentation.record_call('Policy.choose_sys_act', 1, start, 0.001, 0.001)
+    call = time.perf_counter() - start
+    print(f"cost per event [us]: publish {publish / num_events * 1e6:.2f}, "
+          f"delivery {delivery / num_events * 1e6:.2f}, handler call {call / num_events * 1e6:.2f}")
+
+
+def chain(num_services: int, instrument: bool, ports: dict, reg_port: int):
+    """ Creates a dialog system with a chain of services, returns it and the output service """
+    stages = [_stage(index, ports) for index in range(num_services)]
+    output = _output(num_services, ports)
+    ds = DialogSystem(services=[output] + stages, reg_port=reg_port, instrument=instrument, **ports)
+    ds.start_session('benchmark', start_signals={})
+    return ds, output
+
+
+def turn(ds: DialogSystem, output: Service, number: int) -> float:
+    output.done.clear()
+    start = time.perf_counter()
+    with session_context('benchmark'):
+        output.send(number)
+    output.done.wait()
+    return time.perf_counter() - start
+
+
+def main(num_services: int, num_turns: int, trace: str):
+    record_costs()
+    print(f"{num_services} services in a chain, {num_turns} turns")
+    print(f"{'instrumentation':>15} {'p50 [ms]':>9} {'p95 [ms]':>9}")
+    systems = {False: chain(num_services, False, {'sub_port': 63053, 'pub_port': 63054}, 63055),
+               True: chain(num_services, True, {'sub_port': 63063, 'pub_port': 63064}, 63065)}
+    instrumentation = systems[True][0].instrumentation
+    instrumentation.start_trace(['benchmark'])
+    latencies = {False: [], True: []}
+    # alternate between both systems, so both see the same conditions
+    for number in range(num_turns):
+        for instrument, (ds, output) in systems.items():
+            latencies[instrument].append(turn(ds, output, number))
+        instrumentation.stop_trace()
+    for instrument in systems:
+        values = np.array(latencies[instrument]) * 1000
+        print(f"{'on' if instrument else 'off':>15} {np.median(values):>9.3f} {np.percentile(values, 95):>9.3f}")
+        ds = systems[instrument][0]
+        ds.shutdown()
+        ds._proxy_dev.launcher.terminate()
+
+    print()
+    print(instrumentation.summary())
+    if trace:
+        instrumentation.write_trace(trace)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--services', type=int, default=7, help='number of services in the chain')
+    parser.add_argument('--turns', type=int, default=1000, help='number of measured turns')
+    parser.add_argument('--trace', type=str, default=None, help='write the trace of the first turn to this file')
+    args = parser.parse_args()
+    main(args.services, args.turns, args.trace)
+    # the listener threads of the services are only stopped on exit
+    os._exit(0)
@@ -0,0 +1,108 @@
+###############################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+"""
+Benchmark for the control handshakes of the `DialogSystem`: measures the construction of a
+dialog system and the setup / teardown overhead of dialogs (`run_dialog`) and sessions
+(`start_session` / `end_session`) for services with several subscriber functions each.
+The dialogs end immediately, so only the overhead is measured.
+
+Usage: python tools/benchmarks/dialog_handshake.py [--services N] [--listeners N] [--dialogs N]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+head_location = os.path.abspath(os.path.join(os.path.abspath(__file__), '..', '..', '..')) # main folder of adviser
+sys.path.append(head_location)
+
+import numpy as np
+
+from services.service import DialogSystem, PublishSubscribe, Service
+from utils.topics import Topic
+
+PORTS = {'sub_port': 63033, 'pub_port': 63034}
+
+
+def _service(index: int, num_listeners: int) -> Service:
+    """ Creates a service with `num_listeners` subscriber functions """
+    members = {}
+    for listener in range(num_listeners):
+        def listen(self, **values):
+            pass
+        listen.__name__ = listen.__qualname__ = f'listen{listener}'
+        members[listen.__name__] = PublishSubscribe(sub_topics=[f'topic{index}_{listener}'])(listen)
+    return type(f'Service{index}', (Service,), members)(**PORTS)
+
+
+class Ender(Service):
+    """ Ends every dialog as soon as it started """
+
+    @PublishSubscribe(sub_topics=['go'], pub_topics=[Topic.DIALOG_END])
+    def end(self, go: bool = None):
+        return {Topic.DIALOG_END: True}
+
+
+def _report(name: str, durations: list):
+    durations = np.array(durations) * 1000
+    print(f"{name:>22} {np.median(durations):>9.3f} {np.percentile(durations, 95):>9.3f}")
+
+
+def main(num_services: int, num_listeners: int, num_dialogs: int):
+    services = [_service(index, num_listeners) for index in range(num_services)] + [Ender(**PORTS)]
+    start = time.perf_counter()
+    ds = DialogSystem(services=services, reg_port=63035, **PORTS)
+    startup = time.perf_counter() - start
+
+    dialogs = []
+    for _ in range(num_dialogs):
+        start = time.perf_counter()
+        ds.run_dialog(start_signals={'go': True})
+        dialogs.append(time.perf_counter() - start)
+
+    session_starts, session_ends = [], []
+    for session in range(num_dialogs):
+        start = time.perf_counter()
+        ds.start_session(session, start_signals={})
+        session_starts.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        ds.end_session(session)
+        session_ends.append(time.perf_counter() - start)
+    ds.shutdown()
+    ds._proxy_dev.launcher.terminate()
+
+    print(f"{num_services + 1} services, {num_services * num_listeners + 1} subscriber functions")
+    print(f"{'':>22} {'p50 [ms]':>9} {'p95 [ms]':>9}")
+    _report('DialogSystem()', [startup])
+    _report('run_dialog', dialogs)
+    _report('start_session', session_starts)
+    _report('end_session', session_ends)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--services', type=int, default=6, help='number of services')
+    parser.add_argument('--listeners', type=int, default=3, help='number of subscriber functions per service')
+    parser.add_argument('--dialogs', type=int, default=200, help='number of measured dialogs / sessions')
+    args = parser.parse_args()
+    main(args.services, args.listeners, args.dialogs)
+    # the listener threads of the services are only stopped on exit
+    os._exit(0)
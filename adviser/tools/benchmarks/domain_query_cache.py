@@ -0,0 +1,89 @@
+###############################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+"""
+Measures the effect of the query cache of JSONLookupDomain in simulated dialogs: the
+HandcraftedUserSimulator (whose goals are drawn with `find_entities` in a retry loop), the
+HandcraftedBST and the HandcraftedPolicy talk to each other on the synthetic domain of
+policy_turns.py, once with the cache disabled and once with the default cache size. Reports the
+time of all dialogs, the time spent in `find_entities` / `find_info_about_entity` and the hit
+rate of the cache, and checks that both runs produce the same dialogs.
+
+Usage: python tools/benchmarks/domain_query_cache.py [--dialogs N] [--entities N] [--cache-size N]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+head_location = os.path.abspath(os.path.join(os.path.abspath(__file__), '..', '..', '..')) # main folder of adviser
+sys.path.append(head_location)
+
+from services.policy.policy_handcrafted import HandcraftedPolicy
+from tools.benchmarks.policy_turns import _create_domain, _run_dialogs
+from utils.domain.jsonlookupdomain import JSONLookupDomain
+from utils.domain.querycache import QueryCache
+from utils.logger import DiasysLogger, LogLevel
+
+
+def _timed_lookups(domain: JSONLookupDomain) -> list:
+    """ Wraps the lookup methods of the domain instance to add up the time spent in them """
+    spent = [0.0]
+    for name in ('find_entities', 'find_info_about_entity'):
+        def timed(*args, _lookup=getattr(domain, name), **kwargs):
+            start = time.perf_counter()
+            try:
+                return _lookup(*args, **kwargs)
+            finally:
+                spent[0] += time.perf_counter() - start
+        setattr(domain, name, timed)
+    return spent
+
+
+def main(num_dialogs: int, num_entities: int, cache_size: int):
+    logger = DiasysLogger(console_log_lvl=LogLevel.NONE, file_log_lvl=LogLevel.NONE)
+    with tempfile.TemporaryDirectory() as folder:
+        domain = _create_domain(folder, num_entities, seed=0)
+        print(f"{num_dialogs} simulated dialogs, {num_entities} entities")
+        runs = []
+        for size in (0, cache_size):
+            domain.query_cache = QueryCache(size)
+            spent = _timed_lookups(domain)
+            start = time.perf_counter()
+            dialogs = _run_dialogs(domain, HandcraftedPolicy(domain, logger=logger), num_dialogs, seed=0)
+            total = time.perf_counter() - start
+            del domain.find_entities, domain.find_info_about_entity
+            cache = domain.query_cache
+            print(f"cache size {size:>5}: {total:6.2f} s, lookups {spent[0]:6.2f} s "
+                  f"({cache.hits + cache.misses} lookups, hit rate {cache.hit_rate * 100:5.1f} %)")
+            runs.append(dialogs)
+        same = runs[0] == runs[1]
+        print("same dialogs with and without the cache" if same else "DIALOGS DIFFER")
+        return same
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--dialogs', type=int, default=500, help='number of simulated dialogs per run')
+    parser.add_argument('--entities', type=int, default=2000, help='number of entities of the synthetic domain')
+    parser.add_argument('--cache-size', type=int, default=256, help='maximum number of cached results')
+    args = parser.parse_args()
+    sys.exit(0 if main(args.dialogs, args.entities, args.cache_size) else 1)
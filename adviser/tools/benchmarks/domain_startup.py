@@ -0,0 +1,156 @@
+###############################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+"""
+Measures the construction time of an in-memory JSONLookupDomain for synthetic databases of
+different sizes:
+
+- previous load: the database file is dumped to SQL statements (`iterdump`) which are executed
+  again in a new in-memory database,
+- backup: the pages of the file are copied to memory with SQLite's backup API,
+- shared memory (first): the database is copied and written to a snapshot in shared memory,
+- shared memory (attach): another domain (e.g. in a worker process) opens the existing snapshot.
+
+Also reports the time of the first query of an unpickled domain (which reconnects) with and
+without shared memory, and checks that all variants return the same entities.
+
+Usage: python tools/benchmarks/domain_startup.py [--sizes MB [MB ...]] [--skip-dump-above MB]
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import pickle
+import sqlite3
+import sys
+import tempfile
+import time
+from io import StringIO
+
+head_location = os.path.abspath(os.path.join(os.path.abspath(__file__), '..', '..', '..')) # main folder of adviser
+sys.path.append(head_location)
+
+from utils.domain.jsonlookupdomain import JSONLookupDomain
+
+SLOTS = ('city', 'cuisine', 'price')
+ROWS_PER_BATCH = 1000
+
+
+class PreviousDumpDomain(JSONLookupDomain):
+    """ JSONLookupDomain with the previous load of the database to memory (SQL dump and replay) """
+
+    def _load_db_to_memory(self, db_file_path: str):
+        file_db = sqlite3.connect(db_file_path, check_same_thread=False)
+        tempfile = StringIO()
+        for line in file_db.iterdump():
+            tempfile.write('%s\n' % line)
+        file_db.close()
+        tempfile.seek(0)
+        db = sqlite3.connect(':memory:', check_same_thread=False)
+        db.row_factory = self._sqllite_dict_factory
+        db.cursor().executescript(tempfile.read())
+        self._prepare_db(db)
+        db.commit()
+        return db
+
+
+def _create_db(folder: str, size_mb: int) -> str:
+    """ Creates the database `places` (a name, three slots and a description of ~200 characters
+        per entity) with at least `size_mb` MB """
+    db_file = os.path.join(folder, f'places{size_mb}.db')
+    with contextlib.closing(sqlite3.connect(db_file)) as db:
+        db.execute('CREATE TABLE places (name TEXT, {}, description TEXT)'.format(
+            ', '.join(f'{slot} TEXT' for slot in SLOTS)))
+        db.execute('CREATE INDEX places_name ON places (name)')
+        rows = 0
+        while os.path.getsize(db_file) < size_mb * 2 ** 20:
+            db.executemany('INSERT INTO places VALUES (?, ?, ?, ?, ?)',
+                           ((f'place {i}', f'city {i % 50}', f'cuisine {i % 30}', f'price {i % 5}',
+                             f'description {i} ' * 12) for i in range(rows, rows + ROWS_PER_BATCH)))
+            db.commit()
+            rows += ROWS_PER_BATCH
+    return db_file
+
+
+def _time(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def main(sizes: list, skip_dump_above: int):
+    with tempfile.TemporaryDirectory() as folder:
+        ontology_file = os.path.join(folder, 'places.json')
+        with open(ontology_file, 'w') as file:
+            json.dump({'key': 'name', 'requestable': list(SLOTS), 'system_requestable': list(SLOTS),
+                       'informable': {slot: [] for slot in SLOTS}}, file)
+        same = True
+        for size_mb in sizes:
+            db_file = _create_db(folder, size_mb)
+            print(f"{os.path.getsize(db_file) / 2 ** 20:7.1f} MB database")
+
+            def create(domain_class=JSONLookupDomain, **kwargs):
+                return domain_class('places', json_ontology_file=ontology_file, sqllite_db_file=db_file,
+                                    in_memory=True, max_cached_queries=0, **kwargs)
+
+            def first_query(domain):
+                return domain.find_entities({'city': 'city 7', 'price': 'price 2'})
+
+            results = []
+            if size_mb <= skip_dump_above:
+                try:
+                    seconds, domain = _time(lambda: create(PreviousDumpDomain))
+                    print(f"{'previous load':>24}: {seconds:8.3f} s")
+                    results.append(first_query(domain))
+                    del domain
+                except sqlite3.DataError as error:
+                    # the dump is executed as a single script, which SQLite limits to 1 GB
+                    print(f"{'previous load':>24}: failed ({error})")
+            seconds, domain = _time(create)
+            print(f"{'backup':>24}: {seconds:8.3f} s")
+            results.append(first_query(domain))
+            seconds, _ = _time(lambda: first_query(pickle.loads(pickle.dumps(domain))))
+            print(f"{'unpickled, first query':>24}: {seconds:8.3f} s")
+            del domain
+
+            seconds, shared = _time(lambda: create(shared_memory=True))
+            print(f"{'shared memory (first)':>24}: {seconds:8.3f} s")
+            seconds, attached = _time(lambda: create(shared_memory=True))
+            print(f"{'shared memory (attach)':>24}: {seconds:8.3f} s")
+            results.append(first_query(attached))
+            seconds, _ = _time(lambda: first_query(pickle.loads(pickle.dumps(attached))))
+            print(f"{'unpickled, first query':>24}: {seconds:8.3f} s")
+            prefix, version = shared._shared_snapshot_path(db_file)
+            del shared, attached
+            os.remove(prefix + version)
+            os.remove(db_file)
+
+            same = same and all(result == results[0] for result in results)
+        print("same entities for all loads" if same else "ENTITIES DIFFER")
+        return same
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 100, 1024], help='database sizes in MB')
+    parser.add_argument('--skip-dump-above', type=int, default=1024,
+                        help='skip the previous load for larger databases (it needs several times their size in memory)')
+    args = parser.parse_args()
+    sys.exit(0 if main(args.sizes, args.skip_dump_above) else 1)
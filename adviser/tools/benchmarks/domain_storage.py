@@ -0,0 +1,114 @@
+###############################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+"""
+Compares startup time and query latency of the RecipeDomain when the database is imported into
+memory (dump + replay) and when the database file is opened directly, and of searches answered
+by SQL conditions and by the in-memory RecipeIndex.
+Works on a temporary copy of the recipe database, optionally enlarged by replicating its rows.
+
+Usage: python tools/benchmarks/domain_storage.py [--scale N] [--repeat N]
+"""
+
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+head_location = os.path.abspath(os.path.join(os.path.abspath(__file__), '..', '..', '..')) # main folder of adviser
+sys.path.append(head_location)
+
+from recipe_project.domain import RecipeDomain
+from recipe_project.models.recipe_req import RecipeReq
+
+
+def _make_db(scale: int) -> str:
+    """ Copies the recipe database to a temporary file, replicating all recipes `scale` times """
+    db_file = os.path.join(tempfile.mkdtemp(), 'recipes.db')
+    shutil.copy(os.path.join(head_location, 'resources', 'databases', 'recipes.db'), db_file)
+    db = sqlite3.connect(db_file)
+    # derived tables are rebuilt by the domain on startup
+    db.execute("DROP TABLE IF EXISTS recipe_ingredients")
+    columns = [row[1] for row in db.execute("PRAGMA table_info(recipes)")]
+    for i in range(1, scale):
+        select = ", ".join(f"name || ' #{i}'" if c == 'name' else c for c in columns)
+        db.execute(f"INSERT INTO recipes ({', '.join(columns)}) "
+                   f"SELECT {select} FROM recipes WHERE name NOT LIKE '% #%'")
+    db.commit()
+    db.close()
+    return db_file
+
+
+def _requests():
+    requests = []
+    for ingredients, ease, prep_time in ((["Chicken"], None, None), (["Beans", "Rice"], None, None),
+                                         ([], "easy", None), (["Noodles"], None, "30")):
+        req = RecipeReq()
+        req.ingredients, req.ease, req.prep_time = ingredients, ease, prep_time
+        requests.append(req)
+    req = RecipeReq()
+    req.name = "Pasta Salad"
+    return requests + [req]
+
+
+def _time(func, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main(scale: int, repeat: int):
+    db_file = _make_db(scale)
+    rows = sqlite3.connect(db_file).execute("SELECT COUNT(*) FROM recipes").fetchone()[0]
+    print(f"database: {rows} recipes, {os.path.getsize(db_file) / 1e6:.2f} MB")
+
+    for label, in_memory, use_index in (("in-memory import, SQL", True, False),
+                                        ("file (WAL), SQL", False, False),
+                                        ("file (WAL), index", False, True)):
+        # without the per-request cache, every call runs the search
+        def create():
+            return RecipeDomain(in_memory=in_memory, sqllite_db_file=db_file, max_cached_requests=0,
+                                use_index=use_index, wal=not in_memory)
+        # the first start in file mode creates the working copy of the database
+        create()
+        startup = _time(create, 3)
+        domain = create()
+        print(f"{label}: startup {startup:8.2f} ms")
+        if use_index:
+            print(f"   index build: {_time(lambda: setattr(domain, '_index', None) or domain.get_index(), 3):8.2f} ms")
+        for req in _requests():
+            latency = _time(lambda: domain.find_recipes(req), repeat)
+            print(f"   find_recipes({vars(req)}): {latency:8.3f} ms")
+            latency = _time(lambda: domain.count_recipes(req, partial=True), repeat)
+            print(f"   count_recipes(partial=True):  {latency:8.3f} ms")
+        print(f"   get_users_favs: {_time(domain.get_users_favs, repeat):8.3f} ms")
+        print(f"   set_favorite:   {_time(lambda: domain.set_favorite('Pasta Salad'), repeat):8.3f} ms")
+        domain.unset_favorite('Pasta Salad')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--scale', type=int, default=1, help='replicate the recipes this many times')
+    parser.add_argument('--repeat', type=int, default=100, help='repetitions per query')
+    args = parser.parse_args()
+    main(args.scale, args.repeat)
@@ -0,0 +1,158 @@
+###############################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+"""
+Compares the compiled NLG templates (template lookup by slot signature, pre-parsed messages) with
+the previous interpretation (scan of all templates of the intent, code of a message parsed on every
+use): checks that both render the same messages for system acts of all `SysActionType`s which have
+a template and reports the time per message. Also reports the time to load a template file when it
+is parsed, cached in the process and cached on disk.
+
+Usage: python tools/benchmarks/nlg_rendering.py [--templates FILE] [--repeat N]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+head_location = os.path.abspath(os.path.join(os.path.abspath(__file__), '..', '..', '..')) # main folder of adviser
+sys.path.append(head_location)
+
+from services.nlg.templates import templatefile
+from services.nlg.templates.data.commands.message import Message, CODE_PARSER
+from services.nlg.templates.data.memory import Memory
+from services.nlg.templates.parsing.parsers.messageparser.data.messagecomponent import MessageComponentType
+from services.nlg.templates.templatefile import TemplateFile, _TemplateFileReader
+from utils.sysact import SysAct, SysActionType
+
+
+def _interpret(message: Message, parameters: Memory) -> str:
+    """ Previous `Message.apply`: parses the code components on every call """
+    output = ''
+    for component in message.components:
+        if component.component_type == MessageComponentType.STRING:
+            output += component.value
+        else:
+            expression = CODE_PARSER.parse(component.value + '$')[0]
+            output += expression.evaluate(parameters)
+    return output
+
+
+class LegacyTemplateFile(TemplateFile):
+    """ TemplateFile with its own parse of the file, interpreting the messages and scanning the
+    templates of the intent for every system act (previous implementation). """
+
+    def __init__(self, filename: str):
+        TemplateFile.__init__(self, filename, None, disk_cache=False)
+        tfr = _TemplateFileReader(filename)
+        for command in tfr.get_templates() + tfr.get_functions():
+            self._use_interpreter(command)
+        self._templates = self._create_template_dict(tfr.get_templates())
+        self._add_functions_to_global_memory(tfr.get_functions())
+
+    def _use_interpreter(self, command):
+        for message in getattr(command, 'messages', []):
+            message._render = lambda parameters, message=message: _interpret(message, parameters)
+        for special_case in getattr(command, 'special_cases', []) + getattr(command, 'additions', []):
+            self._use_interpreter(special_case)
+
+    def create_message(self, sys_act: SysAct) -> str:
+        slots = self._create_memory_from_sys_act(sys_act)
+        for template in self._templates[sys_act.type.value]:
+            if template.is_applicable(slots):
+                return template.apply(slots)
+        raise BaseException(f'No template was found for given system act {sys_act.type}.')
+
+
+def _sys_acts(templates: TemplateFile):
+    """ One system act per template of every SysActionType (with an extra slot for free parameters) """
+    sys_acts, missing = [], []
+    for act_type in SysActionType:
+        if act_type.value not in templates._templates:
+            missing.append(act_type.value)
+            continue
+        for template in templates._templates[act_type.value]:
+            slot_values = {slot: [f'{slot} value'] for slot in template.slot_names}
+            if template.free_parameter is not None:
+                slot_values['extra_slot'] = ['extra value']
+            sys_acts.append(SysAct(act_type, slot_values))
+    return sys_acts, missing
+
+
+def _render(templates: TemplateFile, sys_acts, seed: int = 0):
+    random.seed(seed)  # templates can choose randomly between messages
+    return [templates.create_message(sys_act) for sys_act in sys_acts]
+
+
+def _load_times(filename: str, repeat: int):
+    with tempfile.TemporaryDirectory() as directory:
+        copy = os.path.join(directory, os.path.basename(filename))
+        with open(filename, 'rb') as source, open(copy, 'wb') as target:
+            target.write(source.read())
+        times = {}
+        for name, clear, disk_cache in (("parse", True, False), ("disk cache", True, True),
+                                        ("process cache", False, True)):
+            TemplateFile(copy, None, disk_cache=disk_cache)  # fills the caches
+            start = time.perf_counter()
+            for _ in range(repeat):
+                if clear:
+                    templatefile._parsed_files.clear()
+                TemplateFile(copy, None, disk_cache=disk_cache)
+            times[name] = (time.perf_counter() - start) / repeat
+    return times
+
+
+def main(filename: str, repeat: int):
+    legacy = LegacyTemplateFile(filename)
+    compiled = TemplateFile(filename, None)
+    sys_acts, missing = _sys_acts(compiled)
+    print(f"{len(sys_acts)} system acts of {len(SysActionType) - len(missing)} SysActionTypes "
+          f"(no template for: {', '.join(missing)})")
+
+    mismatches = 0
+    for sys_act, expected, actual in zip(sys_acts, _render(legacy, sys_acts), _render(compiled, sys_acts)):
+        if expected != actual:
+            mismatches += 1
+            print(f"MISMATCH for {sys_act}:\n   interpreted: {expected}\n   compiled:    {actual}")
+    print(f"{mismatches} mismatches")
+
+    for name, templates in (("interpreted", legacy), ("compiled", compiled)):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            _render(templates, sys_acts)
+        elapsed = time.perf_counter() - start
+        print(f"{name:>15}: {elapsed / (repeat * len(sys_acts)) * 1e6:8.1f} us / message, "
+              f"{repeat * len(sys_acts) / elapsed:10.0f} messages / s")
+
+    for name, seconds in _load_times(filename, max(repeat // 100, 5)).items():
+        print(f"load ({name}): {seconds * 1000:8.3f} ms")
+    return mismatches
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--templates', default=os.path.join(head_location, 'resources', 'nlg_templates',
+                                                             'recipesMessages.nlg'),
+                        help='template file to render')
+    parser.add_argument('--repeat', type=int, default=2000, help='number of passes over the system acts')
+    args = parser.parse_args()
+    sys.exit(1 if main(args.templates, args.repeat) else 0)
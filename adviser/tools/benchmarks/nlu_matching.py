@@ -0,0 +1,134 @@
+###############################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+"""
+Compares the pre-compiled rule matching of the RecipeNLU with the previous per-value
+`re.search` loop: checks that both produce identical user acts and reports the time per utterance.
+
+Usage: python tools/benchmarks/nlu_matching.py [--repeat N]
+"""
+
+import argparse
+import ast
+import glob
+import os
+import re
+import sys
+import time
+
+head_location = os.path.abspath(os.path.join(os.path.abspath(__file__), '..', '..', '..')) # main folder of adviser
+sys.path.append(head_location)
+
+from recipe_project.domain import RecipeDomain
+from recipe_project.nlu import RecipeNLU
+from utils.useract import UserAct, UserActionType
+from utils.logger import DiasysLogger, LogLevel
+
+
+class LegacyRecipeNLU(RecipeNLU):
+    """ RecipeNLU matching the uncompiled rule strings one by one (previous implementation). """
+
+    def _match_general_act(self, user_utterance: str):
+        for act in self.general_regex:
+            if re.search(self.general_regex[act], user_utterance, re.I):
+                if act != 'dontcare' and act != 'req_everything':
+                    user_act_type = UserActionType(act)
+                else:
+                    user_act_type = act
+                self.user_acts.append(UserAct(act_type=user_act_type, text=user_utterance))
+
+    def _match_request(self, user_utterance: str):
+        for slot in self.USER_REQUESTABLE:
+            if self._check(re.search(self.request_regex[slot], user_utterance, re.I)):
+                self._add_request(user_utterance, slot)
+
+    def _match_inform(self, user_utterance: str):
+        for slot in self.USER_INFORMABLE:
+            for value in self.inform_regex[slot]:
+                if self._check(re.search(self.inform_regex[slot][value], user_utterance, re.I)):
+                    self._add_inform(user_utterance, slot, value)
+
+
+def _test_corpus_utterances():
+    """ Collects all string literals from the NLU test modules (utterances of the test corpora). """
+    utterances = []
+    for filename in sorted(glob.glob(os.path.join(head_location, 'tests', 'nlu', '*.py'))):
+        with open(filename, encoding='utf-8') as f:
+            tree = ast.parse(f.read())
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Constant) and isinstance(node.value, str) \
+                    and '\n' not in node.value and 0 < len(node.value) < 200:
+                utterances.append(node.value)
+    return utterances
+
+
+def _recipe_utterances(domain: RecipeDomain):
+    """ Utterances covering every informable value of the recipe domain. """
+    utterances = [
+        "suggest me a recipe with mango", "find a meal with tuna",
+        "can you suggest a recipe that contains yeast?", "I want to cook something with spinach",
+        "do you have the recipe for black bean soup?", "Hi, do you have a recipe with beans?",
+        "It should also include carrots.", "How long does it take to prepare?",
+        "How difficult is this recipe?", "Can you give me something different?",
+        "Do you have a recipe that is easy to prepare and takes little time?",
+        "Yes, can you list my favorites?", "Can you delete Chocolate Mousse from my favorites?",
+        "what can i cook with durian", "thank you, that is all", "bye"]
+    for slot in domain.get_informable_slots():
+        for value in domain.get_possible_values(slot):
+            utterances.append(f"I want to cook something with {value}")
+            utterances.append(f"do you have a recipe for {value}")
+            utterances.append(f"I want to cook something that is {value}")
+            utterances.append(f"suggest me a recipe from {value}")
+    return utterances
+
+
+def _run(nlu, utterances):
+    return [nlu.extract_user_acts(utterance)['user_acts'] for utterance in utterances]
+
+
+def main(repeat: int):
+    domain = RecipeDomain()
+    logger = DiasysLogger(console_log_lvl=LogLevel.NONE, file_log_lvl=LogLevel.NONE)
+    utterances = _test_corpus_utterances() + _recipe_utterances(domain)
+
+    legacy = LegacyRecipeNLU(domain=domain, logger=logger)
+    compiled = RecipeNLU(domain=domain, logger=logger)
+
+    mismatches = 0
+    for utterance, expected, actual in zip(utterances, _run(legacy, utterances),
+                                           _run(compiled, utterances)):
+        if expected != actual:
+            mismatches += 1
+            print(f"MISMATCH for '{utterance}':\n   per-value: {expected}\n   compiled:  {actual}")
+    print(f"{len(utterances)} utterances, {mismatches} mismatches")
+
+    for name, nlu in (("per-value loop", legacy), ("compiled", compiled)):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            _run(nlu, utterances)
+        elapsed = time.perf_counter() - start
+        print(f"{name:>15}: {elapsed / (repeat * len(utterances)) * 1e6:8.1f} us / utterance")
+    return mismatches
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=3, help='number of passes over the corpus')
+    args = parser.parse_args()
+    sys.exit(1 if main(args.repeat) else 0)
@@ -0,0 +1,153 @@
+###############################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+"""
+Measures the startup time of the RecipeNLU: building its rules from the sources (previous behaviour
+for every instance, now only when a source changed), loading them from the disk cache (new process)
+and getting the shared rules of the process (further instances). The same is measured for inform
+rules with a growing number of ingredients, together with the time of the first utterance, which
+compiles the patterns it needs, and the size of the inform rule file as per-slot patterns and as
+expanded per-value rules. Also measures generating the inform rules from the .nlu file for all values
+and incrementally for one value added to the ontology.
+
+Usage: python tools/benchmarks/nlu_startup.py [--repeat N]
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+head_location = os.path.abspath(os.path.join(os.path.abspath(__file__), '..', '..', '..')) # main folder of adviser
+sys.path.append(head_location)
+
+from recipe_project.domain import RecipeDomain
+from recipe_project.nlu import RecipeNLU, _add_unknown_ingredient_rule
+from services.nlu import rulecache
+from services.nlu.rulecache import load_rules, read_inform_patterns, write_inform_patterns
+from services.nlu.rulematcher import SlotRules
+from tools.regextemplates.gen_regexes import create_inform_rules
+from tools.regextemplates.rules.regexfile import RegexFile
+from utils.logger import DiasysLogger, LogLevel
+
+RULE_FOLDER = os.path.join(head_location, 'resources', 'nlu_regexes')
+
+
+def _time(function, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat
+
+
+def _load_times(domain: RecipeDomain, folder: str, repeat: int):
+    def build():
+        rulecache._rule_sets.clear()
+        re.purge()
+        load_rules(domain, folder, extend=_add_unknown_ingredient_rule, disk_cache=False)
+
+    def from_disk():
+        rulecache._rule_sets.clear()
+        re.purge()
+        load_rules(domain, folder, extend=_add_unknown_ingredient_rule)
+
+    load_rules(domain, folder, extend=_add_unknown_ingredient_rule)  # writes the disk cache
+    shared = _time(lambda: load_rules(domain, folder, extend=_add_unknown_ingredient_rule), repeat * 10)
+    return _time(build, repeat), _time(from_disk, repeat), shared
+
+
+def _first_utterance(domain: RecipeDomain, folder: str) -> float:
+    rulecache._rule_sets.clear()
+    re.purge()
+    matcher = load_rules(domain, folder, extend=_add_unknown_ingredient_rule).matcher
+    start = time.perf_counter()
+    for slot in matcher.inform:
+        list(matcher.match_inform(slot, "I want to cook something easy with ingredient 7"))
+    return time.perf_counter() - start
+
+
+def _scaled_rules(folder: str, num_ingredients: int, expanded: bool = False):
+    """ Rule files with `num_ingredients` synthetic ingredients (and no .nlu file)
+
+    Returns:
+        the size of the inform rule file in bytes
+    """
+    for filename in ('GeneralRules.json', 'recipesRequestRules.json'):
+        shutil.copy(os.path.join(RULE_FOLDER, filename), folder)
+    nlu_hash, inform_regex = read_inform_patterns(os.path.join(RULE_FOLDER, 'recipesInformPatterns.json'))
+    ingredients = inform_regex['ingredients']
+    inform_regex['ingredients'] = SlotRules(ingredients.pattern, [f'ingredient {i}' for i in range(num_ingredients)])
+    if expanded:
+        path = os.path.join(folder, 'recipesInformRules.json')
+        with open(path, 'w', encoding='utf-8') as rule_file:
+            json.dump({slot: dict(rules) for slot, rules in inform_regex.items()}, rule_file)
+    else:
+        path = os.path.join(folder, 'recipesInformPatterns.json')
+        write_inform_patterns(path, nlu_hash, inform_regex)
+    return os.path.getsize(path)
+
+
+def _update_times(domain: RecipeDomain, repeat: int):
+    """ Time to generate the inform rules from the .nlu file, fully and for one added ingredient """
+    nlu_file = os.path.join(RULE_FOLDER, 'recipes.nlu')
+    template = RegexFile(nlu_file, domain)
+    full = _time(lambda: create_inform_rules(domain, template), repeat)
+    previous = create_inform_rules(domain, template)
+    del previous['ingredients'][next(iter(previous['ingredients']))]
+    return full, _time(lambda: create_inform_rules(domain, template, previous), repeat)
+
+
+def main(repeat: int):
+    domain = RecipeDomain(in_memory=True)
+    logger = DiasysLogger(console_log_lvl=LogLevel.NONE, file_log_lvl=LogLevel.NONE)
+    RecipeNLU(domain, logger=logger)
+    print(f"RecipeNLU instance (shared rules): {_time(lambda: RecipeNLU(domain, logger=logger), repeat * 10) * 1000:8.3f} ms")
+
+    with tempfile.TemporaryDirectory() as folder:
+        for filename in ('GeneralRules.json', 'recipes.nlu'):
+            shutil.copy(os.path.join(RULE_FOLDER, filename), folder)
+        build, from_disk, shared = _load_times(domain, folder, repeat)
+        print(f"recipe rules from .nlu:  build {build * 1000:8.1f} ms, disk cache {from_disk * 1000:6.1f} ms, "
+              f"shared {shared * 1000:6.3f} ms")
+
+    full, incremental = _update_times(domain, repeat)
+    print(f"inform rules from .nlu:  all values {full * 1000:8.1f} ms, one new value {incremental * 1000:6.1f} ms")
+
+    for num_ingredients in (100, 1000, 10000):
+        for expanded in (False, True):
+            with tempfile.TemporaryDirectory() as folder:
+                size = _scaled_rules(folder, num_ingredients, expanded)
+                build, from_disk, shared = _load_times(domain, folder, repeat)
+                first = _first_utterance(domain, folder)
+                print(f"{num_ingredients:>6} ingredients, {'expanded' if expanded else 'patterns'}: "
+                      f"{size / 1024:8.1f} KiB, build {build * 1000:8.1f} ms, disk cache "
+                      f"{from_disk * 1000:6.1f} ms, shared {shared * 1000:6.3f} ms, first utterance "
+                      f"{first * 1000:6.1f} ms")
+    rulecache._rule_sets.clear()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=3, help='number of measurements to average')
+    args = parser.parse_args()
+    main(args.repeat)
@@ -0,0 +1,144 @@
+###############################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+"""
+Compares the selection of the next requested slot of the HandcraftedPolicy from value counts of
+the domain's columnar table with the previous selection (transposing the result rows into one
+list per column and counting in Python) on a synthetic domain. Checks that both select the same
+slot and reports the time per selection for candidate sets of different sizes. The time to fetch
+the results (`find_entities`, needed by the policy anyway) is reported for comparison.
+
+Usage: python tools/benchmarks/policy_next_request.py [--entities N] [--repeat N]
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+head_location = os.path.abspath(os.path.join(os.path.abspath(__file__), '..', '..', '..')) # main folder of adviser
+sys.path.append(head_location)
+
+from services.policy.policy_handcrafted import HandcraftedPolicy
+from utils.domain.jsonlookupdomain import JSONLookupDomain
+from utils.logger import DiasysLogger, LogLevel
+
+# slot -> number of values (2: binary slot)
+SLOTS = {'city': 50, 'cuisine': 30, 'price': 5, 'rating': 10, 'parking': 2, 'terrace': 2, 'delivery': 2}
+
+
+def _create_domain(folder: str, num_entities: int) -> JSONLookupDomain:
+    random.seed(0)
+    values = {slot: [f'{slot} {i}' for i in range(num_values)] for slot, num_values in SLOTS.items()}
+    for slot in ('parking', 'terrace', 'delivery'):
+        values[slot] = ['yes', 'no']
+    db_file = os.path.join(folder, 'places.db')
+    with sqlite3.connect(db_file) as db:
+        db.execute('CREATE TABLE places (name TEXT, {})'.format(', '.join(f'{slot} TEXT' for slot in SLOTS)))
+        # skewed value distributions, binary slots split differently
+        db.executemany('INSERT INTO places VALUES ({})'.format(', '.join('?' * (len(SLOTS) + 1))),
+                       ([f'place {i}'] + [random.choice(values[slot][:random.randint(1, len(values[slot]))])
+                                          for slot in SLOTS] for i in range(num_entities)))
+    ontology = {'key': 'name', 'requestable': list(SLOTS), 'system_requestable': list(SLOTS),
+                'informable': values}
+    ontology_file = os.path.join(folder, 'places.json')
+    with open(ontology_file, 'w') as file:
+        json.dump(ontology, file)
+    return JSONLookupDomain('places', json_ontology_file=ontology_file, sqllite_db_file=db_file)
+
+
+def _previous_next_request(policy: HandcraftedPolicy, q_res, beliefstate) -> str:
+    """ Previous implementation: one list per column of the results, counted in Python """
+    temp = {key: [] for key in q_res[0].keys()}
+    for result in q_res:
+        for key in result.keys():
+            if key != policy.domain_key:
+                temp[key].append(result[key])
+    constraints, dontcare = policy._get_constraints(beliefstate)
+    req_slots = [s for s in policy.domain.get_system_requestable_slots() if s not in dontcare and s not in constraints]
+    bin_slots = [slot for slot in req_slots if len(policy.domain.get_possible_values(slot)) == 2]
+    for slot in req_slots:
+        if slot not in bin_slots and len(set(temp[slot])) > 1:
+            return slot
+    diffs = {}
+    for slot in bin_slots:
+        val1, val2 = policy.domain.get_possible_values(slot)
+        values_dic = defaultdict(int)
+        for val in temp[slot]:
+            values_dic[val] += 1
+        if val1 in values_dic and val2 in values_dic:
+            diffs[slot] = abs(values_dic[val1] - values_dic[val2])
+    return sorted(diffs.items(), key=lambda kv: kv[1])[0][0] if diffs else ""
+
+
+def _next_request(policy: HandcraftedPolicy, beliefstate) -> str:
+    constraints, _ = policy._get_constraints(beliefstate)
+    value_counts = policy.domain.get_value_counts(constraints, policy.domain.get_system_requestable_slots())
+    return policy._gen_next_request(value_counts, beliefstate)
+
+
+def _time(function, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main(num_entities: int, repeat: int):
+    with tempfile.TemporaryDirectory() as folder:
+        domain = _create_domain(folder, num_entities)
+        policy = HandcraftedPolicy(domain, logger=DiasysLogger(console_log_lvl=LogLevel.NONE,
+                                                               file_log_lvl=LogLevel.NONE))
+        start = time.perf_counter()
+        domain.get_value_counts({}, domain.get_system_requestable_slots())
+        print(f"{num_entities} entities, columnar table built in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        mismatches = 0
+        informs = {}
+        for slot in ('city', 'cuisine', 'price', 'rating', 'parking', 'terrace'):
+            beliefstate = {'informs': dict(informs), 'requests': {}}
+            constraints, _ = policy._get_constraints(beliefstate)
+            fetch, q_res = _time(lambda: domain.find_entities(constraints), repeat)
+            if len(q_res) < 2:
+                break
+            previous, expected = _time(lambda: _previous_next_request(policy, q_res, beliefstate), repeat)
+            counted, actual = _time(lambda: _next_request(policy, beliefstate), repeat)
+            if expected != actual:
+                mismatches += 1
+                print(f"MISMATCH for {constraints}: previous {expected}, counted {actual}")
+            print(f"{len(q_res):>7} results: previous {previous * 1000:8.2f} ms, value counts "
+                  f"{counted * 1000:7.2f} ms (find_entities {fetch * 1000:8.2f} ms) -> request {actual}")
+            # the user answers with the most frequent value
+            informs[slot] = {max(domain.get_value_counts(constraints, [slot])[slot].items(),
+                                 key=lambda item: item[1])[0]: 1.0}
+        print(f"{mismatches} mismatches")
+        return mismatches
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--entities', type=int, default=100000, help='number of entities of the synthetic domain')
+    parser.add_argument('--repeat', type=int, default=5, help='number of measurements to average')
+    args = parser.parse_args()
+    sys.exit(1 if main(args.entities, args.repeat) else 0)
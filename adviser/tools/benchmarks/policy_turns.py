@@ -0,0 +1,203 @@
+###############################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+"""
+Compares the number of turns the HandcraftedPolicy needs in simulated dialogs when it requests the
+slot with the highest expected information gain with the previous heuristic (the first non-binary
+slot with more than one value among the results, otherwise the binary slot splitting the results
+most evenly). Both policies talk to the HandcraftedUserSimulator with the same seeds on a
+synthetic domain whose slots differ in number and distribution of values; average turns, the
+average turns of successful dialogs and the success rate are reported. To separate the effect of
+the slot selection from the user model, the number of requests until the results can't be split
+any further is also reported for users who only answer the requests.
+
+Usage: python tools/benchmarks/policy_turns.py [--dialogs N] [--entities N] [--seed N]
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+from typing import Dict
+
+head_location = os.path.abspath(os.path.join(os.path.abspath(__file__), '..', '..', '..')) # main folder of adviser
+sys.path.append(head_location)
+
+from services.bst import HandcraftedBST
+from services.policy.policy_handcrafted import HandcraftedPolicy
+from services.session import session_context
+from services.simulator import HandcraftedUserSimulator
+from services.stats.evaluation import ObjectiveReachedEvaluator
+from utils import common
+from utils.beliefstate import BeliefState
+from utils.domain.jsonlookupdomain import JSONLookupDomain
+from utils.logger import DiasysLogger, LogLevel
+
+# slot -> relative frequencies of its values (system requestable in this order)
+SLOTS = {'price': [90, 5, 5], 'delivery': [50, 50], 'city': [1] * 12, 'parking': [80, 20],
+         'cuisine': [8, 4, 2, 1, 1, 1, 1], 'rating': [1, 2, 3, 2, 1]}
+
+
+def _create_domain(folder: str, num_entities: int, seed: int) -> JSONLookupDomain:
+    rng = random.Random(seed)
+    values = {slot: [f'{slot} {i}' for i in range(len(weights))] for slot, weights in SLOTS.items()}
+    for slot in ('delivery', 'parking'):
+        values[slot] = ['yes', 'no']
+    db_file = os.path.join(folder, 'places.db')
+    with sqlite3.connect(db_file) as db:
+        db.execute('CREATE TABLE places (name TEXT, phone TEXT, {})'.format(
+            ', '.join(f'{slot} TEXT' for slot in SLOTS)))
+        db.executemany('INSERT INTO places VALUES ({})'.format(', '.join('?' * (len(SLOTS) + 2))),
+                       ([f'place {i}', f'0711 {i}'] + [rng.choices(values[slot], weights)[0]
+                                                         for slot, weights in SLOTS.items()]
+                        for i in range(num_entities)))
+    ontology = {'key': 'name', 'requestable': ['phone'] + list(SLOTS), 'system_requestable': list(SLOTS),
+                'informable': values, 'pronoun_map': {}}
+    ontology_file = os.path.join(folder, 'places.json')
+    with open(ontology_file, 'w') as file:
+        json.dump(ontology, file)
+    return JSONLookupDomain('places', json_ontology_file=ontology_file, sqllite_db_file=db_file)
+
+
+class PreviousHeuristicPolicy(HandcraftedPolicy):
+    """ HandcraftedPolicy with the previous selection of the next requested slot """
+
+    def _gen_next_request(self, value_counts: Dict[str, Dict[str, int]], belief_state: BeliefState):
+        constraints, dontcare = self._get_constraints(belief_state)
+        req_slots = [s for s in self.domain.get_system_requestable_slots()
+                     if s not in dontcare and s not in constraints]
+        bin_slots = [slot for slot in req_slots if len(self.domain.get_possible_values(slot)) == 2]
+        for slot in req_slots:
+            if slot not in bin_slots and len(value_counts[slot]) > 1:
+                return slot
+        diffs = {}
+        for slot in bin_slots:
+            val1, val2 = self.domain.get_possible_values(slot)
+            if value_counts[slot].get(val1) and value_counts[slot].get(val2):
+                diffs[slot] = abs(value_counts[slot][val1] - value_counts[slot][val2])
+        return min(diffs.items(), key=lambda kv: kv[1])[0] if diffs else ""
+
+
+def _seed(seed: int):
+    """ Seeds the random generators of the simulator (`common.init_random` only takes the first seed) """
+    common.random.seed(seed)
+    common.numpy.random.seed(seed)
+
+
+def _run_dialogs(domain: JSONLookupDomain, policy: HandcraftedPolicy, num_dialogs: int, seed: int,
+                 num_constraints: tuple = None):
+    """ Runs simulated dialogs without the message bus
+
+    Args:
+        num_constraints (tuple): minimum and maximum number of constraints of the user goals (default
+                                 from services/simulator/usermodel.cfg)
+
+    Returns:
+        list of (number of system turns, success) per dialog
+    """
+    logger = policy.logger
+    _seed(seed)  # the user model's probabilities are drawn once
+    user = HandcraftedUserSimulator(domain, logger=logger)
+    if num_constraints is not None:
+        user.parameters['goal']['MinConstraints'], user.parameters['goal']['MaxConstraints'] = num_constraints
+    bst = HandcraftedBST(domain=domain, logger=logger)
+    evaluator = ObjectiveReachedEvaluator(domain, logger=logger)
+    dialogs = []
+    for session_id in range(num_dialogs):
+        # same goal and user behaviour for both policies, regardless of the previous dialogs
+        _seed(seed + session_id)
+        with session_context(session_id):
+            for service in (user, bst, policy):
+                service.dialog_start()
+            user_acts, turns = [], 0
+            while True:
+                beliefstate = bst.update_bst(user_acts=user_acts)['beliefstate']
+                sys_act = policy.choose_sys_act(beliefstate)['sys_act']
+                turns += 1
+                user_turn = user.user_turn(sys_act=sys_act, sys_turn_over=True)
+                if 'sim_goal' in user_turn:
+                    dialogs.append((turns, evaluator.get_final_reward(user_turn['sim_goal'], logging=False)[1]))
+                    break
+                user_acts = user_turn['user_acts']
+        for service in (user, bst, policy):
+            service._drop_session(session_id)
+    return dialogs
+
+
+def _requests_to_identify(domain: JSONLookupDomain, policy: HandcraftedPolicy, num_dialogs: int, seed: int):
+    """ Number of requests the policy needs until the results can't be split any more, for users
+        answering only what is requested (with the values of a random target entity)
+
+    Returns:
+        list of (number of requests, number of remaining results) per target entity
+    """
+    slots = domain.get_system_requestable_slots()
+    entities = domain.find_entities({})
+    rng = random.Random(seed)
+    searches = []
+    for _ in range(num_dialogs):
+        target = rng.choice(entities)
+        informs = {}
+        while True:
+            beliefstate = {'informs': informs, 'requests': {}}
+            constraints, _ = policy._get_constraints(beliefstate)
+            slot = policy._gen_next_request(domain.get_value_counts(constraints, slots), beliefstate)
+            if not slot:
+                break
+            informs[slot] = {target[slot]: 1.0}
+        searches.append((len(informs), len(domain.find_entities(policy._get_constraints(beliefstate)[0]))))
+    return searches
+
+
+def main(num_dialogs: int, num_entities: int, seed: int):
+    logger = DiasysLogger(console_log_lvl=LogLevel.NONE, file_log_lvl=LogLevel.NONE)
+    with tempfile.TemporaryDirectory() as folder:
+        domain = _create_domain(folder, num_entities, seed)
+        print(f"{num_dialogs} simulated dialogs, {num_entities} entities")
+        print("users answering only the requests")
+        for name, policy_class in (("previous heuristic", PreviousHeuristicPolicy),
+                                   ("information gain", HandcraftedPolicy)):
+            searches = _requests_to_identify(domain, policy_class(domain, logger=logger), num_dialogs, seed)
+            print(f"{name:>19}: {sum(requests for requests, _ in searches) / len(searches):5.2f} requests, "
+                  f"{sum(results for _, results in searches) / len(searches):5.2f} results left")
+        # users of usermodel.cfg answer most requests with 'dontcare', users with a constraint
+        # for every slot answer each request
+        for num_constraints in (None, (len(SLOTS), len(SLOTS))):
+            print("goals with " + ("the constraints of usermodel.cfg" if num_constraints is None else
+                                   f"{num_constraints[0]}-{num_constraints[1]} constraints"))
+            for name, policy_class in (("previous heuristic", PreviousHeuristicPolicy),
+                                       ("information gain", HandcraftedPolicy)):
+                dialogs = _run_dialogs(domain, policy_class(domain, logger=logger), num_dialogs, seed,
+                                       num_constraints)
+                successful = [turns for turns, success in dialogs if success]
+                print(f"{name:>19}: {sum(turns for turns, _ in dialogs) / len(dialogs):5.2f} turns, "
+                      f"{sum(successful) / max(len(successful), 1):5.2f} turns per successful dialog, "
+                      f"success {len(successful) / len(dialogs) * 100:5.1f} %")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--dialogs', type=int, default=1000, help='number of simulated dialogs per policy')
+    parser.add_argument('--entities', type=int, default=2000, help='number of entities of the synthetic domain')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the domain and the simulated users')
+    args = parser.parse_args()
+    main(args.dialogs, args.entities, args.seed)
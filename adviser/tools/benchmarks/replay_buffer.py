@@ -0,0 +1,81 @@
+###############################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+"""
+Benchmark for the prioritized experience replay buffers: fills a NaivePrioritizedBuffer and a
+PrioritizedBuffer (sum tree) of each size and reports the time of sampling a batch and updating
+the priorities of the sampled transitions, as done in every training step of the DQNPolicy.
+
+Usage: python tools/benchmarks/replay_buffer.py [--sizes N N ...] [--batch N] [--repeat N]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+head_location = os.path.abspath(os.path.join(os.path.abspath(__file__), '..', '..', '..')) # main folder of adviser
+sys.path.append(head_location)
+
+import torch
+
+from services.policy.rl.experience_buffer import NaivePrioritizedBuffer, PrioritizedBuffer
+from utils import common
+
+STATE_DIM = 16
+DIALOG_LENGTH = 10
+
+
+def _fill(buffer):
+    """ Fills the buffer with dialogs of random transitions """
+    while len(buffer) < buffer.buffer_size:
+        states = list(torch.rand(DIALOG_LENGTH, 1, STATE_DIM).unbind(0))
+        actions = torch.randint(0, 10, (DIALOG_LENGTH,)).tolist()
+        buffer.store_dialog(states, actions, [-1.0] * DIALOG_LENGTH, 20.0)
+
+
+def _train_step(buffer):
+    s_batch, a_batch, r_batch, s2_batch, t_batch, indices, weights = buffer.sample()
+    buffer.update_batch(indices, torch.rand(len(indices)))
+
+
+def main(sizes: list, batch_size: int, repeat: int):
+    common.init_random(0)
+    print(f"batch size {batch_size}, time per sample + priority update")
+    print(f"{'buffer size':>12} {'naive [ms]':>11} {'sum tree [ms]':>14}")
+    for size in sizes:
+        times = []
+        for buffer_cls in (NaivePrioritizedBuffer, PrioritizedBuffer):
+            buffer = buffer_cls(size, batch_size, STATE_DIM)
+            _fill(buffer)
+            start = time.perf_counter()
+            for _ in range(repeat):
+                _train_step(buffer)
+            times.append((time.perf_counter() - start) / repeat * 1000)
+        print(f"{size:>12} {times[0]:>11.3f} {times[1]:>14.3f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[8192, 65536, 262144, 1048576],
+                        help='buffer sizes')
+    parser.add_argument('--batch', type=int, default=64, help='batch size')
+    parser.add_argument('--repeat', type=int, default=20, help='measured training steps per buffer')
+    args = parser.parse_args()
+    main(args.sizes, args.batch, args.repeat)
@@ -0,0 +1,158 @@
+###############################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+"""
+Measures the time to the final transcript of recorded utterances (16 kHz mono WAV files, e.g. the
+`*_user.wav` files the SpeechRecorder writes to its conversation log directory) for the speech
+input pipeline and the streaming speech input pipeline.
+
+The recording is replayed in blocks of 1024 samples at the speed of a microphone. The
+end of speech and the end of the utterance are detected as by the SpeechRecorder. The time to
+the final transcript is the time from the block which ends the utterance to the user
+utterance.
+- Pipeline: the SpeechInputFeatureExtractor and the SpeechInputDecoder process the whole
+  recording.
+- Streaming pipeline: the StreamingSpeechInputFeatureExtractor and the
+  StreamingSpeechInputDecoder process the chunks in a second thread while the recording is
+  replayed.
+
+Usage: python tools/benchmarks/speech_streaming.py WAV [WAV ...] [--speed FACTOR] [--threshold N]
+"""
+
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
+import wave
+
+import numpy as np
+
+head_location = os.path.abspath(os.path.join(os.path.abspath(__file__), '..', '..', '..')) # main folder of adviser
+sys.path.append(head_location)
+
+from services.hci.speech import SpeechInputDecoder, SpeechInputFeatureExtractor
+from services.hci.speech import StreamingSpeechInputDecoder, StreamingSpeechInputFeatureExtractor
+from services.hci.speech.streaming import UtteranceChunker
+
+BLOCK_SIZE = 1024
+SAMPLING_RATE = 16000
+
+
+def _read_wav(wav_file: str) -> np.ndarray:
+    with wave.open(wav_file, 'rb') as audio_file:
+        assert audio_file.getframerate() == SAMPLING_RATE and audio_file.getnchannels() == 1 \
+            and audio_file.getsampwidth() == 2, f"{wav_file} is not a 16 kHz mono 16 bit recording"
+        return np.frombuffer(audio_file.readframes(audio_file.getnframes()), dtype=np.int16)
+
+
+def _replay(samples: np.ndarray, threshold: int, speed: float, on_chunk=None):
+    """ Replays the recording block by block at the speed of a microphone (times `speed`) until
+        the utterance ends, passing the chunks of the utterance to `on_chunk`
+
+    Returns:
+        the time at which the block ending the utterance was recorded and the number of recorded blocks
+    """
+    chunker = UtteranceChunker(SAMPLING_RATE, BLOCK_SIZE, threshold)
+    num_blocks = 0
+    start = time.perf_counter()
+    for num_blocks, offset in enumerate(range(0, len(samples) - BLOCK_SIZE + 1, BLOCK_SIZE), 1):
+        # wait until the block would have been recorded
+        time.sleep(max(0.0, start + num_blocks * BLOCK_SIZE / SAMPLING_RATE / speed - time.perf_counter()))
+        chunks = chunker.add_block(samples[offset:offset + BLOCK_SIZE])
+        if on_chunk is not None:
+            for chunk in chunks:
+                on_chunk(chunk)
+        if chunker.finished:
+            break
+    else:
+        # the recording stops before the end of the utterance was detected
+        if on_chunk is not None:
+            on_chunk(chunker.end_utterance())
+    return time.perf_counter(), num_blocks
+
+
+def _pipeline(samples, threshold, speed, extractor, decoder):
+    """ Returns (time to the final transcript, transcript) of the pipeline """
+    end, num_blocks = _replay(samples, threshold, speed)
+    # the recorder publishes everything recorded until the end of the utterance
+    recorded = samples[:num_blocks * BLOCK_SIZE].astype(np.float32)
+    features = extractor.speech_to_features((recorded, SAMPLING_RATE))['speech_features']
+    user_utterance = decoder.features_to_text(features)['gen_user_utterance']
+    return time.perf_counter() - end, user_utterance
+
+
+def _streaming_pipeline(samples, threshold, speed, extractor, decoder):
+    """ Returns (time to the final transcript, transcript, number of partial hypotheses) of the
+        streaming pipeline """
+    chunks = queue.Queue()
+    result = {}
+
+    def process():
+        partials = 0
+        while True:
+            # like queued topics: all chunks received while the previous ones were processed
+            received = [chunks.get()]
+            while not chunks.empty():
+                received.append(chunks.get())
+            feature_chunk = extractor.speech_chunks_to_features(received)['speech_features_chunk']
+            hypothesis = decoder.feature_chunks_to_text([feature_chunk]) or {}
+            partials += 'partial_user_utterance' in hypothesis
+            if 'gen_user_utterance' in hypothesis:
+                result.update(end=time.perf_counter(), text=hypothesis['gen_user_utterance'], partials=partials)
+                return
+
+    worker = threading.Thread(target=process)
+    worker.start()
+    end, _ = _replay(samples, threshold, speed, chunks.put)
+    worker.join()
+    return result['end'] - end, result['text'], result['partials']
+
+
+def main(wav_files: list, speed: float, threshold: int):
+    extractor, decoder = SpeechInputFeatureExtractor(), SpeechInputDecoder()
+    streaming_extractor, streaming_decoder = StreamingSpeechInputFeatureExtractor(), StreamingSpeechInputDecoder()
+    # warm up
+    features = extractor.speech_to_features((np.zeros(SAMPLING_RATE, np.float32), SAMPLING_RATE))['speech_features']
+    decoder.features_to_text(features)
+
+    totals = [0.0, 0.0]
+    for wav_file in wav_files:
+        samples = _read_wav(wav_file)
+        offline_time, offline_text = _pipeline(samples, threshold, speed, extractor, decoder)
+        streaming_time, streaming_text, partials = _streaming_pipeline(samples, threshold, speed,
+                                                                       streaming_extractor, streaming_decoder)
+        totals[0] += offline_time
+        totals[1] += streaming_time
+        print(f"{os.path.basename(wav_file)} ({len(samples) / SAMPLING_RATE:.1f} s): "
+              f"pipeline {offline_time * 1000:7.1f} ms, streaming {streaming_time * 1000:7.1f} ms "
+              f"({partials} partial hypotheses)")
+        print(f"    pipeline:  {offline_text}\n    streaming: {streaming_text}")
+    print(f"mean time to the final transcript: pipeline {totals[0] / len(wav_files) * 1000:.1f} ms, "
+          f"streaming {totals[1] / len(wav_files) * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('wav_files', nargs='+', help='recorded utterances (16 kHz mono 16 bit WAV files)')
+    parser.add_argument('--speed', type=float, default=1.0, help='replay speed relative to a microphone')
+    parser.add_argument('--threshold', type=int, default=8000, help='loudness threshold of the SpeechRecorder')
+    args = parser.parse_args()
+    main(args.wav_files, args.speed, args.threshold)
@@ -0,0 +1,76 @@
+###############################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+"""
+Benchmark for routing received topics to the arguments of a subscriber function: compares the
+`TopicRouter` with scanning all subscribed topics for the longest prefix (the former routing of
+`Service._collect_message`) for listeners with many topics and domain suffixes.
+
+Usage: python tools/benchmarks/topic_routing.py [--topics N] [--domains N] [--messages N]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+head_location = os.path.abspath(os.path.join(os.path.abspath(__file__), '..', '..', '..')) # main folder of adviser
+sys.path.append(head_location)
+
+from services.service import TopicRouter
+
+
+def scan(topic: str, all_sub_topics: list) -> str:
+    """ Longest prefix by testing every subscribed topic """
+    common_prefix = ""
+    for key in all_sub_topics:
+        if topic.startswith(key) and len(topic) > len(common_prefix):
+            common_prefix = key
+    return common_prefix
+
+
+def _measure(route, received: list) -> float:
+    """ Returns routed messages per second """
+    start = time.perf_counter()
+    for topic in received:
+        route(topic)
+    return len(received) / (time.perf_counter() - start)
+
+
+def main(num_topics: int, num_domains: int, num_messages: int):
+    # topics sharing prefixes, like sys_act / sys_act_detail
+    topics = [f"topic{index // 4}" + "_detail" * (index % 4) for index in range(num_topics)]
+    received = [f"{topics[index % num_topics]}/domain{index % num_domains}" for index in range(num_messages)]
+    router = TopicRouter(topics, [])
+    assert all(router.route(topic)[0] == scan(topic, topics) for topic in set(received))
+    router = TopicRouter(topics, [])
+
+    print(f"{num_topics} subscribed topics, {num_domains} domains, {num_messages} messages")
+    print(f"{'routing':>12} {'messages/s':>12}")
+    print(f"{'scan':>12} {_measure(lambda topic: scan(topic, topics), received):>12.0f}")
+    print(f"{'trie':>12} {_measure(router.route, received):>12.0f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--topics', type=int, default=16, help='number of topics the listener subscribes to')
+    parser.add_argument('--domains', type=int, default=8, help='number of domain suffixes of the received topics')
+    parser.add_argument('--messages', type=int, default=200000, help='number of routed messages')
+    args = parser.parse_args()
+    main(args.topics, args.domains, args.messages)
@@ -0,0 +1,142 @@
+###############################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+"""
+Benchmark for the transports of the `DialogSystem`: measures the turn latency of the recipe bot
+(domain tracker, NLU, BST, policy and NLG) over tcp, ipc and inproc (in one process, messages
+passed by reference), compared with calling the services directly.
+
+Usage: python tools/benchmarks/transport_latency.py [--dialogs N]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+head_location = os.path.abspath(os.path.join(os.path.abspath(__file__), '..', '..', '..')) # main folder of adviser
+sys.path.append(head_location)
+
+import numpy as np
+
+from recipe_project.bst import RecipeBST
+from recipe_project.domain import RecipeDomain
+from recipe_project.nlg import RecipeNLG
+from recipe_project.nlu import RecipeNLU
+from recipe_project.policy import RecipePolicy
+from services.domain_tracker import DomainTracker
+from services.service import DialogSystem, PublishSubscribe, Service
+from services.session import session_context
+from utils.logger import DiasysLogger, LogLevel
+
+UTTERANCES = ["hello", "suggest me a recipe with mango", "something vegetarian please",
+              "how long does it take?", "thank you, bye"]
+
+
+class UserIO(Service):
+    """ Publishes user utterances and waits for the system's answer """
+
+    def __init__(self):
+        Service.__init__(self, domain="")
+        self.answered = threading.Event()
+
+    @PublishSubscribe(pub_topics=["gen_user_utterance"])
+    def say(self, text: str):
+        return {'gen_user_utterance': text}
+
+    @PublishSubscribe(sub_topics=["sys_utterance"])
+    def hear(self, sys_utterance: str = None):
+        self.answered.set()
+
+
+def _bot(domain: RecipeDomain) -> list:
+    logger = DiasysLogger(console_log_lvl=LogLevel.NONE)
+    return [DomainTracker(domains=[domain]), RecipeNLU(domain=domain, logger=logger),
+            RecipeBST(domain=domain, logger=logger), RecipePolicy(domain=domain, logger=logger),
+            RecipeNLG(domain=domain, logger=logger)]
+
+
+def _report(name: str, latencies: list):
+    latencies = np.array(latencies) * 1000
+    print(f"{name:>10} {np.median(latencies):>9.3f} {np.percentile(latencies, 95):>9.3f}")
+
+
+def over_bus(domain: RecipeDomain, protocol: str, num_dialogs: int):
+    io = UserIO()
+    ds = DialogSystem(services=[io] + _bot(domain), protocol=protocol)
+    latencies = []
+    for dialog in range(num_dialogs):
+        ds.start_session(dialog, start_signals={})
+        for utterance in UTTERANCES:
+            io.answered.clear()
+            start = time.perf_counter()
+            with session_context(dialog):
+                io.say(utterance)
+            io.answered.wait()
+            latencies.append(time.perf_counter() - start)
+        ds.end_session(dialog)
+    ds.shutdown()
+    if protocol != 'inproc':
+        ds._proxy_dev.launcher.terminate()
+    _report(protocol, latencies)
+
+
+def direct(domain: RecipeDomain, num_dialogs: int):
+    """ Calls the subscriber functions of the services one after the other (no bus) """
+    tracker, nlu, bst, policy, nlg = _bot(domain)
+    latencies = []
+    for dialog in range(num_dialogs):
+        with session_context(dialog):
+            for service in (tracker, nlu, bst, policy, nlg):
+                service.dialog_start()
+            for utterance in UTTERANCES:
+                start = time.perf_counter()
+                routed = tracker.select_domain(gen_user_utterance=utterance)
+                if 'user_utterance' in routed:
+                    user_acts = nlu.extract_user_acts(user_utterance=routed['user_utterance'])['user_acts']
+                    beliefstate = bst.update_bst(user_acts=user_acts)['beliefstate']
+                    result = policy.generate_sys_acts(beliefstate=beliefstate)
+                    nlu._update_bot_state(bot_state=result['bot_state'])
+                    bst.bot_state_changed(bot_state=result['bot_state'])
+                    nlg.publish_system_utterance(sys_act=result['sys_act'], bot_state=result['bot_state'])
+                latencies.append(time.perf_counter() - start)
+    _report('direct', latencies)
+
+
+def main(num_dialogs: int):
+    # in memory: the benchmark must not change the database file
+    domain = RecipeDomain(in_memory=True)
+    print(f"{num_dialogs} dialogs with {len(UTTERANCES)} turns")
+    print(f"{'transport':>10} {'p50 [ms]':>9} {'p95 [ms]':>9}")
+    # ipc creates its socket files in the working directory
+    os.chdir(tempfile.mkdtemp())
+    for protocol in ('tcp', 'ipc', 'inproc'):
+        over_bus(domain, protocol, num_dialogs)
+    direct(domain, num_dialogs)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--dialogs', type=int, default=20, help='number of measured dialogs')
+    args = parser.parse_args()
+    main(args.dialogs)
+    # the listener threads of the services are only stopped on exit
+    os._exit(0)
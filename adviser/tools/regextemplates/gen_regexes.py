@@ -20,11 +20,14 @@
 import argparse
 import os
 import sys
+from typing import Dict, Tuple
 
 head_location = os.path.abspath(os.path.join(os.path.abspath(__file__), '..', '..', '..')) # main folder of adviser
 sys.path.append(head_location)
 
 import json
+from services.nlu.rulecache import read_inform_patterns, source_hash, write_inform_patterns
+from services.nlu.rulematcher import PLACEHOLDER, SlotRules
 from utils.domain.jsonlookupdomain import JSONLookupDomain
 from utils.useract import UserAct, UserActionType
 from tools.regextemplates.rules.regexfile import RegexFile
@@ -54,11 +57,84 @@ def _create_inform_json(domain: JSONLookupDomain, template: RegexFile):
     return inform_regex_json
 
 
-def create_json_from_template(domain: JSONLookupDomain, template_filename: str):
+def create_inform_rules(domain: JSONLookupDomain, template: RegexFile,
+                        previous: Dict[str, SlotRules] = None) -> Dict[str, SlotRules]:
+    """ Creates the inform rules of all informable slots as one pattern per slot
+
+    The pattern is the rule generated for a placeholder value. The rule of every value is generated
+    once to check that it only differs from the pattern in the value; values with other rules (e.g.
+    because of special cases) are stored as exceptions.
+
+    Args:
+        domain (JSONLookupDomain): domain whose ontology lists the values
+        template (RegexFile): the parsed .nlu file
+        previous (Dict[str, SlotRules]): rules generated from the same .nlu file before, e.g. for an
+                                         older ontology - only values missing there are generated
+
+    Returns:
+        slot -> rules
+    """
+    inform_rules = {}
+    for slot in domain.get_informable_slots():
+        # sorted like the keys of the expanded rules, so the order of matched values stays the same
+        values = sorted(domain.get_possible_values(slot))
+        old = previous.get(slot) if previous else None
+        pattern = old.pattern if old is not None else None
+        if pattern is None and values:
+            pattern = template.create_regex(UserAct(act_type=UserActionType.Inform, slot=slot, value=PLACEHOLDER))
+        exceptions = {}
+        for value in values:
+            if old is not None and value in old:
+                if value in old.exceptions:
+                    exceptions[value] = old.exceptions[value]
+                continue
+            regex = template.create_regex(UserAct(act_type=UserActionType.Inform, slot=slot, value=value))
+            if regex != pattern.replace(PLACEHOLDER, value):
+                exceptions[value] = regex
+        inform_rules[slot] = SlotRules(pattern, values, exceptions)
+    return inform_rules
+
+
+def create_rules_from_template(domain: JSONLookupDomain, template_filename: str,
+                               previous: Dict[str, SlotRules] = None) -> Tuple[dict, Dict[str, SlotRules]]:
+    """ Returns the request rules (slot -> regex) and inform rules (slot -> `SlotRules`) of a .nlu file
+
+    Args:
+        domain (JSONLookupDomain): domain whose ontology lists the slots and values
+        template_filename (str): the .nlu file
+        previous (Dict[str, SlotRules]): inform rules generated from the same .nlu file before (see
+                                         `create_inform_rules`)
+    """
     template = RegexFile(template_filename, domain)
+    return _create_request_json(domain, template), create_inform_rules(domain, template, previous)
+
+
+def create_json_from_template(domain: JSONLookupDomain, template_filename: str, incremental: bool = True,
+                              expanded: bool = False):
+    """ Writes the request rules and inform patterns of a .nlu file to resources/nlu_regexes
+
+    Args:
+        domain (JSONLookupDomain): domain whose ontology lists the slots and values
+        template_filename (str): the .nlu file
+        incremental (bool): only generate the rules of values missing in the existing inform patterns
+                            (if they were generated from the same .nlu file)
+        expanded (bool): also write the rules of every value (<domain>InformRules.json)
+    """
     domain_name = domain.get_domain_name()
-    _write_dict_to_file(_create_request_json(domain, template), f'{domain_name}RequestRules.json')
-    _write_dict_to_file(_create_inform_json(domain, template), f'{domain_name}InformRules.json')
+    patterns_file = os.path.join(head_location, 'resources', 'nlu_regexes', f'{domain_name}InformPatterns.json')
+    nlu_hash = source_hash(template_filename)
+    previous = None
+    if incremental and os.path.exists(patterns_file):
+        previous_hash, previous_rules = read_inform_patterns(patterns_file)
+        if previous_hash == nlu_hash:
+            previous = previous_rules
+
+    request_rules, inform_rules = create_rules_from_template(domain, template_filename, previous)
+    _write_dict_to_file(request_rules, f'{domain_name}RequestRules.json')
+    write_inform_patterns(patterns_file, nlu_hash, inform_rules)
+    if expanded:
+        _write_dict_to_file({slot: dict(rules) for slot, rules in inform_rules.items()},
+                            f'{domain_name}InformRules.json')
 
 
 if __name__ == '__main__':
@@ -66,7 +142,11 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument("domain", help="name of the domain")
     parser.add_argument("filename", help="name of your .nlu file without the .nlu ending (e.g.: resources/nlu_regexes/YOURNLUFILE.nlu -> provide YOURFILE)")
+    parser.add_argument("--full", action="store_true",
+                        help="generate the rules of all values, not only of values added to the ontology")
+    parser.add_argument("--expanded", action="store_true",
+                        help="also write the rule of every value to <domain>InformRules.json")
     args = parser.parse_args()
     nlu_file = os.path.join(head_location, 'resources', 'nlu_regexes', f"{args.filename}.nlu")
     dom = JSONLookupDomain(args.domain)
-    create_json_from_template(dom, nlu_file)
+    create_json_from_template(dom, nlu_file, incremental=not args.full, expanded=args.expanded)
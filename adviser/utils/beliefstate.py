@@ -24,6 +24,16 @@ import copy
 from utils.domain.jsonlookupdomain import JSONLookupDomain
 
 
+def _copy_value(key, value):
+    """ Copies a value shared with the previous turn, so it can be changed in the current turn """
+    if key == 'informs':
+        # slot -> {value: probability}
+        return {slot: dict(values) for slot, values in value.items()}
+    if isinstance(value, (dict, list, set)):
+        return copy.copy(value)
+    return value
+
+
 class BeliefState:
     """
     A representation of the belief state, can be accessed like a dictionary.
@@ -35,28 +45,69 @@ class BeliefState:
         * number of db matches for given constraints
         * if the db matches can further be split
 
+    Each turn is a layer (dict) in the history. A new turn starts as a shallow copy of the
+    previous layer, so both share their values. A shared container (e.g. the informs) is only
+    copied when it is first accessed in the new turn, because it may be changed in place then.
+    Other values (e.g. entities chosen from the database) are never copied, so they must be
+    replaced instead of changed in place. Older turns must not be changed.
+
+    With a `history_window`, only the most recent turns are kept (and sent over the bus).
+    Belief states can be published as deltas (see `services.delta`); the receivers' replicas then
+    get one turn per received message.
+
     """
-    def __init__(self, domain: JSONLookupDomain):
+    def __init__(self, domain: JSONLookupDomain, history_window: int = None):
+        """
+        Args:
+            domain (JSONLookupDomain): the domain of the dialog
+            history_window (int): number of turns to keep, including the current one
+                                  (None: keep all turns)
+        """
         self.domain = domain
+        self.history_window = history_window
         self._history = [self._init_beliefstate()]
-    
+        # keys of the current turn whose values are still shared with the previous turn
+        self._shared = set()
+
     def dialog_start(self):
         self._history = [self._init_beliefstate()]
+        self._shared = set()
+
+    def _current(self, key):
+        """ Returns a value of the current turn, copying it first if it is shared """
+        layer = self._history[-1]
+        if key in self._shared:
+            self._shared.discard(key)
+            layer[key] = _copy_value(key, layer[key])
+        return layer[key]
+
+    def _unshare(self):
+        """ Copies all shared values of the current turn (before handing out the whole turn) """
+        for key in list(self._shared):
+            self._current(key)
 
     def __getitem__(self, val):  # for indexing
         # if used with numbers: int (e.g. state[-2]) or slice (e.g. state[3:6])
         if isinstance(val, int) or isinstance(val, slice):
+            self._unshare()
             return self._history[val]  # interpret the number as turn
         # if used with strings (e.g. state['beliefs'])
         elif isinstance(val, str):
             # take the current turn's belief state
-            return self._history[-1][val]
+            return self._current(val)
+
+    def get(self, key: str, default=None):
+        """ Returns the value of the current turn for key, or default if it is not set """
+        if key in self._history[-1]:
+            return self._current(key)
+        return default
 
     def __iter__(self):
         return iter(self._history[-1])
 
     def __setitem__(self, key, val):
         # e.g. state['beliefs']['area']['west'] = 1.0
+        self._shared.discard(key)
         self._history[-1][key] = val
 
     def __len__(self):
@@ -65,6 +116,53 @@ class BeliefState:
     def __contains__(self, val):  # assume
         return val in self._history[-1]
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if self.history_window is not None:
+            state['_history'] = self._history[-self.history_window:]
+        return state
+
+    def _delta_base(self) -> dict:
+        """ Returns the current turn as base for a later delta (see `services.delta`).
+
+        The returned turn stays unchanged: all its containers are copied when they are accessed again.
+        """
+        self._shared = set(self._history[-1])
+        return dict(self._history[-1])
+
+    def _delta_since(self, base: dict) -> tuple:
+        """ Returns the changes of the current turn compared to a turn returned by `_delta_base`
+
+        Returns:
+            tuple(dict of changed / new values, list of removed keys)
+        """
+        layer = self._history[-1]
+        changed = {key: value for key, value in layer.items()
+                   if key not in base or (value is not base[key] and value != base[key])}
+        removed = [key for key in base if key not in layer]
+        return changed, removed
+
+    def _apply_delta(self, changes: tuple):
+        """ Starts a new turn from changes returned by `_delta_since` (on a replica of the belief state) """
+        changed, removed = changes
+        self.start_new_turn()
+        for key in removed:
+            self._shared.discard(key)
+            del self._history[-1][key]
+        for key, value in changed.items():
+            self[key] = value
+
+    def _delta_view(self) -> 'BeliefState':
+        """ Returns a copy of a replica to hand to a subscriber (see `services.delta`).
+
+        The copy shares all values of the current turn with the replica until they are accessed
+        (like a new turn), so changing them doesn't change the replica the next delta is applied to.
+        """
+        view = copy.copy(self)
+        view._history = self._history[:-1] + [dict(self._history[-1])]
+        view._shared = set(view._history[-1])
+        return view
+
     def _recursive_repr(self, sub_dict, indent=0):
         # if isinstance(sub_dict, type(None)):
         #     return ""
@@ -91,8 +189,11 @@ class BeliefState:
         to ensure the correct history can be accessed correctly by other modules
         """
 
-        # copy last turn's dict
-        self._history.append(copy.deepcopy(self._history[-1]))
+        # share the values of the last turn until they are accessed
+        self._history.append(dict(self._history[-1]))
+        self._shared = set(self._history[-1])
+        if self.history_window is not None and len(self._history) > self.history_window:
+            del self._history[:-self.history_window]
 
     def _init_beliefstate(self):
         """Initializes the belief state based on the currently active domain
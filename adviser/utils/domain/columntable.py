@@ -0,0 +1,168 @@
+###############################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+"""Columnar in-memory copy of database columns for counting values among the entities meeting constraints."""
+
+import string
+import threading
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# sqlite's NOCASE collation only folds ASCII letters
+_NOCASE = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+class _Column(object):
+    """ One column, dictionary encoded: each row stores the index of its value in `values`. """
+
+    def __init__(self, rows: Iterable[Any]):
+        codes_by_value: Dict[Any, int] = {}
+        self.codes = np.fromiter((codes_by_value.setdefault(value, len(codes_by_value)) for value in rows),
+                                 dtype=np.int32)
+        self.values: List[Any] = list(codes_by_value)
+        # case-folded value -> codes of all spellings of the value (NULL never meets a constraint)
+        self.folded: Dict[str, List[int]] = {}
+        for code, value in enumerate(self.values):
+            if value is not None:
+                self.folded.setdefault(str(value).translate(_NOCASE), []).append(code)
+        # rows grouped by value: the rows with code c are _order[_starts[c]:_starts[c + 1]]
+        self._order = np.argsort(self.codes, kind='stable')
+        self._starts = np.concatenate(([0], np.cumsum(np.bincount(self.codes, minlength=len(self.values)))))
+
+    def _codes_equal_to(self, value: Any) -> List[int]:
+        return self.folded.get(str(value).translate(_NOCASE), [])
+
+    def rows_equal_to(self, value: Any) -> np.ndarray:
+        """ Returns the (ascending) rows whose value equals `value`, ignoring case like sqlite's NOCASE """
+        groups = [self._order[self._starts[code]:self._starts[code + 1]] for code in self._codes_equal_to(value)]
+        if len(groups) == 1:
+            return groups[0]
+        return np.sort(np.concatenate(groups)) if groups else np.zeros(0, dtype=self._order.dtype)
+
+    def count_equal_to(self, value: Any) -> int:
+        return int(sum(self._starts[code + 1] - self._starts[code] for code in self._codes_equal_to(value)))
+
+    def filter_equal_to(self, rows: np.ndarray, value: Any) -> np.ndarray:
+        """ Returns those of `rows` whose value equals `value` """
+        allowed = np.zeros(len(self.values), dtype=bool)
+        allowed[self._codes_equal_to(value)] = True
+        return rows[allowed[self.codes[rows]]]
+
+    def counts(self, rows: Optional[np.ndarray] = None) -> Dict[Any, int]:
+        """ Returns value -> number of rows with the value (of the given rows, or of all rows) """
+        if rows is None:
+            counts = np.diff(self._starts)
+        else:
+            counts = np.bincount(self.codes[rows], minlength=len(self.values))
+        return {self.values[code]: int(counts[code]) for code in np.flatnonzero(counts)}
+
+
+class ColumnTable(object):
+    """
+    Columnar copy of some columns of a database table, kept in memory.
+
+    Every column is stored as one integer array over all rows (in the same row order for all
+    columns) plus the list of its distinct values and the rows of each value. Selecting the rows
+    which meet constraints and counting the values of a column among them are vectorized
+    operations, so the Python work only grows with the number of columns and distinct values,
+    not with the number of rows.
+
+    Selections may run in several threads (the services of a dialog system share their domain).
+    """
+
+    def __init__(self, num_rows: int, max_cached_selections: int = 256):
+        """
+        Args:
+            num_rows (int): number of rows of every column
+            max_cached_selections (int): number of constraint sets whose rows are kept, so the rows of
+                                         a constraint set extending one of them (e.g. the user added a
+                                         constraint in the last turn) are found by filtering its rows
+        """
+        self.num_rows = num_rows
+        self._columns: Dict[str, _Column] = {}
+        self._selections: Dict[FrozenSet[Tuple[str, str]], np.ndarray] = {}
+        self.max_cached_selections = max_cached_selections
+        self._selections_lock = threading.Lock()
+
+    def __contains__(self, column: str) -> bool:
+        return column in self._columns
+
+    def add_column(self, column: str, rows: Iterable[Any]):
+        """ Adds a column
+
+        Args:
+            column (str): name of the column
+            rows (Iterable[Any]): the value of each row, in the row order of all other columns
+        """
+        encoded = _Column(rows)
+        if len(encoded.codes) != self.num_rows:
+            raise ValueError(f"column {column} has {len(encoded.codes)} rows instead of {self.num_rows}")
+        self._columns[column] = encoded
+
+    def select(self, constraints: Dict[str, Any]) -> Optional[np.ndarray]:
+        """ Returns the (ascending) rows meeting all constraints (column = value, ignoring case), or
+            None if there are no constraints (all rows)
+
+            The rows are found by filtering the rows of a cached subset of the constraints, or else
+            the rows of the most selective constraint, by the remaining constraints. So the cost grows
+            with the number of rows meeting the constraints known before, not with the table size.
+        """
+        if not constraints:
+            return None
+        key = frozenset((column, str(value).translate(_NOCASE)) for column, value in constraints.items())
+        with self._selections_lock:
+            if key in self._selections:
+                return self._selections[key]
+            # filtering runs without the lock, on the selections cached so far
+            selections = list(self._selections.items())
+
+        remaining = sorted(key, key=lambda item: self._columns[item[0]].count_equal_to(item[1]))
+        column, value = remaining[0]
+        start, rows = {remaining[0]}, None
+        # an earlier selection for some of the constraints, if it has fewer rows
+        for cached, cached_rows in selections:
+            if cached <= key and len(cached_rows) < (self._columns[column].count_equal_to(value)
+                                                     if rows is None else len(rows)):
+                start, rows = cached, cached_rows
+        if rows is None:
+            rows = self._columns[column].rows_equal_to(value)
+        for column, value in remaining:
+            if (column, value) not in start:
+                rows = self._columns[column].filter_equal_to(rows, value)
+
+        with self._selections_lock:
+            if len(self._selections) >= self.max_cached_selections:
+                self._selections.clear()
+            self._selections[key] = rows
+        return rows
+
+    def value_counts(self, constraints: Dict[str, Any], columns: Iterable[str]) -> Dict[str, Dict[Any, int]]:
+        """ Counts the values of columns among the rows meeting the constraints
+
+        Args:
+            constraints (Dict[str, Any]): column -> value every counted row must have
+            columns (Iterable[str]): the columns whose values should be counted
+
+        Returns:
+            column -> value -> number of rows meeting the constraints with that value (values without
+            such rows are left out)
+        """
+        selected = self.select(constraints)
+        return {column: self._columns[column].counts(selected) for column in columns}
@@ -18,13 +18,19 @@
 ###############################################################################
 
 
+import contextlib
+import glob
+import hashlib
 import json
 import os
+import pathlib
 import sqlite3
-from io import StringIO
-from typing import List, Iterable
+import tempfile
+from typing import Any, Dict, List, Iterable, Tuple
 
 from utils.domain import Domain
+from utils.domain.columntable import ColumnTable
+from utils.domain.querycache import QueryCache, ReadOnlyRow
 
 
 class JSONLookupDomain(Domain):
@@ -33,7 +39,8 @@ class JSONLookupDomain(Domain):
     """
 
     def __init__(self, name: str, json_ontology_file: str = None, sqllite_db_file: str = None, \
-                 display_name: str = None):
+                 display_name: str = None, in_memory: bool = True, max_cached_queries: int = 256,
+                 shared_memory: bool = False, working_db_file: str = None, wal: bool = False):
         """ Loads the ontology from a json file and the data from a sqllite
             database.
 
@@ -49,28 +56,62 @@ class JSONLookupDomain(Domain):
                                 (from the top-level adviser directory, e.g. resources/databases)
             display_name (str): the domain's name as it appears on the screen
                                 (e.g. containing whitespaces)
+            in_memory (bool): If True, the database is copied to memory on startup and all
+                              changes (e.g. through `write_db`) are lost once the domain object
+                              is gone. If False, the working copy of the database (see
+                              `working_db_file`) is opened directly: lookups use a read-only
+                              connection, changes are written to the file and survive restarts.
+            max_cached_queries (int): number of results of `find_entities` and
+                              `find_info_about_entity` which are kept (least recently used ones
+                              are dropped first, 0 disables the cache). Writes through `write_db`
+                              clear the cache; changes to the database file by other processes
+                              are only seen for queries which are not cached.
+            shared_memory (bool): Only used if `in_memory` is True. If True, the prepared
+                              database is written once to a snapshot in shared memory (/dev/shm,
+                              or the temp directory if there is none), which all domains of the
+                              same class and database file on this host - in other processes,
+                              or unpickled ones - open read-only instead of loading their own
+                              copy. A private copy is only made on the first `write_db`. The
+                              snapshot is kept after the process ends and is replaced once the
+                              database file changes.
+            working_db_file (str): Only used if `in_memory` is False. Relative path to the database
+                              file which is opened (from the top-level adviser directory). It is
+                              created as a copy of `sqllite_db_file` if it doesn't exist yet, so
+                              the database shipped with the domain is never changed. Defaults to
+                              `sqllite_db_file` with the extension `.user.db`.
+            wal (bool): Only used if `in_memory` is False. If True, the working copy is switched to
+                              WAL journaling (which the file keeps): lookups don't wait for writes
+                              and vice versa, at the cost of `-wal` and `-shm` files next to it.
         """
         super(JSONLookupDomain, self).__init__(name)
 
         root_dir = self._get_root_dir()
         self.sqllite_db_file = sqllite_db_file
+        self.in_memory = in_memory
+        self.shared_memory = shared_memory
+        self.working_db_file = working_db_file
+        self.wal = wal
         # make sure to set default values in case of None
         json_ontology_file = json_ontology_file or os.path.join('resources', 'ontologies',
                                                                 name + '.json')
-        sqllite_db_file = sqllite_db_file or os.path.join('resources', 'databases',
-                                                          name + '.db')
 
-        self.ontology_json = json.load(open(root_dir + '/' + json_ontology_file))
+        with open(os.path.join(root_dir, json_ontology_file)) as ontology_file:
+            self.ontology_json = json.load(ontology_file)
+        self.query_cache = QueryCache(max_cached_queries)
         # load database
-        self.db = self._load_db_to_memory(root_dir + '/' + sqllite_db_file)
+        self._connect_db()
+        # columnar copy of the columns used by `get_value_counts`, built on demand
+        self._column_table = None
 
         self.display_name = display_name if display_name is not None else name
 
     def __getstate__(self):
-        # remove sql connection from state dict so that pickling works
+        # remove sql connections from state dict so that pickling works
         state = self.__dict__.copy()
-        if 'db' in state:
-            del state['db']
+        for connection in ('db', '_write_db'):
+            if connection in state:
+                del state[connection]
+        state['_column_table'] = None
         return state
 
     def _get_root_dir(self):
@@ -85,6 +126,72 @@ class JSONLookupDomain(Domain):
             row_dict[col[0]] = row[col_idx]
         return row_dict
 
+    def _get_db_file_path(self) -> str:
+        """ Returns the absolute path to the database file """
+        sqllite_db_file = self.sqllite_db_file or os.path.join('resources', 'databases',
+                                                               self.name + '.db')
+        return os.path.join(self._get_root_dir(), sqllite_db_file)
+
+    def _get_working_db_file_path(self) -> str:
+        """ Returns the absolute path to the working copy of the database file (file mode) """
+        if self.working_db_file:
+            return os.path.join(self._get_root_dir(), self.working_db_file)
+        return os.path.splitext(self._get_db_file_path())[0] + '.user.db'
+
+    def _connect_db(self):
+        """ Sets up the connection used for lookups (`db`) and the one used for writes """
+        if self.in_memory and self.shared_memory:
+            # the private copy for writes is made by `write_db` when it's needed
+            self.db = self._attach_shared_snapshot(self._get_db_file_path())
+            self._write_db = None
+        elif self.in_memory:
+            self.db = self._load_db_to_memory(self._get_db_file_path())
+            self._write_db = self.db
+        else:
+            self.db, self._write_db = self._open_db_file(self._get_working_db_file_path())
+
+    def _prepare_db(self, db: sqlite3.Connection):
+        """ Called once the database is opened, with a writable connection.
+            Overwrite this function to create indexes or derived tables for your domain
+            (make sure to only create them if they don't exist yet, and to fill in derived data
+            which is missing, e.g. for rows added since).
+
+        Args:
+            db (sqlite3.Connection): writable connection to the domain's database
+        """
+        pass
+
+    def _open_db_file(self, db_file_path: str):
+        """ Opens a sqllite3 database file directly (no copy to memory), creating it as a copy of
+            the domain's database first if it doesn't exist yet.
+
+        Args:
+            db_file_path (str): absolute path to database file
+
+        Returns:
+            A tuple of sqllite3 connections: (read-only connection for lookups, connection for writes)
+        """
+        if not os.path.exists(db_file_path):
+            # other processes only ever see the complete copy
+            partial = '{}.{}.tmp'.format(db_file_path, os.getpid())
+            with contextlib.closing(sqlite3.connect(self._get_db_file_path())) as source, \
+                    contextlib.closing(sqlite3.connect(partial)) as working_copy:
+                source.backup(working_copy)
+            os.replace(partial, db_file_path)
+        write_db = sqlite3.connect(db_file_path, check_same_thread=False)
+        write_db.row_factory = self._sqllite_dict_factory
+        if self.wal:
+            # readers don't block the writer and vice versa, committed writes are visible to readers
+            write_db.execute('PRAGMA journal_mode=WAL')
+            write_db.execute('PRAGMA synchronous=NORMAL')
+        self._prepare_db(write_db)
+        write_db.commit()
+
+        read_db = sqlite3.connect(f'{pathlib.Path(db_file_path).as_uri()}?mode=ro&cache=shared',
+                                  uri=True, check_same_thread=False)
+        read_db.row_factory = self._sqllite_dict_factory
+        return read_db, write_db
+
     def _load_db_to_memory(self, db_file_path : str):
         """ Loads a sqllite3 database from file to memory in order to save
             I/O operations
@@ -95,28 +202,88 @@ class JSONLookupDomain(Domain):
         Returns:
             A sqllite3 connection
         """
+        with contextlib.closing(sqlite3.connect(db_file_path, check_same_thread=False)) as file_db:
+            db = self._copy_to_memory(file_db)
+        self._prepare_db(db)
+        db.commit()
+        return db
+
+    def _copy_to_memory(self, source: sqlite3.Connection) -> sqlite3.Connection:
+        """ Copies a database to memory page by page with SQLite's backup API (much faster than
+            dumping it to SQL statements and executing them again)
+
+        Args:
+            source (sqlite3.Connection): connection to the database to copy
 
-        # open and read db file to temporary file
-        file_db = sqlite3.connect(db_file_path, check_same_thread=False)
-        tempfile = StringIO()
-        for line in file_db.iterdump():
-            tempfile.write('%s\n' % line)
-        file_db.close()
-        tempfile.seek(0)
-        # Create a database in memory and import from temporary file
+        Returns:
+            A sqllite3 connection to the copy in memory
+        """
+        cursor = source.cursor()
+        cursor.row_factory = None
+        page_size = cursor.execute('PRAGMA page_size').fetchone()[0]
         db = sqlite3.connect(':memory:', check_same_thread=False)
+        # the backup fails if the page size of an in-memory destination differs from the source
+        db.execute('PRAGMA page_size = {}'.format(page_size))
+        source.backup(db)
         db.row_factory = self._sqllite_dict_factory
-        db.cursor().executescript(tempfile.read())
-        db.commit()
-        # file_db.backup(databases[domain]) # works only in python >= 3.7
+        return db
+
+    def _shared_snapshot_path(self, db_file_path: str) -> Tuple[str, str]:
+        """ Returns the path of the shared snapshot of the database file for this class (whose
+            `_prepare_db` may add indexes or tables), split into a prefix common to all versions
+            of the file and the version. The size and modification time of the database file (and
+            of its write-ahead log) make up the version, so changes to the file lead to a new
+            snapshot.
+        """
+        folder = '/dev/shm' if os.access('/dev/shm', os.W_OK) else tempfile.gettempdir()
+        source = '{}.{}:{}'.format(type(self).__module__, type(self).__qualname__,
+                                   os.path.realpath(db_file_path))
+        prefix = os.path.join(folder, 'adviser-{}-{}-'.format(
+            self.name, hashlib.sha1(source.encode()).hexdigest()[:16]))
+        version = '-'.join('{}-{}'.format(stat.st_mtime_ns, stat.st_size)
+                           for stat in (os.stat(path) for path in (db_file_path, db_file_path + '-wal')
+                                        if os.path.exists(path)))
+        return prefix, version + '.db'
+
+    def _attach_shared_snapshot(self, db_file_path: str) -> sqlite3.Connection:
+        """ Opens the shared snapshot of the prepared database (creating it if it doesn't exist
+            yet) read-only. The snapshot is memory-mapped, so all processes read the same pages.
 
+        Args:
+            db_file_path (str): absolute path to database file
+
+        Returns:
+            A read-only sqllite3 connection to the snapshot
+        """
+        prefix, version = self._shared_snapshot_path(db_file_path)
+        snapshot = prefix + version
+        if not os.path.exists(snapshot):
+            with contextlib.closing(self._load_db_to_memory(db_file_path)) as db:
+                # other processes only ever see the complete snapshot
+                partial = '{}.{}.tmp'.format(snapshot, os.getpid())
+                with contextlib.closing(sqlite3.connect(partial)) as snapshot_db:
+                    db.backup(snapshot_db)
+                os.replace(partial, snapshot)
+            # domains still using snapshots of previous versions keep them open
+            for previous in glob.glob(glob.escape(prefix) + '*.db'):
+                if previous != snapshot:
+                    with contextlib.suppress(OSError):
+                        os.remove(previous)
+        # immutable: the snapshot is never changed, so no locks are needed
+        db = sqlite3.connect('{}?mode=ro&immutable=1'.format(pathlib.Path(snapshot).as_uri()),
+                             uri=True, check_same_thread=False)
+        db.execute('PRAGMA mmap_size = {}'.format(os.path.getsize(snapshot)))
+        db.row_factory = self._sqllite_dict_factory
         return db
 
-    def find_entities(self, constraints: dict, requested_slots: Iterable = iter(())):
+    def find_entities(self, constraints: dict, requested_slots: Iterable = iter(())) -> Tuple[ReadOnlyRow, ...]:
         """ Returns all entities from the data backend that meet the constraints, with values for
             the primary key and the system requestable slots (and optional slots, specifyable
             via requested_slots).
 
+            Results are cached (see `query_cache`), so the rows are shared by all callers and
+            can't be changed.
+
         Args:
             constraints (dict): Slot-value mapping of constraints.
                                 If empty, all entities in the database will be returned.
@@ -125,21 +292,65 @@ class JSONLookupDomain(Domain):
 
         """
         # values for name and all system requestable slots
-        select_clause = ", ".join(set([self.get_primary_key()]) |
-                                  set(self.get_system_requestable_slots()) |
-                                  set(requested_slots))
-        query = "SELECT {} FROM {}".format(select_clause, self.get_domain_name())
-        constraints = {slot: value.replace("'", "''") for slot, value in constraints.items()
+        columns = frozenset(set([self.get_primary_key()]) |
+                            set(self.get_system_requestable_slots()) |
+                            set(requested_slots))
+        constraints = {slot: str(value) for slot, value in constraints.items()
                        if value is not None and str(value).lower() != 'dontcare'}
-        if constraints:
-            query += ' WHERE ' + ' AND '.join("{}='{}' COLLATE NOCASE".format(key, str(val))
-                                              for key, val in constraints.items())
-        return self.query_db(query)
 
-    def find_info_about_entity(self, entity_id, requested_slots: Iterable):
+        def query():
+            query_str = "SELECT {} FROM {}".format(", ".join(columns), self.get_domain_name())
+            if constraints:
+                query_str += ' WHERE ' + ' AND '.join("{}='{}' COLLATE NOCASE".format(key, val.replace("'", "''"))
+                                                      for key, val in constraints.items())
+            return self.query_db(query_str)
+        return self.query_cache.get(('entities', frozenset(constraints.items()), columns), query)
+
+    def get_value_counts(self, constraints: dict, slots: Iterable[str]) -> Dict[str, Dict[Any, int]]:
+        """ Counts how often each value of the slots occurs among the entities that meet the
+            constraints (the entities returned by `find_entities`).
+
+            The counts are taken from a columnar copy of the database columns, which is built on
+            the first call and dropped by `write_db`.
+
+        Args:
+            constraints (dict): Slot-value mapping of constraints.
+                                If empty, all entities in the database are counted.
+            slots (Iterable[str]): the slots whose values should be counted
+
+        Returns:
+            slot -> value -> number of entities meeting the constraints with that value (values
+            without such entities are left out)
+        """
+        constraints = {slot: value for slot, value in constraints.items()
+                       if value is not None and str(value).lower() != 'dontcare'}
+        slots = list(slots)
+        table = self._get_column_table(set(constraints) | set(slots))
+        return table.value_counts(constraints, slots)
+
+    def _get_column_table(self, columns: Iterable[str]) -> ColumnTable:
+        """ Returns the columnar copy of the database, adding the given columns if they are missing """
+        table = self.__dict__.get('_column_table')
+        if table is None:
+            count = self.query_db("SELECT COUNT(*) AS count FROM {}".format(self.get_domain_name()))
+            table = self._column_table = ColumnTable(count[0]['count'])
+        if "db" not in self.__dict__:
+            self._connect_db()
+        for column in columns:
+            if column not in table:
+                cursor = self.db.cursor()
+                cursor.row_factory = None  # plain tuples, no dict per row
+                cursor.execute("SELECT {} FROM {} ORDER BY rowid".format(column, self.get_domain_name()))
+                table.add_column(column, (row[0] for row in cursor))
+        return table
+
+    def find_info_about_entity(self, entity_id, requested_slots: Iterable) -> Tuple[ReadOnlyRow, ...]:
         """ Returns the values (stored in the data backend) of the specified slots for the
             specified entity.
 
+            Results are cached (see `query_cache`), so the rows are shared by all callers and
+            can't be changed.
+
         Args:
             entity_id (str): primary key value of the entity
             requested_slots (dict): slot-value mapping of constraints
@@ -152,27 +363,46 @@ class JSONLookupDomain(Domain):
             select_clause = "*"
         query = 'SELECT {} FROM {} WHERE {}="{}";'.format(
             select_clause, self.get_domain_name(), self.get_primary_key(), entity_id)
-        return self.query_db(query)
+        return self.query_cache.get(('info', str(entity_id), select_clause), lambda: self.query_db(query))
 
-    def query_db(self, query_str):
+    def query_db(self, query_str, parameters: Iterable = ()):
         """ Function for querying the sqlite3 db
 
         Args:
             query_str (string): sqlite3 query style string
+            parameters (Iterable): values for the placeholders (?) in the query string
 
         Return:
             (iterable): rows of the query response set
         """
         if "db" not in self.__dict__:
-            root_dir = self._get_root_dir()
-            sqllite_db_file = self.sqllite_db_file or os.path.join(
-                'resources', 'databases', self.name + '.db')
-            self.db = self._load_db_to_memory(root_dir + '/' + sqllite_db_file)
+            self._connect_db()
         cursor = self.db.cursor()
-        cursor.execute(query_str)
+        cursor.execute(query_str, parameters)
         res = cursor.fetchall()
         return res
 
+    def write_db(self, query_str: str, parameters: Iterable = ()):
+        """ Function for changing the sqlite3 db (e.g. UPDATE / INSERT statements).
+            The change is committed right away; if the domain is not kept in memory, it is
+            written to the database file.
+
+        Args:
+            query_str (string): sqlite3 query style string
+            parameters (Iterable): values for the placeholders (?) in the query string
+        """
+        if "_write_db" not in self.__dict__:
+            self._connect_db()
+        if self._write_db is None:
+            # copy-on-write: leave the shared snapshot to the other domains
+            with contextlib.closing(self.db):
+                self.db = self._write_db = self._copy_to_memory(self.db)
+        with self._write_db:
+            self._write_db.execute(query_str, tuple(parameters))
+        # the value counts and cached results were taken from the (possibly changed) database
+        self._column_table = None
+        self.query_cache.clear()
+
     def get_display_name(self):
         return self.display_name
 
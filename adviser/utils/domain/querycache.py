@@ -0,0 +1,104 @@
+###############################################################################
+#
+# Copyright 2020, University of Stuttgart: Institute for Natural Language Processing (IMS)
+#
+# This file is part of Adviser.
+# Adviser is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3.
+#
+# Adviser is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Adviser.  If not, see <https://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+"""Bounded LRU cache for the results of database lookups of a domain."""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, Iterable, Tuple
+
+
+class ReadOnlyRow(dict):
+    """ A database row (column -> value) which can't be changed, so it can be shared by all
+        callers getting the same cached result. Copy it with `dict(row)` to change it. """
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("rows of cached query results can't be changed, use dict(row) for a copy")
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _read_only
+    __ior__ = _read_only
+
+    def __reduce__(self):
+        return ReadOnlyRow, (dict(self),)
+
+
+class QueryCache(object):
+    """ Keeps the results of the most recently used queries (least recently used ones are dropped
+        once `max_size` results are stored) and counts how many lookups it could answer.
+        Safe to share between threads (e.g. the services of a dialog system).
+
+    Attributes:
+        hits (int): number of lookups answered from the cache
+        misses (int): number of lookups which had to query the database
+    """
+
+    def __init__(self, max_size: int = 256):
+        """
+        Args:
+            max_size (int): maximum number of cached results (0 disables the cache)
+        """
+        self.max_size = max_size
+        self._results: 'OrderedDict[Hashable, Tuple[ReadOnlyRow, ...]]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def __reduce__(self):
+        # cached results are only valid for the connection they were queried from
+        return QueryCache, (self.max_size,)
+
+    @property
+    def hit_rate(self) -> float:
+        """ Share of all lookups answered from the cache (0 if there were none) """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, key: Hashable, query: Callable[[], Iterable[dict]]) -> Tuple[ReadOnlyRow, ...]:
+        """ Returns the cached result for the key, or runs the query and caches its result
+
+        Args:
+            key (Hashable): normalized description of the query
+            query (Callable[[], Iterable[dict]]): returns the rows of the query
+
+        Returns:
+            the rows of the result (shared with all other callers, so they can't be changed)
+        """
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None:
+                self.hits += 1
+                self._results.move_to_end(key)
+                return result
+            self.misses += 1
+        # query without holding the lock, so lookups of other threads don't wait for the database
+        result = tuple(ReadOnlyRow(row) for row in query())
+        if self.max_size > 0:
+            with self._lock:
+                self._results[key] = result
+                while len(self._results) > self.max_size:
+                    self._results.popitem(last=False)
+        return result
+
+    def clear(self):
+        """ Drops all cached results (the counters are kept) """
+        with self._lock:
+            self._results.clear()